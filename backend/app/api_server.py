@@ -5,44 +5,71 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import base64
+import json
 import logging
 from datetime import datetime
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 from app.config import Config
 from app.database import TradeRecord, SQLiteAdapter
-from app.parser import ExcelParser
+from app.http_cache import conditional, enable_gzip, storage_version
+from app.import_jobs import ImportJobQueue, ImportQueueFull, UploadRequest
 
 logger = logging.getLogger(__name__)
 
+# 交易列表分页
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(trade: TradeRecord) -> str:
+    """将一页最后一条记录的 (trade_date, trade_time, id) 编码为游标"""
+    key = json.dumps([trade.trade_date, trade.trade_time, trade.id])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        trade_date, trade_time, trade_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(trade_date), str(trade_time), int(trade_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
 def create_app():
     """创建Flask应用"""
     app = Flask(__name__)
+    app.request_class = UploadRequest  # 上传文件在内存中接收并计算哈希
     CORS(app)  # 允许跨域请求
 
     # 配置
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-    app.config['UPLOAD_FOLDER'] = Config.WATCH_FOLDER
 
     # 初始化数据库 - 强制使用SQLite用于Web API
     storage = SQLiteAdapter(Config.SQLITE_DB_PATH)
+    data_version = storage_version(storage)
+    enable_gzip(app)
 
-    # 确保上传目录存在
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # 上传文件的导入任务（后台线程数和排队数有上限）
+    import_jobs = ImportJobQueue(storage)
+    app.extensions['import_jobs'] = import_jobs
 
     def allowed_file(filename):
         """检查文件扩展名是否合法"""
-        return '.' in filename and \
-               filename.rsplit('.', 1)[1].lower() in Config.SUPPORTED_EXTENSIONS
+        return os.path.splitext(filename)[1].lower() in Config.SUPPORTED_EXTENSIONS
 
     @app.route('/api/trades', methods=['GET'])
+    @conditional(data_version)
     def get_trades():
-        """获取交易记录列表"""
+        """获取交易记录列表（键集分页，用返回的 next_cursor 获取下一页）"""
         try:
             # 获取查询参数
-            limit = request.args.get('limit', type=int)
+            limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            try:
+                after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             filters = {}
 
             if request.args.get('symbol'):
@@ -54,14 +81,18 @@ def create_app():
             if request.args.get('end_date'):
                 filters['end_date'] = request.args.get('end_date')
 
-            trades = storage.get_trades(limit=limit, filters=filters)
+            # 多取一条用于判断是否还有下一页
+            trades = list(storage.iter_trades(after=after, limit=limit + 1, filters=filters))
+            has_more = len(trades) > limit
+            trades = trades[:limit]
 
             # 转换为字典格式
             trades_data = [trade.to_dict() for trade in trades]
 
             return jsonify({
                 'trades': trades_data,
-                'total': len(trades_data)
+                'has_more': has_more,
+                'next_cursor': encode_cursor(trades[-1]) if has_more else None
             })
 
         except Exception as e:
@@ -69,11 +100,11 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/trades/<int:trade_id>', methods=['GET'])
+    @conditional(data_version)
     def get_trade(trade_id):
         """获取单个交易记录"""
         try:
-            trades = storage.get_trades()
-            trade = next((t for t in trades if t.id == trade_id), None)
+            trade = storage.get_trade_by_id(trade_id)
 
             if not trade:
                 return jsonify({'error': '交易记录不存在'}), 404
@@ -143,8 +174,7 @@ def create_app():
             data = request.get_json()
 
             # 验证交易记录是否存在
-            trades = storage.get_trades()
-            existing_trade = next((t for t in trades if t.id == trade_id), None)
+            existing_trade = storage.get_trade_by_id(trade_id)
 
             if not existing_trade:
                 return jsonify({'error': '交易记录不存在'}), 404
@@ -167,8 +197,7 @@ def create_app():
 
             if success:
                 # 获取更新后的记录
-                updated_trades = storage.get_trades()
-                updated_trade = next((t for t in updated_trades if t.id == trade_id), None)
+                updated_trade = storage.get_trade_by_id(trade_id)
 
                 return jsonify({
                     'trade': updated_trade.to_dict(),
@@ -197,6 +226,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/statistics', methods=['GET'])
+    @conditional(data_version)
     def get_statistics():
         """获取统计信息"""
         try:
@@ -209,7 +239,7 @@ def create_app():
 
     @app.route('/api/import', methods=['POST'])
     def import_excel():
-        """导入Excel文件"""
+        """导入Excel文件：立即返回任务ID，由后台任务解析和保存"""
         try:
             # 检查是否有文件
             if 'file' not in request.files:
@@ -222,45 +252,22 @@ def create_app():
             if not allowed_file(file.filename):
                 return jsonify({'error': '不支持的文件格式'}), 400
 
-            # 保存上传的文件
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            safe_filename = f"{timestamp}_{filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], safe_filename)
-            file.save(filepath)
-
-            logger.info(f"文件上传成功: {filepath}")
-
-            # 解析Excel文件
-            parser = ExcelParser()
-            trades_data = parser.parse_file(filepath)
-
-            if not trades_data:
-                return jsonify({'error': '文件中没有找到有效的交易记录'}), 400
-
-            # 转换为TradeRecord对象
-            trades = []
-            for trade_data in trades_data:
-                trade = TradeRecord.from_dict(trade_data)
-                trades.append(trade)
+            # 上传的文件接收时已在内存中（较大时在临时文件中）计算好哈希，直接交给导入任务解析，
+            # 不写入监控目录
+            stream = request.keep_file(file)
+            logger.info(f"文件上传成功: {file.filename} ({stream.size} 字节)")
 
-            # 保存到数据库
-            success = storage.save_trades(trades)
+            try:
+                job = import_jobs.submit(stream, file.filename, stream.digests(), stream.size)
+            except ImportQueueFull as e:
+                stream.close()
+                response = jsonify({'error': str(e)})
+                response.headers['Retry-After'] = '10'
+                return response, 503
 
-            if success:
-                # 删除临时文件
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-
-                return jsonify({
-                    'message': f'成功导入 {len(trades)} 条交易记录',
-                    'trades_count': len(trades),
-                    'trades': [trade.to_dict() for trade in trades[:10]]  # 返回前10条作为示例
-                })
-            else:
-                return jsonify({'error': '保存数据失败'}), 500
+            response = jsonify({**job.to_dict(), 'status_url': f'/api/import/{job.id}'})
+            response.headers['Location'] = f'/api/import/{job.id}'
+            return response, 202
 
         except RequestEntityTooLarge:
             return jsonify({'error': '文件太大，最大支持16MB'}), 413
@@ -268,6 +275,14 @@ def create_app():
             logger.error(f"导入Excel文件失败: {str(e)}")
             return jsonify({'error': f'导入失败: {str(e)}'}), 500
 
+    @app.route('/api/import/<job_id>', methods=['GET'])
+    def get_import_job(job_id):
+        """查询导入任务的状态和进度"""
+        job = import_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': '导入任务不存在或已过期'}), 404
+        return jsonify(job.to_dict())
+
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """健康检查"""
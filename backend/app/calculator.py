@@ -2,27 +2,81 @@
 盈亏计算引擎 - FIFO算法实现
 """
 import logging
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
 
+import pandas as pd
+
+from app import fifo_engine
+from app.config import Config
+
 logger = logging.getLogger(__name__)
 
+
+def trade_key(trade: Dict) -> str:
+    """交易在持仓批次账本中的唯一键（账户、成交时间、标的、方向、数量、价格）"""
+    return '|'.join((
+        str(trade.get('account_id') or ''),
+        str(trade['trade_date']),
+        str(trade.get('trade_time') or ''),
+        str(trade['symbol']),
+        str(trade['action']),
+        repr(float(trade['quantity'])),
+        repr(float(trade['price'])),
+    ))
+
+
+def compute_symbols(jobs: List[Tuple[str, List[Dict], Dict, List[Dict]]]) -> List[Tuple]:
+    """
+    依次计算一组标的的FIFO配对（可在子进程中执行，不访问存储）
+
+    Args:
+        jobs: (标的, 新交易, 当前持仓, 未平仓批次) 列表
+
+    Returns:
+        与 jobs 顺序一致的 (标的, 持仓, 剩余批次, 已平仓记录, 错误信息) 列表，
+        出错的标的前三项结果为None
+    """
+    calculator = PnLCalculator(None)
+    results = []
+    for symbol, trades, position, lots in jobs:
+        try:
+            logger.info(f"处理标的 {symbol}, 交易数: {len(trades)}")
+            closed = calculator._apply_trades(trades, position, lots)
+            results.append((symbol, position, calculator._remaining_lots(lots), closed, None))
+        except Exception as e:
+            results.append((symbol, None, None, None, str(e)))
+    return results
+
+
 class PnLCalculator:
     """盈亏计算器"""
 
-    def __init__(self, storage):
+    def __init__(self, storage, workers: Optional[int] = None):
         """
         初始化计算器
 
         Args:
             storage: 存储适配器实例
+            workers: 并行计算的进程数，默认取 Config.PNL_WORKERS，1为串行
         """
         self.storage = storage
+        self.workers = workers or Config.PNL_WORKERS
+        self._pool = None
+        self._pool_lock = threading.Lock()
 
     def process_trades(self, trades: List[Dict]) -> Dict:
         """
-        处理交易记录，更新持仓和已平仓记录
+        处理交易记录，更新持仓、持仓批次账本和已平仓记录
+
+        卖出只与账本中仍有剩余数量的买入批次配对，不再回放历史交易；
+        已计入账本的交易会被跳过，重复导入同一批交易不会重复配对。
+        持仓和未平仓批次每批只读取一次，计算完成后一次性写回。
 
         Args:
             trades: 交易记录列表
@@ -32,51 +86,241 @@ class PnLCalculator:
         """
         result = {
             'processed': 0,
+            'skipped': 0,
             'positions_updated': 0,
             'closed_positions': 0,
             'errors': []
         }
 
-        # 按标的和日期排序
-        sorted_trades = sorted(trades, key=lambda x: (x['symbol'], x['trade_date'], x['trade_time']))
-
-        # 按标的分组处理
-        symbol_groups = defaultdict(list)
-        for trade in sorted_trades:
-            symbol_groups[trade['symbol']].append(trade)
-
+        symbol_groups = self._group_by_symbol(trades)
+        if not symbol_groups:
+            return result
+
+        # 本批涉及标的的持仓、批次和已计入的交易键，各读取一次
+        symbol_keys = {symbol: [trade_key(trade) for trade in symbol_trades]
+                       for symbol, symbol_trades in symbol_groups.items()}
+        applied = self.storage.get_applied_trade_keys(
+            [key for keys in symbol_keys.values() for key in keys])
+        positions = self._load_positions(symbol_groups)
+        open_lots = self._load_open_lots(symbol_groups)
+
+        # 跳过已计入账本的交易（包括本批内的重复交易）
+        jobs = []
+        new_keys = {}
         for symbol, symbol_trades in symbol_groups.items():
-            try:
-                logger.info(f"处理标的 {symbol}, 交易数: {len(symbol_trades)}")
+            new_trades = []
+            for trade, key in zip(symbol_trades, symbol_keys[symbol]):
+                if key in applied:
+                    result['skipped'] += 1
+                    continue
+                applied.add(key)
+                new_trades.append(trade)
+                new_keys[key] = symbol
+
+            if new_trades:
+                # 在副本上计算，出错时不影响索引中的状态
+                jobs.append((symbol, new_trades, dict(positions[symbol]),
+                             [dict(lot) for lot in open_lots.get(symbol, [])]))
+
+        if result['skipped']:
+            logger.info(f"跳过已计入账本的交易: {result['skipped']} 笔")
+
+        changed_positions = []
+        changed_lots = {}
+        closed_positions = []
+        processed = 0
+
+        for (symbol, new_trades, _, _), (_, position, lots, closed, error) in zip(jobs, self._compute(jobs)):
+            if error is not None:
+                error_msg = f"处理标的 {symbol} 失败: {error}"
+                logger.error(error_msg)
+                result['errors'].append(error_msg)
+                for key in symbol_keys[symbol]:
+                    new_keys.pop(key, None)
+                continue
 
-                # 获取当前持仓
-                current_position = self._get_current_position(symbol)
+            changed_positions.append(position)
+            changed_lots[symbol] = lots
+            closed_positions.extend(closed)
+            processed += len(new_trades)
 
-                # 获取未配对的买入记录（用于FIFO）
-                open_buy_trades = self._get_open_buy_trades(symbol)
+        if not changed_positions:
+            return result
 
-                for trade in symbol_trades:
-                    if trade['action'] == 'BUY':
-                        self._process_buy(trade, current_position)
-                        open_buy_trades.append(trade)
-                    elif trade['action'] == 'SELL':
-                        closed_count = self._process_sell(trade, current_position, open_buy_trades)
-                        result['closed_positions'] += closed_count
+        # 已平仓记录、持仓和账本在一个事务中写回
+        try:
+            with self._transaction():
+                if closed_positions:
+                    self.storage.insert_closed_positions(closed_positions)
+                self.storage.update_positions(changed_positions)
+                self.storage.save_lot_ledger(changed_lots, new_keys)
+        except Exception as e:
+            error_msg = f"保存盈亏计算结果失败: {str(e)}"
+            logger.error(error_msg)
+            result['errors'].append(error_msg)
+            return result
+
+        result['processed'] = processed
+        result['positions_updated'] = len(changed_positions)
+        result['closed_positions'] = len(closed_positions)
+        return result
 
-                    result['processed'] += 1
+    def rebuild_lot_ledger(self) -> Dict:
+        """
+        根据已存储的全部交易重建持仓和持仓批次账本
 
-                # 更新持仓
-                if current_position:
-                    self.storage.update_position(symbol, current_position)
-                    result['positions_updated'] += 1
+        用于从旧版本升级（账本为空）或账本与交易记录不一致时，
+        只重建持仓和未平仓批次，不重复写入已平仓记录。
 
-            except Exception as e:
-                error_msg = f"处理标的 {symbol} 失败: {str(e)}"
-                logger.error(error_msg)
-                result['errors'].append(error_msg)
+        Returns:
+            重建结果统计
+        """
+        jobs = []
+        keys = {}
+        for symbol, symbol_trades in self._group_by_symbol(self.storage.get_all_trades()).items():
+            unique_trades = {}
+            for trade in symbol_trades:
+                unique_trades.setdefault(trade_key(trade), trade)
+            jobs.append((symbol, list(unique_trades.values()), self._empty_position(symbol), []))
+            keys.update(dict.fromkeys(unique_trades, symbol))
+
+        positions = []
+        lots_by_symbol = {}
+        for symbol, position, lots, _, error in self._compute(jobs):
+            if error is not None:
+                raise RuntimeError(f"重建标的 {symbol} 失败: {error}")
+            positions.append(position)
+            lots_by_symbol[symbol] = lots
+        trades_count = sum(len(job[1]) for job in jobs)
+
+        if positions:
+            with self._transaction():
+                self.storage.update_positions(positions)
+                self.storage.save_lot_ledger(lots_by_symbol, keys)
 
+        result = {
+            'symbols': len(positions),
+            'trades': trades_count,
+            'open_lots': sum(len(lots) for lots in lots_by_symbol.values())
+        }
+        logger.info(f"持仓批次账本重建完成: 标的={result['symbols']}, "
+                    f"交易={result['trades']}, 未平仓批次={result['open_lots']}")
         return result
 
+    def ensure_lot_ledger(self) -> Optional[Dict]:
+        """
+        账本缺失时重建（调度器启动时调用）
+
+        有持仓但账本中没有任何未平仓批次，说明数据来自没有账本的旧版本，
+        此时卖出无法配对，需要先根据全部交易重建账本。
+
+        Returns:
+            重建结果统计，账本已存在或没有持仓时返回None
+        """
+        symbols = [position['symbol'] for position in self.storage.get_open_positions()]
+        if not symbols or self.storage.get_open_lots_for_symbols(symbols):
+            return None
+
+        logger.warning(f"持仓批次账本为空（{len(symbols)} 个标的有持仓），根据全部交易重建")
+        return self.rebuild_lot_ledger()
+
+    def rebuild_closed_positions(self) -> Dict:
+        """
+        根据已存储的全部交易重建已平仓记录（修改成本规则或修正数据后使用）
+
+        使用 fifo_engine 按标的整列计算FIFO配对，结果与逐笔处理一致；
+        持仓和未平仓批次需要同步时再调用 rebuild_lot_ledger。
+
+        Returns:
+            重建结果统计
+        """
+        closed_positions = fifo_engine.rebuild_closed_positions(
+            self.storage.get_all_trades(), self._replay_closed_positions)
+
+        with self._transaction():
+            self.storage.replace_closed_positions(closed_positions)
+
+        logger.info(f"已平仓记录重建完成: {len(closed_positions)} 条")
+        return {'closed_positions': len(closed_positions)}
+
+    def _replay_closed_positions(self, symbol_trades: List[Dict]) -> List[Dict]:
+        """从空持仓逐笔处理一个标的的交易，返回已平仓记录"""
+        return self._apply_trades(symbol_trades, self._empty_position(symbol_trades[0]['symbol']), [])
+
+    def _compute(self, jobs: List[Tuple]) -> List[Tuple]:
+        """
+        计算各标的的FIFO配对，标的数足够多且配置了多个进程时分片并行
+
+        各分片为连续的标的区间，结果按提交顺序合并，与串行计算完全一致。
+        """
+        workers = min(self.workers, len(jobs))
+        if workers <= 1 or len(jobs) < Config.PNL_PARALLEL_MIN_SYMBOLS:
+            return compute_symbols(jobs)
+
+        # 按交易数均衡切分，每个进程分到若干分片，避免个别大标的拖慢整体
+        shard_count = min(len(jobs), workers * 4)
+        target = sum(len(job[1]) for job in jobs) / shard_count
+        shards = [[]]
+        size = 0
+        for job in jobs:
+            if size >= target and len(shards) < shard_count:
+                shards.append([])
+                size = 0
+            shards[-1].append(job)
+            size += len(job[1])
+
+        logger.info(f"并行计算盈亏: 标的={len(jobs)}, 分片={len(shards)}, 进程数={workers}")
+        try:
+            return [result for shard in self._executor().map(compute_symbols, shards) for result in shard]
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，下一批重新创建
+            self.close()
+            raise
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """并行计算的进程池，第一次使用时创建，之后各批次复用"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def close(self):
+        """关闭并行计算的进程池（调度器关闭时调用）"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _transaction(self):
+        """存储支持事务时返回事务上下文，否则返回空上下文"""
+        transaction = getattr(self.storage, 'transaction', None)
+        return transaction() if transaction else nullcontext()
+
+    @staticmethod
+    def _group_by_symbol(trades: List[Dict]) -> Dict[str, List[Dict]]:
+        """按标的分组，组内按成交时间排序"""
+        sorted_trades = sorted(trades, key=lambda x: (x['symbol'], x['trade_date'], x.get('trade_time') or ''))
+        symbol_groups = defaultdict(list)
+        for trade in sorted_trades:
+            symbol_groups[trade['symbol']].append(trade)
+        return symbol_groups
+
+    def _apply_trades(self, trades: List[Dict], current_position: Dict, open_lots: List[Dict]) -> List[Dict]:
+        """
+        依次计入交易，更新持仓和批次列表
+
+        Returns:
+            生成的已平仓记录列表
+        """
+        closed_positions = []
+        for trade in trades:
+            if trade['action'] == 'BUY':
+                self._process_buy(trade, current_position)
+                open_lots.append(self._new_lot(trade))
+            elif trade['action'] == 'SELL':
+                self._process_sell(trade, current_position, open_lots, closed_positions)
+        return closed_positions
+
     def _process_buy(self, trade: Dict, current_position: Dict):
         """处理买入交易"""
         symbol = trade['symbol']
@@ -103,14 +347,18 @@ class PnLCalculator:
 
         logger.debug(f"买入处理完成 {symbol}: 数量={new_quantity}, 均价={new_avg_cost:.4f}")
 
-    def _process_sell(self, trade: Dict, current_position: Dict, open_buy_trades: List[Dict]) -> int:
+    def _process_sell(self, trade: Dict, current_position: Dict, open_lots: List[Dict],
+                      closed_buffer: List[Dict]) -> int:
         """
-        处理卖出交易，使用FIFO算法
+        处理卖出交易，按FIFO消耗同一账户的买入批次
+
+        生成的已平仓记录追加到 closed_buffer，由 process_trades 批量写入存储。
 
         Returns:
             生成的已平仓记录数量
         """
         symbol = trade['symbol']
+        account_id = trade.get('account_id') or ''
         sell_quantity = trade['quantity']
         remaining_sell_qty = sell_quantity
         closed_count = 0
@@ -124,30 +372,32 @@ class PnLCalculator:
             remaining_sell_qty = current_position.get('total_quantity', 0)
 
         # FIFO配对
-        for buy_trade in open_buy_trades[:]:
+        for lot in open_lots:
             if remaining_sell_qty <= 0:
                 break
 
-            buy_remaining = buy_trade.get('remaining_quantity', buy_trade['quantity'])
-            if buy_remaining <= 0:
+            if lot['account_id'] != account_id or lot['remaining_quantity'] <= 0:
                 continue
 
             # 计算本次配对数量
-            match_qty = min(remaining_sell_qty, buy_remaining)
+            match_qty = min(remaining_sell_qty, lot['remaining_quantity'])
 
             # 创建已平仓记录
-            closed_position = self._create_closed_position(buy_trade, trade, match_qty)
-            self.storage.insert_closed_position(closed_position)
+            closed_buffer.append(self._create_closed_position(lot, trade, match_qty))
             closed_count += 1
 
-            # 更新买入交易的剩余数量
-            buy_trade['remaining_quantity'] = buy_remaining - match_qty
+            # 更新批次的剩余数量和成本
+            lot['remaining_quantity'] -= match_qty
+            lot['cost_basis'] = self._lot_cost_basis(lot)
 
             # 更新卖出交易的剩余数量
             remaining_sell_qty -= match_qty
 
             logger.debug(f"FIFO配对 {symbol}: 配对数量={match_qty}, 剩余卖出={remaining_sell_qty}")
 
+        if remaining_sell_qty > 0:
+            logger.warning(f"卖出未完全配对 {symbol}: 账户={account_id or '-'}, 未配对数量={remaining_sell_qty}")
+
         # 更新持仓
         old_quantity = current_position.get('total_quantity', 0)
         new_quantity = old_quantity - sell_quantity
@@ -164,6 +414,34 @@ class PnLCalculator:
 
         return closed_count
 
+    def _new_lot(self, trade: Dict) -> Dict:
+        """由买入交易生成持仓批次"""
+        lot = {
+            'account_id': trade.get('account_id') or '',
+            'symbol': trade['symbol'],
+            'security_name': trade.get('security_name', ''),
+            'trade_date': trade['trade_date'],
+            'trade_time': trade.get('trade_time') or '',
+            'quantity': trade['quantity'],
+            'remaining_quantity': trade['quantity'],
+            'price': trade['price'],
+            'commission': trade.get('commission', 0),
+        }
+        lot['cost_basis'] = self._lot_cost_basis(lot)
+        return lot
+
+    @staticmethod
+    def _lot_cost_basis(lot: Dict) -> float:
+        """批次剩余数量的成本（含按比例分摊的买入手续费）"""
+        if not lot['quantity']:
+            return 0.0
+        return lot['remaining_quantity'] * (lot['price'] + lot['commission'] / lot['quantity'])
+
+    @staticmethod
+    def _remaining_lots(open_lots: List[Dict]) -> List[Dict]:
+        """仍有剩余数量的批次"""
+        return [lot for lot in open_lots if lot['remaining_quantity'] > 0]
+
     def _create_closed_position(self, buy_trade: Dict, sell_trade: Dict, quantity: float) -> Dict:
         """创建已平仓记录"""
         symbol = buy_trade['symbol']
@@ -205,12 +483,17 @@ class PnLCalculator:
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
 
-    def _get_current_position(self, symbol: str) -> Dict:
-        """获取当前持仓信息"""
-        positions = self.storage.get_open_positions()
-        for pos in positions:
-            if pos['symbol'] == symbol:
-                return pos.copy()
+    def _load_positions(self, symbols) -> Dict[str, Dict]:
+        """一次读取持仓，返回按标的索引的持仓（无持仓的标的为空持仓）"""
+        positions = {symbol: self._empty_position(symbol) for symbol in symbols}
+        for pos in self.storage.get_open_positions():
+            if pos['symbol'] in positions:
+                positions[pos['symbol']] = dict(pos)
+        return positions
+
+    @staticmethod
+    def _empty_position(symbol: str) -> Dict:
+        """空持仓"""
         return {
             'symbol': symbol,
             'total_quantity': 0,
@@ -218,31 +501,20 @@ class PnLCalculator:
             'total_cost': 0
         }
 
-    def _get_open_buy_trades(self, symbol: str) -> List[Dict]:
-        """获取未完全配对的买入记录"""
-        trades = self.storage.get_trades_by_symbol(symbol)
-        open_trades = []
-
-        for trade in trades:
-            if trade['action'] == 'BUY':
-                # 计算剩余未配对数量
-                closed_qty = self._get_closed_quantity_by_trade(trade)
-                remaining_qty = trade['quantity'] - closed_qty
-
-                if remaining_qty > 0:
-                    trade_copy = trade.copy()
-                    trade_copy['remaining_quantity'] = remaining_qty
-                    open_trades.append(trade_copy)
-
-        # 按日期排序（FIFO）
-        open_trades.sort(key=lambda x: (x['trade_date'], x['trade_time']))
-        return open_trades
-
-    def _get_closed_quantity_by_trade(self, trade: Dict) -> float:
-        """计算某笔买入交易已平仓的数量"""
-        # 这里需要查询closed_positions表，计算与该笔买入相关的平仓数量
-        # 简化实现，实际应该更精确
-        return 0.0
+    def _load_open_lots(self, symbols) -> Dict[str, List[Dict]]:
+        """一次读取各标的的未平仓批次（FIFO顺序），返回按标的索引的批次列表"""
+        open_lots = {}
+        for symbol, symbol_lots in self.storage.get_open_lots_for_symbols(list(symbols)).items():
+            lots = []
+            for lot in symbol_lots:
+                lot = dict(lot)
+                lot['account_id'] = lot.get('account_id') or ''
+                lot['trade_time'] = lot.get('trade_time') or ''
+                for field in ('quantity', 'remaining_quantity', 'price', 'commission', 'cost_basis'):
+                    lot[field] = float(lot.get(field) or 0)
+                lots.append(lot)
+            open_lots[symbol] = lots
+        return open_lots
 
     def calculate_daily_summary(self, date: str) -> Dict:
         """计算每日汇总统计"""
@@ -303,6 +575,69 @@ class PnLCalculator:
             logger.error(f"计算每日汇总失败 {date}: {str(e)}")
             return self._empty_daily_summary(date)
 
+    def calculate_daily_summaries(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """
+        计算日期区间内每一天的汇总统计（用于批量回填）
+
+        交易和已平仓记录各读取一次，按日期分组一次性计算，
+        每天的结果与 calculate_daily_summary 相同（没有交易的日期为空汇总）。
+
+        Args:
+            start: 开始日期 YYYY-MM-DD，默认为最早的交易日期
+            end: 结束日期 YYYY-MM-DD，默认为今天
+
+        Returns:
+            按日期排列的每日汇总列表
+        """
+        trades = pd.DataFrame(self.storage.get_all_trades(), columns=['trade_date', 'action', 'amount', 'commission'])
+        closed = pd.DataFrame(self.storage.get_all_closed_positions(), columns=['close_date', 'net_pnl'])
+
+        end = end or datetime.now().strftime('%Y-%m-%d')
+        start = start or (trades['trade_date'].min() if not trades.empty else end)
+        dates = pd.date_range(start, end).strftime('%Y-%m-%d')
+
+        summary = pd.DataFrame(index=pd.Index(dates, name='summary_date'))
+
+        # 交易统计
+        trades = trades[trades['trade_date'].isin(dates)]
+        by_date = trades.groupby('trade_date')
+        summary['total_trades'] = by_date.size()
+        summary['buy_trades'] = (trades['action'] == 'BUY').groupby(trades['trade_date']).sum()
+        summary['sell_trades'] = (trades['action'] == 'SELL').groupby(trades['trade_date']).sum()
+        summary['total_volume'] = pd.to_numeric(trades['amount']).groupby(trades['trade_date']).sum()
+        summary['total_commission'] = pd.to_numeric(trades['commission']).groupby(trades['trade_date']).sum()
+
+        # 盈亏统计
+        closed = closed[closed['close_date'].isin(dates)]
+        net_pnl = pd.to_numeric(closed['net_pnl'])
+        wins = net_pnl[net_pnl > 0].groupby(closed['close_date'])
+        losses = net_pnl[net_pnl < 0].groupby(closed['close_date'])
+        summary['closed_count'] = net_pnl.groupby(closed['close_date']).size()
+        summary['realized_pnl'] = net_pnl.groupby(closed['close_date']).sum()
+        summary['winning_trades'] = wins.size()
+        summary['losing_trades'] = losses.size()
+        summary['largest_profit'] = wins.max()
+        summary['largest_loss'] = losses.min()
+        summary['avg_profit'] = wins.sum() / summary['winning_trades']
+        summary['avg_loss'] = losses.sum() / summary['losing_trades']
+
+        summary = summary.fillna(0)
+        summary['win_rate'] = (summary['winning_trades'] / summary['closed_count'] * 100).fillna(0)
+        summary['profit_factor'] = (summary['avg_profit'] / summary['avg_loss']).abs().where(summary['avg_loss'] != 0, 0)
+
+        # 没有交易的日期与 calculate_daily_summary 一致返回空汇总
+        summary.loc[summary['total_trades'] == 0] = 0
+
+        counts = ['total_trades', 'buy_trades', 'sell_trades', 'winning_trades', 'losing_trades']
+        summary[counts] = summary[counts].astype(int)
+        summary = summary.drop(columns='closed_count').reset_index()
+
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        columns = list(self._empty_daily_summary(start))
+        records = [dict(record, created_at=now, updated_at=now) for record in summary.to_dict('records')]
+        logger.info(f"每日汇总计算完成: {start} ~ {end}, 共 {len(records)} 天")
+        return [{column: record[column] for column in columns} for record in records]
+
     def _empty_daily_summary(self, date: str) -> Dict:
         """返回空的每日汇总结构"""
         return {
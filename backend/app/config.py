@@ -19,18 +19,72 @@ class Config:
     WATCH_FOLDER = os.path.join(BASE_DIR.parent, 'trading_records')
     SUPPORTED_EXTENSIONS = ['.xlsx', '.xls', '.csv']
 
+    # 解析配置
+    PARSE_CHUNK_SIZE = int(os.getenv('PARSE_CHUNK_SIZE', 50000))   # CSV/流式Excel每次读取的行数
+    # Excel读取引擎: auto(按文件类型自动选择) / calamine / openpyxl_stream / openpyxl / pyxlsb / xlrd
+    EXCEL_ENGINE = os.getenv('EXCEL_ENGINE', 'auto')
+
     # Google Sheets配置
     GOOGLE_CREDENTIALS_PATH = os.path.join(BASE_DIR, 'credentials', 'service_account.json')
     SPREADSHEET_NAME = '投资交易记录'
+    SHEETS_CACHE_TTL_SECONDS = int(os.getenv('SHEETS_CACHE_TTL_SECONDS', 300))  # 工作表读缓存有效期，0为不缓存
+    SHEETS_WRITE_BUFFER_ROWS = int(os.getenv('SHEETS_WRITE_BUFFER_ROWS', 500))  # 写入缓冲的行数上限，0为不缓冲
+    SHEETS_WRITE_BUFFER_SECONDS = float(os.getenv('SHEETS_WRITE_BUFFER_SECONDS', 30))  # 写入缓冲最长等待秒数
+    # Sheets API限流：读写分开的每分钟请求数（默认为单用户配额），429/5xx时指数退避重试
+    SHEETS_READ_REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_READ_REQUESTS_PER_MINUTE', 60))
+    SHEETS_WRITE_REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_WRITE_REQUESTS_PER_MINUTE', 60))
+    SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', 6))
+    SHEETS_BACKOFF_BASE_SECONDS = float(os.getenv('SHEETS_BACKOFF_BASE_SECONDS', 1))
+    SHEETS_BACKOFF_MAX_SECONDS = float(os.getenv('SHEETS_BACKOFF_MAX_SECONDS', 64))
+    SHEETS_DATA_VERSION_PATH = os.path.join(BASE_DIR, 'data', 'sheets_data_version')  # 写入后更新，Web API据此生成ETag
 
     # SQLite配置（可选）
-    STORAGE_TYPE = os.getenv('STORAGE_TYPE', 'google_sheets')  # 或 'sqlite'
+    STORAGE_TYPE = os.getenv('STORAGE_TYPE', 'google_sheets')  # 或 'sqlite' / 'hybrid'（本地SQLite镜像 + Google Sheets）
     SQLITE_DB_PATH = os.path.join(BASE_DIR, 'data', 'trading.db')
+    SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))                  # 连接池最大连接数
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16 * 1024))  # 每个连接的页缓存
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # 内存映射读取的上限（字节）
+    SQLITE_STATEMENT_CACHE = 256                                              # 每个连接缓存的预编译语句数
+
+    # 混合存储配置：读取本地镜像，写入异步复制到Google Sheets，定时拉取表格中的修改
+    MIRROR_DB_PATH = os.path.join(BASE_DIR, 'data', 'sheets_mirror.db')
+    HYBRID_SYNC_INTERVAL_SECONDS = float(os.getenv('HYBRID_SYNC_INTERVAL_SECONDS', 300))  # 0为不定时拉取
+    HYBRID_REPLICATION_MAX_ATTEMPTS = int(os.getenv('HYBRID_REPLICATION_MAX_ATTEMPTS', 10))  # 每次写入最多复制次数
+    HYBRID_REPLICATION_LEASE_SECONDS = float(os.getenv('HYBRID_REPLICATION_LEASE_SECONDS', 600))  # 复制租约有效期
+
+    # HTTP缓存：读接口按数据版本生成ETag，未变化时返回304；大于此字节数的JSON响应按gzip压缩
+    HTTP_GZIP_MIN_BYTES = int(os.getenv('HTTP_GZIP_MIN_BYTES', 1024))
+
+    # 实时推送（/api/stream）：检查数据版本的间隔秒数，以及空闲时发送保活注释的间隔秒数
+    SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', 1))
+    SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+
+    # 文件事件监控：新文件写入完成后几秒内开始导入（安装watchdog时使用系统文件事件，否则轮询）
+    FILE_WATCH_ENABLED = os.getenv('FILE_WATCH_ENABLED', 'true').lower() == 'true'
+    FILE_WATCH_DEBOUNCE_SECONDS = float(os.getenv('FILE_WATCH_DEBOUNCE_SECONDS', 2))  # 文件多久不变视为写入完成
+    FILE_WATCH_POLL_SECONDS = float(os.getenv('FILE_WATCH_POLL_SECONDS', 1))
+
+    # 文件哈希配置：按 (路径, inode, 大小, 修改时间) 缓存哈希，未变化的文件不再重新读取
+    FILE_MANIFEST_PATH = os.path.join(BASE_DIR, 'data', 'file_manifest.db')
+    FILE_HASH_ALGORITHM = os.getenv('FILE_HASH_ALGORITHM', 'blake2b')  # blake2b / xxh3_128（需安装xxhash） / md5
+    LEGACY_MD5_HASH = os.getenv('LEGACY_MD5_HASH', 'true').lower() == 'true'  # 同时计算MD5以识别旧版导入日志
 
     # 定时任务配置
-    CHECK_INTERVAL_HOURS = 1       # 每小时检查一次
+    CHECK_INTERVAL_HOURS = 1       # 每小时检查一次（未启用文件事件监控时）
+    SAFETY_CHECK_INTERVAL_HOURS = int(os.getenv('SAFETY_CHECK_INTERVAL_HOURS', 6))  # 启用文件事件监控时的兜底检查间隔
     DAILY_SUMMARY_HOUR = 18        # 每日18:00汇总
 
+    # 导入配置
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 1))   # 并行解析文件的进程数，1为串行
+    IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', 1))        # API上传导入的后台线程数
+    IMPORT_JOB_QUEUE_SIZE = int(os.getenv('IMPORT_JOB_QUEUE_SIZE', 8))   # 排队的上传导入任务上限，已满时返回503
+    IMPORT_JOB_RETENTION_SECONDS = int(os.getenv('IMPORT_JOB_RETENTION_SECONDS', 3600))  # 已结束任务的状态保留秒数
+    UPLOAD_SPOOL_MAX_BYTES = int(os.getenv('UPLOAD_SPOOL_MAX_BYTES', 4 * 1024 * 1024))   # 上传文件超过此字节数时才转存临时文件
+
+    # 盈亏计算配置
+    PNL_WORKERS = int(os.getenv('PNL_WORKERS', 1))   # 按标的并行计算FIFO配对的进程数，1为串行
+    PNL_PARALLEL_MIN_SYMBOLS = int(os.getenv('PNL_PARALLEL_MIN_SYMBOLS', 200))   # 标的数少于此值时串行计算
+
     # 日志配置
     LOG_FOLDER = os.path.join(BASE_DIR, 'logs')
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -53,6 +107,17 @@ class Config:
         if cls.STORAGE_TYPE == 'sqlite':
             from app.database import SQLiteAdapter
             return SQLiteAdapter(cls.SQLITE_DB_PATH)
+        elif cls.STORAGE_TYPE == 'hybrid':
+            from app.database import SQLiteAdapter
+            from app.google_sheets_adapter import GoogleSheetsAdapter
+            from app.hybrid_adapter import HybridAdapter
+            return HybridAdapter(
+                GoogleSheetsAdapter(cls.GOOGLE_CREDENTIALS_PATH, cls.SPREADSHEET_NAME),
+                SQLiteAdapter(cls.MIRROR_DB_PATH),
+                sync_interval=cls.HYBRID_SYNC_INTERVAL_SECONDS,
+                max_attempts=cls.HYBRID_REPLICATION_MAX_ATTEMPTS,
+                lease_seconds=cls.HYBRID_REPLICATION_LEASE_SECONDS
+            )
         else:
             from app.google_sheets_adapter import GoogleSheetsAdapter
             return GoogleSheetsAdapter(
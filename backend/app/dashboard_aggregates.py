@@ -0,0 +1,173 @@
+"""
+Dashboard聚合数据 - 每日已实现盈亏、按标的盈亏和总览计数
+"""
+from typing import Dict, Iterable, List, Tuple
+
+# Dashboard显示最近多少个交易日和盈亏前几名
+DASHBOARD_DAYS = 30
+DASHBOARD_TOP = 5
+
+# 按标的聚合的字段，SQLite的 dashboard_symbol_pnl 表使用相同的列名
+SYMBOL_PNL_FIELDS = ('profit_pnl', 'profit_trades', 'profit_cost', 'loss_pnl', 'loss_trades', 'loss_cost')
+
+
+def _float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _ranking_entry(symbol: str, pnl: float, trades: int, total_cost: float) -> Dict:
+    return_rate = (pnl / total_cost * 100) if total_cost > 0 else 0
+    return {'symbol': symbol, 'pnl': pnl, 'return_rate': return_rate, 'trades': int(trades)}
+
+
+def build_dashboard(overview: Dict, daily_trend: List[Tuple[str, float]],
+                    top_profits: List[Dict], top_losses: List[Dict]) -> Dict:
+    """
+    组装 /api/dashboard 的数据
+
+    Args:
+        overview: total_trades / closed_positions / winning_trades / total_pnl / positions_count
+        daily_trend: 按日期升序的 (日期, 已实现盈亏)
+        top_profits / top_losses: 含 symbol / pnl / trades / total_cost 的标的聚合，已排序
+    """
+    closed_positions = overview.get('closed_positions') or 0
+    win_rate = (overview.get('winning_trades', 0) / closed_positions * 100) if closed_positions else 0
+    return {
+        'overview': {
+            'total_trades': int(overview.get('total_trades') or 0),
+            'total_pnl': float(overview.get('total_pnl') or 0),
+            'win_rate': win_rate,
+            'positions_count': int(overview.get('positions_count') or 0)
+        },
+        'daily_trend': [{'date': date, 'pnl': pnl} for date, pnl in daily_trend],
+        'top_profits': [_ranking_entry(r['symbol'], r['pnl'], r['trades'], r['total_cost']) for r in top_profits],
+        'top_losses': [_ranking_entry(r['symbol'], r['pnl'], r['trades'], r['total_cost']) for r in top_losses]
+    }
+
+
+def dashboard_delta(previous: Dict, current: Dict) -> Dict:
+    """
+    两次Dashboard数据之间的增量（/api/stream 推送的内容），没有变化时返回空字典
+
+    overview 只含变化的字段；daily_trend 只含新增或变化的日期，removed_days 为移出统计窗口的日期；
+    top_profits / top_losses 有任何变化时给出完整排行（最多 DASHBOARD_TOP 项）。
+    """
+    delta = {}
+    overview = {key: value for key, value in current['overview'].items()
+                if previous['overview'].get(key) != value}
+    if overview:
+        delta['overview'] = overview
+
+    before = {item['date']: item for item in previous['daily_trend']}
+    changed = [item for item in current['daily_trend'] if before.get(item['date']) != item]
+    if changed:
+        delta['daily_trend'] = changed
+    dates = {item['date'] for item in current['daily_trend']}
+    removed = [date for date in before if date not in dates]
+    if removed:
+        delta['removed_days'] = removed
+
+    for key in ('top_profits', 'top_losses'):
+        if current[key] != previous[key]:
+            delta[key] = current[key]
+    return delta
+
+
+class DashboardAggregates:
+    """
+    内存中的Dashboard聚合数据
+
+    逐批累加交易、已平仓记录和持仓，snapshot() 只对日期和标的做排序，与已平仓记录数无关。
+    Google Sheets适配器和没有聚合表的存储直接使用；SQLite用它汇总每批写入，再累加到聚合表。
+    """
+
+    def __init__(self):
+        self.total_trades = 0
+        self.closed_positions = 0
+        self.winning_trades = 0
+        self.losing_trades = 0
+        self.total_pnl = 0.0
+        self.daily_pnl: Dict[str, float] = {}            # 交易日 -> 已实现盈亏
+        self.symbols: Dict[str, Dict[str, float]] = {}   # 标的 -> SYMBOL_PNL_FIELDS
+        self.open_symbols = set()                        # 持仓数量大于0的标的
+
+    @classmethod
+    def from_records(cls, trades: Iterable[Dict], positions: Iterable[Dict],
+                     closed_positions: Iterable[Dict]) -> 'DashboardAggregates':
+        aggregates = cls()
+        aggregates.add_trades(trades)
+        aggregates.update_positions(positions)
+        aggregates.add_closed_positions(closed_positions)
+        return aggregates
+
+    def add_trades(self, trades: Iterable[Dict]):
+        for trade in trades:
+            self.total_trades += 1
+            date = trade.get('trade_date', '')
+            if date:
+                self.daily_pnl.setdefault(date, 0.0)
+
+    def add_closed_positions(self, closed_list: Iterable[Dict]):
+        for closed in closed_list:
+            pnl = _float(closed.get('net_pnl'))
+            self.closed_positions += 1
+            self.total_pnl += pnl
+
+            date = closed.get('close_date', '')
+            if date:
+                self.daily_pnl[date] = self.daily_pnl.get(date, 0.0) + pnl
+
+            if pnl == 0:
+                continue
+            side = 'profit' if pnl > 0 else 'loss'
+            if pnl > 0:
+                self.winning_trades += 1
+            else:
+                self.losing_trades += 1
+            stats = self.symbols.setdefault(closed.get('symbol', ''), dict.fromkeys(SYMBOL_PNL_FIELDS, 0))
+            stats[f'{side}_pnl'] += pnl
+            stats[f'{side}_trades'] += 1
+            stats[f'{side}_cost'] += _float(closed.get('total_cost'))
+
+    def update_positions(self, positions: Iterable[Dict]):
+        for position in positions:
+            if _float(position.get('total_quantity')) > 0:
+                self.open_symbols.add(position.get('symbol'))
+            else:
+                self.open_symbols.discard(position.get('symbol'))
+
+    def snapshot(self, days: int = DASHBOARD_DAYS, top: int = DASHBOARD_TOP) -> Dict:
+        """当前聚合对应的Dashboard数据"""
+        daily_trend = [(date, self.daily_pnl[date]) for date in sorted(self.daily_pnl)[-days:]]
+        return build_dashboard(
+            {
+                'total_trades': self.total_trades,
+                'closed_positions': self.closed_positions,
+                'winning_trades': self.winning_trades,
+                'total_pnl': self.total_pnl,
+                'positions_count': len(self.open_symbols)
+            },
+            daily_trend,
+            self._ranking('profit', top, reverse=True),
+            self._ranking('loss', top, reverse=False)
+        )
+
+    def _ranking(self, side: str, top: int, reverse: bool) -> List[Dict]:
+        rows = [{'symbol': symbol, 'pnl': stats[f'{side}_pnl'], 'trades': stats[f'{side}_trades'],
+                 'total_cost': stats[f'{side}_cost']}
+                for symbol, stats in self.symbols.items() if stats[f'{side}_trades'] > 0]
+        rows.sort(key=lambda r: r['pnl'], reverse=reverse)
+        return rows[:top]
+
+
+def dashboard_data(storage, days: int = DASHBOARD_DAYS, top: int = DASHBOARD_TOP) -> Dict:
+    """从存储读取Dashboard数据；存储没有预先聚合时读取全部记录现场计算"""
+    getter = getattr(storage, 'get_dashboard_aggregates', None)
+    if getter is not None:
+        return getter(days, top)
+    return DashboardAggregates.from_records(
+        storage.get_all_trades(), storage.get_open_positions(), storage.get_all_closed_positions()
+    ).snapshot(days, top)
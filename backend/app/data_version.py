@@ -0,0 +1,46 @@
+"""
+数据版本号 - 存储写入后更新，Web API据此生成ETag
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DataVersion:
+    """
+    数据版本号文件
+
+    存储每次提交写入后调用 bump()，把新的版本号原子写入文件；其他进程（Web API）读取该文件
+    得到当前版本。版本号由时间戳、进程号和进程内计数组成，多个进程同时写入也不会重复，
+    因此读取方看到的版本号不变就说明数据没有变化。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._counter = itertools.count()
+
+    def bump(self) -> str:
+        """写入新的版本号并返回"""
+        version = f'{time.time_ns():x}-{os.getpid():x}-{next(self._counter):x}'
+        temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(version)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"更新数据版本号失败 {self.path}: {str(e)}")
+        return version
+
+    def current(self) -> str:
+        """当前版本号，尚未写入过时为 '0'"""
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or '0'
+        except FileNotFoundError:
+            return '0'
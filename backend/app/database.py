@@ -3,13 +3,97 @@
 """
 import sqlite3
 import logging
+import queue
+import threading
 from datetime import datetime
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Set, Tuple
 from contextlib import contextmanager
 
+from app.config import Config
+from app.data_version import DataVersion
+from app.dashboard_aggregates import (
+    DASHBOARD_DAYS, DASHBOARD_TOP, SYMBOL_PNL_FIELDS, DashboardAggregates, build_dashboard
+)
+
 logger = logging.getLogger(__name__)
 
+# trades 表中除 id 外的列，顺序与批量插入语句一致
+TRADE_COLUMNS = (
+    'trade_date', 'trade_time', 'symbol', 'security_name', 'security_type',
+    'action', 'quantity', 'price', 'amount', 'commission', 'net_amount',
+    'underlying_symbol', 'strike_price', 'expiration_date', 'option_type',
+    'source', 'close_date', 'close_price', 'close_quantity', 'close_reason',
+    'trade_rating', 'trade_type', 'notes', 'broker', 'account_id',
+    'source_file', 'import_time', 'created_at', 'updated_at'
+)
+
+# 交易的自然键，相同的记录视为重复导入
+TRADE_NATURAL_KEY = ('trade_date', 'trade_time', 'symbol', 'action', 'quantity', 'price')
+
+# get_statistics 中热门标的的数量
+STATISTICS_TOP_SYMBOLS = 10
+
+# 卖出记录的简单盈亏（(平仓价 - 成交价) * 数量，不做买卖配对），与前端原来的估算一致
+SIMPLE_PROFIT_SQL = "CASE WHEN close_price > 0 THEN (close_price - price) * quantity ELSE 0 END"
+
+INSERT_TRADE_SQL = f'''
+    INSERT INTO trades ({', '.join(TRADE_COLUMNS)})
+    VALUES ({', '.join('?' * len(TRADE_COLUMNS))})
+    ON CONFLICT DO NOTHING
+'''
+
+_trade_values = attrgetter(*TRADE_COLUMNS)
+
+# 盈亏计算相关表的列（除 id 外），与 Google Sheets 工作表的表头一致
+POSITION_COLUMNS = (
+    'symbol', 'security_name', 'security_type',
+    'total_quantity', 'avg_cost', 'total_cost',
+    'current_price', 'market_value', 'unrealized_pnl', 'unrealized_pnl_pct',
+    'last_trade_date', 'updated_at'
+)
+
+CLOSED_POSITION_COLUMNS = (
+    'symbol', 'security_name',
+    'open_date', 'close_date', 'holding_days',
+    'quantity', 'open_price', 'close_price',
+    'total_cost', 'total_revenue', 'commission',
+    'net_pnl', 'pnl_pct', 'created_at'
+)
+
+DAILY_SUMMARY_COLUMNS = (
+    'summary_date',
+    'total_trades', 'buy_trades', 'sell_trades',
+    'total_volume', 'total_commission', 'realized_pnl',
+    'winning_trades', 'losing_trades', 'win_rate',
+    'largest_profit', 'largest_loss', 'avg_profit', 'avg_loss', 'profit_factor',
+    'created_at', 'updated_at'
+)
+
+IMPORT_LOG_COLUMNS = (
+    'file_name', 'file_path', 'file_size', 'file_hash',
+    'records_count', 'success_count', 'error_count',
+    'status', 'error_message', 'import_time', 'duration_seconds'
+)
+
+# 持仓批次账本：每笔买入形成一个批次，卖出按FIFO消耗 remaining_quantity
+LOT_COLUMNS = (
+    'account_id', 'symbol', 'security_name', 'trade_date', 'trade_time',
+    'quantity', 'remaining_quantity', 'price', 'commission', 'cost_basis', 'updated_at'
+)
+
+# 从 Google Sheets 同步到本地镜像时各表写入的列
+MIRROR_COLUMNS = {
+    'trades': ('id',) + TRADE_COLUMNS,
+    'positions': ('id',) + POSITION_COLUMNS,
+    'closed_positions': ('id',) + CLOSED_POSITION_COLUMNS,
+    'daily_summary': ('id',) + DAILY_SUMMARY_COLUMNS,
+    'import_logs': ('id',) + IMPORT_LOG_COLUMNS,
+    'open_lots': LOT_COLUMNS,
+    'ledger_trades': ('trade_key', 'symbol'),
+}
+
 class TradeRecord:
     """交易记录数据模型"""
 
@@ -17,7 +101,7 @@ class TradeRecord:
         # 基础字段
         self.id = kwargs.get('id')
         self.trade_date = kwargs.get('trade_date', '')
-        self.trade_time = kwargs.get('trade_time', '')
+        self.trade_time = kwargs.get('trade_time') or ''
         self.symbol = kwargs.get('symbol', '')
         self.security_name = kwargs.get('security_name', '')
         self.security_type = kwargs.get('security_type', 'STOCK')
@@ -106,6 +190,15 @@ class DatabaseAdapter:
         """获取交易记录"""
         raise NotImplementedError
 
+    def get_trade_by_id(self, trade_id: int) -> Optional[TradeRecord]:
+        """按ID获取交易记录"""
+        raise NotImplementedError
+
+    def iter_trades(self, after: Optional[Tuple[str, str, int]] = None, limit: Optional[int] = None,
+                    filters: Optional[Dict] = None) -> Iterator[TradeRecord]:
+        """按游标遍历交易记录"""
+        raise NotImplementedError
+
     def update_trade(self, trade_id: int, updates: Dict) -> bool:
         """更新交易记录"""
         raise NotImplementedError
@@ -118,18 +211,125 @@ class DatabaseAdapter:
         """获取统计信息"""
         raise NotImplementedError
 
+class ConnectionPool:
+    """
+    线程感知的SQLite连接池
+
+    连接按需创建，最多 pool_size 个，用完归还复用；同一线程内嵌套获取时复用该线程已持有的连接。
+    长期存在的连接可以复用 sqlite3 内部的预编译语句缓存（cached_statements）。
+    """
+
+    def __init__(self, db_path: str, pool_size: int = 5, timeout: float = 30.0,
+                 cached_statements: int = 256):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        """获取连接，退出时回滚未提交的事务并归还连接"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+            except sqlite3.Error:
+                # 连接已损坏，丢弃后允许重新创建
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+
+    def _acquire(self) -> sqlite3.Connection:
+        """优先复用空闲连接，未达上限时新建，否则等待其他线程归还"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"等待数据库连接超时（连接池大小: {self.pool_size}）")
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建连接并设置PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+
+        # WAL模式下读写互不阻塞；NORMAL同步级别在WAL下仍能保证数据库一致
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # 负数表示以KiB为单位
+        conn.execute(f"PRAGMA cache_size=-{int(Config.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
 class SQLiteAdapter(DatabaseAdapter):
     """SQLite数据库适配器"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: Optional[int] = None):
         self.db_path = db_path
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._txn = threading.local()
+        # 每次提交写入后更新，Web API据此判断数据是否变化
+        self.data_version = DataVersion(f'{db_path}.version')
+        self.pool = ConnectionPool(
+            db_path,
+            pool_size=pool_size or Config.SQLITE_POOL_SIZE,
+            cached_statements=Config.SQLITE_STATEMENT_CACHE
+        )
         self.init_database()
 
     def init_database(self):
         """初始化数据库表"""
-        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
 
             # 创建交易记录表
@@ -179,68 +379,274 @@ class SQLiteAdapter(DatabaseAdapter):
                 CREATE INDEX IF NOT EXISTS idx_security_type ON trades(security_type)
             ''')
 
+            self._create_calculator_tables(cursor)
+            self._migrate(conn)
+
             conn.commit()
             logger.info("SQLite数据库初始化完成")
 
-    @contextmanager
+    def _create_calculator_tables(self, cursor: sqlite3.Cursor):
+        """创建盈亏计算使用的表（持仓、已平仓、每日汇总、导入日志、持仓批次账本）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL UNIQUE,
+                security_name TEXT,
+                security_type TEXT,
+                total_quantity REAL DEFAULT 0,
+                avg_cost REAL DEFAULT 0,
+                total_cost REAL DEFAULT 0,
+                current_price REAL DEFAULT 0,
+                market_value REAL DEFAULT 0,
+                unrealized_pnl REAL DEFAULT 0,
+                unrealized_pnl_pct REAL DEFAULT 0,
+                last_trade_date TEXT,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS closed_positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                security_name TEXT,
+                open_date TEXT,
+                close_date TEXT,
+                holding_days INTEGER DEFAULT 0,
+                quantity REAL DEFAULT 0,
+                open_price REAL DEFAULT 0,
+                close_price REAL DEFAULT 0,
+                total_cost REAL DEFAULT 0,
+                total_revenue REAL DEFAULT 0,
+                commission REAL DEFAULT 0,
+                net_pnl REAL DEFAULT 0,
+                pnl_pct REAL DEFAULT 0,
+                created_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_closed_positions_close_date ON closed_positions(close_date)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_summary (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                summary_date TEXT NOT NULL UNIQUE,
+                total_trades INTEGER DEFAULT 0,
+                buy_trades INTEGER DEFAULT 0,
+                sell_trades INTEGER DEFAULT 0,
+                total_volume REAL DEFAULT 0,
+                total_commission REAL DEFAULT 0,
+                realized_pnl REAL DEFAULT 0,
+                winning_trades INTEGER DEFAULT 0,
+                losing_trades INTEGER DEFAULT 0,
+                win_rate REAL DEFAULT 0,
+                largest_profit REAL DEFAULT 0,
+                largest_loss REAL DEFAULT 0,
+                avg_profit REAL DEFAULT 0,
+                avg_loss REAL DEFAULT 0,
+                profit_factor REAL DEFAULT 0,
+                created_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_name TEXT,
+                file_path TEXT,
+                file_size INTEGER DEFAULT 0,
+                file_hash TEXT,
+                records_count INTEGER DEFAULT 0,
+                success_count INTEGER DEFAULT 0,
+                error_count INTEGER DEFAULT 0,
+                status TEXT,
+                error_message TEXT,
+                import_time TEXT,
+                duration_seconds REAL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_import_logs_file_hash ON import_logs(file_hash)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS open_lots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id TEXT NOT NULL DEFAULT '',
+                symbol TEXT NOT NULL,
+                security_name TEXT,
+                trade_date TEXT NOT NULL,
+                trade_time TEXT NOT NULL DEFAULT '',
+                quantity REAL NOT NULL,
+                remaining_quantity REAL NOT NULL,
+                price REAL NOT NULL,
+                commission REAL DEFAULT 0,
+                cost_basis REAL DEFAULT 0,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_open_lots_symbol ON open_lots(symbol, account_id)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ledger_trades (
+                trade_key TEXT PRIMARY KEY,
+                symbol TEXT NOT NULL
+            )
+        ''')
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """按 PRAGMA user_version 依次执行数据库迁移"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < 1:
+            self._migrate_unique_trades(conn)
+            conn.execute("PRAGMA user_version = 1")
+
+        if version < 2:
+            self._migrate_keyset_index(conn)
+            conn.execute("PRAGMA user_version = 2")
+
+        if version < 3:
+            self._migrate_dashboard_aggregates(conn)
+            conn.execute("PRAGMA user_version = 3")
+
+    def _migrate_unique_trades(self, conn: sqlite3.Connection):
+        """
+        迁移1：为交易自然键建立唯一索引
+
+        已有的重复记录只保留最早的一条，其余移到 trades_duplicates 表中备查。
+        trade_time 为 NULL 的记录在唯一索引中互不冲突，因此不参与去重。
+        """
+        key = ', '.join(TRADE_NATURAL_KEY)
+        duplicates = f'''
+            SELECT id FROM trades
+            WHERE trade_time IS NOT NULL
+            AND id NOT IN (SELECT MIN(id) FROM trades GROUP BY {key})
+        '''
+
+        self._move_duplicates(conn, duplicates)
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_trade_natural_key ON trades({key})")
+
+    def _migrate_keyset_index(self, conn: sqlite3.Connection):
+        """
+        迁移2：为按 (trade_date, trade_time, id) 分页建立复合索引
+
+        游标比较要求 trade_time 非空，NULL 统一改为空字符串；
+        改完后与已有记录自然键重复的，同样移到 trades_duplicates 表。
+        """
+        conn.execute("UPDATE OR IGNORE trades SET trade_time = '' WHERE trade_time IS NULL")
+        self._move_duplicates(conn, "SELECT id FROM trades WHERE trade_time IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_trade_keyset ON trades(trade_date, trade_time, id)")
+
+    def _migrate_dashboard_aggregates(self, conn: sqlite3.Connection):
+        """
+        迁移3：Dashboard聚合表
+
+        dashboard_overview（总览计数，单行）、dashboard_daily_pnl（交易日 -> 已实现盈亏）和
+        dashboard_symbol_pnl（标的 -> 盈利/亏损合计）在写入交易和已平仓记录的同一事务中按批增量更新，
+        整表替换时全量重算。
+        """
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dashboard_overview (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_trades INTEGER DEFAULT 0,
+                closed_positions INTEGER DEFAULT 0,
+                winning_trades INTEGER DEFAULT 0,
+                losing_trades INTEGER DEFAULT 0,
+                total_pnl REAL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dashboard_daily_pnl (
+                date TEXT PRIMARY KEY,
+                realized_pnl REAL DEFAULT 0
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS dashboard_symbol_pnl (
+                symbol TEXT PRIMARY KEY,
+                {', '.join(f"{field} REAL DEFAULT 0" for field in SYMBOL_PNL_FIELDS)}
+            )
+        ''')
+        self.rebuild_dashboard_aggregates(conn)
+
+    def _move_duplicates(self, conn: sqlite3.Connection, id_query: str):
+        """将 id_query 选出的重复记录移到 trades_duplicates 表"""
+        count = conn.execute(f"SELECT COUNT(*) FROM ({id_query})").fetchone()[0]
+        if count:
+            conn.execute("CREATE TABLE IF NOT EXISTS trades_duplicates AS SELECT * FROM trades WHERE 0")
+            conn.execute(f"INSERT INTO trades_duplicates SELECT * FROM trades WHERE id IN ({id_query})")
+            conn.execute(f"DELETE FROM trades WHERE id IN ({id_query})")
+            logger.warning(f"迁移: 发现 {count} 条重复交易记录，已移至 trades_duplicates 表")
+
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-        finally:
-            conn.close()
+        """从连接池获取数据库连接"""
+        return self.pool.connection()
+
+    def close(self):
+        """关闭连接池"""
+        self.pool.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        在一个事务中执行多个写操作
+
+        事务内各方法共用当前线程持有的连接且不单独提交，最外层退出时统一提交，异常时全部回滚。
+        """
+        with self.get_connection() as conn:
+            depth = getattr(self._txn, 'depth', 0)
+            self._txn.depth = depth + 1
+            try:
+                yield conn
+                if depth == 0:
+                    conn.commit()
+                    self.data_version.bump()
+            except Exception:
+                if depth == 0:
+                    conn.rollback()
+                raise
+            finally:
+                self._txn.depth = depth
+
+    def _commit(self, conn: sqlite3.Connection):
+        """不在显式事务中时立即提交"""
+        if not getattr(self._txn, 'depth', 0):
+            conn.commit()
+            self.data_version.bump()
+
+    def data_version_tag(self) -> str:
+        """当前数据版本（不访问数据库）"""
+        return self.data_version.current()
 
     def save_trades(self, trades: List[TradeRecord]) -> bool:
         """保存交易记录"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                for trade in trades:
-                    # 检查是否已存在相同记录（避免重复导入）
-                    cursor.execute('''
-                        SELECT id FROM trades
-                        WHERE trade_date = ? AND trade_time = ? AND symbol = ?
-                        AND action = ? AND quantity = ? AND price = ?
-                        LIMIT 1
-                    ''', (trade.trade_date, trade.trade_time, trade.symbol,
-                          trade.action, trade.quantity, trade.price))
-
-                    if cursor.fetchone():
-                        logger.debug(f"跳过重复记录: {trade.symbol} {trade.trade_date}")
-                        continue
-
-                    # 插入新记录
-                    cursor.execute('''
-                        INSERT INTO trades (
-                            trade_date, trade_time, symbol, security_name, security_type,
-                            action, quantity, price, amount, commission, net_amount,
-                            underlying_symbol, strike_price, expiration_date, option_type,
-                            source, close_date, close_price, close_quantity, close_reason,
-                            trade_rating, trade_type, notes, broker, account_id,
-                            source_file, import_time, created_at, updated_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        trade.trade_date, trade.trade_time, trade.symbol, trade.security_name,
-                        trade.security_type, trade.action, trade.quantity, trade.price,
-                        trade.amount, trade.commission, trade.net_amount,
-                        trade.underlying_symbol, trade.strike_price, trade.expiration_date,
-                        trade.option_type, trade.source, trade.close_date, trade.close_price,
-                        trade.close_quantity, trade.close_reason, trade.trade_rating,
-                        trade.trade_type, trade.notes, trade.broker, trade.account_id,
-                        trade.source_file, trade.import_time, trade.created_at, trade.updated_at
-                    ))
-
-                conn.commit()
-                logger.info(f"成功保存 {len(trades)} 条交易记录")
-                return True
-
+            self.save_trades_bulk(trades)
+            return True
         except Exception as e:
             logger.error(f"保存交易记录失败: {e}")
             return False
 
+    def save_trades_bulk(self, trades: List[TradeRecord]) -> Dict[str, int]:
+        """
+        在一个事务中批量保存交易记录，自然键重复的记录（包括同一批次内的重复）跳过
+
+        Returns:
+            {'inserted': 新增条数, 'skipped': 重复跳过条数}
+        """
+        rows = [_trade_values(trade) for trade in trades]
+
+        with self.get_connection() as conn:
+            before = conn.total_changes
+            conn.executemany(INSERT_TRADE_SQL, rows)
+            inserted = conn.total_changes - before
+            self._dashboard_add_trades(conn, inserted, (trade.trade_date for trade in trades))
+            self._commit(conn)
+
+        skipped = len(rows) - inserted
+        logger.info(f"成功保存 {inserted} 条交易记录" + (f"，跳过 {skipped} 条重复记录" if skipped else ""))
+        return {'inserted': inserted, 'skipped': skipped}
+
     def get_trades(self, limit: Optional[int] = None,
                    filters: Optional[Dict] = None) -> List[TradeRecord]:
         """获取交易记录"""
@@ -248,23 +654,8 @@ class SQLiteAdapter(DatabaseAdapter):
             with self.get_connection() as conn:
                 cursor = conn.cursor()
 
-                query = "SELECT * FROM trades WHERE 1=1"
-                params = []
-
-                # 添加过滤条件
-                if filters:
-                    if 'symbol' in filters:
-                        query += " AND symbol = ?"
-                        params.append(filters['symbol'])
-                    if 'security_type' in filters:
-                        query += " AND security_type = ?"
-                        params.append(filters['security_type'])
-                    if 'start_date' in filters:
-                        query += " AND trade_date >= ?"
-                        params.append(filters['start_date'])
-                    if 'end_date' in filters:
-                        query += " AND trade_date <= ?"
-                        params.append(filters['end_date'])
+                where, params = self._filter_clause(filters)
+                query = f"SELECT * FROM trades WHERE {where}"
 
                 query += " ORDER BY trade_date DESC, trade_time DESC"
 
@@ -286,6 +677,73 @@ class SQLiteAdapter(DatabaseAdapter):
             logger.error(f"获取交易记录失败: {e}")
             return []
 
+    def _filter_clause(self, filters: Optional[Dict]) -> Tuple[str, List]:
+        """构建过滤条件，返回 (WHERE子句, 参数)"""
+        clauses = ["1=1"]
+        params = []
+
+        if filters:
+            if 'symbol' in filters:
+                clauses.append("symbol = ?")
+                params.append(filters['symbol'])
+            if 'security_type' in filters:
+                clauses.append("security_type = ?")
+                params.append(filters['security_type'])
+            if 'start_date' in filters:
+                clauses.append("trade_date >= ?")
+                params.append(filters['start_date'])
+            if 'end_date' in filters:
+                clauses.append("trade_date <= ?")
+                params.append(filters['end_date'])
+
+        return " AND ".join(clauses), params
+
+    def get_trade_by_id(self, trade_id: int) -> Optional[TradeRecord]:
+        """按主键获取交易记录"""
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT * FROM trades WHERE id = ?", (trade_id,)).fetchone()
+        return TradeRecord.from_dict(dict(row)) if row else None
+
+    def iter_trades(self, after: Optional[Tuple[str, str, int]] = None, limit: Optional[int] = None,
+                    filters: Optional[Dict] = None, page_size: int = 1000) -> Iterator[TradeRecord]:
+        """
+        按 (trade_date, trade_time, id) 倒序遍历交易记录（键集分页，走 idx_trade_keyset 索引）
+
+        Args:
+            after: 上一页最后一条记录的 (trade_date, trade_time, id)，None 表示从最新的记录开始
+            limit: 最多返回的条数，None 表示遍历到底
+            filters: 过滤条件，同 get_trades
+            page_size: 每次查询的条数，逐页读取，遍历期间不占用数据库连接
+
+        Yields:
+            交易记录
+        """
+        where, filter_params = self._filter_clause(filters)
+        remaining = limit
+
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            query = f"SELECT * FROM trades WHERE {where}"
+            params = list(filter_params)
+            if after is not None:
+                query += " AND (trade_date, trade_time, id) < (?, ?, ?)"
+                params.extend(after)
+            query += " ORDER BY trade_date DESC, trade_time DESC, id DESC LIMIT ?"
+            params.append(size)
+
+            with self.get_connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+
+            for row in rows:
+                yield TradeRecord.from_dict(dict(row))
+
+            if len(rows) < size:
+                return
+            last = rows[-1]
+            after = (last['trade_date'], last['trade_time'], last['id'])
+            if remaining is not None:
+                remaining -= len(rows)
+
     def update_trade(self, trade_id: int, updates: Dict) -> bool:
         """更新交易记录"""
         try:
@@ -299,11 +757,15 @@ class SQLiteAdapter(DatabaseAdapter):
                 set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
                 params = list(updates.values()) + [trade_id]
 
+                old = cursor.execute("SELECT trade_date FROM trades WHERE id = ?", (trade_id,)).fetchone()
                 cursor.execute(f'''
                     UPDATE trades SET {set_clause} WHERE id = ?
                 ''', params)
+                if old is not None and updates.get('trade_date', old[0]) != old[0]:
+                    self._dashboard_add_trades(conn, 0, [updates['trade_date']])
+                    self._dashboard_drop_empty_days(conn, [old[0]])
 
-                conn.commit()
+                self._commit(conn)
                 logger.info(f"更新交易记录 {trade_id} 成功")
                 return True
 
@@ -316,8 +778,12 @@ class SQLiteAdapter(DatabaseAdapter):
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                old = cursor.execute("SELECT trade_date FROM trades WHERE id = ?", (trade_id,)).fetchone()
                 cursor.execute("DELETE FROM trades WHERE id = ?", (trade_id,))
-                conn.commit()
+                if old is not None:
+                    self._dashboard_add_trades(conn, -1, [])
+                    self._dashboard_drop_empty_days(conn, [old[0]])
+                self._commit(conn)
                 logger.info(f"删除交易记录 {trade_id} 成功")
                 return True
         except Exception as e:
@@ -351,6 +817,43 @@ class SQLiteAdapter(DatabaseAdapter):
                 ''')
                 option_trades = cursor.fetchone()[0]
 
+                # Dashboard图表使用的分组统计，在数据库中对全部交易聚合（交易列表是分页的）
+                cursor.execute(f'''
+                    SELECT substr(trade_date, 1, 7) AS month, COUNT(*), SUM(amount),
+                           SUM(CASE WHEN action = 'BUY' THEN 1 ELSE 0 END),
+                           SUM(CASE WHEN action = 'BUY' THEN 0 ELSE 1 END),
+                           SUM(CASE WHEN action = 'BUY' THEN 0 ELSE {SIMPLE_PROFIT_SQL} END)
+                    FROM trades WHERE trade_date <> ''
+                    GROUP BY month ORDER BY month
+                ''')
+                monthly = [{
+                    'month': row[0], 'trades': row[1], 'amount': row[2] or 0,
+                    'buyCount': row[3], 'sellCount': row[4], 'profit': row[5] or 0
+                } for row in cursor.fetchall()]
+
+                cursor.execute('''
+                    SELECT symbol, COUNT(*), SUM(amount) AS total, MAX(security_type)
+                    FROM trades GROUP BY symbol ORDER BY total DESC LIMIT ?
+                ''', (STATISTICS_TOP_SYMBOLS,))
+                top_symbols = [{'symbol': row[0], 'trades': row[1], 'amount': row[2] or 0, 'type': row[3]}
+                               for row in cursor.fetchall()]
+
+                cursor.execute('''
+                    SELECT CAST(ROUND(trade_rating) AS INTEGER) AS rating, COUNT(*)
+                    FROM trades WHERE trade_rating > 0 GROUP BY rating
+                ''')
+                rating_distribution = {str(rating): 0 for rating in range(1, 6)}
+                for rating, count in cursor.fetchall():
+                    rating_distribution[str(rating)] = count
+
+                cursor.execute(f'''
+                    SELECT source, COUNT(*) AS count,
+                           SUM(CASE WHEN action = 'SELL' THEN {SIMPLE_PROFIT_SQL} ELSE 0 END)
+                    FROM trades WHERE source <> '' GROUP BY source ORDER BY count DESC
+                ''')
+                sources = [{'source': row[0], 'count': row[1], 'profit': row[2] or 0}
+                           for row in cursor.fetchall()]
+
                 return {
                     'total_trades': total_trades,
                     'buy_trades': stats[0] or 0,
@@ -359,9 +862,322 @@ class SQLiteAdapter(DatabaseAdapter):
                     'total_commission': stats[3] or 0,
                     'average_rating': stats[4] or 0,
                     'option_trades': option_trades,
-                    'stock_trades': total_trades - option_trades
+                    'stock_trades': total_trades - option_trades,
+                    'monthly': monthly,
+                    'top_symbols': top_symbols,
+                    'rating_distribution': rating_distribution,
+                    'rated_trades': sum(rating_distribution.values()),
+                    'sources': sources
                 }
 
         except Exception as e:
             logger.error(f"获取统计信息失败: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    # ---- 盈亏计算与导入使用的接口（与 GoogleSheetsAdapter 一致） ----
+
+    def insert_trades(self, trades: List[Dict]) -> int:
+        """插入交易记录，返回新增条数（重复记录跳过）"""
+        return self.save_trades_bulk([TradeRecord.from_dict(trade) for trade in trades])['inserted']
+
+    def insert_new_trades(self, trades: List[Dict]) -> List[Dict]:
+        """插入交易记录，返回实际新增的记录（自然键重复的跳过，混合存储只复制这些记录）"""
+        inserted = []
+        with self.get_connection() as conn:
+            for trade in trades:
+                record = TradeRecord.from_dict(trade)
+                if conn.execute(INSERT_TRADE_SQL, _trade_values(record)).rowcount:
+                    inserted.append(trade)
+            self._dashboard_add_trades(conn, len(inserted), (trade.get('trade_date') for trade in inserted))
+            self._commit(conn)
+
+        skipped = len(trades) - len(inserted)
+        logger.info(f"成功保存 {len(inserted)} 条交易记录" + (f"，跳过 {skipped} 条重复记录" if skipped else ""))
+        return inserted
+
+    def get_all_trades(self) -> List[Dict]:
+        """获取所有交易记录"""
+        return self._select_dicts("SELECT * FROM trades ORDER BY trade_date, trade_time, id")
+
+    def get_trades_by_symbol(self, symbol: str) -> List[Dict]:
+        """根据标的获取交易记录"""
+        return self._select_dicts(
+            "SELECT * FROM trades WHERE symbol = ? ORDER BY trade_date, trade_time, id", (symbol,)
+        )
+
+    def get_trades_by_date(self, date: str) -> List[Dict]:
+        """根据日期获取交易记录"""
+        return self._select_dicts(
+            "SELECT * FROM trades WHERE trade_date = ? ORDER BY trade_time, id", (date,)
+        )
+
+    def update_position(self, symbol: str, position_data: Dict):
+        """更新持仓信息（不存在时插入）"""
+        self.update_positions([dict(position_data, symbol=symbol)])
+
+    def update_positions(self, positions: List[Dict]):
+        """批量更新持仓信息（按 symbol 插入或更新）"""
+        updates = ', '.join(f"{column} = excluded.{column}" for column in POSITION_COLUMNS[1:])
+        with self.get_connection() as conn:
+            conn.executemany(f'''
+                INSERT INTO positions ({', '.join(POSITION_COLUMNS)})
+                VALUES ({', '.join('?' * len(POSITION_COLUMNS))})
+                ON CONFLICT(symbol) DO UPDATE SET {updates}
+            ''', [self._row_values(POSITION_COLUMNS, position) for position in positions])
+            self._commit(conn)
+
+    def get_open_positions(self) -> List[Dict]:
+        """获取所有开仓持仓"""
+        return self._select_dicts("SELECT * FROM positions WHERE total_quantity > 0 ORDER BY symbol")
+
+    def insert_closed_position(self, closed_data: Dict):
+        """插入已平仓记录"""
+        self.insert_closed_positions([closed_data])
+
+    def insert_closed_positions(self, closed_list: List[Dict]):
+        """批量插入已平仓记录"""
+        with self.get_connection() as conn:
+            conn.executemany(
+                f"INSERT INTO closed_positions ({', '.join(CLOSED_POSITION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(CLOSED_POSITION_COLUMNS))})",
+                [self._row_values(CLOSED_POSITION_COLUMNS, closed_data) for closed_data in closed_list]
+            )
+            self._dashboard_add_closed(conn, closed_list)
+            self._commit(conn)
+
+    def replace_closed_positions(self, closed_list: List[Dict]):
+        """用重建结果替换全部已平仓记录"""
+        with self.get_connection() as conn:
+            conn.execute("DELETE FROM closed_positions")
+            conn.executemany(
+                f"INSERT INTO closed_positions ({', '.join(CLOSED_POSITION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(CLOSED_POSITION_COLUMNS))})",
+                [self._row_values(CLOSED_POSITION_COLUMNS, closed_data) for closed_data in closed_list]
+            )
+            self.rebuild_dashboard_aggregates(conn)
+            self._commit(conn)
+
+    def get_closed_positions_by_date(self, date: str) -> List[Dict]:
+        """根据日期获取已平仓记录"""
+        return self._select_dicts("SELECT * FROM closed_positions WHERE close_date = ? ORDER BY id", (date,))
+
+    def get_all_closed_positions(self) -> List[Dict]:
+        """获取所有已平仓记录"""
+        return self._select_dicts("SELECT * FROM closed_positions ORDER BY id")
+
+    def insert_or_update_daily_summary(self, summary_data: Dict):
+        """插入或更新每日汇总"""
+        self.insert_or_update_daily_summaries([summary_data])
+
+    def insert_or_update_daily_summaries(self, summaries: List[Dict]):
+        """批量插入或更新每日汇总（按 summary_date）"""
+        # 更新时保留最初的 created_at
+        updates = ', '.join(f"{column} = excluded.{column}" for column in DAILY_SUMMARY_COLUMNS
+                            if column not in ('summary_date', 'created_at'))
+        with self.get_connection() as conn:
+            conn.executemany(f'''
+                INSERT INTO daily_summary ({', '.join(DAILY_SUMMARY_COLUMNS)})
+                VALUES ({', '.join('?' * len(DAILY_SUMMARY_COLUMNS))})
+                ON CONFLICT(summary_date) DO UPDATE SET {updates}
+            ''', [self._row_values(DAILY_SUMMARY_COLUMNS, summary) for summary in summaries])
+            self._commit(conn)
+
+    def insert_import_log(self, log_data: Dict):
+        """插入导入日志"""
+        with self.get_connection() as conn:
+            conn.execute(
+                f"INSERT INTO import_logs ({', '.join(IMPORT_LOG_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(IMPORT_LOG_COLUMNS))})",
+                self._row_values(IMPORT_LOG_COLUMNS, log_data)
+            )
+            self._commit(conn)
+
+    def get_import_log_by_hash(self, file_hash: str) -> Optional[Dict]:
+        """根据文件哈希获取导入日志（优先返回成功的记录）"""
+        rows = self._select_dicts(
+            "SELECT * FROM import_logs WHERE file_hash = ? ORDER BY status = 'SUCCESS' DESC, id LIMIT 1",
+            (file_hash,)
+        )
+        return rows[0] if rows else None
+
+    def get_open_lots(self, symbol: str) -> List[Dict]:
+        """获取标的所有账户的未平仓批次，按FIFO顺序排列"""
+        return self.get_open_lots_for_symbols([symbol]).get(symbol, [])
+
+    def get_open_lots_for_symbols(self, symbols: Iterable[str]) -> Dict[str, List[Dict]]:
+        """一次获取多个标的的未平仓批次，按标的分组，组内按FIFO顺序排列"""
+        lots = {}
+        with self.get_connection() as conn:
+            for chunk in self._chunks(list(symbols)):
+                rows = conn.execute(
+                    f"SELECT * FROM open_lots WHERE symbol IN ({', '.join('?' * len(chunk))}) "
+                    f"ORDER BY symbol, trade_date, trade_time, id", chunk
+                ).fetchall()
+                for row in rows:
+                    lots.setdefault(row['symbol'], []).append(dict(row))
+        return lots
+
+    def get_applied_trade_keys(self, trade_keys: Iterable[str]) -> Set[str]:
+        """返回已计入持仓批次账本的交易键"""
+        applied = set()
+        with self.get_connection() as conn:
+            for chunk in self._chunks(list(trade_keys)):
+                rows = conn.execute(
+                    f"SELECT trade_key FROM ledger_trades WHERE trade_key IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                applied.update(row[0] for row in rows)
+        return applied
+
+    def save_lot_ledger(self, lots_by_symbol: Dict[str, List[Dict]], trade_keys: Dict[str, str]):
+        """
+        保存持仓批次账本：替换各标的的未平仓批次，并记录已计入的交易键
+
+        Args:
+            lots_by_symbol: 标的 -> 该标的全部未平仓批次（剩余数量大于0）
+            trade_keys: 本次新计入账本的交易键 -> 标的
+        """
+        with self.get_connection() as conn:
+            conn.executemany("DELETE FROM open_lots WHERE symbol = ?", [(symbol,) for symbol in lots_by_symbol])
+            conn.executemany(
+                f"INSERT INTO open_lots ({', '.join(LOT_COLUMNS)}) VALUES ({', '.join('?' * len(LOT_COLUMNS))})",
+                [self._row_values(LOT_COLUMNS, dict(lot, symbol=symbol))
+                 for symbol, lots in lots_by_symbol.items() for lot in lots]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO ledger_trades (trade_key, symbol) VALUES (?, ?)",
+                trade_keys.items()
+            )
+            self._commit(conn)
+
+    @staticmethod
+    def _dashboard_add_trades(conn: sqlite3.Connection, inserted: int, trade_dates: Iterable[str]):
+        """按批累加交易数和交易日（重复导入的交易的日期已存在，忽略即可）"""
+        conn.execute("UPDATE dashboard_overview SET total_trades = total_trades + ? WHERE id = 1", (inserted,))
+        conn.executemany("INSERT OR IGNORE INTO dashboard_daily_pnl (date) VALUES (?)",
+                         [(date,) for date in set(trade_dates) if date])
+
+    @staticmethod
+    def _dashboard_add_closed(conn: sqlite3.Connection, closed_list: List[Dict]):
+        """按批累加已平仓记录：先在内存中按日期和标的汇总，再逐日期、逐标的更新"""
+        batch = DashboardAggregates()
+        batch.add_closed_positions(closed_list)
+        conn.execute('''
+            UPDATE dashboard_overview SET closed_positions = closed_positions + ?, winning_trades = winning_trades + ?,
+                losing_trades = losing_trades + ?, total_pnl = total_pnl + ?
+            WHERE id = 1
+        ''', (batch.closed_positions, batch.winning_trades, batch.losing_trades, batch.total_pnl))
+        conn.executemany('''
+            INSERT INTO dashboard_daily_pnl (date, realized_pnl) VALUES (?, ?)
+            ON CONFLICT(date) DO UPDATE SET realized_pnl = realized_pnl + excluded.realized_pnl
+        ''', batch.daily_pnl.items())
+        conn.executemany(f'''
+            INSERT INTO dashboard_symbol_pnl (symbol, {', '.join(SYMBOL_PNL_FIELDS)})
+            VALUES (?, {', '.join('?' * len(SYMBOL_PNL_FIELDS))})
+            ON CONFLICT(symbol) DO UPDATE SET {', '.join(f"{f} = {f} + excluded.{f}" for f in SYMBOL_PNL_FIELDS)}
+        ''', [(symbol, *(stats[f] for f in SYMBOL_PNL_FIELDS)) for symbol, stats in batch.symbols.items()])
+
+    @staticmethod
+    def _dashboard_drop_empty_days(conn: sqlite3.Connection, dates: Iterable[str]):
+        """交易日已没有交易和已平仓记录时从每日盈亏中删除"""
+        conn.executemany('''
+            DELETE FROM dashboard_daily_pnl WHERE date = ?1
+            AND NOT EXISTS (SELECT 1 FROM trades WHERE trade_date = ?1)
+            AND NOT EXISTS (SELECT 1 FROM closed_positions WHERE close_date = ?1)
+        ''', [(date,) for date in dates])
+
+    def rebuild_dashboard_aggregates(self, conn: Optional[sqlite3.Connection] = None):
+        """从 trades 和 closed_positions 全量重算Dashboard聚合表（迁移和整表替换时使用）"""
+        if conn is None:
+            with self.get_connection() as conn:
+                self.rebuild_dashboard_aggregates(conn)
+                self._commit(conn)
+            return
+
+        closed = ("SELECT symbol, close_date, CAST(COALESCE(net_pnl, 0) AS REAL) AS pnl, "
+                  "CAST(COALESCE(total_cost, 0) AS REAL) AS cost FROM closed_positions")
+        conn.execute("DELETE FROM dashboard_overview")
+        conn.execute("DELETE FROM dashboard_daily_pnl")
+        conn.execute("DELETE FROM dashboard_symbol_pnl")
+        conn.execute(f'''
+            INSERT INTO dashboard_overview (id, total_trades, closed_positions, winning_trades, losing_trades, total_pnl)
+            SELECT 1, (SELECT COUNT(*) FROM trades), COUNT(*),
+                   COALESCE(SUM(pnl > 0), 0), COALESCE(SUM(pnl < 0), 0), COALESCE(SUM(pnl), 0)
+            FROM ({closed})
+        ''')
+        conn.execute("INSERT INTO dashboard_daily_pnl (date) SELECT DISTINCT trade_date FROM trades WHERE trade_date <> ''")
+        conn.execute(f'''
+            INSERT INTO dashboard_daily_pnl (date, realized_pnl)
+            SELECT close_date, SUM(pnl) FROM ({closed})
+            WHERE COALESCE(close_date, '') <> '' GROUP BY close_date
+            ON CONFLICT(date) DO UPDATE SET realized_pnl = excluded.realized_pnl
+        ''')
+        conn.execute(f'''
+            INSERT INTO dashboard_symbol_pnl (symbol, {', '.join(SYMBOL_PNL_FIELDS)})
+            SELECT symbol,
+                   SUM(CASE WHEN pnl > 0 THEN pnl ELSE 0 END), SUM(pnl > 0), SUM(CASE WHEN pnl > 0 THEN cost ELSE 0 END),
+                   SUM(CASE WHEN pnl < 0 THEN pnl ELSE 0 END), SUM(pnl < 0), SUM(CASE WHEN pnl < 0 THEN cost ELSE 0 END)
+            FROM ({closed}) GROUP BY symbol
+        ''')
+
+    def get_dashboard_aggregates(self, days: int = DASHBOARD_DAYS, top: int = DASHBOARD_TOP) -> Dict:
+        """读取预先聚合的Dashboard数据（几次按主键的查询，与记录数无关）"""
+        with self.get_connection() as conn:
+            overview = dict(conn.execute("SELECT * FROM dashboard_overview WHERE id = 1").fetchone() or {})
+            overview['positions_count'] = conn.execute(
+                "SELECT COUNT(*) FROM positions WHERE total_quantity > 0").fetchone()[0]
+            daily = conn.execute(
+                "SELECT date, realized_pnl FROM dashboard_daily_pnl ORDER BY date DESC LIMIT ?", (days,)
+            ).fetchall()
+            rankings = [
+                [dict(row) for row in conn.execute(
+                    f"SELECT symbol, {side}_pnl AS pnl, {side}_trades AS trades, {side}_cost AS total_cost "
+                    f"FROM dashboard_symbol_pnl WHERE {side}_trades > 0 ORDER BY {side}_pnl {order} LIMIT ?",
+                    (top,)
+                )]
+                for side, order in (('profit', 'DESC'), ('loss', 'ASC'))
+            ]
+        return build_dashboard(overview, [(row[0], row[1]) for row in reversed(daily)], *rankings)
+
+    def replace_table(self, table: str, records: List[Dict]):
+        """
+        用记录替换整张表（从 Google Sheets 同步本地镜像时使用）
+
+        记录中的整数 id 原样保留，缺失或非整数的 id 由数据库分配；违反唯一约束的记录跳过。
+        """
+        columns = MIRROR_COLUMNS[table]
+        rows = []
+        for record in records:
+            if 'id' in columns and not isinstance(record.get('id'), int):
+                record = dict(record, id=None)
+            rows.append(self._row_values(columns, record))
+
+        with self.get_connection() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows
+            )
+            if table in ('trades', 'closed_positions'):
+                self.rebuild_dashboard_aggregates(conn)
+            self._commit(conn)
+
+    @staticmethod
+    def _chunks(values: List, size: int = 500) -> Iterator[List]:
+        """分批切分 IN 查询的参数，避免超出SQLite参数个数上限"""
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
+
+    def _select_dicts(self, query: str, params: tuple = ()) -> List[Dict]:
+        """执行查询并以字典列表返回"""
+        with self.get_connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    @staticmethod
+    def _row_values(columns: Tuple[str, ...], data: Dict) -> tuple:
+        """按列顺序取值，缺失的时间字段填当前时间"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return tuple(
+            data.get(column, now if column in ('created_at', 'updated_at') else None)
+            for column in columns
+        )
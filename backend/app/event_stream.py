@@ -0,0 +1,308 @@
+"""
+Dashboard实时推送 - Server-Sent Events，数据写入后向所有连接推送增量
+"""
+import json
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from werkzeug.serving import WSGIRequestHandler
+
+from app.config import Config
+from app.dashboard_aggregates import dashboard_data, dashboard_delta
+
+logger = logging.getLogger(__name__)
+
+# EventStreamRequestHandler 在 environ 中提供的连接接管回调
+DETACH_KEY = 'event_stream.detach'
+
+# 连接断开后浏览器等待多少毫秒重连
+RETRY = b'retry: 3000\n\n'
+HEARTBEAT = b': ping\n\n'
+
+# 单个连接积压未发送的数据超过此字节数（或事件数）时断开，客户端重连后重新获取快照
+MAX_PENDING_BYTES = 1 << 20
+MAX_PENDING_EVENTS = 1000
+
+
+def format_event(event: str, data: Dict) -> bytes:
+    """编码一条SSE事件"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class DashboardStream:
+    """
+    Dashboard推送中心
+
+    一个后台线程每 poll_seconds 秒读取存储的数据版本（调度器和API服务每次提交写入都会更新，
+    跨进程可见），版本变化时读取一次Dashboard数据，与上次比较得到增量并只编码一次，再分发给
+    所有连接；新连接先收到完整快照（snapshot 事件），之后是增量（delta 事件）。
+    计算量只与写入次数有关，与连接数无关。
+
+    使用 EventStreamRequestHandler（开发服务器）时，连接发送完响应头后交给后台线程，用非阻塞
+    socket统一发送，不为每个连接占用线程；其他WSGI服务器上每个连接由自己的请求线程从队列读取事件。
+    """
+
+    def __init__(self, storage, get_version: Callable[[], Optional[str]],
+                 poll_seconds: Optional[float] = None, heartbeat_seconds: Optional[float] = None):
+        """
+        Args:
+            storage: 存储适配器
+            get_version: 数据版本获取函数，返回 None 时按 heartbeat_seconds 间隔重新读取数据
+            poll_seconds: 检查数据版本的间隔秒数
+            heartbeat_seconds: 发送保活注释的间隔秒数
+        """
+        self.storage = storage
+        self.get_version = get_version
+        self.poll_seconds = Config.SSE_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.heartbeat_seconds = Config.SSE_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+
+        self._lock = threading.Lock()
+        self._pending = []      # 等待后台线程接管的连接（socket 或 队列）
+        self._sockets = {}      # socket -> 未发送的数据，只由后台线程访问
+        self._queues = set()
+        self._snapshot = None
+        self._snapshot_event = b''
+        self._version = None
+        self._versioned = True
+        self._stop = threading.Event()
+        self._thread = None
+        self._selector = None
+        self._wake_r = self._wake_w = None
+
+    @property
+    def client_count(self) -> int:
+        """当前连接数"""
+        with self._lock:
+            return len(self._pending) + len(self._sockets) + len(self._queues)
+
+    def stream(self, environ: Dict) -> Iterator[bytes]:
+        """/api/stream 的响应体"""
+        detach = environ.get(DETACH_KEY)
+        if detach is not None:
+            # 响应头和第一段数据发送后，请求线程结束，连接由后台线程接管
+            detach(self)
+            yield RETRY
+            return
+
+        events = queue.Queue()
+        self._subscribe(events)
+        try:
+            yield RETRY
+            while True:
+                data = events.get()
+                if data is None:
+                    return
+                yield data
+        finally:
+            with self._lock:
+                self._queues.discard(events)
+                if events in self._pending:
+                    self._pending.remove(events)
+
+    def attach(self, sock: socket.socket):
+        """接管已发送完响应头的连接"""
+        self._subscribe(sock)
+
+    def close(self, timeout: float = 5):
+        """停止后台线程并断开所有连接"""
+        self._stop.set()
+        if self._thread is not None:
+            self._wakeup()
+            self._thread.join(timeout)
+
+    def _subscribe(self, client):
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_r, self._wake_w = socket.socketpair()
+                for sock in (self._wake_r, self._wake_w):
+                    sock.setblocking(False)
+                self._selector.register(self._wake_r, selectors.EVENT_READ)
+                self._thread = threading.Thread(target=self._run, name='dashboard-stream', daemon=True)
+                self._thread.start()
+            self._pending.append(client)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass    # 缓冲区已满说明后台线程已有待处理的唤醒
+
+    def _run(self):
+        next_poll = time.monotonic()
+        next_heartbeat = next_poll + self.heartbeat_seconds
+        while not self._stop.is_set():
+            timeout = max(0.0, min(next_poll, next_heartbeat) - time.monotonic())
+            for key, mask in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if mask & selectors.EVENT_READ and not self._read(key.fileobj):
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(key.fileobj)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            now = time.monotonic()
+            if pending or (now >= next_poll and (self._sockets or self._queues)):
+                self._refresh()
+                next_poll = now + (self.poll_seconds if self._versioned else self.heartbeat_seconds)
+            elif now >= next_poll:
+                next_poll = now + self.poll_seconds
+            for client in pending:
+                self._add(client)
+            if now >= next_heartbeat:
+                self._broadcast(HEARTBEAT)
+                next_heartbeat = now + self.heartbeat_seconds
+
+        for sock in list(self._sockets):
+            self._drop(sock)
+        with self._lock:
+            for events in self._queues | {c for c in self._pending if isinstance(c, queue.Queue)}:
+                events.put(None)
+            self._queues.clear()
+            self._pending.clear()
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _refresh(self):
+        """数据版本变化时重新读取Dashboard数据，向现有连接推送增量"""
+        try:
+            # 先读版本再读数据：两者之间发生的写入会在下次检查时再推送一次，不会遗漏
+            version = self.get_version()
+            self._versioned = version is not None
+            if self._snapshot is not None and self._versioned and version == self._version:
+                return
+            snapshot = dashboard_data(self.storage)
+        except Exception as e:
+            logger.error(f"读取Dashboard数据失败: {str(e)}")
+            return
+
+        previous, self._snapshot, self._version = self._snapshot, snapshot, version
+        self._snapshot_event = format_event('snapshot', snapshot)
+        if previous is not None:
+            delta = dashboard_delta(previous, snapshot)
+            if delta:
+                self._broadcast(format_event('delta', delta))
+
+    def _add(self, client):
+        snapshot = self._snapshot_event
+        if isinstance(client, queue.Queue):
+            with self._lock:
+                self._queues.add(client)
+            if snapshot:
+                client.put(snapshot)
+            return
+
+        try:
+            client.setblocking(False)
+            self._selector.register(client, selectors.EVENT_READ)
+        except (OSError, ValueError):
+            client.close()
+            return
+        self._sockets[client] = bytearray()
+        if snapshot:
+            self._send(client, snapshot)
+
+    def _broadcast(self, data: bytes):
+        for sock in list(self._sockets):
+            self._send(sock, data)
+        with self._lock:
+            queues = list(self._queues)
+        for events in queues:
+            if events.qsize() >= MAX_PENDING_EVENTS:
+                with self._lock:
+                    self._queues.discard(events)
+                events.put(None)
+            else:
+                events.put(data)
+
+    def _send(self, sock: socket.socket, data: bytes):
+        buffer = self._sockets[sock]
+        buffer += data
+        if len(buffer) > MAX_PENDING_BYTES:
+            logger.warning("推送连接积压过多数据，断开连接")
+            self._drop(sock)
+        else:
+            self._flush(sock)
+
+    def _flush(self, sock: socket.socket):
+        buffer = self._sockets.get(sock)
+        if buffer is None:
+            return
+        try:
+            sent = sock.send(buffer) if buffer else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        del buffer[:sent]
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if buffer else 0)
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events)
+
+    def _read(self, sock: socket.socket) -> bool:
+        """客户端不会再发送数据，可读说明连接已关闭；返回连接是否仍然有效"""
+        try:
+            if sock.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._drop(sock)
+        return False
+
+    def _drop(self, sock: socket.socket):
+        if self._sockets.pop(sock, None) is None:
+            return
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+
+class EventStreamRequestHandler(WSGIRequestHandler):
+    """
+    开发服务器的请求处理器：/api/stream 的响应头发送后，把连接交给 DashboardStream，
+    请求线程随即结束
+
+    用法: app.run(..., request_handler=EventStreamRequestHandler)
+    """
+
+    stream = None
+
+    def make_environ(self):
+        environ = super().make_environ()
+        if self.server.ssl_context is None:
+            environ[DETACH_KEY] = self._detach
+        return environ
+
+    def _detach(self, stream: DashboardStream):
+        # HTTP/1.0 响应不使用分块编码，响应体结束后仍可在连接上继续写入事件
+        self.protocol_version = 'HTTP/1.0'
+        self.stream = stream
+
+    def finish(self):
+        super().finish()
+        if self.stream is not None:
+            # 之后服务器关闭请求socket时对已分离的socket不做任何操作
+            fd = self.connection.detach()
+            if fd >= 0:
+                self.stream.attach(socket.socket(fileno=fd))
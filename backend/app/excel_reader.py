@@ -0,0 +1,144 @@
+"""
+Excel读取引擎 - 按文件类型选择读取引擎，支持openpyxl只读流式读取
+"""
+import importlib.util
+import logging
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 引擎 -> 依赖的模块
+ENGINE_MODULES = {
+    'calamine': 'python_calamine',
+    'openpyxl_stream': 'openpyxl',
+    'openpyxl': 'openpyxl',
+    'pyxlsb': 'pyxlsb',
+    'xlrd': 'xlrd'
+}
+
+# 各文件类型按优先级排列的候选引擎（auto模式）
+ENGINE_PREFERENCES = {
+    '.xlsx': ['calamine', 'openpyxl_stream', 'openpyxl'],
+    '.xlsm': ['calamine', 'openpyxl_stream', 'openpyxl'],
+    '.xls': ['calamine', 'xlrd'],
+    '.xlsb': ['calamine', 'pyxlsb']
+}
+
+
+def is_engine_available(engine: str) -> bool:
+    """检查引擎依赖是否已安装"""
+    module = ENGINE_MODULES.get(engine)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def select_engines(file_path: str, preferred: str = 'auto') -> List[str]:
+    """
+    为文件选择候选读取引擎
+
+    Args:
+        file_path: 文件路径
+        preferred: 配置的引擎，'auto' 表示按文件类型自动选择
+
+    Returns:
+        按优先级排列的可用引擎列表，配置的引擎不可用时退回自动选择的引擎
+    """
+    suffix = Path(file_path).suffix.lower()
+    candidates = list(ENGINE_PREFERENCES.get(suffix, ['openpyxl']))
+
+    if preferred != 'auto':
+        if preferred in candidates:
+            candidates.remove(preferred)
+        candidates.insert(0, preferred)
+
+    engines = [engine for engine in candidates if is_engine_available(engine)]
+    if preferred != 'auto' and engines[:1] != [preferred]:
+        logger.warning(f"Excel引擎 {preferred} 不可用于 {suffix} 文件，改用: {engines[:1]}")
+
+    return engines
+
+
+def rewind(source):
+    """文件对象回到开头后返回（同一来源会先后读取表头和数据），文件路径原样返回"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def read_header(source, engine: str) -> pd.Index:
+    """只读取表头"""
+    if engine == 'openpyxl_stream':
+        workbook, rows = _open_stream(source)
+        try:
+            return pd.Index(_header_names(next(rows, ())))
+        finally:
+            workbook.close()
+
+    return pd.read_excel(rewind(source), nrows=0, engine=engine).columns
+
+
+def iter_frames(source, engine: str, usecols: Optional[List] = None,
+                chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+    """
+    读取第一个工作表
+
+    Args:
+        source: 文件路径或可seek的二进制文件对象
+        engine: 读取引擎
+        usecols: 需要读取的列，None表示全部列
+        chunk_size: openpyxl_stream 模式下每块的行数
+
+    Yields:
+        DataFrame，openpyxl_stream 模式按块产出，其他引擎整表产出一次
+    """
+    if engine == 'openpyxl_stream':
+        yield from _iter_stream(source, usecols, chunk_size)
+    else:
+        yield pd.read_excel(rewind(source), usecols=usecols, engine=engine)
+
+
+def _open_stream(source):
+    """以只读模式打开工作簿，返回 (工作簿, 行迭代器)"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(rewind(source), read_only=True, data_only=True)
+    worksheet = workbook.worksheets[0]
+    return workbook, worksheet.iter_rows(values_only=True)
+
+
+def _header_names(row: tuple) -> List:
+    """表头空单元格按pandas的习惯命名为 Unnamed: n"""
+    return [value if value is not None else f'Unnamed: {i}' for i, value in enumerate(row)]
+
+
+def _iter_stream(source, usecols: Optional[List],
+                 chunk_size: int) -> Iterator[pd.DataFrame]:
+    """openpyxl只读模式逐行读取，每 chunk_size 行组装一个DataFrame"""
+    workbook, rows = _open_stream(source)
+    try:
+        header = _header_names(next(rows, ()))
+        if usecols is None:
+            positions = list(range(len(header)))
+        else:
+            wanted = set(usecols)
+            positions = [i for i, name in enumerate(header) if name in wanted]
+        names = [header[i] for i in positions]
+
+        chunk = []
+        for row in rows:
+            values = [row[i] if i < len(row) else None for i in positions]
+            # 跳过空行
+            if all(value is None for value in values):
+                continue
+            chunk.append([np.nan if value is None else value for value in values])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=names)
+                chunk = []
+
+        if chunk:
+            yield pd.DataFrame(chunk, columns=names)
+    finally:
+        workbook.close()
@@ -0,0 +1,243 @@
+"""
+FIFO配对引擎 - 全量重建已平仓记录的NumPy实现
+
+每个标的的交易只排序一次并转为数组，同一账户的买入、卖出数量分别累加，
+两组累计区间的交集即为FIFO配对（哪笔卖出消耗了哪笔买入的多少数量），
+已平仓记录的各项数值按 PnLCalculator._create_closed_position 的公式整列计算。
+"""
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 与 calculator.trade_key 一致的去重字段
+TRADE_KEY_COLUMNS = ['account_id', 'trade_date', 'trade_time', 'symbol', 'action', 'quantity', 'price']
+
+CLOSED_POSITION_FIELDS = (
+    'symbol', 'security_name', 'open_date', 'close_date', 'holding_days',
+    'quantity', 'open_price', 'close_price', 'total_cost', 'total_revenue',
+    'commission', 'net_pnl', 'pnl_pct'
+)
+
+
+def prepare_trades(trades: List[Dict]) -> pd.DataFrame:
+    """
+    将交易记录转为DataFrame：按交易键去重，按 (标的, 日期, 时间) 稳定排序
+
+    Args:
+        trades: 交易记录列表
+
+    Returns:
+        排序后的交易表，保留原记录位置列 _row
+    """
+    df = pd.DataFrame(trades)
+    if df.empty:
+        return df
+
+    for column in ('account_id', 'trade_time', 'security_name'):
+        if column not in df:
+            df[column] = ''
+        df[column] = df[column].fillna('').astype(str)
+    if 'commission' not in df:
+        df['commission'] = 0.0
+    for column in ('quantity', 'price', 'commission'):
+        df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0.0).astype(np.float64)
+
+    df['_row'] = np.arange(len(df))
+    df = df.drop_duplicates(subset=TRADE_KEY_COLUMNS, keep='first')
+    return df.sort_values(['symbol', 'trade_date', 'trade_time'], kind='mergesort').reset_index(drop=True)
+
+
+def match_symbol(actions: np.ndarray, accounts: np.ndarray, quantities: np.ndarray) -> Optional[np.ndarray]:
+    """
+    计算一个标的（已按时间排序）的FIFO配对
+
+    任何一次卖出超过当时持仓（标的合计或所在账户）时，逐笔算法会截断卖出数量，
+    累计区间无法表达，返回None由调用方改用逐笔算法。数量含小数（碎股）时也返回None：
+    逐笔算法逐批相减的浮点误差会留下极小的剩余数量并产生额外配对，累计区间的端点与之对不上。
+
+    Args:
+        actions: 交易方向数组
+        accounts: 账户数组
+        quantities: 数量数组
+
+    Returns:
+        (卖出位置, 买入位置, 配对数量) 三列数组，按卖出顺序、FIFO顺序排列；不可向量化时返回None
+    """
+    if (quantities != np.floor(quantities)).any():
+        return None
+
+    is_buy = actions == 'BUY'
+    is_sell = actions == 'SELL'
+    signed = np.where(is_buy, quantities, np.where(is_sell, -quantities, 0.0))
+
+    # 标的合计持仓在任何卖出后都不能为负（否则逐笔算法会截断卖出）
+    if (np.cumsum(signed)[is_sell] < 0).any():
+        return None
+
+    matches = []
+    for account in np.unique(accounts[is_buy | is_sell]):
+        in_account = accounts == account
+        buys = np.flatnonzero(in_account & is_buy)
+        sells = np.flatnonzero(in_account & is_sell)
+        if not len(sells):
+            continue
+
+        if (np.cumsum(signed[in_account])[is_sell[in_account]] < 0).any():
+            return None
+        if not len(buys):
+            continue
+
+        # 买入、卖出的累计数量区间，两者端点合并后的每一段对应一次配对
+        buy_ends = np.cumsum(quantities[buys])
+        sell_ends = np.cumsum(quantities[sells])
+        points = np.unique(np.concatenate(([0.0], buy_ends, sell_ends)))
+        points = points[points <= sell_ends[-1]]
+
+        starts = points[:-1]
+        sizes = np.diff(points)
+        keep = sizes > 0
+        starts, sizes = starts[keep], sizes[keep]
+
+        matches.append(np.column_stack((
+            sells[np.searchsorted(sell_ends, starts, side='right')],
+            buys[np.searchsorted(buy_ends, starts, side='right')],
+            sizes
+        )))
+
+    if not matches:
+        return np.empty((0, 3))
+
+    matched = np.concatenate(matches)
+    # 各账户的配对按卖出顺序合并，同一卖出内保持FIFO顺序
+    order = np.lexsort((np.arange(len(matched)), matched[:, 0]))
+    return matched[order]
+
+
+def closed_position_arrays(df: pd.DataFrame, sell_rows: np.ndarray, buy_rows: np.ndarray,
+                           quantity: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    按配对结果整列计算已平仓记录
+
+    Args:
+        df: prepare_trades 返回的交易表
+        sell_rows: 卖出交易在 df 中的位置
+        buy_rows: 买入交易在 df 中的位置
+        quantity: 配对数量
+
+    Returns:
+        字段名 -> 数组
+    """
+    buy_price = df['price'].to_numpy()[buy_rows]
+    sell_price = df['price'].to_numpy()[sell_rows]
+    buy_quantity = df['quantity'].to_numpy()[buy_rows]
+    sell_quantity = df['quantity'].to_numpy()[sell_rows]
+    commission = df['commission'].to_numpy()
+
+    open_date = df['trade_date'].to_numpy()[buy_rows]
+    close_date = df['trade_date'].to_numpy()[sell_rows]
+
+    # 计算持有天数（日期无法解析时为0）
+    open_day = pd.to_datetime(pd.Series(open_date), format='%Y-%m-%d', errors='coerce')
+    close_day = pd.to_datetime(pd.Series(close_date), format='%Y-%m-%d', errors='coerce')
+    holding_days = (close_day - open_day).dt.days.fillna(0).astype(np.int64).to_numpy()
+
+    # 按比例分摊手续费
+    buy_commission = (commission[buy_rows] / buy_quantity) * quantity
+    sell_commission = (commission[sell_rows] / sell_quantity) * quantity
+
+    # 计算成本和收益
+    total_cost = quantity * buy_price + buy_commission
+    total_revenue = quantity * sell_price - sell_commission
+    net_pnl = total_revenue - total_cost
+    pnl_pct = np.zeros(len(quantity))
+    positive = total_cost > 0
+    pnl_pct[positive] = (net_pnl[positive] / total_cost[positive]) * 100
+
+    return {
+        'symbol': df['symbol'].to_numpy()[buy_rows],
+        'security_name': df['security_name'].to_numpy()[buy_rows],
+        'open_date': open_date,
+        'close_date': close_date,
+        'holding_days': holding_days,
+        'quantity': quantity,
+        'open_price': buy_price,
+        'close_price': sell_price,
+        'total_cost': total_cost,
+        'total_revenue': total_revenue,
+        'commission': buy_commission + sell_commission,
+        'net_pnl': net_pnl,
+        'pnl_pct': pnl_pct
+    }
+
+
+def to_records(arrays: Dict[str, np.ndarray], created_at: str) -> List[Dict]:
+    """将已平仓记录数组转为字典列表"""
+    columns = [arrays[field].tolist() for field in CLOSED_POSITION_FIELDS]
+    return [dict(zip(CLOSED_POSITION_FIELDS, values), created_at=created_at) for values in zip(*columns)]
+
+
+def rebuild_closed_positions(trades: List[Dict],
+                             fallback: Callable[[List[Dict]], List[Dict]]) -> List[Dict]:
+    """
+    从全部交易重建已平仓记录
+
+    Args:
+        trades: 全部交易记录
+        fallback: 逐笔算法，参数为一个标的按时间排序的交易列表，返回其已平仓记录；
+                  用于出现超额卖出或小数数量、无法按累计区间计算的标的
+
+    Returns:
+        已平仓记录列表，顺序与逐笔算法按标的处理的结果一致
+    """
+    df = prepare_trades(trades)
+    if df.empty:
+        return []
+
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    actions = df['action'].to_numpy()
+    accounts = df['account_id'].to_numpy()
+    quantities = df['quantity'].to_numpy()
+
+    rows = df['_row'].to_numpy()
+    symbols = df['symbol'].to_numpy()
+    boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(df)]))
+
+    parts = []
+    vectorized = []
+    fallback_symbols = 0
+    for start, end in zip(starts, ends):
+        matched = match_symbol(actions[start:end], accounts[start:end], quantities[start:end])
+        if matched is not None:
+            matched[:, :2] += start
+            vectorized.append(matched)
+            continue
+
+        # 先写出已累积的向量化结果，保持按标的的顺序
+        if vectorized:
+            parts.append(_records_for(df, vectorized, created_at))
+            vectorized = []
+        parts.append(fallback([trades[row] for row in rows[start:end]]))
+        fallback_symbols += 1
+
+    if vectorized:
+        parts.append(_records_for(df, vectorized, created_at))
+
+    closed = [record for part in parts for record in part]
+    logger.info(f"FIFO重建完成: 交易={len(df)}, 已平仓={len(closed)}, 逐笔计算标的={fallback_symbols}")
+    return closed
+
+
+def _records_for(df: pd.DataFrame, matches: List[np.ndarray], created_at: str) -> List[Dict]:
+    """把若干标的的配对结果一次性转为已平仓记录"""
+    matched = np.concatenate(matches)
+    arrays = closed_position_arrays(
+        df, matched[:, 0].astype(np.int64), matched[:, 1].astype(np.int64), matched[:, 2]
+    )
+    return to_records(arrays, created_at)
@@ -0,0 +1,90 @@
+"""
+文件清单 - 按 (路径, inode, 大小, 修改时间) 缓存文件内容哈希
+
+文件没有变化时直接使用清单中的哈希，不再重新读取文件内容。
+清单只缓存哈希，文件是否已导入仍以存储中的导入日志为准；删除清单文件只会导致重新计算哈希。
+"""
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FileManifest:
+    """本地文件哈希清单（SQLite）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """初始化清单表"""
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_manifest (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    legacy_hash TEXT,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, file_path: str, stat: os.stat_result, algorithm: str) -> Optional[Tuple[str, str]]:
+        """
+        查询未变化文件的哈希
+
+        Args:
+            file_path: 文件路径
+            stat: 文件当前的stat结果
+            algorithm: 需要的哈希算法
+
+        Returns:
+            (文件哈希, 旧版MD5哈希)，文件有变化或不在清单中时返回None
+        """
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT file_hash, legacy_hash FROM file_manifest
+                WHERE path = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?
+            ''', (os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                  algorithm)).fetchone()
+
+        if row is None:
+            return None
+        return row[0], row[1] or ''
+
+    def save(self, file_path: str, stat: os.stat_result, algorithm: str,
+             file_hash: str, legacy_hash: str = ''):
+        """
+        记录文件哈希
+
+        stat 应在读取文件之前获取：读取期间文件如果被修改，下次检查时会因不匹配而重新计算
+        """
+        with self.get_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO file_manifest
+                (path, inode, size, mtime_ns, algorithm, file_hash, legacy_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                  algorithm, file_hash, legacy_hash, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
@@ -0,0 +1,184 @@
+"""
+文件夹监控 - 新文件写入完成后立即触发导入
+
+安装了 watchdog 时使用系统文件事件（Linux 下为 inotify），
+否则退回到按秒比较文件大小和修改时间的轻量轮询（不读取文件内容）。
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher:
+    """监控文件夹，文件在防抖时间内没有变化后回调"""
+
+    def __init__(self, folder: str, extensions: List[str], callback: Callable[[str], None],
+                 debounce_seconds: float = 2.0, poll_seconds: float = 1.0):
+        """
+        Args:
+            folder: 监控的文件夹
+            extensions: 需要处理的文件扩展名
+            callback: 文件就绪后的回调，参数为文件路径
+            debounce_seconds: 文件大小和修改时间保持不变多久才视为写入完成
+            poll_seconds: 检查待处理文件（以及轮询模式下扫描文件夹）的间隔
+        """
+        self.folder = folder
+        self.extensions = {ext.lower() for ext in extensions}
+        self.callback = callback
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+
+        # 文件路径 -> (最后一次变化的时间, (大小, 修改时间))
+        self._pending: Dict[str, Tuple[float, Tuple[int, int]]] = {}
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def mode(self) -> str:
+        """当前监控方式"""
+        return 'watchdog' if self._observer is not None else 'polling'
+
+    def start(self):
+        """开始监控，已存在的文件不会触发回调"""
+        os.makedirs(self.folder, exist_ok=True)
+        self._stop_event.clear()
+
+        try:
+            self._observer = self._start_observer()
+        except ImportError:
+            logger.warning("未安装watchdog，使用轮询方式监控文件夹")
+            self._snapshot = self._scan_folder()
+
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"文件监控已启动: {self.folder} (方式: {self.mode}, 防抖: {self.debounce_seconds}秒)")
+
+    def stop(self):
+        """停止监控"""
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._thread.join()
+        self._thread = None
+        logger.info("文件监控已停止")
+
+    def notify(self, file_path: str):
+        """记录文件变化，重新开始防抖计时"""
+        if not self._is_candidate(file_path):
+            return
+
+        signature = self._signature(file_path)
+        with self._lock:
+            if signature is None:
+                self._pending.pop(file_path, None)
+            else:
+                self._pending[file_path] = (time.monotonic(), signature)
+
+    def _start_observer(self):
+        """启动watchdog事件监听"""
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(_Handler(), self.folder, recursive=False)
+        observer.start()
+        return observer
+
+    def _run(self):
+        """后台线程：轮询模式下扫描文件夹，并回调已写入完成的文件"""
+        while not self._stop_event.wait(self.poll_seconds):
+            try:
+                if self._observer is None:
+                    self._poll_folder()
+                self._dispatch_ready()
+            except Exception as e:
+                logger.error(f"文件监控异常: {str(e)}")
+
+    def _poll_folder(self):
+        """比较文件夹快照，发现新增或变化的文件"""
+        snapshot = self._scan_folder()
+        for file_path, signature in snapshot.items():
+            if self._snapshot.get(file_path) != signature:
+                self.notify(file_path)
+        self._snapshot = snapshot
+
+    def _scan_folder(self) -> Dict[str, Tuple[int, int]]:
+        """获取文件夹内候选文件的 (大小, 修改时间)"""
+        snapshot = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and self._is_candidate(entry.path):
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _dispatch_ready(self):
+        """回调在防抖时间内大小和修改时间都没有变化的文件"""
+        now = time.monotonic()
+        with self._lock:
+            due = [(path, entry) for path, entry in self._pending.items()
+                   if now - entry[0] >= self.debounce_seconds]
+
+        for file_path, entry in due:
+            current = self._signature(file_path)
+            with self._lock:
+                if self._pending.get(file_path) != entry:
+                    # 检查期间又收到了新的变化事件
+                    continue
+                if current is None:
+                    del self._pending[file_path]
+                    continue
+                if current != entry[1]:
+                    # 文件仍在写入但没有产生事件，重新计时
+                    self._pending[file_path] = (time.monotonic(), current)
+                    continue
+                del self._pending[file_path]
+
+            try:
+                self.callback(file_path)
+            except Exception as e:
+                logger.error(f"处理文件失败 {file_path}: {str(e)}")
+
+    def _is_candidate(self, file_path: str) -> bool:
+        """过滤扩展名，忽略隐藏文件和Office临时文件（~$开头）"""
+        path = Path(file_path)
+        if path.name.startswith(('.', '~$')):
+            return False
+        return path.suffix.lower() in self.extensions
+
+    @staticmethod
+    def _signature(file_path: str) -> Optional[Tuple[int, int]]:
+        """文件的 (大小, 修改时间)，文件不存在时返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
@@ -2,17 +2,75 @@
 Google Sheets适配器 - 数据存储层
 """
 import logging
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 import gspread
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request
 
+from app.config import Config
+from app.data_version import DataVersion
+from app.database import TRADE_NATURAL_KEY
+from app.dashboard_aggregates import DASHBOARD_DAYS, DASHBOARD_TOP, DashboardAggregates
+from app.sheets_cache import SheetCache
+from app.sheets_rate_limit import SheetsRateLimiter
+from app.sheets_writer import SheetWriteBuffer
+from app.utils import safe_float
+
 logger = logging.getLogger(__name__)
 
+# 持仓批次账本工作表（旧电子表格中不存在时按需创建）
+LEDGER_WORKSHEETS = {
+    'open_lots': [
+        'account_id', 'symbol', 'security_name', 'trade_date', 'trade_time',
+        'quantity', 'remaining_quantity', 'price', 'commission', 'cost_basis', 'updated_at'
+    ],
+    'ledger_trades': ['trade_key', 'symbol']
+}
+
+# 各工作表的表头
+WORKSHEET_HEADERS = {
+    'trades': [
+        'id', 'trade_date', 'trade_time', 'symbol', 'security_name', 'security_type',
+        'action', 'quantity', 'price', 'amount', 'commission', 'net_amount',
+        'broker', 'account_id', 'notes', 'source_file', 'import_time'
+    ],
+    'positions': [
+        'id', 'symbol', 'security_name', 'security_type',
+        'total_quantity', 'avg_cost', 'total_cost',
+        'current_price', 'market_value', 'unrealized_pnl', 'unrealized_pnl_pct',
+        'last_trade_date', 'updated_at'
+    ],
+    'closed_positions': [
+        'id', 'symbol', 'security_name',
+        'open_date', 'close_date', 'holding_days',
+        'quantity', 'open_price', 'close_price',
+        'total_cost', 'total_revenue', 'commission',
+        'net_pnl', 'pnl_pct', 'created_at'
+    ],
+    'daily_summary': [
+        'id', 'summary_date',
+        'total_trades', 'buy_trades', 'sell_trades',
+        'total_volume', 'total_commission', 'realized_pnl',
+        'winning_trades', 'losing_trades', 'win_rate',
+        'largest_profit', 'largest_loss', 'avg_profit', 'avg_loss', 'profit_factor',
+        'created_at', 'updated_at'
+    ],
+    'import_logs': [
+        'id', 'file_name', 'file_path', 'file_size', 'file_hash',
+        'records_count', 'success_count', 'error_count',
+        'status', 'error_message', 'import_time', 'duration_seconds'
+    ],
+    **LEDGER_WORKSHEETS
+}
+
 class GoogleSheetsAdapter:
     """Google Sheets存储适配器"""
 
+    _dashboard = None      # (读缓存版本, DashboardAggregates)
+    data_version = None    # 写入Sheets后更新的数据版本号
+
     def __init__(self, credentials_path: str, spreadsheet_name: str):
         """
         初始化Google Sheets适配器
@@ -24,6 +82,23 @@ class GoogleSheetsAdapter:
         self.credentials_path = credentials_path
         self.spreadsheet_name = spreadsheet_name
         self.spreadsheet = None
+        self.limiter = SheetsRateLimiter(
+            Config.SHEETS_READ_REQUESTS_PER_MINUTE,
+            Config.SHEETS_WRITE_REQUESTS_PER_MINUTE,
+            max_retries=Config.SHEETS_MAX_RETRIES,
+            base_delay=Config.SHEETS_BACKOFF_BASE_SECONDS,
+            max_delay=Config.SHEETS_BACKOFF_MAX_SECONDS
+        )
+        self.cache = SheetCache(Config.SHEETS_CACHE_TTL_SECONDS)
+        self.data_version = DataVersion(Config.SHEETS_DATA_VERSION_PATH)
+        self.writer = SheetWriteBuffer(
+            self._worksheet,
+            list(WORKSHEET_HEADERS),
+            max_rows=Config.SHEETS_WRITE_BUFFER_ROWS,
+            max_seconds=Config.SHEETS_WRITE_BUFFER_SECONDS,
+            on_error=self.cache.invalidate,
+            on_flush=self._written
+        )
         self._connect()
 
     def _connect(self):
@@ -39,13 +114,13 @@ class GoogleSheetsAdapter:
             )
             client = gspread.authorize(credentials)
 
-            # 尝试打开现有电子表格
+            # 尝试打开现有电子表格（之后的API调用都经过限流）
             try:
-                self.spreadsheet = client.open(self.spreadsheet_name)
+                self.spreadsheet = self.limiter.wrap(client.open(self.spreadsheet_name))
                 logger.info(f"已连接到电子表格: {self.spreadsheet_name}")
             except gspread.exceptions.SpreadsheetNotFound:
                 # 创建新的电子表格
-                self.spreadsheet = client.create(self.spreadsheet_name)
+                self.spreadsheet = self.limiter.wrap(client.create(self.spreadsheet_name))
                 logger.info(f"已创建新电子表格: {self.spreadsheet_name}")
                 self._initialize_worksheets()
 
@@ -55,54 +130,7 @@ class GoogleSheetsAdapter:
 
     def _initialize_worksheets(self):
         """初始化工作表结构"""
-        worksheets_config = [
-            {
-                'name': 'trades',
-                'headers': [
-                    'id', 'trade_date', 'trade_time', 'symbol', 'security_name', 'security_type',
-                    'action', 'quantity', 'price', 'amount', 'commission', 'net_amount',
-                    'broker', 'account_id', 'notes', 'source_file', 'import_time'
-                ]
-            },
-            {
-                'name': 'positions',
-                'headers': [
-                    'id', 'symbol', 'security_name', 'security_type',
-                    'total_quantity', 'avg_cost', 'total_cost',
-                    'current_price', 'market_value', 'unrealized_pnl', 'unrealized_pnl_pct',
-                    'last_trade_date', 'updated_at'
-                ]
-            },
-            {
-                'name': 'closed_positions',
-                'headers': [
-                    'id', 'symbol', 'security_name',
-                    'open_date', 'close_date', 'holding_days',
-                    'quantity', 'open_price', 'close_price',
-                    'total_cost', 'total_revenue', 'commission',
-                    'net_pnl', 'pnl_pct', 'created_at'
-                ]
-            },
-            {
-                'name': 'daily_summary',
-                'headers': [
-                    'id', 'summary_date',
-                    'total_trades', 'buy_trades', 'sell_trades',
-                    'total_volume', 'total_commission', 'realized_pnl',
-                    'winning_trades', 'losing_trades', 'win_rate',
-                    'largest_profit', 'largest_loss', 'avg_profit', 'avg_loss', 'profit_factor',
-                    'created_at', 'updated_at'
-                ]
-            },
-            {
-                'name': 'import_logs',
-                'headers': [
-                    'id', 'file_name', 'file_path', 'file_size', 'file_hash',
-                    'records_count', 'success_count', 'error_count',
-                    'status', 'error_message', 'import_time', 'duration_seconds'
-                ]
-            }
-        ]
+        worksheets_config = [{'name': name, 'headers': headers} for name, headers in WORKSHEET_HEADERS.items()]
 
         for config in worksheets_config:
             try:
@@ -116,17 +144,129 @@ class GoogleSheetsAdapter:
             except Exception as e:
                 logger.error(f"创建工作表失败 {config['name']}: {str(e)}")
 
+    def _worksheet(self, name: str):
+        """获取工作表（账本工作表不存在时创建）"""
+        if name in LEDGER_WORKSHEETS:
+            return self._ledger_worksheet(name)
+        return self.spreadsheet.worksheet(name)
+
+    def _load(self, name: str) -> List[Dict]:
+        """
+        从工作表读取全部记录，先写入该工作表缓冲中的数据
+
+        账本工作表须在持仓和已平仓记录之后写入，读取账本前按顺序写入全部缓冲。
+        """
+        if name in LEDGER_WORKSHEETS and self.writer.pending(name):
+            self.writer.flush()
+        elif self.writer.pending(name):
+            self.writer.flush(name)
+        return self._worksheet(name).get_all_records()
+
+    def _records(self, name: str) -> List[Dict]:
+        """工作表全部记录（经缓存），返回缓存本身，仅供内部只读使用"""
+        return self.cache.records(name, lambda: self._load(name))
+
+    def _index(self, name: str, field: str) -> Dict:
+        """字段值 -> 记录列表的索引（经缓存），仅供内部只读使用"""
+        return self.cache.index(name, field, lambda: self._load(name))
+
+    def _lookup(self, name: str, field: str, value) -> List[Dict]:
+        """按字段值查找记录（经缓存的二级索引），返回记录副本"""
+        return self.cache.lookup(name, field, value, lambda: self._load(name))
+
+    def _record_count(self, name: str, worksheet) -> int:
+        """现有记录数（含缓冲中待追加的记录），缓存有效或已在本地累计时不请求API"""
+        cached = self.cache.peek(name)
+        if cached is not None:
+            return len(cached)
+        return self.writer.record_count(name, lambda: len(worksheet.col_values(1)) - 1)  # 减去标题行
+
+    @staticmethod
+    def _as_record(name: str, row: List) -> Dict:
+        """把写入的数据行转为与 get_all_records 相同结构的记录"""
+        return dict(zip(WORKSHEET_HEADERS[name], row))
+
+    def _append(self, name: str, rows: List[List], start: int = 0, buffered: bool = False):
+        """
+        追加数据行并修补缓存
+
+        Args:
+            name: 工作表名
+            rows: 数据行
+            start: 第一行对应的记录位置（即追加前的记录数，缓冲中合并后续更新时使用）
+            buffered: 是否放入写入缓冲，否则立即写入
+        """
+        self.writer.append(name, rows, start)
+        if not buffered:
+            try:
+                self.writer.flush(name)
+            except Exception:
+                # 立即写入失败时由调用方处理，不保留在缓冲中重试
+                self.writer.reset(name)
+                raise
+        self.cache.append(name, [self._as_record(name, row) for row in rows])
+
+    def _written(self):
+        """数据写入Sheets后更新数据版本号"""
+        if self.data_version is not None:
+            self.data_version.bump()
+
+    def data_version_tag(self) -> Optional[str]:
+        """
+        当前数据版本（不请求API），不缓存时返回 None
+
+        本进程读到的数据最多比表格旧一个缓存有效期（包括在表格中的手工修改），
+        因此版本中带上当前所处的有效期时段，每个时段至少重新读取一次。
+        """
+        ttl = self.cache.ttl_seconds
+        if self.data_version is None or ttl <= 0:
+            return None
+        return f'{self.data_version.current()}.{int(time.time() // ttl)}'
+
+    def flush(self):
+        """立即写入缓冲中的全部数据（导入结束和关闭时调用）"""
+        self.writer.flush()
+
+    def close(self):
+        """写入缓冲中的数据并停止定时写入"""
+        self.writer.close()
+
+    @staticmethod
+    def _trade_natural_key(trade: Dict) -> tuple:
+        """交易的自然键（与SQLite唯一索引的字段一致，数量和价格按数值比较）"""
+        key = tuple(str(trade.get(field) or '') for field in TRADE_NATURAL_KEY[:4])
+        return key + tuple(safe_float(trade.get(field)) for field in TRADE_NATURAL_KEY[4:])
+
+    def _new_trades(self, trades: List[Dict]) -> List[Dict]:
+        """过滤掉表格中已有的交易（包括同一批次内的重复），按日期索引比较自然键"""
+        by_date = self._index('trades', 'trade_date')
+        seen = set()
+        new_trades = []
+        for trade in trades:
+            key = self._trade_natural_key(trade)
+            if key in seen:
+                continue
+            seen.add(key)
+            existing = by_date.get(trade.get('trade_date', ''), ())
+            if any(self._trade_natural_key(record) == key for record in existing):
+                continue
+            new_trades.append(trade)
+        return new_trades
+
     def insert_trades(self, trades: List[Dict]) -> int:
-        """插入交易记录"""
+        """插入交易记录，返回新增条数（自然键重复的记录跳过，重新导入或重放同一批交易不会重复写入）"""
         try:
             worksheet = self.spreadsheet.worksheet('trades')
 
+            new_trades = self._new_trades(trades)
+            skipped = len(trades) - len(new_trades)
+
             # 获取现有记录数
-            existing_count = len(worksheet.col_values(1)) - 1  # 减去标题行
+            existing_count = self._record_count('trades', worksheet)
 
             # 准备数据行
             rows = []
-            for i, trade in enumerate(trades):
+            for i, trade in enumerate(new_trades):
                 row_id = existing_count + i + 1
                 row = [
                     row_id,
@@ -151,22 +291,37 @@ class GoogleSheetsAdapter:
 
             # 批量插入
             if rows:
-                worksheet.append_rows(rows)
-                logger.info(f"已插入 {len(rows)} 条交易记录")
+                self._append('trades', rows, existing_count)
+                logger.info(f"已插入 {len(rows)} 条交易记录" + (f"，跳过 {skipped} 条重复记录" if skipped else ""))
                 return len(rows)
             else:
+                if skipped:
+                    logger.info(f"跳过 {skipped} 条重复交易记录")
                 return 0
 
         except Exception as e:
             logger.error(f"插入交易记录失败: {str(e)}")
             raise
 
+    def fetch_records(self, name: str) -> List[Dict]:
+        """绕过读缓存重新读取工作表的全部记录（并刷新缓存），用于同步本地镜像"""
+        self.cache.invalidate(name)
+        # 账本中清空待复用的行不是记录
+        return [dict(r) for r in self._records(name) if any(value != '' for value in r.values())]
+
+    def get_dashboard_aggregates(self, days: int = DASHBOARD_DAYS, top: int = DASHBOARD_TOP) -> Dict:
+        """Dashboard聚合：按缓存中的记录计算一次，缓存内容变化（写入或重新读取）前重复使用"""
+        records = [self._records(name) for name in ('trades', 'positions', 'closed_positions')]
+        version = self.cache.version
+        cached = self._dashboard
+        if cached is None or cached[0] != version:
+            cached = self._dashboard = (version, DashboardAggregates.from_records(*records))
+        return cached[1].snapshot(days, top)
+
     def get_all_trades(self) -> List[Dict]:
         """获取所有交易记录"""
         try:
-            worksheet = self.spreadsheet.worksheet('trades')
-            records = worksheet.get_all_records()
-            return records
+            return [dict(r) for r in self._records('trades')]
         except Exception as e:
             logger.error(f"获取交易记录失败: {str(e)}")
             return []
@@ -174,9 +329,7 @@ class GoogleSheetsAdapter:
     def get_trades_by_symbol(self, symbol: str) -> List[Dict]:
         """根据标的获取交易记录"""
         try:
-            all_trades = self.get_all_trades()
-            symbol_trades = [t for t in all_trades if t.get('symbol') == symbol]
-            return symbol_trades
+            return self._lookup('trades', 'symbol', symbol)
         except Exception as e:
             logger.error(f"获取标的交易记录失败 {symbol}: {str(e)}")
             return []
@@ -184,64 +337,82 @@ class GoogleSheetsAdapter:
     def get_trades_by_date(self, date: str) -> List[Dict]:
         """根据日期获取交易记录"""
         try:
-            all_trades = self.get_all_trades()
-            date_trades = [t for t in all_trades if t.get('trade_date') == date]
-            return date_trades
+            return self._lookup('trades', 'trade_date', date)
         except Exception as e:
             logger.error(f"获取日期交易记录失败 {date}: {str(e)}")
             return []
 
     def update_position(self, symbol: str, position_data: Dict):
         """更新持仓信息"""
-        try:
-            worksheet = self.spreadsheet.worksheet('positions')
+        self.update_positions([dict(position_data, symbol=symbol)])
 
+    def update_positions(self, positions: List[Dict]):
+        """批量更新持仓信息：已有记录一次 batch_update，新记录一次 append_rows"""
+        try:
             # 查找现有记录
-            all_records = worksheet.get_all_records()
-            existing_index = None
+            all_records = self._records('positions')
+            existing = {record.get('symbol'): i + 2 for i, record in enumerate(all_records)}  # +2 因为有标题行和从0开始的索引
 
-            for i, record in enumerate(all_records):
-                if record.get('symbol') == symbol:
-                    existing_index = i + 2  # +2 因为有标题行和从0开始的索引
-                    break
+            updates = {}
+            new_rows = []
+            for position_data in positions:
+                existing_index = existing.get(position_data.get('symbol'))
+                if existing_index:
+                    row = self._position_row(existing_index - 1, position_data)
+                    updates[existing_index - 2] = (f'A{existing_index}:M{existing_index}', row)
+                else:
+                    new_rows.append(self._position_row(len(all_records) + len(new_rows) + 1, position_data))
 
-            # 准备数据行
-            row = [
-                existing_index - 1 if existing_index else len(all_records) + 1,  # id
-                position_data.get('symbol', ''),
-                position_data.get('security_name', ''),
-                position_data.get('security_type', 'UNKNOWN'),
-                position_data.get('total_quantity', 0),
-                position_data.get('avg_cost', 0),
-                position_data.get('total_cost', 0),
-                position_data.get('current_price', 0),
-                position_data.get('market_value', 0),
-                position_data.get('unrealized_pnl', 0),
-                position_data.get('unrealized_pnl_pct', 0),
-                position_data.get('last_trade_date', ''),
-                position_data.get('updated_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            ]
+            self._write_rows('positions', updates, len(all_records), new_rows)
 
-            if existing_index:
-                # 更新现有记录
-                worksheet.update(f'A{existing_index}:M{existing_index}', [row])
-                logger.debug(f"已更新持仓 {symbol}")
-            else:
-                # 插入新记录
-                worksheet.append_row(row)
-                logger.debug(f"已插入新持仓 {symbol}")
+            logger.debug(f"已更新持仓: 更新={len(updates)}, 新增={len(new_rows)}")
 
         except Exception as e:
-            logger.error(f"更新持仓失败 {symbol}: {str(e)}")
+            logger.error(f"更新持仓失败: {str(e)}")
             raise
 
+    def _write_rows(self, name: str, updates: Dict[int, tuple], start: int, new_rows: List[List]):
+        """
+        更新已有记录、追加新记录（放入写入缓冲），并修补缓存
+
+        Args:
+            name: 工作表名
+            updates: 记录位置 -> (单元格范围, 数据行)
+            start: 追加前的记录数
+            new_rows: 新记录的数据行
+        """
+        for position, (range_name, row) in updates.items():
+            # 更新现有记录
+            self.writer.update(name, position, range_name, row)
+        self.cache.update(name, {position: self._as_record(name, row) for position, (_, row) in updates.items()})
+        if new_rows:
+            # 插入新记录
+            self._append(name, new_rows, start, buffered=True)
+
+    @staticmethod
+    def _position_row(row_id: int, position_data: Dict) -> List:
+        """持仓工作表的数据行"""
+        return [
+            row_id,
+            position_data.get('symbol', ''),
+            position_data.get('security_name', ''),
+            position_data.get('security_type', 'UNKNOWN'),
+            position_data.get('total_quantity', 0),
+            position_data.get('avg_cost', 0),
+            position_data.get('total_cost', 0),
+            position_data.get('current_price', 0),
+            position_data.get('market_value', 0),
+            position_data.get('unrealized_pnl', 0),
+            position_data.get('unrealized_pnl_pct', 0),
+            position_data.get('last_trade_date', ''),
+            position_data.get('updated_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        ]
+
     def get_open_positions(self) -> List[Dict]:
         """获取所有开仓持仓"""
         try:
-            worksheet = self.spreadsheet.worksheet('positions')
-            records = worksheet.get_all_records()
             # 过滤出有持仓的记录
-            open_positions = [r for r in records if r.get('total_quantity', 0) > 0]
+            open_positions = [dict(r) for r in self._records('positions') if r.get('total_quantity', 0) > 0]
             return open_positions
         except Exception as e:
             logger.error(f"获取开仓持仓失败: {str(e)}")
@@ -249,45 +420,79 @@ class GoogleSheetsAdapter:
 
     def insert_closed_position(self, closed_data: Dict):
         """插入已平仓记录"""
+        self.insert_closed_positions([closed_data])
+
+    def insert_closed_positions(self, closed_list: List[Dict]):
+        """批量插入已平仓记录（放入写入缓冲，与其他写入合并为一次 append_rows）"""
+        if not closed_list:
+            return
+
         try:
             worksheet = self.spreadsheet.worksheet('closed_positions')
 
             # 获取现有记录数
-            existing_count = len(worksheet.col_values(1)) - 1
-            next_id = existing_count + 1
+            existing_count = self._record_count('closed_positions', worksheet)
 
-            row = [
-                next_id,
-                closed_data.get('symbol', ''),
-                closed_data.get('security_name', ''),
-                closed_data.get('open_date', ''),
-                closed_data.get('close_date', ''),
-                closed_data.get('holding_days', 0),
-                closed_data.get('quantity', 0),
-                closed_data.get('open_price', 0),
-                closed_data.get('close_price', 0),
-                closed_data.get('total_cost', 0),
-                closed_data.get('total_revenue', 0),
-                closed_data.get('commission', 0),
-                closed_data.get('net_pnl', 0),
-                closed_data.get('pnl_pct', 0),
-                closed_data.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            ]
+            rows = [self._closed_position_row(existing_count + i + 1, closed_data)
+                    for i, closed_data in enumerate(closed_list)]
 
-            worksheet.append_row(row)
-            logger.debug(f"已插入已平仓记录: {closed_data.get('symbol')}")
+            self._append('closed_positions', rows, existing_count, buffered=True)
+            logger.debug(f"已插入已平仓记录: {len(rows)} 条")
 
         except Exception as e:
             logger.error(f"插入已平仓记录失败: {str(e)}")
             raise
 
+    def replace_closed_positions(self, closed_list: List[Dict]):
+        """用重建结果替换全部已平仓记录（保留标题行）"""
+        try:
+            worksheet = self.spreadsheet.worksheet('closed_positions')
+            rows = [self._closed_position_row(i + 1, closed_data) for i, closed_data in enumerate(closed_list)]
+            self._rewrite('closed_positions', worksheet, rows)
+            logger.info(f"已替换已平仓记录: {len(rows)} 条")
+
+        except Exception as e:
+            logger.error(f"替换已平仓记录失败: {str(e)}")
+            raise
+
+    def _rewrite(self, name: str, worksheet, rows: List[List]):
+        """整表重写（保留表头）并替换缓存，缓冲中该表的待写入内容随之作废"""
+        self.writer.reset(name)
+        try:
+            worksheet.clear()
+            worksheet.update('A1', [WORKSHEET_HEADERS[name]] + rows)
+        except Exception:
+            self.cache.invalidate(name)
+            self._written()
+            raise
+        self.cache.replace(name, [self._as_record(name, row) for row in rows])
+        self._written()
+
+    @staticmethod
+    def _closed_position_row(row_id: int, closed_data: Dict) -> List:
+        """已平仓工作表的数据行"""
+        return [
+            row_id,
+            closed_data.get('symbol', ''),
+            closed_data.get('security_name', ''),
+            closed_data.get('open_date', ''),
+            closed_data.get('close_date', ''),
+            closed_data.get('holding_days', 0),
+            closed_data.get('quantity', 0),
+            closed_data.get('open_price', 0),
+            closed_data.get('close_price', 0),
+            closed_data.get('total_cost', 0),
+            closed_data.get('total_revenue', 0),
+            closed_data.get('commission', 0),
+            closed_data.get('net_pnl', 0),
+            closed_data.get('pnl_pct', 0),
+            closed_data.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        ]
+
     def get_closed_positions_by_date(self, date: str) -> List[Dict]:
         """根据日期获取已平仓记录"""
         try:
-            worksheet = self.spreadsheet.worksheet('closed_positions')
-            all_records = worksheet.get_all_records()
-            date_records = [r for r in all_records if r.get('close_date') == date]
-            return date_records
+            return self._lookup('closed_positions', 'close_date', date)
         except Exception as e:
             logger.error(f"获取日期已平仓记录失败 {date}: {str(e)}")
             return []
@@ -295,69 +500,71 @@ class GoogleSheetsAdapter:
     def get_all_closed_positions(self) -> List[Dict]:
         """获取所有已平仓记录"""
         try:
-            worksheet = self.spreadsheet.worksheet('closed_positions')
-            records = worksheet.get_all_records()
-            return records
+            return [dict(r) for r in self._records('closed_positions')]
         except Exception as e:
             logger.error(f"获取已平仓记录失败: {str(e)}")
             return []
 
     def insert_or_update_daily_summary(self, summary_data: Dict):
         """插入或更新每日汇总"""
-        try:
-            worksheet = self.spreadsheet.worksheet('daily_summary')
+        self.insert_or_update_daily_summaries([summary_data])
 
+    def insert_or_update_daily_summaries(self, summaries: List[Dict]):
+        """批量插入或更新每日汇总（放入写入缓冲）：已有日期合并为 batch_update，新日期合并为 append_rows"""
+        try:
             # 查找现有记录
-            all_records = worksheet.get_all_records()
-            existing_index = None
+            all_records = self._records('daily_summary')
+            existing = {record.get('summary_date'): i + 2 for i, record in enumerate(all_records)}  # +2 因为有标题行和从0开始的索引
 
-            for i, record in enumerate(all_records):
-                if record.get('summary_date') == summary_data.get('summary_date'):
-                    existing_index = i + 2  # +2 因为有标题行和从0开始的索引
-                    break
+            updates = {}
+            new_rows = []
+            for summary_data in summaries:
+                existing_index = existing.get(summary_data.get('summary_date'))
+                if existing_index:
+                    row = self._daily_summary_row(existing_index - 1, summary_data)
+                    updates[existing_index - 2] = (f'A{existing_index}:R{existing_index}', row)
+                else:
+                    new_rows.append(self._daily_summary_row(len(all_records) + len(new_rows) + 1, summary_data))
 
-            # 准备数据行
-            row = [
-                existing_index - 1 if existing_index else len(all_records) + 1,  # id
-                summary_data.get('summary_date', ''),
-                summary_data.get('total_trades', 0),
-                summary_data.get('buy_trades', 0),
-                summary_data.get('sell_trades', 0),
-                summary_data.get('total_volume', 0),
-                summary_data.get('total_commission', 0),
-                summary_data.get('realized_pnl', 0),
-                summary_data.get('winning_trades', 0),
-                summary_data.get('losing_trades', 0),
-                summary_data.get('win_rate', 0),
-                summary_data.get('largest_profit', 0),
-                summary_data.get('largest_loss', 0),
-                summary_data.get('avg_profit', 0),
-                summary_data.get('avg_loss', 0),
-                summary_data.get('profit_factor', 0),
-                summary_data.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                summary_data.get('updated_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            ]
+            self._write_rows('daily_summary', updates, len(all_records), new_rows)
 
-            if existing_index:
-                # 更新现有记录
-                worksheet.update(f'A{existing_index}:R{existing_index}', [row])
-                logger.debug(f"已更新每日汇总 {summary_data.get('summary_date')}")
-            else:
-                # 插入新记录
-                worksheet.append_row(row)
-                logger.debug(f"已插入新每日汇总 {summary_data.get('summary_date')}")
+            logger.debug(f"已保存每日汇总: 更新={len(updates)}, 新增={len(new_rows)}")
 
         except Exception as e:
             logger.error(f"插入/更新每日汇总失败: {str(e)}")
             raise
 
+    @staticmethod
+    def _daily_summary_row(row_id: int, summary_data: Dict) -> List:
+        """每日汇总工作表的数据行"""
+        return [
+            row_id,
+            summary_data.get('summary_date', ''),
+            summary_data.get('total_trades', 0),
+            summary_data.get('buy_trades', 0),
+            summary_data.get('sell_trades', 0),
+            summary_data.get('total_volume', 0),
+            summary_data.get('total_commission', 0),
+            summary_data.get('realized_pnl', 0),
+            summary_data.get('winning_trades', 0),
+            summary_data.get('losing_trades', 0),
+            summary_data.get('win_rate', 0),
+            summary_data.get('largest_profit', 0),
+            summary_data.get('largest_loss', 0),
+            summary_data.get('avg_profit', 0),
+            summary_data.get('avg_loss', 0),
+            summary_data.get('profit_factor', 0),
+            summary_data.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            summary_data.get('updated_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        ]
+
     def insert_import_log(self, log_data: Dict):
-        """插入导入日志"""
+        """插入导入日志（放入写入缓冲）"""
         try:
             worksheet = self.spreadsheet.worksheet('import_logs')
 
             # 获取现有记录数
-            existing_count = len(worksheet.col_values(1)) - 1
+            existing_count = self._record_count('import_logs', worksheet)
             next_id = existing_count + 1
 
             row = [
@@ -375,7 +582,7 @@ class GoogleSheetsAdapter:
                 log_data.get('duration_seconds', 0)
             ]
 
-            worksheet.append_row(row)
+            self._append('import_logs', [row], existing_count, buffered=True)
             logger.debug(f"已插入导入日志: {log_data.get('file_name')}")
 
         except Exception as e:
@@ -385,28 +592,107 @@ class GoogleSheetsAdapter:
     def get_import_log_by_hash(self, file_hash: str) -> Optional[Dict]:
         """根据文件哈希获取导入日志"""
         try:
-            worksheet = self.spreadsheet.worksheet('import_logs')
-            all_records = worksheet.get_all_records()
-            for record in all_records:
-                if record.get('file_hash') == file_hash:
-                    return record
-            return None
+            records = self._lookup('import_logs', 'file_hash', file_hash)
+            return records[0] if records else None
         except Exception as e:
             logger.error(f"获取导入日志失败 {file_hash}: {str(e)}")
             return None
 
+    def _ledger_worksheet(self, name: str):
+        """获取持仓批次账本工作表，不存在时创建"""
+        try:
+            return self.spreadsheet.worksheet(name)
+        except gspread.exceptions.WorksheetNotFound:
+            headers = LEDGER_WORKSHEETS[name]
+            worksheet = self.spreadsheet.add_worksheet(title=name, rows="1000", cols=str(len(headers)))
+            worksheet.append_row(headers)
+            logger.info(f"已创建工作表: {name}")
+            return worksheet
+
+    def get_open_lots(self, symbol: str) -> List[Dict]:
+        """获取标的所有账户的未平仓批次，按FIFO顺序排列"""
+        return self.get_open_lots_for_symbols([symbol]).get(symbol, [])
+
+    def get_open_lots_for_symbols(self, symbols) -> Dict[str, List[Dict]]:
+        """一次读取多个标的的未平仓批次，按标的分组，组内按FIFO顺序排列"""
+        try:
+            index = self._index('open_lots', 'symbol')
+            lots = {symbol: [dict(lot) for lot in index[symbol]] for symbol in set(symbols) if symbol in index}
+            for symbol_lots in lots.values():
+                symbol_lots.sort(key=lambda x: (x.get('trade_date', ''), str(x.get('trade_time', ''))))
+            return lots
+        except Exception as e:
+            logger.error(f"获取未平仓批次失败: {str(e)}")
+            raise
+
+    def get_applied_trade_keys(self, trade_keys) -> set:
+        """返回已计入持仓批次账本的交易键"""
+        try:
+            index = self._index('ledger_trades', 'trade_key')
+            return {key for key in trade_keys if key in index}
+        except Exception as e:
+            logger.error(f"获取账本交易键失败: {str(e)}")
+            raise
+
+    def save_lot_ledger(self, lots_by_symbol: Dict[str, List[Dict]], trade_keys: Dict[str, str]):
+        """
+        保存持仓批次账本：替换各标的的未平仓批次，并追加已计入的交易键
+
+        只写入本次涉及标的的行：这些标的原有的行和已清空的行按行号顺序写入新的批次，
+        多出的批次追加到末尾，用不完的行清空（留待之后复用），不重写整个工作表。
+        账本与持仓、已平仓记录一起放入写入缓冲，flush 时最后写入（交易键在最末），
+        写入中途中断时交易不会被标记为已计入而已平仓记录却没有写入。
+
+        Args:
+            lots_by_symbol: 标的 -> 该标的全部未平仓批次（剩余数量大于0）
+            trade_keys: 本次新计入账本的交易键 -> 标的
+        """
+        try:
+            headers = LEDGER_WORKSHEETS['open_lots']
+            last_column = chr(ord('A') + len(headers) - 1)
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            self._ledger_worksheet('open_lots')
+            records = self._records('open_lots')
+            free = [i for i, r in enumerate(records) if not r.get('symbol') or r.get('symbol') in lots_by_symbol]
+            rows = [[dict(lot, symbol=symbol, updated_at=now).get(h, '') for h in headers]
+                    for symbol, lots in lots_by_symbol.items() for lot in lots]
+
+            updates = {}
+            for position, row in zip(free, rows):
+                updates[position] = (f'A{position + 2}:{last_column}{position + 2}', row)
+            for position in free[len(rows):]:
+                if records[position].get('symbol'):
+                    updates[position] = (f'A{position + 2}:{last_column}{position + 2}', [''] * len(headers))
+            self._write_rows('open_lots', updates, len(records), rows[len(free):])
+
+            key_rows = [[key, symbol] for key, symbol in trade_keys.items()]
+            if key_rows:
+                worksheet = self._ledger_worksheet('ledger_trades')
+                existing_count = self._record_count('ledger_trades', worksheet)
+                self._append('ledger_trades', key_rows, existing_count, buffered=True)
+
+            logger.debug(f"已保存持仓批次账本: 标的={len(lots_by_symbol)}, 写入行={len(updates)}, "
+                         f"追加行={max(0, len(rows) - len(free))}, 新交易={len(key_rows)}")
+
+        except Exception as e:
+            logger.error(f"保存持仓批次账本失败: {str(e)}")
+            raise
+
     def clear_all_data(self):
         """清空所有数据（仅用于测试）"""
         try:
-            worksheets = ['trades', 'positions', 'closed_positions', 'daily_summary', 'import_logs']
+            self.writer.reset()
+            self.cache.invalidate()
 
-            for sheet_name in worksheets:
-                worksheet = self.spreadsheet.worksheet(sheet_name)
+            for sheet_name in WORKSHEET_HEADERS:
+                worksheet = self._worksheet(sheet_name)
                 # 保留标题行，删除其他所有行
                 rows = len(worksheet.col_values(1))
                 if rows > 1:
                     worksheet.delete_rows(2, rows)
                     logger.info(f"已清空工作表: {sheet_name}")
+            self._written()
 
         except Exception as e:
             logger.error(f"清空数据失败: {str(e)}")
@@ -0,0 +1,69 @@
+"""
+HTTP缓存 - 按数据版本生成ETag、条件请求返回304、压缩较大的JSON响应
+"""
+import gzip
+import hashlib
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import Flask, Response, make_response, request
+
+from app.config import Config
+
+
+def storage_version(storage) -> Callable[[], Optional[str]]:
+    """存储的数据版本获取函数（存储不支持时总是返回 None）"""
+    return getattr(storage, 'data_version_tag', lambda: None)
+
+
+def make_etag(version: str) -> str:
+    """数据版本 + 请求路径（含查询参数）-> ETag"""
+    return hashlib.blake2b(f'{version}|{request.full_path}'.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def conditional(get_version: Callable[[], Optional[str]]):
+    """
+    读接口装饰器：数据版本未变化时直接返回304，不执行视图（不访问存储）
+
+    get_version 返回 None 时不使用ETag。ETag为弱校验（同一内容可能以gzip或原文返回），
+    并要求浏览器每次向服务器验证（Cache-Control: no-cache）。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = get_version()
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = make_etag(version)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def enable_gzip(app: Flask, min_bytes: Optional[int] = None):
+    """客户端接受gzip时压缩大于 min_bytes 的JSON响应"""
+    threshold = Config.HTTP_GZIP_MIN_BYTES if min_bytes is None else min_bytes
+
+    @app.after_request
+    def compress(response: Response) -> Response:
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.accept_encodings):
+            return response
+
+        data = response.get_data()
+        if len(data) < threshold:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
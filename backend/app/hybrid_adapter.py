@@ -0,0 +1,473 @@
+"""
+混合存储适配器 - 本地SQLite镜像提供读取，写入异步复制到Google Sheets
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.dashboard_aggregates import DASHBOARD_DAYS, DASHBOARD_TOP
+from app.database import SQLiteAdapter
+from app.google_sheets_adapter import GoogleSheetsAdapter, WORKSHEET_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# 各写入方法在Sheets中写入的工作表，复制失败时据此判断哪些写入已经写入Sheets
+REPLICATED_SHEETS = {
+    'insert_trades': ('trades',),
+    'update_positions': ('positions',),
+    'insert_closed_positions': ('closed_positions',),
+    'replace_closed_positions': ('closed_positions',),
+    'insert_or_update_daily_summaries': ('daily_summary',),
+    'insert_import_log': ('import_logs',),
+    'save_lot_ledger': ('open_lots', 'ledger_trades'),
+}
+
+
+class HybridAdapter:
+    """
+    混合存储适配器
+
+    读取全部由本地SQLite镜像完成，不访问Sheets API。写入先在镜像中执行，并在同一事务中
+    写入复制队列（replication_queue 表，进程重启后仍保留），由后台线程按顺序在Google Sheets
+    上重放；复制失败时退避重试，超过 max_attempts 次后丢弃并记录错误。
+
+    后台线程每 sync_interval 秒从Sheets读取各工作表，与上次同步时的行数和校验和比较，
+    只重新载入发生变化（例如在表格中手工修改）的工作表。复制队列未清空时跳过载入，
+    以免覆盖尚未复制的本地写入。
+
+    调度器和Web服务等多个进程可以使用同一个镜像：复制和同步前在镜像中取得复制租约
+    （replication_lease 表），同一时间只有一个适配器重放队列或载入工作表，其余的稍后重试。
+    持有租约的进程异常退出时，租约在 lease_seconds 秒后过期，由其他进程接管。
+    """
+
+    def __init__(self, sheets: GoogleSheetsAdapter, mirror: SQLiteAdapter, sync_interval: float = 300,
+                 max_attempts: int = 10, retry_seconds: float = 5.0, start: bool = True,
+                 lease_seconds: float = 600):
+        """
+        Args:
+            sheets: Google Sheets适配器（复制目标和同步来源）
+            mirror: 本地SQLite镜像
+            sync_interval: 从Sheets拉取变化的间隔秒数，0为不定时拉取
+            max_attempts: 每条写入最多复制的次数
+            retry_seconds: 复制失败（或其他进程正在复制）后的初始等待秒数（逐次翻倍，最长 sync_interval）
+            start: 是否立即启动后台线程（先执行一次同步）
+            lease_seconds: 复制租约的有效期，每复制一批续期一次，应大于复制一批所需的最长时间
+        """
+        self.sheets = sheets
+        self.mirror = mirror
+        self.sync_interval = sync_interval
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.metrics = {'replicated': 0, 'dropped': 0, 'syncs': 0, 'reloaded_sheets': 0}
+
+        # 本地写入与载入远端数据互斥，保证载入时复制队列为空
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._create_tables()
+
+        if start:
+            self.start()
+
+    def _create_tables(self):
+        with self.mirror.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS replication_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    method TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sheet_sync_state (
+                    sheet TEXT PRIMARY KEY,
+                    row_count INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    synced_at TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS replication_lease (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    # ---- 复制租约 ----
+
+    def _acquire_lease(self) -> bool:
+        """取得或续期复制租约，其他适配器持有未过期的租约时返回False"""
+        now = time.time()
+        with self.mirror.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM replication_lease WHERE id = 1").fetchone()
+            if row is not None and row['owner'] != self.owner and row['expires_at'] > now:
+                conn.rollback()
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO replication_lease (id, owner, expires_at) VALUES (1, ?, ?)",
+                (self.owner, now + self.lease_seconds)
+            )
+            conn.commit()
+
+        if row is None or row['owner'] != self.owner:
+            # 其他适配器复制或同步过，本适配器的Sheets缓存和记录数可能已过期
+            self.sheets.writer.reset()
+            self.sheets.cache.invalidate()
+        return True
+
+    def _release_lease(self):
+        """释放复制租约（保留持有者，下次由本适配器取得时可继续使用Sheets缓存）"""
+        with self.mirror.get_connection() as conn:
+            conn.execute("UPDATE replication_lease SET expires_at = 0 WHERE id = 1 AND owner = ?", (self.owner,))
+            conn.commit()
+
+    @contextmanager
+    def _leased(self):
+        """在复制租约内执行，yield 是否取得租约"""
+        acquired = self._acquire_lease()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._release_lease()
+
+    # ---- 后台线程 ----
+
+    def start(self):
+        """启动复制和同步线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sheets-replication', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """复制队列中的写入；到期时从Sheets拉取变化"""
+        delay = self.retry_seconds
+        next_sync = time.monotonic()
+        while not self._stop.is_set():
+            timeout = None
+            try:
+                self.replicate()
+                delay = self.retry_seconds
+                if self.pending_replication():
+                    # 其他适配器持有复制租约，稍后再试
+                    timeout = self.retry_seconds
+            except Exception as e:
+                logger.warning(f"复制到Google Sheets失败，{delay:.0f} 秒后重试: {str(e)}")
+                timeout = delay
+                delay = min(delay * 2, max(self.sync_interval, self.retry_seconds))
+
+            if self.sync_interval > 0 and time.monotonic() >= next_sync:
+                try:
+                    self.sync_from_sheets()
+                except Exception as e:
+                    logger.error(f"从Google Sheets同步失败: {str(e)}")
+                next_sync = time.monotonic() + self.sync_interval
+
+            if self.sync_interval > 0:
+                remaining = max(0.0, next_sync - time.monotonic())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def replicate(self, batch_size: int = 500) -> int:
+        """
+        按顺序把复制队列中的写入重放到Google Sheets，返回本次复制的条数
+
+        每批写入重放后写入Sheets的写缓冲，成功后才从队列删除。失败时丢弃写缓冲中尚未写入的内容，
+        只有所写工作表已全部写入Sheets的写入从队列删除，其余留在队列中下次重放，
+        已写入的行不会重复写入；出错的写入记录失败次数，超过最多次数时丢弃，然后抛出异常。
+        交易立即写入且按自然键去重，持仓和每日汇总按键更新，重放这些写入不会产生重复行。
+        其他适配器持有复制租约时不复制，返回0。
+        """
+        replicated = 0
+        with self._leased() as acquired:
+            if acquired:
+                replicated = self._replicate_batches(batch_size)
+
+        if replicated:
+            logger.debug(f"已复制 {replicated} 次写入到Google Sheets")
+        return replicated
+
+    def _replicate_batches(self, batch_size: int) -> int:
+        """持有复制租约时逐批复制，每批之前续期租约"""
+        replicated = 0
+        while self._acquire_lease():
+            with self.mirror.get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, method, payload, attempts FROM replication_queue ORDER BY id LIMIT ?",
+                    (batch_size,)
+                ).fetchall()
+            if not rows:
+                break
+
+            executed = []
+            current = None
+            try:
+                for current in rows:
+                    getattr(self.sheets, current['method'])(*json.loads(current['payload']))
+                    executed.append(current)
+                current = None
+                self.sheets.flush()
+            except Exception as e:
+                self._handle_failure(rows, executed, current, e)
+                raise
+
+            self._delete_rows(rows)
+            replicated += len(rows)
+            self.metrics['replicated'] += len(rows)
+        return replicated
+
+    def _handle_failure(self, rows, executed, current, error: Exception):
+        """
+        复制失败：从队列删除已写入Sheets的写入，为出错的写入记录失败次数
+
+        Args:
+            rows: 本批写入
+            executed: 已重放完成的写入
+            current: 重放时出错的写入，写缓冲 flush 失败时为None
+        """
+        writer = self.sheets.writer
+        dirty = [name for name in writer.order if writer.pending(name)]
+        writer.reset()
+        self.sheets.cache.invalidate()
+
+        done = [row for row in executed if not set(REPLICATED_SHEETS.get(row['method'], dirty)) & set(dirty)]
+        if done:
+            self._delete_rows(done)
+            self.metrics['replicated'] += len(done)
+
+        if current is None:
+            # flush 按工作表顺序写入，第一个未写入的工作表即出错的工作表
+            done_ids = {row['id'] for row in done}
+            remaining = [row for row in rows if row['id'] not in done_ids]
+            failed = [row for row in remaining if dirty and dirty[0] in REPLICATED_SHEETS.get(row['method'], dirty)]
+            current = (failed or remaining or [None])[0]
+        if current is not None:
+            self._record_failure(current, error)
+
+    def _record_failure(self, row, error: Exception):
+        attempts = row['attempts'] + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"复制写入 {row['method']} 已失败 {attempts} 次，放弃: {str(error)}")
+            self._delete_rows([row])
+            self.metrics['dropped'] += 1
+            return
+        with self.mirror.get_connection() as conn:
+            conn.execute(
+                "UPDATE replication_queue SET attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, str(error), row['id'])
+            )
+            conn.commit()
+
+    def _delete_rows(self, rows):
+        with self.mirror.get_connection() as conn:
+            conn.executemany("DELETE FROM replication_queue WHERE id = ?", [(row['id'],) for row in rows])
+            conn.commit()
+
+    def pending_replication(self) -> int:
+        """复制队列中尚未写入Sheets的写入数"""
+        with self.mirror.get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM replication_queue").fetchone()[0]
+
+    def sync_from_sheets(self) -> List[str]:
+        """
+        从Google Sheets拉取变化，返回重新载入的工作表
+
+        行数和校验和都与上次同步相同的工作表不重新载入；复制队列不为空或其他适配器
+        持有复制租约时不载入任何工作表。
+        """
+        with self._leased() as acquired:
+            if not acquired:
+                logger.debug("其他进程正在复制或同步，跳过同步")
+                return []
+            return self._sync_sheets()
+
+    def _sync_sheets(self) -> List[str]:
+        """持有复制租约时载入变化的工作表"""
+        if self.pending_replication():
+            logger.debug("复制队列未清空，跳过同步")
+            return []
+
+        with self.mirror.get_connection() as conn:
+            state = {r['sheet']: (r['row_count'], r['checksum'])
+                     for r in conn.execute("SELECT sheet, row_count, checksum FROM sheet_sync_state")}
+
+        reloaded = []
+        for name in WORKSHEET_HEADERS:
+            records = self.sheets.fetch_records(name)
+            checksum = self._checksum(records)
+            if state.get(name) == (len(records), checksum):
+                continue
+
+            with self._lock:
+                if self.pending_replication():
+                    logger.debug("同步期间有新的本地写入，停止同步")
+                    break
+                with self.mirror.transaction() as conn:
+                    self.mirror.replace_table(name, records)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sheet_sync_state (sheet, row_count, checksum, synced_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (name, len(records), checksum, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                    )
+            reloaded.append(name)
+
+        self.metrics['syncs'] += 1
+        self.metrics['reloaded_sheets'] += len(reloaded)
+        if reloaded:
+            logger.info(f"已从Google Sheets载入变化的工作表: {', '.join(reloaded)}")
+        return reloaded
+
+    @staticmethod
+    def _checksum(records: List[Dict]) -> str:
+        payload = json.dumps(records, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def wait_replicated(self, timeout: Optional[float] = None) -> bool:
+        """等待复制队列清空，返回是否在超时前清空"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending_replication():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._wake.set()
+            time.sleep(0.05)
+        return True
+
+    def flush(self):
+        """通知后台线程立即复制（不等待完成）"""
+        self._wake.set()
+
+    def close(self, timeout: float = 30.0):
+        """等待复制完成（最多 timeout 秒）后停止后台线程并关闭连接"""
+        try:
+            if self._thread is not None and self._thread.is_alive():
+                if not self.wait_replicated(timeout):
+                    logger.warning(f"仍有 {self.pending_replication()} 次写入未复制，将在下次启动时继续")
+                self._stop.set()
+                self._wake.set()
+                self._thread.join(timeout)
+            self.sheets.close()
+        finally:
+            self.mirror.close()
+
+    # ---- 写入：本地执行并排队复制 ----
+
+    @contextmanager
+    def transaction(self):
+        """在一个本地事务中执行多个写操作，对应的复制队列项随事务一起提交或回滚"""
+        with self._lock:
+            with self.mirror.transaction() as conn:
+                yield conn
+        self._wake.set()
+
+    def _write(self, method: str, *args):
+        with self._lock:
+            with self.mirror.transaction() as conn:
+                result = getattr(self.mirror, method)(*args)
+                self._enqueue(conn, method, *args)
+        self._wake.set()
+        return result
+
+    @staticmethod
+    def _enqueue(conn, method: str, *args):
+        conn.execute(
+            "INSERT INTO replication_queue (method, payload) VALUES (?, ?)",
+            (method, json.dumps(args, ensure_ascii=False, default=str))
+        )
+
+    def insert_trades(self, trades: List[Dict]) -> int:
+        """本地已有的交易（按自然键）不再复制，只复制镜像中实际新增的记录"""
+        with self._lock:
+            with self.mirror.transaction() as conn:
+                inserted = self.mirror.insert_new_trades(trades)
+                if inserted:
+                    self._enqueue(conn, 'insert_trades', inserted)
+        self._wake.set()
+        return len(inserted)
+
+    def update_position(self, symbol: str, position_data: Dict):
+        self.update_positions([dict(position_data, symbol=symbol)])
+
+    def update_positions(self, positions: List[Dict]):
+        if positions:
+            self._write('update_positions', positions)
+
+    def insert_closed_position(self, closed_data: Dict):
+        self.insert_closed_positions([closed_data])
+
+    def insert_closed_positions(self, closed_list: List[Dict]):
+        if closed_list:
+            self._write('insert_closed_positions', closed_list)
+
+    def replace_closed_positions(self, closed_list: List[Dict]):
+        self._write('replace_closed_positions', closed_list)
+
+    def insert_or_update_daily_summary(self, summary_data: Dict):
+        self.insert_or_update_daily_summaries([summary_data])
+
+    def insert_or_update_daily_summaries(self, summaries: List[Dict]):
+        if summaries:
+            self._write('insert_or_update_daily_summaries', summaries)
+
+    def insert_import_log(self, log_data: Dict):
+        self._write('insert_import_log', log_data)
+
+    def save_lot_ledger(self, lots_by_symbol: Dict[str, List[Dict]], trade_keys: Dict[str, str]):
+        self._write('save_lot_ledger', lots_by_symbol, trade_keys)
+
+    # ---- 读取：全部来自本地镜像 ----
+
+    def data_version_tag(self) -> str:
+        """本地镜像的数据版本（本地写入和载入远端修改时更新）"""
+        return self.mirror.data_version_tag()
+
+    def get_all_trades(self) -> List[Dict]:
+        return self.mirror.get_all_trades()
+
+    def get_trades_by_symbol(self, symbol: str) -> List[Dict]:
+        return self.mirror.get_trades_by_symbol(symbol)
+
+    def get_trades_by_date(self, date: str) -> List[Dict]:
+        return self.mirror.get_trades_by_date(date)
+
+    def get_open_positions(self) -> List[Dict]:
+        return self.mirror.get_open_positions()
+
+    def get_closed_positions_by_date(self, date: str) -> List[Dict]:
+        return self.mirror.get_closed_positions_by_date(date)
+
+    def get_all_closed_positions(self) -> List[Dict]:
+        return self.mirror.get_all_closed_positions()
+
+    def get_import_log_by_hash(self, file_hash: str) -> Optional[Dict]:
+        return self.mirror.get_import_log_by_hash(file_hash)
+
+    def get_open_lots(self, symbol: str) -> List[Dict]:
+        return self.mirror.get_open_lots(symbol)
+
+    def get_open_lots_for_symbols(self, symbols: Iterable[str]) -> Dict[str, List[Dict]]:
+        return self.mirror.get_open_lots_for_symbols(symbols)
+
+    def get_applied_trade_keys(self, trade_keys: Iterable[str]) -> Set[str]:
+        return self.mirror.get_applied_trade_keys(trade_keys)
+
+    def get_dashboard_aggregates(self, days: int = DASHBOARD_DAYS, top: int = DASHBOARD_TOP) -> Dict:
+        return self.mirror.get_dashboard_aggregates(days, top)
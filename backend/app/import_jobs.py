@@ -0,0 +1,293 @@
+"""
+上传导入任务 - 后台线程直接从内存解析上传的文件并分批保存，接口通过任务ID查询进度
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from flask import Request
+from werkzeug.datastructures import FileStorage, iter_multi_items
+
+from app import excel_reader
+from app.config import Config
+from app.database import TradeRecord
+from app.parser import ExcelParser
+from app.utils import HashingSpool, import_hash_algorithms
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+SKIPPED = 'skipped'     # 相同内容的文件已成功导入过
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, SKIPPED, FAILED)
+
+
+class ImportQueueFull(Exception):
+    """导入任务排队已满"""
+
+
+class UploadRequest(Request):
+    """
+    接收上传文件的请求：文件内容写入 HashingSpool，不超过 UPLOAD_SPOOL_MAX_BYTES 时只在内存中，
+    接收的同时计算去重用的哈希；交给导入任务的文件在请求结束时不关闭
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool(Config.UPLOAD_SPOOL_MAX_BYTES, import_hash_algorithms())
+
+    def keep_file(self, file: FileStorage) -> BinaryIO:
+        """把上传的文件交给调用方（由调用方负责关闭），返回已回到开头的文件对象"""
+        file.stream.kept = True
+        return excel_reader.rewind(file.stream)
+
+    def close(self):
+        for _key, file in iter_multi_items(self.__dict__.get('files') or ()):
+            if not getattr(file.stream, 'kept', False):
+                file.close()
+
+
+def estimate_rows(source, file_name: str) -> Optional[int]:
+    """估算文件（路径或文件对象）的数据行数，用于计算进度；无法估算时返回 None"""
+    suffix = Path(file_name).suffix.lower()
+    try:
+        if suffix == '.csv':
+            lines, last = 0, b'\n'
+            f = open(source, 'rb') if isinstance(source, str) else excel_reader.rewind(source)
+            try:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    lines += block.count(b'\n')
+                    last = block[-1:]
+            finally:
+                if f is not source:
+                    f.close()
+            return max(0, lines + (last != b'\n') - 1)
+
+        if suffix in ('.xlsx', '.xlsm'):
+            from openpyxl import load_workbook
+            workbook = load_workbook(excel_reader.rewind(source), read_only=True)
+            try:
+                max_row = workbook.worksheets[0].max_row
+            finally:
+                workbook.close()
+            return max(0, max_row - 1) if max_row else None
+    except Exception as e:
+        logger.debug(f"估算行数失败 {file_name}: {str(e)}")
+    return None
+
+
+class ImportJob:
+    """一个上传文件的导入任务"""
+
+    def __init__(self, source, filename: str, digests: Optional[Dict[str, str]] = None, size: int = 0):
+        """
+        Args:
+            source: 文件内容（文件路径、bytes 或可seek的文件对象），任务结束后关闭文件对象
+            filename: 上传时的文件名
+            digests: 文件哈希（算法 -> 十六进制哈希值），用于与导入日志比对去重
+            size: 文件字节数
+        """
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.filename = filename
+        self.digests = digests or {}
+        self.size = size
+        self.status = QUEUED
+        self.total_rows = None
+        self.rows_parsed = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = None    # 结束时的 time.monotonic()，用于清理过期任务
+
+    @property
+    def progress(self) -> Optional[float]:
+        """完成百分比，总行数未知时运行中为 None"""
+        if self.status in FINISHED:
+            return 100.0
+        if self.status == QUEUED:
+            return 0.0
+        if not self.total_rows:
+            return None
+        return min(99.0, round(self.rows_parsed / self.total_rows * 100, 1))
+
+    def to_dict(self) -> Dict:
+        data = {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': self.progress,
+            'total_rows': self.total_rows,
+            'rows_parsed': self.rows_parsed,
+            'inserted_count': self.inserted,
+            'skipped_count': self.skipped,
+            'errors': list(self.errors),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == SUCCEEDED:
+            data['message'] = f"成功导入 {self.inserted} 条交易记录，跳过 {self.skipped} 条重复记录"
+        elif self.status == SKIPPED:
+            data['message'] = '相同内容的文件已导入过，跳过'
+        return data
+
+
+class ImportJobQueue:
+    """
+    导入任务队列
+
+    固定数量的后台线程依次执行排队的任务；排队任务数达到 max_pending 时 submit() 抛出
+    ImportQueueFull，接口据此返回503，一批并发上传不会占满服务器、拖慢读请求。
+
+    文件内容由任务直接从内存（或超过阈值时的临时文件）解析，不写入监控目录。与定时任务一样，
+    先按文件哈希查询导入日志，相同内容已成功导入时跳过，导入结束后写入导入日志。
+    每个任务按解析器产出的批次（CSV每 PARSE_CHUNK_SIZE 行一批）逐批保存，每批一个短事务，
+    不会长时间持有数据库写锁；重复记录按自然键跳过，失败后重新上传同一文件不会重复导入。
+    任务状态保存在内存中，结束 retention_seconds 秒后清除。
+    """
+
+    def __init__(self, storage, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, retention_seconds: Optional[float] = None):
+        """
+        Args:
+            storage: 存储适配器（需要 save_trades_bulk / get_import_log_by_hash / insert_import_log）
+            workers: 后台线程数
+            max_pending: 最多排队（尚未开始）的任务数
+            retention_seconds: 已结束任务的状态保留秒数
+        """
+        self.storage = storage
+        self.workers = Config.IMPORT_JOB_WORKERS if workers is None else workers
+        self.max_pending = Config.IMPORT_JOB_QUEUE_SIZE if max_pending is None else max_pending
+        self.retention_seconds = Config.IMPORT_JOB_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._threads = []
+
+    def submit(self, source, filename: str, digests: Optional[Dict[str, str]] = None,
+               size: int = 0) -> ImportJob:
+        """提交文件，返回排队中的任务；排队已满时抛出 ImportQueueFull（文件仍由调用方关闭）"""
+        job = ImportJob(source, filename, digests, size)
+        with self._lock:
+            self._cleanup()
+            self._start_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise ImportQueueFull(f"导入任务排队已满（{self.max_pending}个），请稍后重试")
+            self._jobs[job.id] = job
+        logger.info(f"导入任务已排队: {job.id} {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            self._cleanup()
+            return self._jobs.get(job_id)
+
+    def close(self, timeout: float = 30):
+        """等待排队的任务执行完并停止后台线程"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f'import-job-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _cleanup(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and now - job.finished > self.retention_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: ImportJob):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        start_time = time.time()
+        logger.info(f"开始导入任务: {job.id} {job.filename}")
+
+        try:
+            if self._is_imported(job):
+                job.status = SKIPPED
+            else:
+                job.total_rows = estimate_rows(job.source, job.filename)
+                for batch in ExcelParser().iter_batches(job.source, job.filename):
+                    if not batch:
+                        continue
+                    result = self.storage.save_trades_bulk([TradeRecord.from_dict(trade) for trade in batch])
+                    job.rows_parsed += len(batch)
+                    job.inserted += result['inserted']
+                    job.skipped += result['skipped']
+
+                if job.rows_parsed == 0:
+                    job.errors.append('文件中没有找到有效的交易记录')
+        except Exception as e:
+            logger.error(f"导入任务失败 {job.id} {job.filename}: {str(e)}")
+            job.errors.append(f'导入失败: {str(e)}')
+        finally:
+            if hasattr(job.source, 'close'):
+                job.source.close()
+            job.source = None
+
+        if job.status == RUNNING:
+            job.status = FAILED if job.errors else SUCCEEDED
+            self._log_import(job, time.time() - start_time)
+        job.finished_at = datetime.now().isoformat()
+        job.finished = time.monotonic()
+        logger.info(f"导入任务结束: {job.id} {job.status}，解析 {job.rows_parsed} 条，"
+                    f"新增 {job.inserted} 条，跳过 {job.skipped} 条")
+
+    def _is_imported(self, job: ImportJob) -> bool:
+        """相同内容的文件是否已成功导入（与定时任务共用导入日志，旧版日志记录的是MD5）"""
+        for file_hash in job.digests.values():
+            existing_log = self.storage.get_import_log_by_hash(file_hash)
+            if existing_log and existing_log.get('status') == 'SUCCESS':
+                return True
+        return False
+
+    def _log_import(self, job: ImportJob, duration: float):
+        """写入导入日志，之后定时任务遇到相同内容的文件会跳过"""
+        try:
+            self.storage.insert_import_log({
+                'file_name': job.filename,
+                'file_path': '',
+                'file_size': job.size,
+                'file_hash': job.digests.get(Config.FILE_HASH_ALGORITHM, ''),
+                'records_count': job.rows_parsed,
+                'success_count': job.inserted + job.skipped,
+                'error_count': len(job.errors),
+                'status': 'FAILED' if job.errors else 'SUCCESS',
+                'error_message': '; '.join(job.errors[:3]),
+                'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'duration_seconds': round(duration, 2)
+            })
+        except Exception as e:
+            logger.error(f"记录导入日志失败 {job.filename}: {str(e)}")
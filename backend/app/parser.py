@@ -1,17 +1,96 @@
 """
 Excel解析器 - 支持多券商格式
 """
+import codecs
+import csv
+import io
+import os
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 import logging
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import BinaryIO, List, Dict, Iterator, Optional, Tuple, Union
 from pathlib import Path
 
+from app import excel_reader
+from app.config import Config
 from app.database import TradeRecord
 from app.option_parser import parse_symbol
 
 logger = logging.getLogger(__name__)
 
+# CSV编码/分隔符探测读取的字节数
+CSV_SNIFF_BYTES = 64 * 1024
+
+# 可解析的数据来源：文件路径、bytes 或二进制文件对象（例如上传的文件流）
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# 各券商 标准字段 -> 原始列名 映射
+FUTU_NEW_COLUMNS = {
+    'order_time': 'Order Time', 'symbol': 'Symbol', 'name': 'Stock Name',
+    'action': 'Direction', 'quantity': 'Executed Qty', 'price': 'Avg Price',
+    'amount': 'Turnover', 'order_no': 'Order No.'
+}
+
+FUTU_OLD_COLUMNS = {
+    'date': '成交日期', 'time': '成交时间', 'symbol': '证券代码', 'name': '证券名称',
+    'action': '交易方向', 'quantity': '成交数量', 'price': '成交价格', 'amount': '成交金额',
+    'commission': '手续费', 'account': '账户', 'notes': '备注'
+}
+
+TIGER_COLUMNS = {
+    'date': 'date', 'time': 'time', 'symbol': 'symbol', 'name': 'name',
+    'action': 'side', 'quantity': 'quantity', 'price': 'price', 'amount': 'amount',
+    'commission': 'commission', 'account': 'account', 'notes': 'notes'
+}
+
+IB_COLUMNS = {
+    'date': 'Date', 'time': 'Time', 'symbol': 'Symbol', 'name': 'Description',
+    'action': 'Action', 'quantity': 'Quantity', 'price': 'Price', 'amount': 'Amount',
+    'commission': 'Commission', 'account': 'Account', 'notes': 'Notes'
+}
+
+SNOWBALL_COLUMNS = {
+    'date': '成交日期', 'time': '成交时间', 'symbol': '股票代码', 'name': '股票名称',
+    'action': '方向', 'quantity': '数量', 'price': '成交价', 'amount': '成交额',
+    'commission': '手续费', 'account': '账户', 'notes': '备注'
+}
+
+ZHENG_COLUMNS = {
+    'symbol': '代码', 'date': '开仓日期', 'action': '操作',
+    'strike_price': '行权价', 'expiration_date': '行权日', 'option_type': '开单类型',
+    'quantity': '开仓数量', 'price': '交易价格', 'amount': '占用资金',
+    'source': '消息来源', 'close_date': '平仓日期', 'close_price': '平仓价格',
+    'close_quantity': '平仓数量', 'close_reason': '平仓理由', 'trade_rating': '交易评分',
+    'trade_type': '交易类型', 'notes': '笔记'
+}
+
+# 券商 -> 列名映射（富途新旧版本在读取表头后区分）
+BROKER_COLUMNS = {
+    '老虎证券': TIGER_COLUMNS,
+    '雪盈证券': SNOWBALL_COLUMNS,
+    'Interactive Brokers': IB_COLUMNS,
+    '郑兄格式': ZHENG_COLUMNS
+}
+
+# 通用格式各标准字段可能的列名
+GENERIC_COLUMN_CANDIDATES = {
+    'date': ['日期', 'date', '成交日期', '交易日期'],
+    'time': ['时间', 'time', '成交时间', '交易时间'],
+    'symbol': ['代码', 'symbol', '股票代码', '证券代码'],
+    'name': ['名称', 'name', '股票名称', '证券名称'],
+    'action': ['方向', 'action', '交易方向', '买卖方向', 'side'],
+    'quantity': ['数量', 'quantity', '成交数量', '交易数量'],
+    'price': ['价格', 'price', '成交价', '成交价格'],
+    'amount': ['金额', 'amount', '成交额', '成交金额'],
+    'commission': ['手续费', 'commission', '佣金', '费用']
+}
+
+# 可能作为证券代码的列名
+SYMBOL_COLUMNS = {'Symbol', 'symbol', '证券代码', '股票代码', '代码'}
+
 class ExcelParser:
     """Excel交易记录解析器"""
 
@@ -25,47 +104,218 @@ class ExcelParser:
             '通用': self._parse_generic
         }
 
-    def parse_file(self, file_path: str) -> List[Dict]:
+    def parse_file(self, source: Source, file_name: Optional[str] = None) -> List[Dict]:
         """
-        解析Excel文件
+        解析Excel/CSV文件
 
         Args:
-            file_path: Excel文件路径
+            source: 文件路径、bytes 或二进制文件对象
+            file_name: 文件名，用于按扩展名判断格式；source 为路径时可省略
 
         Returns:
             交易记录列表
         """
-        try:
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
-            logger.info(f"成功读取文件: {file_path}, 记录数: {len(df)}")
+        trades = []
+        for batch in self.iter_batches(source, file_name):
+            trades.extend(batch)
 
-            # 识别券商格式
-            broker = self._identify_broker(df)
-            logger.info(f"识别券商: {broker}")
+        logger.info(f"解析完成，有效交易记录: {len(trades)}")
+        return trades
 
-            # 根据券商选择解析器
-            if broker in self.supported_brokers:
-                trades = self.supported_brokers[broker](df)
-            else:
-                # 使用通用解析器
-                trades = self.supported_brokers['通用'](df)
+    def iter_file(self, source: Source, file_name: Optional[str] = None) -> Iterator[Dict]:
+        """
+        逐条产出文件中的交易记录（CSV按块流式读取，内存占用与文件大小无关）
+
+        Args:
+            source: 文件路径、bytes 或二进制文件对象
+            file_name: 文件名，source 为路径时可省略
+
+        Yields:
+            交易记录
+        """
+        for batch in self.iter_batches(source, file_name):
+            yield from batch
+
+    def iter_batches(self, source: Source, file_name: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        按批产出交易记录，CSV每个数据块为一批，Excel整表为一批
+
+        Args:
+            source: 文件路径、bytes 或二进制文件对象（直接从内存解析，不写入磁盘）
+            file_name: 文件名，用于按扩展名判断格式和记录来源文件；source 为路径时可省略
+
+        Yields:
+            交易记录列表
+        """
+        source, file_path = self._open_source(source, file_name)
+        try:
+            if Path(file_path).suffix.lower() == '.csv':
+                yield from self._iter_csv(source, file_path)
+                return
 
-            # 添加元数据
-            for trade in trades:
-                trade.update({
-                    'broker': broker,
-                    'source_file': Path(file_path).name,
-                    'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
+            # 只读表头识别券商
+            engine, header = self._read_excel_header(source, file_path)
+            broker = self._identify_broker(pd.DataFrame(columns=header))
+            logger.info(f"识别券商: {broker} (Excel引擎={engine})")
 
-            logger.info(f"解析完成，有效交易记录: {len(trades)}")
-            return trades
+            # 只读取该券商解析器需要的列
+            total = 0
+            usecols = self._usecols(broker, header)
+            for df in excel_reader.iter_frames(source, engine, usecols, Config.PARSE_CHUNK_SIZE):
+                total += len(df)
+                yield self._parse_frame(df, broker, file_path)
+
+            logger.info(f"成功读取文件: {file_path}, 记录数: {total}")
 
         except Exception as e:
             logger.error(f"解析文件失败 {file_path}: {str(e)}")
             raise ParserException(f"文件解析失败: {str(e)}")
 
+    def _open_source(self, source: Source, file_name: Optional[str]) -> Tuple[object, str]:
+        """
+        统一数据来源：文件路径原样返回，bytes 包装为内存文件；不能seek的流先复制到临时文件
+        （不超过 UPLOAD_SPOOL_MAX_BYTES 时只在内存中），因为表头和数据需要分别读取
+
+        Returns:
+            (文件路径或可seek的文件对象, 文件名)
+        """
+        if isinstance(source, (str, os.PathLike)):
+            path = os.fspath(source)
+            return path, file_name or path
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        elif not source.seekable():
+            spool = tempfile.SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_MAX_BYTES)
+            shutil.copyfileobj(source, spool)
+            source = spool
+
+        name = getattr(source, 'name', None)
+        return source, file_name or (name if isinstance(name, str) else '')
+
+    def _read_excel_header(self, source, file_path: str) -> Tuple[str, pd.Index]:
+        """
+        按配置的引擎顺序尝试读取表头，失败时退回下一个引擎
+
+        Returns:
+            (实际使用的引擎, 表头)
+        """
+        engines = excel_reader.select_engines(file_path, Config.EXCEL_ENGINE)
+        if not engines:
+            raise ParserException(f"没有可用的Excel读取引擎: {Path(file_path).suffix}")
+
+        for engine in engines[:-1]:
+            try:
+                return engine, excel_reader.read_header(source, engine)
+            except Exception as e:
+                logger.warning(f"Excel引擎 {engine} 读取失败，尝试下一个引擎: {e}")
+
+        return engines[-1], excel_reader.read_header(source, engines[-1])
+
+    def _iter_csv(self, source, file_path: str) -> Iterator[List[Dict]]:
+        """分块读取CSV文件，每块交给券商解析器"""
+        encoding, delimiter = self._sniff_csv(source)
+        read_options = {'sep': delimiter, 'encoding': encoding}
+
+        # 只读表头识别券商
+        header = pd.read_csv(excel_reader.rewind(source), nrows=0, **read_options)
+        broker = self._identify_broker(header)
+        logger.info(f"识别券商: {broker} (CSV, 编码={encoding}, 分隔符={delimiter!r})")
+
+        # 证券代码按文本读取，避免 000001 之类的代码丢失前导零
+        dtype = {col: str for col in header.columns if col in SYMBOL_COLUMNS}
+
+        total = 0
+        with pd.read_csv(excel_reader.rewind(source), chunksize=Config.PARSE_CHUNK_SIZE, dtype=dtype,
+                         usecols=self._usecols(broker, header.columns), **read_options) as reader:
+            for chunk in reader:
+                total += len(chunk)
+                yield self._parse_frame(chunk, broker, file_path)
+
+        logger.info(f"成功读取文件: {file_path}, 记录数: {total}")
+
+    def _sniff_csv(self, source) -> Tuple[str, str]:
+        """
+        根据文件开头的样本推断编码和分隔符
+
+        Returns:
+            (编码, 分隔符)
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                sample = f.read(CSV_SNIFF_BYTES)
+        else:
+            sample = excel_reader.rewind(source).read(CSV_SNIFF_BYTES)
+
+        if sample.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = 'utf-16'
+        else:
+            encoding = 'latin-1'
+            for candidate in ('utf-8', 'gb18030'):
+                try:
+                    sample.decode(candidate)
+                except UnicodeDecodeError as e:
+                    # 样本末尾可能截断了一个多字节字符
+                    if e.start < len(sample) - 4:
+                        continue
+                encoding = candidate
+                break
+
+        text = sample.decode(encoding, errors='ignore')
+        try:
+            delimiter = csv.Sniffer().sniff(text, delimiters=',\t;|').delimiter
+        except csv.Error:
+            delimiter = ','
+
+        return encoding, delimiter
+
+    def _usecols(self, broker: str, columns: pd.Index) -> Optional[List]:
+        """
+        根据识别出的券商，计算解析时需要读取的列
+
+        Args:
+            broker: 券商名称
+            columns: 文件表头
+
+        Returns:
+            需要读取的列名列表，无法确定时返回None（读取全部列）
+        """
+        if broker == '富途证券':
+            if 'Order Status' in columns:
+                wanted = set(FUTU_NEW_COLUMNS.values()) | {'Order Status'}
+            else:
+                wanted = set(FUTU_OLD_COLUMNS.values())
+        elif broker in BROKER_COLUMNS:
+            wanted = set(BROKER_COLUMNS[broker].values())
+        else:
+            candidates = {name.lower() for names in GENERIC_COLUMN_CANDIDATES.values() for name in names}
+            wanted = {col for col in columns if str(col).lower() in candidates}
+
+        usecols = [col for col in columns if col in wanted]
+        return usecols or None
+
+    def _parse_frame(self, df: pd.DataFrame, broker: str, file_path: str) -> List[Dict]:
+        """用指定券商的解析器解析DataFrame并添加元数据"""
+        # 根据券商选择解析器
+        if broker in self.supported_brokers:
+            trades = self.supported_brokers[broker](df)
+        else:
+            # 使用通用解析器
+            trades = self.supported_brokers['通用'](df)
+
+        # 添加元数据
+        metadata = {
+            'broker': broker,
+            'source_file': Path(file_path).name,
+            'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        for trade in trades:
+            trade.update(metadata)
+
+        return trades
+
     def _identify_broker(self, df: pd.DataFrame) -> str:
         """根据Excel结构识别券商"""
         columns = set(df.columns.str.lower())
@@ -99,8 +349,6 @@ class ExcelParser:
 
     def _parse_futu(self, df: pd.DataFrame) -> List[Dict]:
         """解析富途证券格式"""
-        trades = []
-
         # 检查是否为新版本富途格式
         if 'Order Status' in df.columns:
             return self._parse_futu_new(df)
@@ -109,84 +357,58 @@ class ExcelParser:
 
     def _parse_futu_new(self, df: pd.DataFrame) -> List[Dict]:
         """解析新版本富途证券格式"""
-        trades = []
-
         # 只处理已成交的订单
-        df_executed = df[df['Order Status'] == '已成交'].copy()
-
-        for _, row in df_executed.iterrows():
-            try:
-                # 检查是否有执行数量
-                executed_qty = float(row.get('Executed Qty', 0))
-                if executed_qty == 0:
-                    continue
-
-                # 解析日期时间
-                order_time = str(row.get('Order Time', ''))
-                trade_date, trade_time = self._parse_futu_datetime(order_time)
-
-                trade = {
-                    'trade_date': trade_date,
-                    'trade_time': trade_time,
-                    'symbol': str(row['Symbol']).strip(),
-                    'security_name': str(row.get('Stock Name', '')).strip(),
-                    'security_type': self._identify_security_type(str(row['Symbol'])),
-                    'action': self._normalize_action(str(row['Direction'])),
-                    'quantity': executed_qty,
-                    'price': float(row.get('Avg Price', 0)),
-                    'amount': float(row.get('Turnover', 0)),
-                    'commission': 0,  # 富途新格式中手续费不在此文件显示
-                    'account_id': '',
-                    'notes': f"订单号: {row.get('Order No.', '')}"
-                }
-
-                # 处理期权格式
-                symbol = trade['symbol']
-                if 'Call' in symbol or 'Put' in symbol:
-                    trade['security_type'] = 'OPTION'
-
-                # 计算净金额
-                trade['net_amount'] = trade['amount'] + trade['commission']
-
-                trades.append(trade)
-
-            except Exception as e:
-                logger.warning(f"解析富途新格式记录失败: {row}, 错误: {e}")
-                continue
-
+        df_executed = df[df['Order Status'] == '已成交']
+        frame = self._rename_columns(df_executed, FUTU_NEW_COLUMNS)
+
+        if 'symbol' not in frame.columns or 'action' not in frame.columns:
+            return self._missing_columns(frame, '富途新格式')
+
+        # 检查是否有执行数量
+        quantity, quantity_ok = self._to_float(self._column(frame, 'quantity', 0))
+        price, price_ok = self._to_float(self._column(frame, 'price', 0))
+        amount, amount_ok = self._to_float(self._column(frame, 'amount', 0))
+        valid = quantity_ok & price_ok & amount_ok
+        mask = valid & (quantity != 0)
+
+        # 解析日期时间
+        order_time = self._to_str(self._column(frame, 'order_time', ''), strip=False)
+        datetimes, _ = self._map_unique(order_time, self._parse_futu_datetime)
+
+        raw_symbol = self._to_str(frame['symbol'], strip=False)
+        symbol = self._to_str(frame['symbol'])
+        security_type, _ = self._map_unique(raw_symbol, self._identify_security_type)
+
+        # 处理期权格式
+        is_option = np.array(['Call' in s or 'Put' in s for s in symbol], dtype=bool)
+        security_type[is_option] = 'OPTION'
+
+        action, _ = self._map_unique(self._to_str(frame['action'], strip=False), self._normalize_action)
+        order_no = self._column(frame, 'order_no', '')
+
+        trades = self._emit_records({
+            'trade_date': np.array([dt[0] for dt in datetimes], dtype=object),
+            'trade_time': np.array([dt[1] for dt in datetimes], dtype=object),
+            'symbol': symbol,
+            'security_name': self._to_str(self._column(frame, 'name', '')),
+            'security_type': security_type,
+            'action': action,
+            'quantity': quantity,
+            'price': price,
+            'amount': amount,
+            'commission': 0,  # 富途新格式中手续费不在此文件显示
+            'account_id': '',
+            'notes': np.array([f"订单号: {no}" for no in order_no.tolist()], dtype=object),
+            # 计算净金额
+            'net_amount': amount + 0,
+        }, mask)
+
+        self._log_skipped(len(frame) - int(valid.sum()), '富途新格式')
         return trades
 
     def _parse_futu_old(self, df: pd.DataFrame) -> List[Dict]:
         """解析旧版本富途证券格式"""
-        trades = []
-
-        for _, row in df.iterrows():
-            try:
-                trade = {
-                    'trade_date': self._parse_date(row['成交日期']),
-                    'trade_time': self._parse_time(row.get('成交时间', '')),
-                    'symbol': str(row['证券代码']).strip(),
-                    'security_name': str(row.get('证券名称', '')).strip(),
-                    'security_type': self._identify_security_type(str(row['证券代码'])),
-                    'action': self._normalize_action(str(row['交易方向'])),
-                    'quantity': float(row['成交数量']),
-                    'price': float(row['成交价格']),
-                    'amount': float(row['成交金额']),
-                    'commission': float(row.get('手续费', 0)),
-                    'account_id': str(row.get('账户', '')).strip(),
-                    'notes': str(row.get('备注', '')).strip()
-                }
-
-                # 计算净金额
-                trade['net_amount'] = trade['amount'] + trade['commission']
-
-                trades.append(trade)
-
-            except Exception as e:
-                logger.warning(f"解析富途旧格式记录失败: {row}, 错误: {e}")
-                continue
-
-        return trades
+        return self._parse_standard(self._rename_columns(df, FUTU_OLD_COLUMNS), '富途旧格式')
 
     def _parse_futu_datetime(self, datetime_str: str) -> tuple:
         """解析富途日期时间格式"""
@@ -210,186 +432,173 @@ class ExcelParser:
 
     def _parse_tiger(self, df: pd.DataFrame) -> List[Dict]:
         """解析老虎证券格式"""
-        trades = []
-
-        for _, row in df.iterrows():
-            try:
-                trade = {
-                    'trade_date': self._parse_date(row['date']),
-                    'trade_time': self._parse_time(row.get('time', '')),
-                    'symbol': str(row['symbol']).strip(),
-                    'security_name': str(row.get('name', '')).strip(),
-                    'security_type': self._identify_security_type(str(row['symbol'])),
-                    'action': self._normalize_action(str(row['side'])),
-                    'quantity': float(row['quantity']),
-                    'price': float(row['price']),
-                    'amount': float(row['amount']),
-                    'commission': float(row.get('commission', 0)),
-                    'account_id': str(row.get('account', '')).strip(),
-                    'notes': str(row.get('notes', '')).strip()
-                }
-
-                trade['net_amount'] = trade['amount'] + trade['commission']
-                trades.append(trade)
-
-            except Exception as e:
-                logger.warning(f"解析老虎记录失败: {row}, 错误: {e}")
-                continue
-
-        return trades
+        return self._parse_standard(self._rename_columns(df, TIGER_COLUMNS), '老虎')
 
     def _parse_ib(self, df: pd.DataFrame) -> List[Dict]:
         """解析Interactive Brokers格式"""
-        trades = []
-
-        for _, row in df.iterrows():
-            try:
-                trade = {
-                    'trade_date': self._parse_date(row['Date']),
-                    'trade_time': self._parse_time(row.get('Time', '')),
-                    'symbol': str(row['Symbol']).strip(),
-                    'security_name': str(row.get('Description', '')).strip(),
-                    'security_type': self._identify_security_type(str(row['Symbol'])),
-                    'action': self._normalize_action(str(row['Action'])),
-                    'quantity': float(row['Quantity']),
-                    'price': float(row['Price']),
-                    'amount': float(row['Amount']),
-                    'commission': float(row.get('Commission', 0)),
-                    'account_id': str(row.get('Account', '')).strip(),
-                    'notes': str(row.get('Notes', '')).strip()
-                }
-
-                trade['net_amount'] = trade['amount'] + trade['commission']
-                trades.append(trade)
-
-            except Exception as e:
-                logger.warning(f"解析IB记录失败: {row}, 错误: {e}")
-                continue
-
-        return trades
+        return self._parse_standard(self._rename_columns(df, IB_COLUMNS), 'IB')
 
     def _parse_snowball(self, df: pd.DataFrame) -> List[Dict]:
         """解析雪盈证券格式"""
-        trades = []
+        return self._parse_standard(self._rename_columns(df, SNOWBALL_COLUMNS), '雪盈')
 
-        for _, row in df.iterrows():
-            try:
-                trade = {
-                    'trade_date': self._parse_date(row['成交日期']),
-                    'trade_time': self._parse_time(row.get('成交时间', '')),
-                    'symbol': str(row['股票代码']).strip(),
-                    'security_name': str(row.get('股票名称', '')).strip(),
-                    'security_type': self._identify_security_type(str(row['股票代码'])),
-                    'action': self._normalize_action(str(row['方向'])),
-                    'quantity': float(row['数量']),
-                    'price': float(row['成交价']),
-                    'amount': float(row['成交额']),
-                    'commission': float(row.get('手续费', 0)),
-                    'account_id': str(row.get('账户', '')).strip(),
-                    'notes': str(row.get('备注', '')).strip()
-                }
-
-                trade['net_amount'] = trade['amount'] + trade['commission']
-                trades.append(trade)
+    def _parse_standard(self, frame: pd.DataFrame, label: str,
+                        amount: Optional[np.ndarray] = None,
+                        amount_ok: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        按列解析已重命名为标准列名的交易表
 
-            except Exception as e:
-                logger.warning(f"解析雪盈记录失败: {row}, 错误: {e}")
-                continue
+        Args:
+            frame: 列名已映射为标准字段的DataFrame
+            label: 日志中显示的格式名称
+            amount: 预先计算的成交金额（通用格式缺少金额列时使用）
+            amount_ok: 预先计算金额的有效掩码
 
+        Returns:
+            交易记录列表
+        """
+        required = ['date', 'symbol', 'action', 'quantity', 'price']
+        if amount is None:
+            required.append('amount')
+        if any(field not in frame.columns for field in required):
+            return self._missing_columns(frame, label)
+
+        quantity, quantity_ok = self._to_float(frame['quantity'])
+        price, price_ok = self._to_float(frame['price'])
+        if amount is None:
+            amount, amount_ok = self._to_float(frame['amount'])
+        commission, commission_ok = self._to_float(self._column(frame, 'commission', 0))
+        valid = quantity_ok & price_ok & amount_ok & commission_ok
+
+        trade_date, _ = self._map_unique(frame['date'], self._parse_date)
+        trade_time, _ = self._map_unique(self._column(frame, 'time', ''), self._parse_time)
+        security_type, _ = self._map_unique(
+            self._to_str(frame['symbol'], strip=False), self._identify_security_type
+        )
+        action, _ = self._map_unique(self._to_str(frame['action'], strip=False), self._normalize_action)
+
+        trades = self._emit_records({
+            'trade_date': trade_date,
+            'trade_time': trade_time,
+            'symbol': self._to_str(frame['symbol']),
+            'security_name': self._to_str(self._column(frame, 'name', '')),
+            'security_type': security_type,
+            'action': action,
+            'quantity': quantity,
+            'price': price,
+            'amount': amount,
+            'commission': commission,
+            'account_id': self._to_str(self._column(frame, 'account', '')),
+            'notes': self._to_str(self._column(frame, 'notes', '')),
+            'net_amount': amount + commission,
+        }, valid)
+
+        self._log_skipped(len(frame) - int(valid.sum()), label)
         return trades
 
     def _parse_zheng_format(self, df: pd.DataFrame) -> List[Dict]:
         """解析郑兄长期权策略格式"""
-        trades = []
-
-        for _, row in df.iterrows():
+        frame = self._rename_columns(df, ZHENG_COLUMNS)
+        if 'symbol' not in frame.columns:
+            return self._missing_columns(frame, '郑兄格式')
+
+        # 基础字段
+        symbol = self._to_str(frame['symbol'])
+        trade_date, _ = self._map_unique(self._column(frame, 'date', ''), self._parse_date)
+        action, _ = self._map_unique(
+            self._to_str(self._column(frame, 'action', ''), strip=False), self._normalize_action
+        )
+        amount, amount_ok = self._map_unique(self._column(frame, 'amount', 0), self._parse_currency)
+
+        # 解析期权信息（相同参数组合只解析一次）
+        option_cache = {}
+        option_infos = []
+        option_ok = np.ones(len(frame), dtype=bool)
+        option_args = zip(
+            symbol.tolist(),
+            self._column(frame, 'strike_price', 0).tolist(),
+            self._column(frame, 'expiration_date', '').tolist(),
+            self._column(frame, 'option_type', '').tolist()
+        )
+        for i, args in enumerate(option_args):
             try:
-                # 基础字段
-                symbol = str(row['代码']).strip()
-                trade_date = self._parse_date(row.get('开仓日期', ''))
-                action = self._normalize_action(str(row.get('操作', '')))
-
-                # 跳过空行
-                if not symbol or not trade_date:
-                    continue
-
-                # 解析期权信息
-                strike_price = row.get('行权价', 0)
-                expiration_date = row.get('行权日', '')
-                option_type = row.get('开单类型', '')
-
-                # 使用期权解析器
-                option_info = parse_symbol(
-                    symbol,
-                    strike_price=strike_price,
-                    expiration_date=expiration_date,
-                    option_type=option_type
-                )
-
-                # 构建交易记录
-                trade_data = {
-                    'trade_date': trade_date,
-                    'trade_time': '00:00:00',  # 郑兄格式没有时间字段
-                    'symbol': symbol,
-                    'security_name': '',  # 郑兄格式没有证券名称
-                    'security_type': 'OPTION' if option_info.format_type != 'STOCK' else 'STOCK',
-                    'action': action,
-                    'quantity': self._parse_float(row.get('开仓数量', 0)),
-                    'price': self._parse_float(row.get('交易价格', 0)),
-                    'amount': self._parse_currency(row.get('占用资金', 0)),
-                    'commission': 0,  # 郑兄格式没有单独的手续费字段
-                    'net_amount': self._parse_currency(row.get('占用资金', 0)),
-
-                    # 期权字段
-                    'underlying_symbol': option_info.underlying_symbol if option_info.format_type != 'STOCK' else '',
-                    'strike_price': option_info.strike_price,
-                    'expiration_date': option_info.expiration_date,
-                    'option_type': option_info.option_type,
-
-                    # 扩展字段
-                    'source': str(row.get('消息来源', '')).strip(),
-                    'close_date': self._parse_date(row.get('平仓日期', '')) if pd.notna(row.get('平仓日期')) and row.get('平仓日期') != '' else '',
-                    'close_price': self._parse_float(row.get('平仓价格', 0)),
-                    'close_quantity': self._parse_float(row.get('平仓数量', 0)),
-                    'close_reason': str(row.get('平仓理由', '')).strip(),
-                    'trade_rating': self._parse_float(row.get('交易评分', 0)),
-                    'trade_type': str(row.get('交易类型', '')).strip(),
-                    'notes': str(row.get('笔记', '')).strip(),
-                    'account_id': '',
-                    'broker': '郑兄格式'
-                }
-
-                # 计算净金额
-                trade_data['net_amount'] = trade_data['amount'] + trade_data['commission']
-
-                trades.append(trade_data)
-
+                info = option_cache.get(args)
+                if info is None:
+                    info = parse_symbol(
+                        args[0],
+                        strike_price=args[1],
+                        expiration_date=args[2],
+                        option_type=args[3]
+                    )
+                    option_cache[args] = info
             except Exception as e:
-                logger.warning(f"解析郑兄格式记录失败: {row}, 错误: {e}")
-                continue
-
+                logger.warning(f"解析郑兄格式期权信息失败: {args}, 错误: {e}")
+                info = None
+                option_ok[i] = False
+            option_infos.append(info)
+
+        is_option = np.array(
+            [info is not None and info.format_type != 'STOCK' for info in option_infos], dtype=bool
+        )
+        close_date, _ = self._map_unique(self._column(frame, 'close_date', None), self._parse_close_date)
+
+        # 跳过空行
+        valid = amount_ok & option_ok
+        mask = valid & (symbol != '')
+
+        amount = np.array([value if ok else 0.0 for value, ok in zip(amount.tolist(), amount_ok)],
+                          dtype=float)
+        infos = [info if info is not None else parse_symbol('') for info in option_infos]
+
+        trades = self._emit_records({
+            'trade_date': trade_date,
+            'trade_time': '00:00:00',  # 郑兄格式没有时间字段
+            'symbol': symbol,
+            'security_name': '',  # 郑兄格式没有证券名称
+            'security_type': np.where(is_option, 'OPTION', 'STOCK').astype(object),
+            'action': action,
+            'quantity': self._to_float_or_zero(self._column(frame, 'quantity', 0)),
+            'price': self._to_float_or_zero(self._column(frame, 'price', 0)),
+            'amount': amount,
+            'commission': 0,  # 郑兄格式没有单独的手续费字段
+            # 计算净金额
+            'net_amount': amount + 0,
+
+            # 期权字段
+            'underlying_symbol': np.array(
+                [info.underlying_symbol if opt else '' for info, opt in zip(infos, is_option)], dtype=object
+            ),
+            'strike_price': np.array([info.strike_price for info in infos], dtype=object),
+            'expiration_date': np.array([info.expiration_date for info in infos], dtype=object),
+            'option_type': np.array([info.option_type for info in infos], dtype=object),
+
+            # 扩展字段
+            'source': self._to_str(self._column(frame, 'source', '')),
+            'close_date': close_date,
+            'close_price': self._to_float_or_zero(self._column(frame, 'close_price', 0)),
+            'close_quantity': self._to_float_or_zero(self._column(frame, 'close_quantity', 0)),
+            'close_reason': self._to_str(self._column(frame, 'close_reason', '')),
+            'trade_rating': self._to_float_or_zero(self._column(frame, 'trade_rating', 0)),
+            'trade_type': self._to_str(self._column(frame, 'trade_type', '')),
+            'notes': self._to_str(self._column(frame, 'notes', '')),
+            'account_id': '',
+            'broker': '郑兄格式'
+        }, mask)
+
+        self._log_skipped(int((~valid & (symbol != '')).sum()), '郑兄格式')
         return trades
 
+    def _parse_close_date(self, value) -> str:
+        """解析郑兄格式平仓日期，空值返回空字符串"""
+        if pd.notna(value) and value != '':
+            return self._parse_date(value)
+        return ''
+
     def _parse_generic(self, df: pd.DataFrame) -> List[Dict]:
         """通用解析器 - 尝试智能识别列名"""
-        trades = []
-
-        # 列名映射
-        column_mapping = {
-            'date': ['日期', 'date', '成交日期', '交易日期'],
-            'time': ['时间', 'time', '成交时间', '交易时间'],
-            'symbol': ['代码', 'symbol', '股票代码', '证券代码'],
-            'name': ['名称', 'name', '股票名称', '证券名称'],
-            'action': ['方向', 'action', '交易方向', '买卖方向', 'side'],
-            'quantity': ['数量', 'quantity', '成交数量', '交易数量'],
-            'price': ['价格', 'price', '成交价', '成交价格'],
-            'amount': ['金额', 'amount', '成交额', '成交金额'],
-            'commission': ['手续费', 'commission', '佣金', '费用']
-        }
-
         # 智能匹配列名
         mapped_columns = {}
-        for field, possible_names in column_mapping.items():
+        for field, possible_names in GENERIC_COLUMN_CANDIDATES.items():
             for col in df.columns:
                 if str(col).lower() in [name.lower() for name in possible_names]:
                     mapped_columns[field] = col
@@ -402,36 +611,16 @@ class ExcelParser:
         if missing_fields:
             raise ParserException(f"无法识别必要列: {missing_fields}")
 
-        # 解析每一行
-        for _, row in df.iterrows():
-            try:
-                # 计算金额（如果没有明确金额列）
-                amount = row.get(mapped_columns.get('amount', 'amount'),
-                               row[mapped_columns['quantity']] * row[mapped_columns['price']])
-
-                trade = {
-                    'trade_date': self._parse_date(row[mapped_columns['date']]),
-                    'trade_time': self._parse_time(row.get(mapped_columns.get('time', 'time'), '')),
-                    'symbol': str(row[mapped_columns['symbol']]).strip(),
-                    'security_name': str(row.get(mapped_columns.get('name', 'name'), '')).strip(),
-                    'security_type': self._identify_security_type(str(row[mapped_columns['symbol']])),
-                    'action': self._normalize_action(str(row[mapped_columns['action']])),
-                    'quantity': float(row[mapped_columns['quantity']]),
-                    'price': float(row[mapped_columns['price']]),
-                    'amount': float(amount),
-                    'commission': float(row.get(mapped_columns.get('commission', 'commission'), 0)),
-                    'account_id': '',
-                    'notes': ''
-                }
-
-                trade['net_amount'] = trade['amount'] + trade['commission']
-                trades.append(trade)
+        frame = self._rename_columns(df, mapped_columns)
 
-            except Exception as e:
-                logger.warning(f"解析通用格式记录失败: {row}, 错误: {e}")
-                continue
+        # 计算金额（如果没有明确金额列，使用 数量 × 价格）
+        product, product_ok = self._multiply(frame['quantity'], frame['price'])
+        if 'amount' in frame.columns:
+            amount, amount_ok = self._to_float(frame['amount'])
+        else:
+            amount, amount_ok = self._to_float(pd.Series(product, index=frame.index))
 
-        return trades
+        return self._parse_standard(frame, '通用格式', amount=amount, amount_ok=amount_ok & product_ok)
 
     def _parse_date(self, date_value) -> str:
         """解析日期"""
@@ -545,6 +734,126 @@ class ExcelParser:
         except (ValueError, TypeError):
             return 0.0
 
+    def _rename_columns(self, df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
+        """按 标准字段 -> 原始列名 的映射挑选并重命名列，缺失的列直接忽略"""
+        present = {field: col for field, col in mapping.items() if col in df.columns}
+        frame = df[list(present.values())]
+        frame.columns = list(present.keys())
+        return frame
+
+    def _missing_columns(self, frame: pd.DataFrame, label: str) -> List[Dict]:
+        """缺少必要列时整表无法解析"""
+        if len(frame):
+            logger.warning(f"解析{label}记录失败: 缺少必要列, 跳过 {len(frame)} 条记录")
+        return []
+
+    def _log_skipped(self, count: int, label: str):
+        """汇总记录被跳过的无效行"""
+        if count:
+            logger.warning(f"解析{label}记录失败: {count} 条记录数据无效，已跳过")
+
+    def _column(self, frame: pd.DataFrame, field: str, default) -> pd.Series:
+        """获取标准字段列，不存在时返回填充默认值的列"""
+        if field in frame.columns:
+            return frame[field]
+        return pd.Series([default] * len(frame), index=frame.index, dtype=object)
+
+    def _to_str(self, values, strip: bool = True) -> np.ndarray:
+        """整列转换为字符串"""
+        result = np.empty(len(values), dtype=object)
+        if strip:
+            result[:] = [str(value).strip() for value in values.tolist()]
+        else:
+            result[:] = [str(value) for value in values.tolist()]
+        return result
+
+    def _map_unique(self, values, func) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        对列中每个唯一值只调用一次func，再按编码广播回整列
+
+        Returns:
+            (结果数组, 转换成功掩码)
+        """
+        codes, uniques = pd.factorize(values)
+        # 末尾多留一个位置给空值（编码-1），稍后单独填充
+        results = np.empty(len(uniques) + 1, dtype=object)
+        ok = np.ones(len(uniques) + 1, dtype=bool)
+        for i, value in enumerate(uniques):
+            results[i], ok[i] = self._apply(func, value)
+        mapped, mapped_ok = results[codes], ok[codes]
+
+        # factorize会把None/NaN/NaT合并为同一空值，这里按实际类型分别计算
+        missing = np.flatnonzero(codes == -1)
+        if len(missing):
+            raw = np.asarray(values, dtype=object)
+            cache = {}
+            for i in missing:
+                value_type = type(raw[i])
+                if value_type not in cache:
+                    cache[value_type] = self._apply(func, raw[i])
+                mapped[i], mapped_ok[i] = cache[value_type]
+        return mapped, mapped_ok
+
+    def _apply(self, func, value) -> Tuple[object, bool]:
+        """调用单值转换函数，返回 (结果, 是否成功)"""
+        try:
+            return func(value), True
+        except Exception:
+            return None, False
+
+    def _to_float(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """整列转换为浮点数，返回 (数值数组, 转换成功掩码)"""
+        if values.dtype.kind in 'fiub':
+            return values.to_numpy(dtype=float), np.ones(len(values), dtype=bool)
+
+        results, ok = self._map_unique(values, float)
+        numbers = np.full(len(values), np.nan)
+        numbers[ok] = results[ok].astype(float)
+        return numbers, ok
+
+    def _to_float_or_zero(self, values: pd.Series) -> np.ndarray:
+        """整列解析浮点数，空值或无法解析时为0（与_parse_float一致）"""
+        if values.dtype.kind in 'fiub':
+            numbers = values.to_numpy(dtype=float)
+            return np.where(np.isnan(numbers), 0.0, numbers)
+
+        results, _ = self._map_unique(values, self._parse_float)
+        return results.astype(float)
+
+    def _multiply(self, left: pd.Series, right: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """整列相乘，返回 (乘积数组, 计算成功掩码)"""
+        if left.dtype.kind in 'fiub' and right.dtype.kind in 'fiub':
+            product = left.to_numpy(dtype=float) * right.to_numpy(dtype=float)
+            return product, np.ones(len(left), dtype=bool)
+
+        # 非数值列逐个计算，保持与Python运算一致的语义
+        product = np.full(len(left), np.nan, dtype=object)
+        ok = np.ones(len(left), dtype=bool)
+        for i, (a, b) in enumerate(zip(left.tolist(), right.tolist())):
+            try:
+                product[i] = a * b
+            except Exception:
+                ok[i] = False
+        return product, ok
+
+    def _emit_records(self, columns: Dict, mask: np.ndarray) -> List[Dict]:
+        """
+        将列数据组装为交易记录字典
+
+        Args:
+            columns: 字段名 -> 整列数组（或所有记录共用的常量）
+            mask: 需要输出的行
+        """
+        index = np.flatnonzero(mask)
+        fields = list(columns.keys())
+        values = []
+        for field in fields:
+            column = columns[field]
+            if isinstance(column, np.ndarray):
+                values.append(column[index].tolist())
+            else:
+                values.append([column] * len(index))
+        return [dict(zip(fields, row)) for row in zip(*values)]
 
 class ParserException(Exception):
     """解析异常"""
@@ -2,9 +2,17 @@
 定时任务调度器
 """
 import logging
+import multiprocessing
+import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
+from queue import Empty
+from typing import Dict, Iterable, Iterator, List, Tuple
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
@@ -12,10 +20,93 @@ from apscheduler.triggers.cron import CronTrigger
 from app.config import Config
 from app.parser import ExcelParser
 from app.calculator import PnLCalculator
-from app.utils import calculate_file_hash, get_files_in_folder, validate_trade_record
+from app.file_manifest import FileManifest
+from app.file_watcher import FileWatcher
+from app.utils import calculate_file_digests, get_files_in_folder, import_hash_algorithms, validate_trade_record
 
 logger = logging.getLogger(__name__)
 
+# 多进程导入时每个文件在子进程和主进程之间最多积压的批次数
+STREAM_QUEUE_BATCHES = 2
+
+
+def iter_valid_batches(parser: ExcelParser, file_path: str) -> Iterator[Tuple[int, List[Dict], int]]:
+    """
+    逐批解析并验证文件中的交易记录
+
+    Yields:
+        (记录数, 有效交易列表, 无效记录数)
+    """
+    for trades in parser.iter_batches(file_path):
+        valid_trades = []
+        invalid_count = 0
+
+        # 验证交易记录
+        for trade in trades:
+            if validate_trade_record(trade):
+                valid_trades.append(trade)
+            else:
+                invalid_count += 1
+                logger.warning(f"无效交易记录: {trade}")
+
+        yield len(trades), valid_trades, invalid_count
+
+
+def stream_file_batches(file_path: str, batch_queue) -> int:
+    """
+    进程池任务：在子进程中逐批解析并验证文件，每批放入队列，结束时放入None
+
+    队列有长度上限，主进程来不及入库时子进程等待，大文件不会整个积压在内存中。
+
+    Returns:
+        批次数
+    """
+    count = 0
+    try:
+        for batch in iter_valid_batches(ExcelParser(), file_path):
+            batch_queue.put(batch)
+            count += 1
+    finally:
+        batch_queue.put(None)
+    return count
+
+
+class BatchStream:
+    """主进程按顺序读取子进程解析出的批次"""
+
+    def __init__(self, batch_queue, future: Future):
+        self.batch_queue = batch_queue
+        self.future = future
+        self.finished = False
+
+    def __iter__(self) -> Iterator[Tuple[int, List[Dict], int]]:
+        while not self.finished:
+            batch = self._get()
+            if batch is None:
+                self.finished = True
+                # 子进程解析失败时，在已解析的批次之后抛出异常（与串行导入一致）
+                self.future.result()
+                return
+            yield batch
+
+    def _get(self):
+        while True:
+            try:
+                return self.batch_queue.get(timeout=1)
+            except Empty:
+                if self.future.done():
+                    # 子进程异常退出时没有放入结束标记，result() 抛出异常
+                    self.future.result()
+
+    def close(self):
+        """未读完就停止时（入库失败或已导入）取走剩余批次，子进程才能结束"""
+        while not self.finished and not self.future.done():
+            try:
+                self.finished = self.batch_queue.get(timeout=1) is None
+            except Empty:
+                pass
+
+
 class TradingScheduler:
     """交易系统定时任务调度器"""
 
@@ -24,17 +115,32 @@ class TradingScheduler:
         self.parser = ExcelParser()
         self.storage = Config.get_storage_adapter()
         self.calculator = PnLCalculator(self.storage)
+        self.manifest = FileManifest(Config.FILE_MANIFEST_PATH)
+        # 本进程内已确认导入成功的文件哈希
         self.processed_files = set()
+        self.imported_trades = 0
+
+        # 文件事件监控和定时检查可能同时触发，导入过程串行执行
+        self._import_lock = threading.Lock()
+        self.watcher = None
+        if Config.FILE_WATCH_ENABLED:
+            self.watcher = FileWatcher(
+                Config.WATCH_FOLDER,
+                Config.SUPPORTED_EXTENSIONS,
+                self._on_file_ready,
+                debounce_seconds=Config.FILE_WATCH_DEBOUNCE_SECONDS,
+                poll_seconds=Config.FILE_WATCH_POLL_SECONDS
+            )
 
         # 配置定时任务
         self._setup_jobs()
 
     def _setup_jobs(self):
         """配置定时任务"""
-        # 每小时检查新文件
+        # 定时检查新文件（启用文件事件监控时只作为兜底，降低频率）
         self.scheduler.add_job(
             func=self._check_new_files,
-            trigger=IntervalTrigger(hours=Config.CHECK_INTERVAL_HOURS),
+            trigger=IntervalTrigger(hours=self.check_interval_hours),
             id='check_files',
             name='检查新交易文件',
             max_instances=1
@@ -59,24 +165,57 @@ class TradingScheduler:
             max_instances=1
         )
 
+    @property
+    def check_interval_hours(self) -> int:
+        """定时检查间隔"""
+        if self.watcher is not None:
+            return Config.SAFETY_CHECK_INTERVAL_HOURS
+        return Config.CHECK_INTERVAL_HOURS
+
     def start(self):
         """启动调度器"""
         logger.info("交易系统调度器启动")
         logger.info(f"监控文件夹: {Config.WATCH_FOLDER}")
-        logger.info(f"检查间隔: {Config.CHECK_INTERVAL_HOURS} 小时")
+        logger.info(f"检查间隔: {self.check_interval_hours} 小时")
+        logger.info(f"导入进程数: {Config.IMPORT_WORKERS}")
         logger.info(f"每日汇总时间: {Config.DAILY_SUMMARY_HOUR}:00")
 
+        self._ensure_lot_ledger()
+        if self.watcher is not None:
+            self.watcher.start()
+
         try:
             self.scheduler.start()
         except KeyboardInterrupt:
             logger.info("收到中断信号，正在停止调度器...")
-            self.scheduler.shutdown()
+            self.shutdown()
         except Exception as e:
             logger.error(f"调度器异常: {str(e)}")
-            self.scheduler.shutdown()
+            self.shutdown()
+
+    def _ensure_lot_ledger(self):
+        """从没有持仓批次账本的旧版本升级时，导入新文件前先重建账本"""
+        try:
+            if self.calculator.ensure_lot_ledger() is not None:
+                self._flush_storage()
+        except Exception as e:
+            logger.error(f"重建持仓批次账本失败，可运行 rebuild_ledger.py 重试: {str(e)}")
+
+    def _on_file_ready(self, file_path: str):
+        """文件监控回调：文件写入完成后立即导入"""
+        with self._import_lock:
+            start_time = time.time()
+            self.imported_trades = 0
+            if self._process_file(file_path):
+                self._log_throughput(1, time.time() - start_time)
 
     def _check_new_files(self):
         """检查并处理新文件"""
+        with self._import_lock:
+            self._check_folder()
+
+    def _check_folder(self):
+        """扫描监控文件夹，导入所有未处理的文件"""
         logger.info("=" * 50)
         logger.info(f"开始检查新文件 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -90,21 +229,44 @@ class TradingScheduler:
 
             logger.info(f"发现 {len(files)} 个文件，开始检查...")
 
-            processed_count = 0
-            for file_path in files:
-                try:
-                    if self._process_file(file_path):
-                        processed_count += 1
-                except Exception as e:
-                    logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            batch_start = time.time()
+            self.imported_trades = 0
+
+            if Config.IMPORT_WORKERS > 1 and len(files) > 1:
+                processed_count = self._process_files_parallel(files)
+            else:
+                processed_count = 0
+                for file_path in files:
+                    try:
+                        if self._process_file(file_path):
+                            processed_count += 1
+                    except Exception as e:
+                        logger.error(f"处理文件失败 {file_path}: {str(e)}")
 
             logger.info(f"文件检查完成，处理了 {processed_count} 个文件")
+            self._log_throughput(processed_count, time.time() - batch_start)
 
         except Exception as e:
             logger.error(f"检查新文件时发生异常: {str(e)}")
 
         logger.info("=" * 50)
 
+    def _log_throughput(self, file_count: int, duration: float):
+        """记录本批次的导入吞吐量"""
+        if not file_count:
+            return
+
+        duration = max(duration, 1e-6)
+        logger.info(f"本批次导入: 文件={file_count}, 交易={self.imported_trades}, "
+                    f"耗时={duration:.2f}秒, 吞吐量={file_count / duration:.2f} 文件/秒, "
+                    f"{self.imported_trades / duration:.0f} 条/秒")
+
+        limiter = getattr(self.storage, 'limiter', None)
+        if limiter is not None:
+            metrics = limiter.metrics
+            logger.info(f"Sheets API累计: 读={metrics['read_requests']}, 写={metrics['write_requests']}, "
+                        f"重试={metrics['retries']}, 限流等待={metrics['throttled_seconds']:.1f}秒")
+
     def _process_file(self, file_path: str) -> bool:
         """
         处理单个文件
@@ -118,44 +280,159 @@ class TradingScheduler:
         start_time = time.time()
 
         try:
-            # 计算文件哈希
-            file_hash = calculate_file_hash(file_path)
+            # 计算文件哈希（文件未变化时直接使用清单中的哈希）
+            file_hash, legacy_hash = self._file_hashes(file_path)
 
             # 检查文件是否已处理
-            existing_log = self.storage.get_import_log_by_hash(file_hash)
-            if existing_log and existing_log.get('status') == 'SUCCESS':
+            if self._is_imported(file_hash, legacy_hash):
                 logger.info(f"文件已处理，跳过: {file_name}")
                 return False
 
             # 记录开始处理
             logger.info(f"开始解析文件: {file_name}")
 
-            # 解析Excel文件
-            trades = self.parser.parse_file(file_path)
+            # 按批解析、验证、入库并计算盈亏，大文件也不会一次性载入内存
+            batches = iter_valid_batches(self.parser, file_path)
+            return self._store_batches(file_path, file_hash, batches, start_time)
 
-            if not trades:
-                logger.warning(f"文件中未发现有效交易记录: {file_name}")
-                return False
+        except Exception as e:
+            self._log_failure(file_path, start_time, e)
+            return False
 
-            # 验证交易记录
-            valid_trades = []
-            invalid_count = 0
+    def _process_files_parallel(self, files: List[str]) -> int:
+        """
+        多进程流水线处理文件：解析和验证在进程池中并行执行，
+        入库和盈亏计算在当前线程按文件顺序依次执行，保证结果确定
 
-            for trade in trades:
-                if validate_trade_record(trade):
-                    valid_trades.append(trade)
-                else:
-                    invalid_count += 1
-                    logger.warning(f"无效交易记录: {trade}")
+        子进程每解析出一批就通过有长度上限的队列交给主进程，与串行导入一样逐批入库，
+        同时解析的文件数和每个文件积压的批次数都有上限。
 
-            if not valid_trades:
-                logger.warning(f"文件中没有有效的交易记录: {file_name}")
-                return False
+        Returns:
+            成功处理的文件数
+        """
+        pending = []
+        pending_hashes = set()
+        for file_path in files:
+            start_time = time.time()
+            try:
+                file_hash, legacy_hash = self._file_hashes(file_path)
+                if self._is_imported(file_hash, legacy_hash):
+                    logger.info(f"文件已处理，跳过: {Path(file_path).name}")
+                    continue
+                # 同一批次中内容相同的文件只导入第一个
+                if file_hash in pending_hashes:
+                    logger.info(f"文件内容与本批次中的其他文件相同，跳过: {Path(file_path).name}")
+                    continue
+                pending_hashes.add(file_hash)
+                pending.append((file_path, file_hash, legacy_hash))
+            except Exception as e:
+                self._log_failure(file_path, start_time, e)
+
+        if not pending:
+            return 0
+
+        logger.info(f"并行解析 {len(pending)} 个文件，进程数: {Config.IMPORT_WORKERS}")
+
+        processed_count = 0
+        queue = iter(pending)
+        in_flight = deque()
+
+        with multiprocessing.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=Config.IMPORT_WORKERS) as pool:
+            def submit(item):
+                file_path, file_hash, legacy_hash = item
+                batch_queue = manager.Queue(STREAM_QUEUE_BATCHES)
+                future = pool.submit(stream_file_batches, file_path, batch_queue)
+                in_flight.append((file_path, file_hash, legacy_hash, time.time(), BatchStream(batch_queue, future)))
+
+            # 限制同时解析的文件数量，每个文件最多积压 STREAM_QUEUE_BATCHES 批，避免解析结果堆积占用内存
+            for item in islice(queue, Config.IMPORT_WORKERS * 2):
+                submit(item)
+
+            while in_flight:
+                file_path, file_hash, legacy_hash, start_time, batches = in_flight.popleft()
+                next_item = next(queue, None)
+                if next_item:
+                    submit(next_item)
+
+                try:
+                    # 解析期间可能已有其他导入写入了相同内容的导入日志，入库前再检查一次
+                    if self._is_imported(file_hash, legacy_hash):
+                        logger.info(f"文件已处理，跳过: {Path(file_path).name}")
+                        continue
+                    logger.info(f"正在处理文件: {Path(file_path).name}")
+                    if self._store_batches(file_path, file_hash, batches, start_time):
+                        processed_count += 1
+                except Exception as e:
+                    self._log_failure(file_path, start_time, e)
+                finally:
+                    batches.close()
+
+        return processed_count
+
+    def _file_hashes(self, file_path: str) -> Tuple[str, str]:
+        """
+        获取文件哈希，(路径, inode, 大小, 修改时间) 与清单一致时不读取文件
 
-            logger.info(f"解析完成: 总记录={len(trades)}, 有效记录={len(valid_trades)}, 无效记录={invalid_count}")
+        Returns:
+            (文件哈希, 旧版MD5哈希)，未启用MD5兼容时后者为空字符串
+        """
+        algorithm = Config.FILE_HASH_ALGORITHM
+        stat = os.stat(file_path)
+        cached = self.manifest.lookup(file_path, stat, algorithm)
+        if cached:
+            return cached
+
+        digests = calculate_file_digests(file_path, import_hash_algorithms())
+        file_hash, legacy_hash = digests[algorithm], digests.get('md5', '')
+        self.manifest.save(file_path, stat, algorithm, file_hash, legacy_hash)
+        return file_hash, legacy_hash
+
+    def _is_imported(self, file_hash: str, legacy_hash: str = '') -> bool:
+        """检查文件是否已成功导入（旧版导入日志记录的是MD5哈希）"""
+        if file_hash in self.processed_files:
+            return True
+
+        for value in (file_hash, legacy_hash):
+            if not value:
+                continue
+            existing_log = self.storage.get_import_log_by_hash(value)
+            if existing_log and existing_log.get('status') == 'SUCCESS':
+                self.processed_files.add(file_hash)
+                return True
+        return False
+
+    def _store_batches(self, file_path: str, file_hash: str,
+                       batches: Iterable[Tuple[int, List[Dict], int]], start_time: float) -> bool:
+        """
+        将已验证的交易批次写入存储并计算盈亏，最后记录导入日志
+
+        Args:
+            file_path: 文件路径
+            file_hash: 文件哈希
+            batches: (记录数, 有效交易列表, 无效记录数) 序列
+            start_time: 开始处理时间
+
+        Returns:
+            bool: 是否成功处理
+        """
+        file_name = Path(file_path).name
+
+        records_count = 0
+        success_count = 0
+        invalid_count = 0
+        calc_errors = []
+
+        for batch_count, valid_trades, batch_invalid in batches:
+            records_count += batch_count
+            invalid_count += batch_invalid
+
+            if not valid_trades:
+                continue
 
             # 插入交易记录到存储
             self.storage.insert_trades(valid_trades)
+            success_count += len(valid_trades)
 
             # 处理盈亏计算
             logger.info("开始处理盈亏计算...")
@@ -165,81 +442,91 @@ class TradingScheduler:
                        f"持仓更新={calc_result['positions_updated']}, "
                        f"已平仓={calc_result['closed_positions']}")
 
-            if calc_result['errors']:
-                for error in calc_result['errors']:
-                    logger.error(error)
+            for error in calc_result['errors']:
+                logger.error(error)
+            calc_errors.extend(calc_result['errors'])
 
-            # 记录导入日志
-            duration = time.time() - start_time
+        if not records_count:
+            logger.warning(f"文件中未发现有效交易记录: {file_name}")
+            return False
+
+        if not success_count:
+            logger.warning(f"文件中没有有效的交易记录: {file_name}")
+            return False
+
+        logger.info(f"解析完成: 总记录={records_count}, 有效记录={success_count}, 无效记录={invalid_count}")
+        self.imported_trades += success_count
+
+        # 记录导入日志
+        duration = time.time() - start_time
+        log_data = {
+            'file_name': file_name,
+            'file_path': file_path,
+            'file_size': Path(file_path).stat().st_size,
+            'file_hash': file_hash,
+            'records_count': records_count,
+            'success_count': success_count,
+            'error_count': invalid_count + len(calc_errors),
+            'status': 'FAILED' if calc_errors else 'SUCCESS',
+            'error_message': '; '.join(calc_errors[:3]) if calc_errors else '',
+            'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_seconds': round(duration, 2)
+        }
+
+        self.storage.insert_import_log(log_data)
+        # 导入结束，写入存储缓冲中的数据
+        self._flush_storage()
+        if log_data['status'] == 'SUCCESS':
+            self.processed_files.add(file_hash)
+
+        logger.info(f"文件处理完成: {file_name} (耗时: {duration:.2f}秒)")
+        return True
+
+    def _log_failure(self, file_path: str, start_time: float, error: Exception):
+        """记录失败日志"""
+        file_name = Path(file_path).name
+        duration = time.time() - start_time
+        error_message = str(error)
+
+        try:
             log_data = {
                 'file_name': file_name,
                 'file_path': file_path,
-                'file_size': Path(file_path).stat().st_size,
-                'file_hash': file_hash,
-                'records_count': len(trades),
-                'success_count': len(valid_trades),
-                'error_count': invalid_count + len(calc_result['errors']),
-                'status': 'FAILED' if calc_result['errors'] else 'SUCCESS',
-                'error_message': '; '.join(calc_result['errors'][:3]) if calc_result['errors'] else '',
+                'file_size': Path(file_path).stat().st_size if Path(file_path).exists() else 0,
+                'file_hash': '',
+                'records_count': 0,
+                'success_count': 0,
+                'error_count': 1,
+                'status': 'FAILED',
+                'error_message': error_message,
                 'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'duration_seconds': round(duration, 2)
             }
-
             self.storage.insert_import_log(log_data)
+            self._flush_storage()
+        except Exception as log_error:
+            logger.error(f"记录失败日志时出错: {str(log_error)}")
 
-            logger.info(f"文件处理完成: {file_name} (耗时: {duration:.2f}秒)")
-            return True
-
-        except Exception as e:
-            # 记录失败日志
-            duration = time.time() - start_time
-            error_message = str(e)
-
-            try:
-                log_data = {
-                    'file_name': file_name,
-                    'file_path': file_path,
-                    'file_size': Path(file_path).stat().st_size if Path(file_path).exists() else 0,
-                    'file_hash': '',
-                    'records_count': 0,
-                    'success_count': 0,
-                    'error_count': 1,
-                    'status': 'FAILED',
-                    'error_message': error_message,
-                    'import_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'duration_seconds': round(duration, 2)
-                }
-                self.storage.insert_import_log(log_data)
-            except Exception as log_error:
-                logger.error(f"记录失败日志时出错: {str(log_error)}")
-
-            logger.error(f"处理文件失败 {file_name}: {error_message}")
-            return False
+        logger.error(f"处理文件失败 {file_name}: {error_message}")
 
     def _daily_summary(self):
-        """执行每日汇总统计"""
+        """执行每日汇总统计（昨天和今天，一次读取、一次写入）"""
         logger.info("开始执行每日汇总统计")
 
         try:
-            # 获取需要汇总的日期（昨天）
             yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+            today = datetime.now().strftime('%Y-%m-%d')
 
-            # 计算每日汇总
-            summary = self.calculator.calculate_daily_summary(yesterday)
-
-            # 保存汇总结果
-            self.storage.insert_or_update_daily_summary(summary)
+            # 计算每日汇总并保存
+            summary, today_summary = self.calculator.calculate_daily_summaries(yesterday, today)
+            self.storage.insert_or_update_daily_summaries([summary, today_summary])
+            self._flush_storage()
 
             logger.info(f"每日汇总完成 - {yesterday}")
             logger.info(f"  交易次数: {summary['total_trades']}")
             logger.info(f"  已实现盈亏: {summary['realized_pnl']:.2f}")
             logger.info(f"  胜率: {summary['win_rate']:.2f}%")
 
-            # 如果今天还有交易，也汇总今天的
-            today = datetime.now().strftime('%Y-%m-%d')
-            today_summary = self.calculator.calculate_daily_summary(today)
-            self.storage.insert_or_update_daily_summary(today_summary)
-
             if today_summary['total_trades'] > 0:
                 logger.info(f"今日汇总完成 - {today}")
                 logger.info(f"  交易次数: {today_summary['total_trades']}")
@@ -249,6 +536,12 @@ class TradingScheduler:
 
         logger.info("每日汇总统计完成")
 
+    def _flush_storage(self):
+        """写入存储适配器缓冲中的数据（Google Sheets写入缓冲，SQLite无需写入）"""
+        flush = getattr(self.storage, 'flush', None)
+        if flush is not None:
+            flush()
+
     def manual_trigger(self):
         """手动触发文件检查"""
         logger.info("手动触发文件检查")
@@ -256,6 +549,18 @@ class TradingScheduler:
 
     def shutdown(self):
         """关闭调度器"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.calculator.close()
+
+        # 写入存储缓冲中尚未写入的数据
+        close = getattr(self.storage, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logger.error(f"关闭存储时写入缓冲数据失败: {str(e)}")
+
         if self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("调度器已关闭")
\ No newline at end of file
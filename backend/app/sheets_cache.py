@@ -0,0 +1,135 @@
+"""
+Google Sheets读缓存 - 按工作表缓存记录和二级索引
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """一个工作表的缓存内容"""
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.loaded_at = time.monotonic()
+        self.indexes: Dict[str, Dict] = {}
+
+
+class SheetCache:
+    """
+    工作表记录缓存
+
+    每个工作表缓存一次 get_all_records 的结果，按需建立字段 -> 记录列表的二级索引。
+    缓存在 ttl_seconds 后过期；适配器自己的写入通过 append / update / replace
+    就地修补缓存，因此同一进程内反复读取不产生API请求。ttl_seconds 为0时不缓存。
+    缓存内容每次变化（读取、修补、丢弃）时 version 加一，供基于缓存的派生数据判断是否需要重算。
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def records(self, name: str, loader: Callable[[], List[Dict]]) -> List[Dict]:
+        """
+        获取工作表的全部记录，缓存过期或不存在时调用 loader 读取
+
+        返回缓存中的列表本身，调用方不应修改。
+        """
+        with self._lock:
+            entry = self._fresh(name)
+            if entry is not None:
+                self.hits += 1
+                return entry.records
+
+        records = loader()
+        with self._lock:
+            self.misses += 1
+            self.version += 1
+            if self.ttl_seconds > 0:
+                self._entries[name] = _Entry(records)
+        return records
+
+    def index(self, name: str, field: str, loader: Callable[[], List[Dict]]) -> Dict:
+        """
+        字段值 -> 记录列表的索引，首次查询该字段时建立
+
+        返回缓存中的索引本身，调用方不应修改。
+        """
+        records = self.records(name, loader)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.records is records and field in entry.indexes:
+                return entry.indexes[field]
+
+            index = {}
+            for record in records:
+                index.setdefault(record.get(field), []).append(record)
+            if entry is not None and entry.records is records:
+                entry.indexes[field] = index
+            return index
+
+    def lookup(self, name: str, field: str, value, loader: Callable[[], List[Dict]]) -> List[Dict]:
+        """按字段值查找记录（副本）"""
+        return [dict(record) for record in self.index(name, field, loader).get(value, [])]
+
+    def peek(self, name: str) -> Optional[List[Dict]]:
+        """返回未过期的缓存记录，不触发读取"""
+        with self._lock:
+            entry = self._fresh(name)
+            return entry.records if entry is not None else None
+
+    def append(self, name: str, records: List[Dict]):
+        """适配器追加写入成功后，把新记录补到缓存和已建立的索引中"""
+        with self._lock:
+            entry = self._fresh(name)
+            if entry is None:
+                return
+            self.version += 1
+            entry.records.extend(records)
+            for field, index in entry.indexes.items():
+                for record in records:
+                    index.setdefault(record.get(field), []).append(record)
+
+    def update(self, name: str, rows: Dict[int, Dict]):
+        """适配器按行更新成功后修补缓存，rows 为 记录位置 -> 新记录"""
+        with self._lock:
+            entry = self._fresh(name)
+            if entry is None:
+                return
+            self.version += 1
+            for position, record in rows.items():
+                entry.records[position] = record
+            entry.indexes.clear()
+
+    def replace(self, name: str, records: List[Dict]):
+        """适配器整表重写成功后，用写入的内容替换缓存"""
+        with self._lock:
+            self.version += 1
+            if self.ttl_seconds > 0:
+                self._entries[name] = _Entry(records)
+
+    def invalidate(self, name: Optional[str] = None):
+        """丢弃一个或全部工作表的缓存"""
+        with self._lock:
+            self.version += 1
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def _fresh(self, name: str) -> Optional[_Entry]:
+        """未过期的缓存项"""
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.loaded_at >= self.ttl_seconds:
+            del self._entries[name]
+            return None
+        return entry
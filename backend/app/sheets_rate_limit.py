@@ -0,0 +1,210 @@
+"""
+Google Sheets API限流 - 读写分开的令牌桶，429/5xx时指数退避重试
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import gspread
+
+logger = logging.getLogger(__name__)
+
+# 读请求的方法，其余访问API的方法按写请求计
+READ_METHODS = {
+    'worksheet', 'worksheets', 'fetch_sheet_metadata',
+    'get', 'get_values', 'get_all_values', 'get_all_records', 'batch_get',
+    'row_values', 'col_values', 'acell', 'cell', 'find', 'findall'
+}
+WRITE_METHODS = {
+    'add_worksheet', 'del_worksheet',
+    'update', 'update_acell', 'update_cell', 'update_cells', 'batch_update',
+    'append_row', 'append_rows', 'insert_row', 'insert_rows',
+    'delete_rows', 'clear', 'batch_clear'
+}
+# 非幂等写入：服务器出错时可能已经生效，只在429（请求被拒绝）时重试
+NON_IDEMPOTENT_METHODS = {'add_worksheet', 'append_row', 'append_rows', 'insert_row', 'insert_rows', 'delete_rows'}
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 per_minute 个令牌，最多积累 burst 个（默认 per_minute）
+
+    令牌不足时预先扣减再等待，多个线程同时取令牌时按先后顺序排队。
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else per_minute)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """取一个令牌，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class SheetsRateLimiter:
+    """
+    Sheets API客户端限流
+
+    每次API调用先从对应的读/写令牌桶取令牌；返回429或5xx时按指数退避（带随机抖动）
+    重试，服务器给出 Retry-After 时至少等待该时长。等待和退避的时间计入 metrics。
+    """
+
+    def __init__(self, read_per_minute: float, write_per_minute: float, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 64.0, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 rand: Optional[random.Random] = None):
+        self.buckets = {
+            'read': TokenBucket(read_per_minute, clock, sleep, burst),
+            'write': TokenBucket(write_per_minute, clock, sleep, burst)
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rand = rand or random.Random()
+        self.metrics = {
+            'read_requests': 0,
+            'write_requests': 0,
+            'retries': 0,
+            'throttled_seconds': 0.0,   # 令牌桶等待 + 退避等待
+            'backoff_seconds': 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def call(self, kind: str, method: str, func: Callable, *args, **kwargs):
+        """
+        限流执行一次API调用
+
+        Args:
+            kind: 'read' 或 'write'
+            method: 方法名（用于判断是否可在5xx时重试和记录日志）
+            func: 实际调用
+        """
+        attempt = 0
+        while True:
+            waited = self.buckets[kind].acquire()
+            self._record(f'{kind}_requests', 1, throttled=waited)
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if attempt >= self.max_retries or not self._retryable(e, method):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.warning(f"Sheets API {method} 返回 {e.code}，{delay:.1f} 秒后第 {attempt} 次重试")
+                self._record('retries', 1, throttled=delay, backoff=delay)
+                self.sleep(delay)
+
+    def wrap(self, spreadsheet):
+        """返回经限流的电子表格对象"""
+        return RateLimitedSpreadsheet(spreadsheet, self)
+
+    @staticmethod
+    def _status(error: gspread.exceptions.APIError) -> int:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        return status if isinstance(status, int) else error.code
+
+    def _retryable(self, error: gspread.exceptions.APIError, method: str) -> bool:
+        status = self._status(error)
+        if status == 429:
+            return True
+        return 500 <= status < 600 and method not in NON_IDEMPOTENT_METHODS
+
+    def _backoff(self, attempt: int, error: gspread.exceptions.APIError) -> float:
+        """指数退避，在 [0, 上限] 内随机取值；服务器给出 Retry-After 时不少于该值"""
+        delay = self.rand.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            delay = max(delay, float(headers.get('Retry-After', 0)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    def _record(self, key: str, count: int, throttled: float = 0.0, backoff: float = 0.0):
+        with self._lock:
+            self.metrics[key] += count
+            self.metrics['throttled_seconds'] += throttled
+            self.metrics['backoff_seconds'] += backoff
+
+
+class _RateLimited:
+    """代理gspread对象，访问API的方法经限流执行，其他属性原样返回"""
+
+    def __init__(self, target, limiter: SheetsRateLimiter):
+        self._target = target
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in READ_METHODS:
+            kind = 'read'
+        elif name in WRITE_METHODS:
+            kind = 'write'
+        else:
+            return value
+
+        def call(*args, **kwargs):
+            result = self._limiter.call(kind, name, value, *args, **kwargs)
+            if isinstance(result, gspread.Worksheet):
+                return RateLimitedWorksheet(result, self._limiter)
+            return result
+        return call
+
+
+class RateLimitedWorksheet(_RateLimited):
+    """经限流的工作表"""
+
+    def batch_update(self, data, *args, **kwargs):
+        # gspread 会在传入的每一项的 range 前就地加上工作表名，重试时需使用原始数据的副本
+        data = [dict(item) for item in data]
+
+        def update(*call_args, **call_kwargs):
+            return self._target.batch_update([dict(item) for item in data], *call_args, **call_kwargs)
+        return self._limiter.call('write', 'batch_update', update, *args, **kwargs)
+
+
+class RateLimitedSpreadsheet(_RateLimited):
+    """
+    经限流的电子表格
+
+    worksheet() 每次都会读取电子表格元数据，这里按标题缓存工作表对象以节省读配额。
+    """
+
+    def __init__(self, target, limiter: SheetsRateLimiter):
+        super().__init__(target, limiter)
+        self._worksheets: Dict[str, RateLimitedWorksheet] = {}
+
+    def worksheet(self, title: str):
+        if title not in self._worksheets:
+            self._worksheets[title] = self.__getattr__('worksheet')(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, *args, **kwargs):
+        worksheet = self.__getattr__('add_worksheet')(title, *args, **kwargs)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def del_worksheet(self, worksheet):
+        self._worksheets = {k: v for k, v in self._worksheets.items() if v is not worksheet}
+        target = worksheet._target if isinstance(worksheet, _RateLimited) else worksheet
+        return self.__getattr__('del_worksheet')(target)
@@ -0,0 +1,192 @@
+"""
+Google Sheets写入缓冲 - 按工作表合并追加和按行更新，延后批量写入
+"""
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    """一个工作表待写入的内容"""
+
+    def __init__(self):
+        self.appends: List[List] = []
+        self.append_start = 0                 # 第一条待追加记录的位置（从0开始，不含标题行）
+        self.updates: Dict[int, Dict] = {}    # 记录位置 -> {'range', 'values'}
+
+    def __len__(self):
+        return len(self.appends) + len(self.updates)
+
+
+class SheetWriteBuffer:
+    """
+    工作表写入缓冲（write-behind）
+
+    追加的数据行和按行更新按工作表排队，flush 时每个工作表最多一次 batch_update
+    和一次 append_rows。待写入行数达到 max_rows 时立即写入；第一条写入排队后
+    max_seconds 秒由后台定时器写入；导入结束和调度器关闭时由调用方显式 flush。
+    max_rows 为0时每次写入立即执行（不缓冲）。
+
+    各工作表的记录数在本地累计，追加时据此分配ID，不必每次读取ID列。
+    """
+
+    def __init__(self, get_worksheet: Callable, order: List[str], max_rows: int, max_seconds: float,
+                 on_error: Optional[Callable[[str], None]] = None, on_flush: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            get_worksheet: 工作表名 -> gspread.Worksheet
+            order: flush 时写入工作表的顺序
+            max_rows: 待写入行数上限
+            max_seconds: 排队后最长等待秒数
+            on_error: 写入失败时以工作表名回调（用于丢弃读缓存）
+            on_flush: flush 写入了数据后回调（用于更新数据版本号）
+        """
+        self.get_worksheet = get_worksheet
+        self.order = list(order)
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.on_error = on_error
+        self.on_flush = on_flush
+        self.flushes = 0
+        self._pending: Dict[str, _Pending] = {}
+        self._counts: Dict[str, int] = {}
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def record_count(self, name: str, loader: Callable[[], int]) -> int:
+        """工作表记录数（含待追加的记录），首次调用时用 loader 读取已写入的记录数"""
+        with self._lock:
+            if name not in self._counts:
+                pending = self._pending.get(name)
+                self._counts[name] = loader() + (len(pending.appends) if pending else 0)
+            return self._counts[name]
+
+    def append(self, name: str, rows: List[List], start: int):
+        """
+        排队追加数据行
+
+        Args:
+            name: 工作表名
+            rows: 数据行
+            start: 第一行对应的记录位置（即追加前的记录数）
+        """
+        if not rows:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(name, _Pending())
+            if not pending.appends:
+                pending.append_start = start
+            pending.appends.extend(rows)
+            if name in self._counts:
+                self._counts[name] += len(rows)
+            self._after_enqueue()
+
+    def update(self, name: str, position: int, range_name: str, row: List):
+        """
+        排队更新一条记录
+
+        记录尚在追加队列中时直接替换待追加的数据行；同一记录多次更新只保留最后一次。
+        """
+        with self._lock:
+            pending = self._pending.setdefault(name, _Pending())
+            offset = position - pending.append_start
+            if pending.appends and 0 <= offset < len(pending.appends):
+                pending.appends[offset] = row
+            else:
+                pending.updates[position] = {'range': range_name, 'values': [row]}
+            self._after_enqueue()
+
+    def pending(self, name: Optional[str] = None) -> int:
+        """待写入的行数"""
+        with self._lock:
+            if name is not None:
+                return len(self._pending.get(name, ()))
+            return sum(len(p) for p in self._pending.values())
+
+    def reset(self, name: Optional[str] = None):
+        """工作表被整表重写或清空时，丢弃其待写入内容和本地记录数"""
+        with self._lock:
+            if name is None:
+                self._pending.clear()
+                self._counts.clear()
+            else:
+                self._pending.pop(name, None)
+                self._counts.pop(name, None)
+
+    def flush(self, name: Optional[str] = None):
+        """
+        写入待写入的内容：每个工作表一次 batch_update 和一次 append_rows
+
+        写入失败的工作表保留待写入内容以便重试，并抛出异常。
+        """
+        with self._lock:
+            names = [name] if name is not None else self.order + [n for n in self._pending if n not in self.order]
+            written = False
+            for sheet_name in names:
+                pending = self._pending.get(sheet_name)
+                if not pending:
+                    continue
+                try:
+                    worksheet = self.get_worksheet(sheet_name)
+                    if pending.updates:
+                        # gspread 会就地修改传入的 range，写入失败保留待重试时须保持原样
+                        worksheet.batch_update([dict(pending.updates[p]) for p in sorted(pending.updates)])
+                        pending.updates = {}
+                    if pending.appends:
+                        worksheet.append_rows(pending.appends)
+                        pending.appends = []
+                except Exception as e:
+                    logger.error(f"写入工作表失败 {sheet_name}: {str(e)}")
+                    self._counts.pop(sheet_name, None)
+                    # 之前的工作表（以及本表的 batch_update）可能已经写入
+                    if self.on_flush is not None:
+                        self.on_flush()
+                    if self.on_error is not None:
+                        self.on_error(sheet_name)
+                    raise
+                del self._pending[sheet_name]
+                written = True
+                self.flushes += 1
+                logger.debug(f"已写入工作表 {sheet_name}")
+
+            if not self._pending:
+                self._cancel_timer()
+            if written and self.on_flush is not None:
+                self.on_flush()
+
+    def close(self):
+        """写入全部待写入内容并停止定时器"""
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._cancel_timer()
+
+    def _after_enqueue(self):
+        """达到行数上限时立即写入，否则确保定时器在运行"""
+        if self.pending() >= self.max_rows:
+            self.flush()
+        elif self._timer is None and self.max_seconds > 0:
+            self._timer = threading.Timer(self.max_seconds, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        """定时器回调"""
+        with self._lock:
+            self._timer = None
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"定时写入失败，等待下次写入重试: {str(e)}")
+                if self._pending and self.max_seconds > 0:
+                    self._timer = threading.Timer(self.max_seconds, self._flush_on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -4,9 +4,10 @@
 import hashlib
 import logging
 import os
+import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 def setup_logging():
     """设置日志配置"""
@@ -38,13 +39,79 @@ def setup_logging():
     # 防止重复日志
     root_logger.propagate = False
 
-def calculate_file_hash(file_path: str) -> str:
-    """计算文件MD5哈希值"""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+# 计算文件哈希时每次读取的字节数
+HASH_BUFFER_SIZE = 1024 * 1024
+
+def _new_hash(algorithm: str):
+    """创建哈希对象，支持 blake2b / md5 / xxh3_128（需安装xxhash）"""
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=32)
+    if algorithm == 'xxh3_128':
+        import xxhash
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
+
+def calculate_file_digests(file_path: str, algorithms: Tuple[str, ...] = ('blake2b',)) -> Dict[str, str]:
+    """
+    读取一遍文件，同时计算多种哈希值
+
+    Args:
+        file_path: 文件路径
+        algorithms: 哈希算法
+
+    Returns:
+        算法 -> 十六进制哈希值
+    """
+    hashers = {algorithm: _new_hash(algorithm) for algorithm in algorithms}
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    # 复用同一块缓冲区，避免每次读取都分配新的bytes对象
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            chunk = view[:size]
+            for hasher in hashers.values():
+                hasher.update(chunk)
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+def calculate_file_hash(file_path: str, algorithm: str = 'md5') -> str:
+    """计算文件哈希值，默认MD5（与旧版导入日志一致）"""
+    return calculate_file_digests(file_path, (algorithm,))[algorithm]
+
+def import_hash_algorithms() -> Tuple[str, ...]:
+    """导入去重使用的哈希算法：配置的算法，以及兼容旧版导入日志的MD5（如已启用）"""
+    from app.config import Config
+
+    algorithms = (Config.FILE_HASH_ALGORITHM,)
+    if Config.LEGACY_MD5_HASH and Config.FILE_HASH_ALGORITHM != 'md5':
+        algorithms += ('md5',)
+    return algorithms
+
+class HashingSpool(tempfile.SpooledTemporaryFile):
+    """
+    写入时同时计算哈希的临时文件，不超过 max_size 字节时只在内存中
+
+    用于接收上传的文件：数据写入一次即得到哈希，不需要再读一遍
+    """
+
+    def __init__(self, max_size: int, algorithms: Tuple[str, ...] = ('blake2b',)):
+        super().__init__(max_size=max_size, mode='w+b')
+        self.hashers = {algorithm: _new_hash(algorithm) for algorithm in algorithms}
+        self.size = 0
+
+    def write(self, data) -> int:
+        for hasher in self.hashers.values():
+            hasher.update(data)
+        self.size += len(data)
+        return super().write(data)
+
+    def digests(self) -> Dict[str, str]:
+        """已写入数据的哈希值（算法 -> 十六进制哈希值）"""
+        return {algorithm: hasher.hexdigest() for algorithm, hasher in self.hashers.items()}
 
 def format_currency(amount: float, currency: str = '¥') -> str:
     """格式化货币金额"""
@@ -81,7 +148,8 @@ def get_files_in_folder(folder_path: str, extensions: List[str] = None) -> List[
         if file_path.is_file() and file_path.suffix.lower() in extensions:
             files.append(str(file_path))
 
-    return files
+    # 按文件名排序，保证每次处理顺序一致
+    return sorted(files)
 
 def validate_trade_record(trade: Dict) -> bool:
     """验证交易记录的完整性"""
@@ -7,10 +7,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import logging
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, jsonify, request, render_template_string
 from flask_cors import CORS
 from app.config import Config
-from app.google_sheets_adapter import GoogleSheetsAdapter
+from app.dashboard_aggregates import dashboard_data
+from app.event_stream import DashboardStream, EventStreamRequestHandler
+from app.http_cache import conditional, enable_gzip, storage_version
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,10 @@ def create_app():
 
     # 初始化数据存储
     storage = Config.get_storage_adapter()
+    data_version = storage_version(storage)
+    enable_gzip(app)
+    stream = DashboardStream(storage, data_version)
+    app.extensions['dashboard_stream'] = stream
 
     @app.route('/')
     def dashboard():
@@ -257,6 +263,7 @@ def create_app():
     <script>
         // 全局变量
         let charts = {};
+        let dashboardData = null;
 
         // 格式化货币
         function formatCurrency(amount) {
@@ -484,9 +491,7 @@ def create_app():
                 const data = await fetchDashboardData();
 
                 // 更新界面
-                updateStatsCards(data);
-                updateCharts(data);
-                updateLastUpdated();
+                renderDashboard(data);
 
                 // 显示内容
                 document.getElementById('loading').style.display = 'none';
@@ -498,11 +503,64 @@ def create_app():
             }
         }
 
-        // 页面加载完成后初始化
-        document.addEventListener('DOMContentLoaded', initDashboard);
+        // 更新整个界面
+        function renderDashboard(data) {
+            dashboardData = data;
+            updateStatsCards(data);
+            updateCharts(data);
+            updateLastUpdated();
+        }
 
-        // 每5分钟自动刷新
-        setInterval(initDashboard, 5 * 60 * 1000);
+        // 合并服务器推送的增量
+        function applyDelta(data, delta) {
+            if (delta.overview) {
+                Object.assign(data.overview, delta.overview);
+            }
+            if (delta.daily_trend || delta.removed_days) {
+                const days = new Map(data.daily_trend.map(item => [item.date, item]));
+                (delta.removed_days || []).forEach(date => days.delete(date));
+                (delta.daily_trend || []).forEach(item => days.set(item.date, item));
+                data.daily_trend = [...days.values()].sort((a, b) => a.date.localeCompare(b.date));
+            }
+            if (delta.top_profits) {
+                data.top_profits = delta.top_profits;
+            }
+            if (delta.top_losses) {
+                data.top_losses = delta.top_losses;
+            }
+            return data;
+        }
+
+        // 订阅实时更新：连接（及断线重连）时收到完整快照，之后每次写入收到增量
+        function connectStream() {
+            if (!window.EventSource) {
+                // 不支持SSE的浏览器每5分钟自动刷新
+                initDashboard();
+                setInterval(initDashboard, 5 * 60 * 1000);
+                return;
+            }
+            const source = new EventSource('/api/stream');
+            source.onerror = () => {
+                // 还没有收到快照时改为直接请求数据（显示数据或错误信息），浏览器会继续自动重连
+                if (!dashboardData) {
+                    initDashboard();
+                }
+            };
+            source.addEventListener('snapshot', event => {
+                renderDashboard(JSON.parse(event.data));
+                document.getElementById('loading').style.display = 'none';
+                document.getElementById('error-message').style.display = 'none';
+                document.getElementById('dashboard-content').style.display = 'block';
+            });
+            source.addEventListener('delta', event => {
+                if (dashboardData) {
+                    renderDashboard(applyDelta(dashboardData, JSON.parse(event.data)));
+                }
+            });
+        }
+
+        // 页面加载完成后初始化
+        document.addEventListener('DOMContentLoaded', connectStream);
     </script>
 </body>
 </html>
@@ -510,103 +568,25 @@ def create_app():
         return render_template_string(html_template)
 
     @app.route('/api/dashboard')
+    @conditional(data_version)
     def get_dashboard_data():
         """获取Dashboard数据"""
         try:
-            # 获取基础统计
-            all_trades = storage.get_all_trades()
-            positions = storage.get_open_positions()
-            closed_positions = storage.get_all_closed_positions()
-
-            # 计算基础指标
-            total_trades = len(all_trades)
-            total_pnl = sum(float(pos.get('net_pnl', 0)) for pos in closed_positions)
-            positions_count = len([p for p in positions if float(p.get('total_quantity', 0)) > 0])
-
-            # 计算胜率
-            winning_trades = len([cp for cp in closed_positions if float(cp.get('net_pnl', 0)) > 0])
-            losing_trades = len([cp for cp in closed_positions if float(cp.get('net_pnl', 0)) < 0])
-            win_rate = (winning_trades / len(closed_positions) * 100) if closed_positions else 0
-
-            # 每日盈亏趋势
-            daily_pnl = {}
-            for trade in all_trades:
-                date = trade.get('trade_date', '')
-                if date:
-                    if date not in daily_pnl:
-                        daily_pnl[date] = 0
-
-            for cp in closed_positions:
-                date = cp.get('close_date', '')
-                pnl = float(cp.get('net_pnl', 0))
-                if date in daily_pnl:
-                    daily_pnl[date] += pnl
-
-            # 排序并格式化每日数据
-            sorted_dates = sorted(daily_pnl.keys())
-            daily_trend = [{'date': date, 'pnl': daily_pnl[date]} for date in sorted_dates[-30:]]  # 最近30天
-
-            # 盈利TOP5
-            profits_by_symbol = {}
-            for cp in closed_positions:
-                symbol = cp.get('symbol', '')
-                pnl = float(cp.get('net_pnl', 0))
-                if pnl > 0:
-                    if symbol not in profits_by_symbol:
-                        profits_by_symbol[symbol] = {'pnl': 0, 'trades': 0, 'total_cost': 0}
-                    profits_by_symbol[symbol]['pnl'] += pnl
-                    profits_by_symbol[symbol]['trades'] += 1
-                    profits_by_symbol[symbol]['total_cost'] += float(cp.get('total_cost', 0))
-
-            top_profits = []
-            for symbol, data in sorted(profits_by_symbol.items(), key=lambda x: x[1]['pnl'], reverse=True)[:5]:
-                return_rate = (data['pnl'] / data['total_cost'] * 100) if data['total_cost'] > 0 else 0
-                top_profits.append({
-                    'symbol': symbol,
-                    'pnl': data['pnl'],
-                    'return_rate': return_rate,
-                    'trades': data['trades']
-                })
-
-            # 亏损TOP5
-            losses_by_symbol = {}
-            for cp in closed_positions:
-                symbol = cp.get('symbol', '')
-                pnl = float(cp.get('net_pnl', 0))
-                if pnl < 0:
-                    if symbol not in losses_by_symbol:
-                        losses_by_symbol[symbol] = {'pnl': 0, 'trades': 0, 'total_cost': 0}
-                    losses_by_symbol[symbol]['pnl'] += pnl
-                    losses_by_symbol[symbol]['trades'] += 1
-                    losses_by_symbol[symbol]['total_cost'] += float(cp.get('total_cost', 0))
-
-            top_losses = []
-            for symbol, data in sorted(losses_by_symbol.items(), key=lambda x: x[1]['pnl'])[:5]:
-                return_rate = (data['pnl'] / data['total_cost'] * 100) if data['total_cost'] > 0 else 0
-                top_losses.append({
-                    'symbol': symbol,
-                    'pnl': data['pnl'],
-                    'return_rate': return_rate,
-                    'trades': data['trades']
-                })
-
-            return jsonify({
-                'overview': {
-                    'total_trades': total_trades,
-                    'total_pnl': total_pnl,
-                    'win_rate': win_rate,
-                    'positions_count': positions_count
-                },
-                'daily_trend': daily_trend,
-                'top_profits': top_profits,
-                'top_losses': top_losses,
-                'last_updated': datetime.now().isoformat()
-            })
+            # 总览、每日盈亏和盈亏排行由存储预先聚合，不再读取全部记录
+            data = dashboard_data(storage)
+            data['last_updated'] = datetime.now().isoformat()
+            return jsonify(data)
 
         except Exception as e:
             logger.error(f"获取Dashboard数据失败: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/stream')
+    def stream_dashboard():
+        """Dashboard实时推送（Server-Sent Events）：连接时发送快照，数据写入后发送增量"""
+        return Response(stream.stream(request.environ), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
     @app.route('/api/refresh')
     def refresh_data():
         """手动刷新数据"""
@@ -626,4 +606,5 @@ def create_app():
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # 推送连接由后台线程统一发送，不占用请求线程
+    app.run(host='0.0.0.0', port=5001, debug=True, request_handler=EventStreamRequestHandler)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+每日汇总回填 - 命令行工具
+
+一次读取交易和已平仓记录，计算日期区间内每一天的汇总并批量写入 daily_summary。
+
+用法:
+    python backfill_summary.py                              # 从最早的交易日期回填到今天
+    python backfill_summary.py --start 2024-01-01 --end 2025-12-31
+"""
+import sys
+import os
+import argparse
+import logging
+import time
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.config import Config
+from app.calculator import PnLCalculator
+from app.utils import setup_logging
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='回填每日汇总统计')
+    parser.add_argument('--start', help='开始日期 YYYY-MM-DD（默认为最早的交易日期）')
+    parser.add_argument('--end', help='结束日期 YYYY-MM-DD（默认为今天）')
+    parser.add_argument('--dry-run', action='store_true', help='只计算不写入')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """回填入口"""
+    args = parse_args(argv)
+
+    Config.init_directories()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    start_time = time.time()
+    try:
+        storage = Config.get_storage_adapter()
+        summaries = PnLCalculator(storage).calculate_daily_summaries(args.start, args.end)
+        if summaries and not args.dry_run:
+            storage.insert_or_update_daily_summaries(summaries)
+            if hasattr(storage, 'flush'):
+                storage.flush()
+    except Exception as e:
+        logger.error(f"回填每日汇总失败: {str(e)}", exc_info=True)
+        print(f"✗ 回填每日汇总失败: {e}")
+        return 1
+
+    trading_days = [s for s in summaries if s['total_trades'] > 0]
+    print(f"✓ 每日汇总{'计算' if args.dry_run else '回填'}完成: "
+          f"{summaries[0]['summary_date'] if summaries else '-'} ~ {summaries[-1]['summary_date'] if summaries else '-'}, "
+          f"共 {len(summaries)} 天, 有交易 {len(trading_days)} 天, 耗时 {time.time() - start_time:.2f} 秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
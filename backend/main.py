@@ -55,7 +55,8 @@ def main():
     logger.info(f"监控文件夹: {Config.WATCH_FOLDER}")
     logger.info(f"存储方式: {Config.STORAGE_TYPE}")
     logger.info(f"电子表格: {Config.SPREADSHEET_NAME}")
-    logger.info(f"检查间隔: {Config.CHECK_INTERVAL_HOURS} 小时")
+    logger.info(f"文件事件监控: {'启用' if Config.FILE_WATCH_ENABLED else '关闭'}")
+    logger.info(f"检查间隔: {Config.SAFETY_CHECK_INTERVAL_HOURS if Config.FILE_WATCH_ENABLED else Config.CHECK_INTERVAL_HOURS} 小时")
     logger.info(f"每日汇总时间: {Config.DAILY_SUMMARY_HOUR}:00")
 
     print()
@@ -64,15 +65,21 @@ def main():
     print(f"  存储方式: {Config.STORAGE_TYPE}")
     if Config.STORAGE_TYPE == 'google_sheets':
         print(f"  电子表格: {Config.SPREADSHEET_NAME}")
+    elif Config.STORAGE_TYPE == 'hybrid':
+        print(f"  电子表格: {Config.SPREADSHEET_NAME}（本地镜像: {Config.MIRROR_DB_PATH}）")
     else:
         print(f"  本地数据库: {Config.SQLITE_DB_PATH}")
-    print(f"  检查间隔: {Config.CHECK_INTERVAL_HOURS} 小时")
+    if Config.FILE_WATCH_ENABLED:
+        print(f"  文件监控: 新文件写入完成 {Config.FILE_WATCH_DEBOUNCE_SECONDS:g} 秒后自动导入")
+        print(f"  兜底检查: {Config.SAFETY_CHECK_INTERVAL_HOURS} 小时")
+    else:
+        print(f"  检查间隔: {Config.CHECK_INTERVAL_HOURS} 小时")
     print(f"  每日汇总: {Config.DAILY_SUMMARY_HOUR}:00")
     print()
 
     # 验证必要条件
     try:
-        if Config.STORAGE_TYPE == 'google_sheets':
+        if Config.STORAGE_TYPE in ('google_sheets', 'hybrid'):
             credentials_file = Path(Config.GOOGLE_CREDENTIALS_PATH)
             if not credentials_file.exists():
                 print("✗ 未找到Google API凭证文件")
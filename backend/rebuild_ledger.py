@@ -0,0 +1,66 @@
+"""
+持仓批次账本重建 - 命令行工具
+
+根据已存储的全部交易重建持仓和持仓批次账本。用于从没有账本的旧版本升级
+（调度器启动时发现账本为空也会自动重建），或账本与交易记录不一致时。
+
+用法:
+    python rebuild_ledger.py                        # 重建持仓和持仓批次账本
+    python rebuild_ledger.py --closed-positions     # 同时重建已平仓记录
+"""
+import sys
+import os
+import argparse
+import logging
+import time
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.config import Config
+from app.calculator import PnLCalculator
+from app.utils import setup_logging
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='重建持仓批次账本')
+    parser.add_argument('--closed-positions', action='store_true', help='同时根据全部交易重建已平仓记录')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """重建入口"""
+    args = parse_args(argv)
+
+    Config.init_directories()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    start_time = time.time()
+    calculator = None
+    try:
+        storage = Config.get_storage_adapter()
+        calculator = PnLCalculator(storage)
+        result = calculator.rebuild_lot_ledger()
+        if args.closed_positions:
+            result.update(calculator.rebuild_closed_positions())
+        if hasattr(storage, 'flush'):
+            storage.flush()
+    except Exception as e:
+        logger.error(f"重建持仓批次账本失败: {str(e)}", exc_info=True)
+        print(f"✗ 重建持仓批次账本失败: {e}")
+        return 1
+    finally:
+        if calculator is not None:
+            calculator.close()
+
+    print(f"✓ 持仓批次账本重建完成: 标的 {result['symbols']} 个, 交易 {result['trades']} 笔, "
+          f"未平仓批次 {result['open_lots']} 个"
+          + (f", 已平仓记录 {result['closed_positions']} 条" if args.closed_positions else "")
+          + f", 耗时 {time.time() - start_time:.2f} 秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Dashboard接口延迟基准 - 每次请求现场计算 vs 读取预聚合数据
+
+按已平仓记录数（默认 1万 / 10万 / 100万）生成SQLite数据库，用Flask测试客户端请求
+/api/dashboard，统计 p50 / p99 延迟。现场计算即原实现：读取全部交易、持仓和已平仓记录后逐条统计。
+
+用法: python benchmarks/bench_dashboard.py [已平仓记录数,...] [请求次数]
+"""
+import sys
+import os
+import time
+import logging
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import numpy as np
+
+from app.config import Config
+from app.dashboard_aggregates import DashboardAggregates
+from app.database import SQLiteAdapter, TradeRecord
+from app import web_api
+
+logging.disable(logging.WARNING)
+
+SYMBOLS = [f'SYM{i:03d}' for i in range(500)]
+BATCH = 50000
+
+
+class RecomputeAdapter(SQLiteAdapter):
+    """原实现：每次请求读取全部记录后现场计算"""
+
+    def get_dashboard_aggregates(self, days: int, top: int):
+        return DashboardAggregates.from_records(
+            self.get_all_trades(), self.get_open_positions(), self.get_all_closed_positions()
+        ).snapshot(days, top)
+
+
+def populate(storage: SQLiteAdapter, closed_count: int):
+    """每条已平仓记录对应一笔卖出交易，按批写入（与导入流程一样增量更新聚合表）"""
+    rng = np.random.default_rng(42)
+    for start in range(0, closed_count, BATCH):
+        indexes = range(start, min(start + BATCH, closed_count))
+        dates = [f'20{10 + i // 336 % 15:02d}-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}' for i in indexes]
+        pnls = rng.normal(0, 100, len(dates))
+        storage.save_trades_bulk([TradeRecord(
+            trade_date=date, trade_time=f'{i % 86400 // 3600:02d}:{i % 3600 // 60:02d}:{i % 60:02d}',
+            symbol=SYMBOLS[i % len(SYMBOLS)], action='SELL', quantity=1 + i % 100, price=100.0, amount=100.0,
+        ) for i, date in zip(indexes, dates)])
+        storage.insert_closed_positions([{
+            'symbol': SYMBOLS[i % len(SYMBOLS)], 'close_date': date, 'quantity': 1 + i % 100,
+            'total_cost': 1000.0, 'net_pnl': float(pnl)
+        } for i, date, pnl in zip(indexes, dates, pnls)])
+    storage.update_positions([{'symbol': symbol, 'total_quantity': 10} for symbol in SYMBOLS[:50]])
+
+
+def measure(storage: SQLiteAdapter, requests: int) -> dict:
+    saved = vars(Config)['get_storage_adapter']
+    try:
+        Config.get_storage_adapter = classmethod(lambda cls: storage)
+        client = web_api.create_app().test_client()
+    finally:
+        Config.get_storage_adapter = saved
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get('/api/dashboard')
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return {'p50': float(np.percentile(samples, 50)), 'p99': float(np.percentile(samples, 99)),
+            'data': response.get_json()}
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"{'已平仓记录':>10s}  {'方式':<8s}  {'请求':>5s}  {'p50':>10s}  {'p99':>10s}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            path = os.path.join(folder, f'dashboard_{size}.db')
+            storage = SQLiteAdapter(path)
+            start = time.perf_counter()
+            populate(storage, size)
+            print(f"{size:>10d}  写入并增量聚合耗时 {time.perf_counter() - start:.1f}秒")
+
+            # 现场计算每次请求要读取全部记录，请求次数按记录数减少
+            recompute_requests = max(5, min(requests, 2000000 // size))
+            results = {}
+            for label, adapter, count in (('现场计算', RecomputeAdapter(path), recompute_requests),
+                                          ('预聚合', storage, requests)):
+                results[label] = measure(adapter, count)
+                print(f"{size:>10d}  {label:<8s}  {count:>5d}  "
+                      f"{results[label]['p50']:8.2f}ms  {results[label]['p99']:8.2f}ms")
+                adapter.close()
+
+            overview = [results[label]['data']['overview'] for label in results]
+            assert overview[0]['total_trades'] == overview[1]['total_trades']
+            assert abs(overview[0]['total_pnl'] - overview[1]['total_pnl']) < 1e-6 * max(1.0, abs(overview[0]['total_pnl']))
+
+
+if __name__ == '__main__':
+    main()
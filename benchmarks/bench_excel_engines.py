@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Excel读取引擎基准 - 比较各引擎读取 .xlsx / .xls 的耗时
+
+用法: python benchmarks/bench_excel_engines.py [行数 ...]   (默认 10000 100000 500000)
+
+.xls 格式单个工作表最多 65536 行，超出部分按上限生成；生成 .xls 需要安装 xlwt。
+"""
+import sys
+import os
+import time
+import tempfile
+import importlib.util
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app import excel_reader
+
+XLS_MAX_ROWS = 65535
+
+HEADER = ['成交日期', '成交时间', '证券代码', '证券名称', '交易方向',
+          '成交数量', '成交价格', '成交金额', '手续费', '账户', '备注']
+
+
+def make_row(i: int) -> list:
+    """生成一行合成成交数据"""
+    quantity = (i % 900) + 100
+    price = round(10 + (i % 5000) / 100, 2)
+    return [
+        f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+        f"{9 + i % 7:02d}:{i % 60:02d}:{(i * 7) % 60:02d}",
+        ['AAPL', 'TSLA', 'NVDA', '600519', '000001'][i % 5],
+        '',
+        '买入' if i % 2 else '卖出',
+        quantity,
+        price,
+        round(quantity * price, 2),
+        round((i % 50) / 10, 2),
+        'ACC001',
+        ''
+    ]
+
+
+def write_xlsx(path: str, rows: int):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for i in range(rows):
+        sheet.append(make_row(i))
+    workbook.save(path)
+
+
+def write_xls(path: str, rows: int):
+    import xlwt
+
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet('trades')
+    for col, name in enumerate(HEADER):
+        sheet.write(0, col, name)
+    for i in range(rows):
+        for col, value in enumerate(make_row(i)):
+            sheet.write(i + 1, col, value)
+    workbook.save(path)
+
+
+def read_all(path: str, engine: str) -> int:
+    """读取整个工作表，返回行数"""
+    return sum(len(df) for df in excel_reader.iter_frames(path, engine))
+
+
+def bench_file(path: str):
+    for engine in excel_reader.ENGINE_PREFERENCES[os.path.splitext(path)[1]]:
+        if not excel_reader.is_engine_available(engine):
+            print(f"    {engine:<16s} 未安装")
+            continue
+        start = time.perf_counter()
+        rows = read_all(path, engine)
+        print(f"    {engine:<16s} {time.perf_counter() - start:8.2f}s  ({rows} 行)")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 500_000]
+    has_xlwt = importlib.util.find_spec('xlwt') is not None
+
+    print("Excel读取引擎基准测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            print(f"\n{rows} 行:")
+
+            path = os.path.join(tmp, f'trades_{rows}.xlsx')
+            write_xlsx(path, rows)
+            print(f"  .xlsx ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+            bench_file(path)
+
+            if not has_xlwt:
+                print("  .xls  跳过（未安装 xlwt）")
+                continue
+            xls_rows = min(rows, XLS_MAX_ROWS)
+            path = os.path.join(tmp, f'trades_{rows}.xls')
+            write_xls(path, xls_rows)
+            print(f"  .xls  ({xls_rows} 行, {os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+            bench_file(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+FIFO全量重建基准 - 逐笔字典算法 vs NumPy累计区间引擎
+
+用法: python benchmarks/bench_fifo_rebuild.py [交易数] [标的数]
+"""
+import sys
+import os
+import time
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import numpy as np
+
+from app import fifo_engine
+from app.calculator import PnLCalculator
+
+logging.disable(logging.WARNING)
+
+
+def make_trades(count: int, symbols: int):
+    """每个账户先买后卖，卖出不超过持仓"""
+    rng = np.random.default_rng(0)
+    symbol_ids = rng.integers(0, symbols, count)
+    accounts = rng.choice(['', 'A', 'B'], count)
+    quantities = rng.integers(1, 200, count)
+    prices = np.round(rng.uniform(1, 500, count), 2)
+    commissions = np.round(rng.uniform(0, 5, count), 2)
+    sell_draws = rng.random(count)
+
+    start_date = np.datetime64('2015-01-01')
+    holdings = {}
+    trades = []
+    for i in range(count):
+        key = (symbol_ids[i], accounts[i])
+        held = holdings.get(key, 0)
+        quantity = int(quantities[i])
+        if held and sell_draws[i] < 0.45:
+            action = 'SELL'
+            quantity = min(quantity, held)
+            holdings[key] = held - quantity
+        else:
+            action = 'BUY'
+            holdings[key] = held + quantity
+        trades.append({
+            'trade_date': str(start_date + np.timedelta64(i * 3650 // count, 'D')),
+            'trade_time': f'{9 + i % 25200 // 3600:02d}:{i % 3600 // 60:02d}:{i % 60:02d}',
+            'symbol': f'SYM{symbol_ids[i]:04d}', 'security_name': '', 'action': action,
+            'quantity': quantity, 'price': float(prices[i]), 'amount': quantity * float(prices[i]),
+            'commission': float(commissions[i]), 'account_id': str(accounts[i]),
+        })
+    return trades
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    trades = make_trades(count, symbols)
+    calculator = PnLCalculator(None)
+    print(f"交易记录: {count} 条, 标的: {symbols} 个")
+
+    start = time.perf_counter()
+    expected = []
+    for symbol_trades in calculator._group_by_symbol(trades).values():
+        expected.extend(calculator._replay_closed_positions(symbol_trades))
+    loop_seconds = time.perf_counter() - start
+    print(f"  逐笔算法:   {loop_seconds:7.2f} 秒, 已平仓 {len(expected)} 条")
+
+    start = time.perf_counter()
+    closed = fifo_engine.rebuild_closed_positions(trades, calculator._replay_closed_positions)
+    engine_seconds = time.perf_counter() - start
+    print(f"  NumPy引擎:  {engine_seconds:7.2f} 秒, 已平仓 {len(closed)} 条  "
+          f"加速 {loop_seconds / engine_seconds:.1f}x")
+
+    fields = fifo_engine.CLOSED_POSITION_FIELDS
+    same = [tuple(cp[f] for f in fields) for cp in closed] == [tuple(cp[f] for f in fields) for cp in expected]
+    print(f"  结果一致: {same}")
+
+
+if __name__ == '__main__':
+    main()
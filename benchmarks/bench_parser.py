@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+解析器性能基准 - 逐行 iterrows 解析 vs 按列解析
+
+用法: python benchmarks/bench_parser.py [行数]
+"""
+import sys
+import os
+import time
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import numpy as np
+import pandas as pd
+
+from app.parser import ExcelParser, IB_COLUMNS, FUTU_OLD_COLUMNS
+
+logging.disable(logging.WARNING)
+
+
+def make_frame(rows: int, columns: dict) -> pd.DataFrame:
+    """生成合成成交明细"""
+    rng = np.random.default_rng(42)
+    symbols = np.array(['AAPL', 'TSLA', 'NVDA', 'MSFT', '600519', '000001', 'AVGO0919C'])
+    dates = pd.date_range('2024-01-01', periods=250, freq='B').strftime('%Y-%m-%d')
+    quantity = rng.integers(1, 1000, rows)
+    price = np.round(rng.uniform(1, 500, rows), 2)
+    return pd.DataFrame({
+        columns['date']: rng.choice(dates, rows),
+        columns['time']: [f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in zip(
+            rng.integers(9, 16, rows), rng.integers(0, 60, rows), rng.integers(0, 60, rows))],
+        columns['symbol']: rng.choice(symbols, rows),
+        columns['name']: '',
+        columns['action']: rng.choice(['BUY', 'SELL', '买入', '卖出'], rows),
+        columns['quantity']: quantity,
+        columns['price']: price,
+        columns['amount']: quantity * price,
+        columns['commission']: np.round(rng.uniform(0, 5, rows), 2),
+        columns['account']: 'U1234567',
+    })
+
+
+def legacy_parse(parser: ExcelParser, df: pd.DataFrame, columns: dict) -> list:
+    """按原来的方式逐行解析（作为对照）"""
+    trades = []
+    for _, row in df.iterrows():
+        try:
+            trade = {
+                'trade_date': parser._parse_date(row[columns['date']]),
+                'trade_time': parser._parse_time(row.get(columns['time'], '')),
+                'symbol': str(row[columns['symbol']]).strip(),
+                'security_name': str(row.get(columns['name'], '')).strip(),
+                'security_type': parser._identify_security_type(str(row[columns['symbol']])),
+                'action': parser._normalize_action(str(row[columns['action']])),
+                'quantity': float(row[columns['quantity']]),
+                'price': float(row[columns['price']]),
+                'amount': float(row[columns['amount']]),
+                'commission': float(row.get(columns['commission'], 0)),
+                'account_id': str(row.get(columns['account'], '')).strip(),
+                'notes': str(row.get(columns['notes'], '')).strip()
+            }
+            trade['net_amount'] = trade['amount'] + trade['commission']
+            trades.append(trade)
+        except Exception:
+            continue
+    return trades
+
+
+def bench(label: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12s} {elapsed:8.3f}s  ({len(result)} 条)")
+    return result, elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    parser = ExcelParser()
+
+    print(f"解析器基准测试: {rows} 行")
+    print("=" * 50)
+
+    for name, columns, method in [
+        ('Interactive Brokers', IB_COLUMNS, parser._parse_ib),
+        ('富途证券(旧版)', FUTU_OLD_COLUMNS, parser._parse_futu_old),
+    ]:
+        df = make_frame(rows, columns)
+        print(f"\n{name}:")
+        legacy, legacy_time = bench('iterrows', legacy_parse, parser, df, columns)
+        columnar, columnar_time = bench('按列解析', method, df)
+        assert legacy == columnar, "两种解析结果不一致"
+        print(f"  加速比: {legacy_time / columnar_time:.1f}x，结果一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+盈亏全量重算基准 - 按标的分片的多进程FIFO计算
+
+用 PnLCalculator.rebuild_lot_ledger 从全部交易重算持仓和未平仓批次，
+对比不同进程数的耗时（存储为内存实现，只计计算和进程间传输的开销）。
+
+用法: python benchmarks/bench_pnl_parallel.py [交易数] [标的数] [进程数,...]
+"""
+import sys
+import os
+import time
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.calculator import PnLCalculator
+from bench_fifo_rebuild import make_trades
+
+logging.disable(logging.WARNING)
+
+
+class MemoryStorage:
+    """只实现重算用到的接口"""
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.positions = []
+        self.lots = {}
+
+    def get_all_trades(self):
+        return self.trades
+
+    def update_positions(self, positions):
+        self.positions = positions
+
+    def save_lot_ledger(self, lots_by_symbol, trade_keys):
+        self.lots = lots_by_symbol
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    worker_counts = [int(n) for n in sys.argv[3].split(',')] if len(sys.argv) > 3 else [1, 2, 4, 8, 16]
+    trades = make_trades(count, symbols)
+    print(f"交易记录: {count} 条, 标的: {symbols} 个, CPU核数: {os.cpu_count()}")
+
+    baseline = None
+    reference = None
+    for workers in worker_counts:
+        storage = MemoryStorage(trades)
+        start = time.perf_counter()
+        PnLCalculator(storage, workers=workers).rebuild_lot_ledger()
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        result = ([(p['symbol'], p['total_quantity'], p['avg_cost']) for p in storage.positions], storage.lots)
+        reference = reference or result
+        print(f"  进程数={workers:<3d} 耗时={elapsed:7.2f}秒  加速={baseline / elapsed:5.2f}x  "
+              f"结果一致={result == reference}")
+
+
+if __name__ == '__main__':
+    main()
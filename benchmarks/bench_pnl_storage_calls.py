@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+盈亏计算存储调用基准 - 逐条写入已平仓记录 vs 批量写入
+
+用内存中的假电子表格替代Google Sheets，统计导入一个文件时
+PnLCalculator 产生的适配器调用次数和Sheets API请求次数。
+
+用法: python benchmarks/bench_pnl_storage_calls.py [交易数]
+"""
+import sys
+import os
+import time
+import logging
+from collections import Counter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.calculator import PnLCalculator
+from app.google_sheets_adapter import GoogleSheetsAdapter, LEDGER_WORKSHEETS, WORKSHEET_HEADERS
+from app.sheets_cache import SheetCache
+from app.sheets_writer import SheetWriteBuffer
+
+logging.disable(logging.WARNING)
+
+SYMBOLS = [f'SYM{i:03d}' for i in range(300)]
+
+HEADERS = {
+    'positions': [
+        'id', 'symbol', 'security_name', 'security_type',
+        'total_quantity', 'avg_cost', 'total_cost',
+        'current_price', 'market_value', 'unrealized_pnl', 'unrealized_pnl_pct',
+        'last_trade_date', 'updated_at'
+    ],
+    'closed_positions': [
+        'id', 'symbol', 'security_name',
+        'open_date', 'close_date', 'holding_days',
+        'quantity', 'open_price', 'close_price',
+        'total_cost', 'total_revenue', 'commission',
+        'net_pnl', 'pnl_pct', 'created_at'
+    ],
+    **LEDGER_WORKSHEETS,
+}
+
+
+class FakeWorksheet:
+    """只实现适配器用到的 gspread.Worksheet 方法，每次调用计为一次API请求"""
+
+    def __init__(self, name, headers, requests):
+        self.name = name
+        self.rows = [list(headers)]
+        self.requests = requests
+
+    def _count(self, method):
+        self.requests[f'{self.name}.{method}'] += 1
+
+    def get_all_records(self):
+        self._count('get_all_records')
+        headers = self.rows[0]
+        return [dict(zip(headers, row)) for row in self.rows[1:]]
+
+    def col_values(self, col):
+        self._count('col_values')
+        return [row[col - 1] for row in self.rows]
+
+    def append_row(self, row):
+        self._count('append_row')
+        self.rows.append(list(row))
+
+    def append_rows(self, rows):
+        self._count('append_rows')
+        self.rows.extend(list(row) for row in rows)
+
+    def batch_update(self, data):
+        self._count('batch_update')
+        for item in data:
+            index = int(item['range'].split(':')[0][1:]) - 1
+            self.rows[index] = list(item['values'][0])
+
+    def update(self, range_name, values):
+        self._count('update')
+        self.rows = [list(row) for row in values]
+
+    def clear(self):
+        self._count('clear')
+        self.rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.requests = Counter()
+        self.sheets = {name: FakeWorksheet(name, headers, self.requests) for name, headers in HEADERS.items()}
+
+    def worksheet(self, name):
+        return self.sheets[name]
+
+
+class CountingAdapter(GoogleSheetsAdapter):
+    """不连接Google，统计适配器方法调用次数"""
+
+    def __init__(self, cache_ttl=0):
+        self.spreadsheet = FakeSpreadsheet()
+        self.cache = SheetCache(cache_ttl)
+        self.writer = SheetWriteBuffer(self._worksheet, list(WORKSHEET_HEADERS), 0, 0)
+        self.calls = Counter()
+
+    def __getattribute__(self, name):
+        if not name.startswith('_') and name not in ('spreadsheet', 'cache', 'writer', 'calls'):
+            self.calls[name] += 1
+        return super().__getattribute__(name)
+
+
+class PerRowAdapter(CountingAdapter):
+    """原实现：每配对一个批次就写入一条已平仓记录"""
+
+    def insert_closed_positions(self, closed_list):
+        for closed_data in closed_list:
+            self.insert_closed_position(closed_data)
+
+    def insert_closed_position(self, closed_data):
+        GoogleSheetsAdapter.insert_closed_positions(self, [closed_data])
+
+
+def make_trades(count: int):
+    """每个标的先分两批买入，再分三次卖出，每次卖出跨越多个批次"""
+    trades = []
+    for i in range(count):
+        symbol = SYMBOLS[i % len(SYMBOLS)]
+        step = i // len(SYMBOLS)
+        action = 'BUY' if step % 5 < 2 else 'SELL'
+        quantity = 30 if action == 'BUY' else 20
+        trades.append({
+            'trade_date': f'2025-{step // 28 % 12 + 1:02d}-{step % 28 + 1:02d}',
+            'trade_time': f'10:{step % 60:02d}:00',
+            'symbol': symbol, 'action': action,
+            'quantity': quantity, 'price': 100.0 + step, 'amount': quantity * (100.0 + step),
+            'commission': 1.0, 'account_id': '',
+        })
+    return trades
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    trades = make_trades(count)
+    print(f"交易记录: {count} 条, 标的: {len(SYMBOLS)} 个")
+
+    variants = (
+        ('逐条写入', PerRowAdapter, 0),
+        ('批量写入', CountingAdapter, 0),
+        ('批量写入+读缓存(两次导入)', CountingAdapter, 300),
+    )
+    for label, adapter_class, cache_ttl in variants:
+        adapter = adapter_class(cache_ttl)
+        start = time.perf_counter()
+        result = PnLCalculator(adapter).process_trades(trades)
+        if cache_ttl:
+            # 再导入一次同一文件：交易全部已计入账本，读取全部命中缓存
+            PnLCalculator(adapter).process_trades(trades)
+        elapsed = time.perf_counter() - start
+
+        requests = adapter.spreadsheet.requests
+        closed_requests = sum(v for k, v in requests.items() if k.startswith('closed_positions.'))
+        print(f"  {label}: 已平仓={result['closed_positions']}  "
+              f"适配器调用={sum(adapter.calls.values())}  "
+              f"API请求={sum(requests.values())} (已平仓表 {closed_requests})  耗时={elapsed:.2f}秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+SQLite并发基准 - N个读线程 vs 1个写线程
+
+对比每次调用新建连接（回滚日志模式）与连接池（WAL模式）下，
+仪表盘类查询在导入写入期间的延迟和吞吐量。
+
+用法: python benchmarks/bench_sqlite_concurrency.py [读线程数] [持续秒数]
+"""
+import sys
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import numpy as np
+
+from app.database import SQLiteAdapter, TradeRecord
+
+logging.disable(logging.WARNING)
+
+SYMBOLS = ['AAPL', 'TSLA', 'NVDA', 'MSFT', 'AMZN', 'META', 'GOOG', 'AVGO']
+
+
+class LegacyAdapter(SQLiteAdapter):
+    """原实现：每次调用新建连接，默认回滚日志模式"""
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.close()
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+    @contextmanager
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def make_trades(count: int, offset: int):
+    """生成交易记录，时间各不相同以免被去重跳过"""
+    return [TradeRecord(
+        trade_date=f'2024-{(i // 28) % 12 + 1:02d}-{i % 28 + 1:02d}',
+        trade_time=f'{(offset + i) % 86400 // 3600:02d}:{(offset + i) % 3600 // 60:02d}:{(offset + i) % 60:02d}',
+        symbol=SYMBOLS[i % len(SYMBOLS)],
+        action='BUY' if i % 2 else 'SELL',
+        quantity=1 + i % 100,
+        price=100.0 + (offset + i) % 50,
+        amount=(1 + i % 100) * (100.0 + (offset + i) % 50),
+    ) for i in range(count)]
+
+
+def run(adapter: SQLiteAdapter, readers: int, duration: float) -> dict:
+    """写线程持续按批导入，读线程持续执行仪表盘查询"""
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    errors = []
+    written = [0]
+
+    def writer():
+        batch = 0
+        while not stop.is_set():
+            trades = make_trades(500, batch * 500)
+            if adapter.save_trades(trades):
+                written[0] += len(trades)
+            batch += 1
+
+    def reader(slot):
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                adapter.get_statistics()
+                adapter.get_trades(limit=100, filters={'symbol': SYMBOLS[slot % len(SYMBOLS)]})
+            except Exception as e:
+                errors.append(str(e))
+            latencies[slot].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    samples = np.array([value for values in latencies for value in values]) * 1000
+    return {
+        'reads': len(samples),
+        'p50': float(np.percentile(samples, 50)) if len(samples) else 0.0,
+        'p99': float(np.percentile(samples, 99)) if len(samples) else 0.0,
+        'max': float(samples.max()) if len(samples) else 0.0,
+        'written': written[0],
+        'errors': len(errors),
+    }
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    print(f"读线程: {readers}, 写线程: 1, 持续: {duration}秒")
+    with tempfile.TemporaryDirectory() as folder:
+        for label, adapter_class in (('每次新建连接', LegacyAdapter), ('连接池+WAL', SQLiteAdapter)):
+            adapter = adapter_class(os.path.join(folder, f'{adapter_class.__name__}.db'))
+            adapter.save_trades(make_trades(20000, 10 ** 6))
+            result = run(adapter, readers, duration)
+            adapter.close()
+            print(f"  {label:<10s} 读取={result['reads'] / duration:8.0f} 次/秒  "
+                  f"p50={result['p50']:7.2f}ms  p99={result['p99']:8.2f}ms  max={result['max']:8.2f}ms  "
+                  f"写入={result['written'] / duration:8.0f} 条/秒  错误={result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+SQLite批量写入基准 - 逐行查重插入 vs 唯一索引 + executemany
+
+用法: python benchmarks/bench_sqlite_insert.py [行数]
+"""
+import sys
+import os
+import time
+import logging
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.database import SQLiteAdapter, TradeRecord
+
+logging.disable(logging.WARNING)
+
+SYMBOLS = ['AAPL', 'TSLA', 'NVDA', 'MSFT', 'AMZN', 'META', 'GOOG', 'AVGO']
+
+
+def make_trades(count: int):
+    return [TradeRecord(
+        trade_date=f'2024-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}',
+        trade_time=f'{i % 86400 // 3600:02d}:{i % 3600 // 60:02d}:{i % 60:02d}',
+        symbol=SYMBOLS[i % len(SYMBOLS)],
+        action='BUY' if i % 2 else 'SELL',
+        quantity=1 + i % 100,
+        price=100.0 + i % 997,
+        amount=(1 + i % 100) * (100.0 + i % 997),
+    ) for i in range(count)]
+
+
+def legacy_save(adapter: SQLiteAdapter, trades) -> int:
+    """原实现：逐行 SELECT 查重再单行 INSERT"""
+    inserted = 0
+    with adapter.get_connection() as conn:
+        cursor = conn.cursor()
+        for trade in trades:
+            cursor.execute('''
+                SELECT id FROM trades
+                WHERE trade_date = ? AND trade_time = ? AND symbol = ?
+                AND action = ? AND quantity = ? AND price = ?
+                LIMIT 1
+            ''', (trade.trade_date, trade.trade_time, trade.symbol,
+                  trade.action, trade.quantity, trade.price))
+            if cursor.fetchone():
+                continue
+            values = trade.to_dict()
+            del values['id']
+            cursor.execute(f"INSERT INTO trades ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                           list(values.values()))
+            inserted += 1
+        conn.commit()
+    return inserted
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trades = make_trades(rows)
+    print(f"交易记录: {rows} 条")
+
+    with tempfile.TemporaryDirectory() as folder:
+        # 原实现没有自然键索引，用去掉唯一索引的数据库模拟
+        legacy = SQLiteAdapter(os.path.join(folder, 'legacy.db'))
+        with legacy.get_connection() as conn:
+            conn.execute("DROP INDEX idx_trade_natural_key")
+            conn.commit()
+        start = time.perf_counter()
+        inserted = legacy_save(legacy, trades)
+        elapsed = time.perf_counter() - start
+        print(f"  逐行查重插入   {elapsed:8.3f}s  ({inserted} 条)")
+        legacy.close()
+
+        adapter = SQLiteAdapter(os.path.join(folder, 'bulk.db'))
+        start = time.perf_counter()
+        result = adapter.save_trades_bulk(trades)
+        print(f"  批量插入       {time.perf_counter() - start:8.3f}s  {result}")
+
+        start = time.perf_counter()
+        result = adapter.save_trades_bulk(trades)
+        print(f"  重复导入       {time.perf_counter() - start:8.3f}s  {result}")
+        adapter.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -41,8 +41,8 @@ function App() {
       const formData = new FormData()
       formData.append('file', file)
 
-      await importTrades(formData)
-      message.success('文件导入成功')
+      const job = await importTrades(formData)
+      message.success(job.message || '文件导入成功')
       fetchTrades()
       fetchStatistics()
     } catch (error) {
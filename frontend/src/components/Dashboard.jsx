@@ -37,101 +37,18 @@ ChartJS.register(
 )
 
 function Dashboard() {
-  const { trades, statistics, fetchTrades, fetchStatistics } = useTradeStore()
+  const { statistics, fetchStatistics } = useTradeStore()
 
   useEffect(() => {
-    fetchTrades()
     fetchStatistics()
-  }, [fetchTrades, fetchStatistics])
+  }, [fetchStatistics])
 
-  // 计算月度交易统计
-  const monthlyStats = React.useMemo(() => {
-    const stats = {}
-
-    trades.forEach(trade => {
-      const month = dayjs(trade.trade_date).format('YYYY-MM')
-      if (!stats[month]) {
-        stats[month] = {
-          month,
-          trades: 0,
-          profit: 0,
-          amount: 0,
-          buyCount: 0,
-          sellCount: 0
-        }
-      }
-
-      stats[month].trades++
-      stats[month].amount += trade.amount
-
-      if (trade.action === 'BUY') {
-        stats[month].buyCount++
-      } else {
-        stats[month].sellCount++
-        // 简单的盈亏计算 (这里需要更复杂的逻辑来匹配买卖)
-        stats[month].profit += trade.close_price ? (trade.close_price - trade.price) * trade.quantity : 0
-      }
-    })
-
-    return Object.values(stats).sort((a, b) => a.month.localeCompare(b.month))
-  }, [trades])
-
-  // 按标的统计
-  const symbolStats = React.useMemo(() => {
-    const stats = {}
-
-    trades.forEach(trade => {
-      if (!stats[trade.symbol]) {
-        stats[trade.symbol] = {
-          symbol: trade.symbol,
-          trades: 0,
-          amount: 0,
-          type: trade.security_type
-        }
-      }
-
-      stats[trade.symbol].trades++
-      stats[trade.symbol].amount += trade.amount
-    })
-
-    return Object.values(stats)
-      .sort((a, b) => b.amount - a.amount)
-      .slice(0, 10)
-  }, [trades])
-
-  // 评分分布
-  const ratingDistribution = React.useMemo(() => {
-    const distribution = { 1: 0, 2: 0, 3: 0, 4: 0, 5: 0 }
-
-    trades.forEach(trade => {
-      if (trade.trade_rating > 0) {
-        const rating = Math.round(trade.trade_rating)
-        distribution[rating] = (distribution[rating] || 0) + 1
-      }
-    })
-
-    return distribution
-  }, [trades])
-
-  // 消息来源统计
-  const sourceStats = React.useMemo(() => {
-    const stats = {}
-
-    trades.forEach(trade => {
-      if (trade.source) {
-        if (!stats[trade.source]) {
-          stats[trade.source] = { source: trade.source, count: 0, profit: 0 }
-        }
-        stats[trade.source].count++
-        // 简单盈亏计算
-        if (trade.close_price && trade.action === 'SELL') {
-          stats[trade.source].profit += (trade.close_price - trade.price) * trade.quantity
-        }
-      }
-    })
-
-    return Object.values(stats).sort((a, b) => b.count - a.count)
-  }, [trades])
+  // 月度、标的、评分和消息来源统计由 /api/statistics 在服务端对全部交易聚合
+  // （交易列表是分页加载的，不能用它计算）
+  const monthlyStats = statistics.monthly || []
+  const symbolStats = statistics.top_symbols || []
+  const ratingDistribution = statistics.rating_distribution || { 1: 0, 2: 0, 3: 0, 4: 0, 5: 0 }
+  const sourceStats = statistics.sources || []
 
   // 图表配置
   const monthlyChartConfig = {
@@ -340,7 +257,7 @@ function Dashboard() {
                     </div>
                     <Progress
                       type="circle"
-                      percent={Math.round((count / trades.filter(t => t.trade_rating > 0).length) * 100) || 0}
+                      percent={Math.round((count / statistics.rated_trades) * 100) || 0}
                       format={() => `${count} 笔`}
                       strokeColor={rating >= 4 ? '#52c41a' : rating >= 3 ? '#faad14' : '#ff4d4f'}
                     />
@@ -1,4 +1,4 @@
-import React, { useState } from 'react'
+import React, { useEffect, useState } from 'react'
 import {
   Table,
   Button,
@@ -30,33 +30,48 @@ function TradeList({ trades, loading, onEdit }) {
   const [securityTypeFilter, setSecurityTypeFilter] = useState('')
   const [viewModalVisible, setViewModalVisible] = useState(false)
   const [selectedTrade, setSelectedTrade] = useState(null)
+  const [pageSize, setPageSize] = useState(20)
+  const [filtersTouched, setFiltersTouched] = useState(false)
 
-  const { deleteTrade } = useTradeStore()
+  const { deleteTrade, fetchTrades, fetchMoreTrades, hasMore } = useTradeStore()
 
-  // 过滤交易记录
-  const filteredTrades = trades.filter(trade => {
-    let matchesSearch = true
-    let matchesDate = true
-    let matchesSecurityType = true
+  // 证券类型和日期范围在服务端过滤，变化后从第一页重新加载
+  useEffect(() => {
+    if (!filtersTouched) return
 
-    if (searchText) {
-      matchesSearch = trade.symbol.toLowerCase().includes(searchText.toLowerCase()) ||
-                     trade.security_name.toLowerCase().includes(searchText.toLowerCase()) ||
-                     trade.source.toLowerCase().includes(searchText.toLowerCase())
+    const filters = {}
+    if (securityTypeFilter) {
+      filters.security_type = securityTypeFilter
     }
-
     if (dateRange && dateRange.length === 2) {
-      const tradeDate = dayjs(trade.trade_date)
-      matchesDate = tradeDate.isAfter(dateRange[0]) && tradeDate.isBefore(dateRange[1])
+      filters.start_date = dateRange[0].format('YYYY-MM-DD')
+      filters.end_date = dateRange[1].format('YYYY-MM-DD')
     }
+    fetchTrades(filters).catch(error => message.error(`加载失败: ${error.message}`))
+  }, [securityTypeFilter, dateRange, filtersTouched, fetchTrades])
 
-    if (securityTypeFilter) {
-      matchesSecurityType = trade.security_type === securityTypeFilter
-    }
+  // 搜索只在已加载的记录中过滤
+  const filteredTrades = trades.filter(trade => {
+    if (!searchText) return true
 
-    return matchesSearch && matchesDate && matchesSecurityType
+    const keyword = searchText.toLowerCase()
+    return (trade.symbol || '').toLowerCase().includes(keyword) ||
+           (trade.security_name || '').toLowerCase().includes(keyword) ||
+           (trade.source || '').toLowerCase().includes(keyword)
   })
 
+  const loadMore = () => {
+    fetchMoreTrades().catch(error => message.error(`加载失败: ${error.message}`))
+  }
+
+  // 翻到已加载数据的最后一页时自动加载下一批
+  const handlePageChange = (page, size) => {
+    setPageSize(size)
+    if (hasMore && page * size >= filteredTrades.length) {
+      loadMore()
+    }
+  }
+
   const handleDelete = async (tradeId) => {
     Modal.confirm({
       title: '确认删除',
@@ -263,7 +278,10 @@ function TradeList({ trades, loading, onEdit }) {
           <Select
             placeholder="证券类型"
             value={securityTypeFilter}
-            onChange={setSecurityTypeFilter}
+            onChange={(value) => {
+              setFiltersTouched(true)
+              setSecurityTypeFilter(value || '')
+            }}
             style={{ width: 120 }}
             allowClear
           >
@@ -273,7 +291,10 @@ function TradeList({ trades, loading, onEdit }) {
           <RangePicker
             placeholder={['开始日期', '结束日期']}
             value={dateRange}
-            onChange={setDateRange}
+            onChange={(value) => {
+              setFiltersTouched(true)
+              setDateRange(value)
+            }}
             style={{ width: 240 }}
           />
         </Space>
@@ -286,14 +307,23 @@ function TradeList({ trades, loading, onEdit }) {
         rowKey="id"
         pagination={{
           total: filteredTrades.length,
-          pageSize: 20,
+          pageSize,
           showSizeChanger: true,
           showQuickJumper: true,
-          showTotal: (total) => `共 ${total} 条记录`,
+          showTotal: (total) => hasMore ? `已加载 ${total} 条记录` : `共 ${total} 条记录`,
+          onChange: handlePageChange,
         }}
         scroll={{ x: 1200 }}
       />
 
+      {hasMore && (
+        <div style={{ textAlign: 'center', marginTop: 16 }}>
+          <Button onClick={loadMore} loading={loading}>
+            加载更多
+          </Button>
+        </div>
+      )}
+
       {/* 查看详情模态框 */}
       <Modal
         title="交易详情"
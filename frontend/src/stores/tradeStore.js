@@ -1,18 +1,50 @@
 import { create } from 'zustand'
 import api from '../services/api'
 
+const PAGE_SIZE = 200
+
 const useTradeStore = create((set, get) => ({
   trades: [],
   loading: false,
   statistics: {},
   currentTrade: null,
+  filters: {},
+  nextCursor: null,
+  hasMore: false,
+
+  // 获取交易列表第一页（不传过滤条件时沿用上一次的条件）
+  fetchTrades: async (filters = get().filters) => {
+    set({ loading: true, filters })
+    try {
+      const data = await api.get('/trades', { params: { ...filters, limit: PAGE_SIZE } })
+      set({
+        trades: data.trades,
+        nextCursor: data.next_cursor,
+        hasMore: data.has_more,
+        loading: false
+      })
+    } catch (error) {
+      set({ loading: false })
+      throw error
+    }
+  },
+
+  // 按游标加载下一页并追加到列表
+  fetchMoreTrades: async () => {
+    const { nextCursor, hasMore, loading, filters } = get()
+    if (!hasMore || loading) return
 
-  // 获取交易列表
-  fetchTrades: async (filters = {}) => {
     set({ loading: true })
     try {
-      const data = await api.get('/trades', { params: filters })
-      set({ trades: data.trades, loading: false })
+      const data = await api.get('/trades', {
+        params: { ...filters, limit: PAGE_SIZE, cursor: nextCursor }
+      })
+      set({
+        trades: [...get().trades, ...data.trades],
+        nextCursor: data.next_cursor,
+        hasMore: data.has_more,
+        loading: false
+      })
     } catch (error) {
       set({ loading: false })
       throw error
@@ -67,15 +99,25 @@ const useTradeStore = create((set, get) => ({
     }
   },
 
-  // 导入交易
-  importTrades: async (formData) => {
+  // 导入交易：上传后由后台任务导入，轮询任务状态直到结束
+  importTrades: async (formData, onProgress) => {
     try {
-      const data = await api.post('/import', formData, {
+      let job = await api.post('/import', formData, {
         headers: {
           'Content-Type': 'multipart/form-data'
         }
       })
-      return data
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        job = await api.get(`/import/${job.job_id}`)
+        if (onProgress) {
+          onProgress(job)
+        }
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.errors.join('; '))
+      }
+      return job
     } catch (error) {
       throw error
     }
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试CSV解析（编码/分隔符探测、分块流式读取）
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app.parser import ExcelParser
+
+FUTU_ROWS = [
+    ['成交日期', '成交时间', '证券代码', '证券名称', '交易方向', '成交数量', '成交价格', '成交金额', '手续费'],
+    ['2025-01-02', '09:30:00', '000001', '平安银行', '买入', '100', '10.5', '1050', '5'],
+    ['2025-01-03', '10:00:00', '600519', '贵州茅台', '卖出', '10', '1500', '15000', '8'],
+    ['2025/01/06', '14:59', '000001', '平安银行', '卖出', '100', '11', '1100', '5'],
+]
+
+
+def write_csv(rows, encoding, delimiter):
+    """写入临时CSV文件"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', encoding=encoding, newline='') as f:
+        for row in rows:
+            f.write(delimiter.join(row) + '\r\n')
+    return path
+
+
+def test_csv_encodings_and_delimiters():
+    """测试GBK/UTF-8-BOM编码和不同分隔符"""
+    print("CSV编码/分隔符探测测试")
+    print("=" * 50)
+
+    parser = ExcelParser()
+    for encoding, delimiter in [('gbk', ','), ('utf-8-sig', ';'), ('utf-8', '\t')]:
+        path = write_csv(FUTU_ROWS, encoding, delimiter)
+        try:
+            trades = parser.parse_file(path)
+            print(f"{encoding:10s} {delimiter!r:6s} -> {len(trades)} 条记录")
+
+            assert len(trades) == 3
+            assert trades[0]['symbol'] == '000001'
+            assert trades[0]['security_name'] == '平安银行'
+            assert trades[0]['action'] == 'BUY'
+            assert trades[0]['amount'] == 1050.0
+            assert trades[2]['trade_date'] == '2025-01-06'
+            assert trades[2]['trade_time'] == '14:59:00'
+            assert trades[1]['broker'] == '富途证券'
+        finally:
+            os.remove(path)
+
+
+def test_csv_streaming_chunks():
+    """测试分块流式读取"""
+    print("\nCSV分块读取测试")
+    print("=" * 50)
+
+    rows = FUTU_ROWS[:1] + FUTU_ROWS[1:] * 10
+    path = write_csv(rows, 'gbk', ',')
+    chunk_size = Config.PARSE_CHUNK_SIZE
+    Config.PARSE_CHUNK_SIZE = 7
+    try:
+        parser = ExcelParser()
+        batches = [len(batch) for batch in parser.iter_batches(path)]
+        print(f"分块大小: {batches}")
+        assert batches == [7, 7, 7, 7, 2]
+
+        trades = list(parser.iter_file(path))
+        assert len(trades) == 30
+        assert [t['symbol'] for t in trades] == [t['symbol'] for t in parser.parse_file(path)]
+    finally:
+        Config.PARSE_CHUNK_SIZE = chunk_size
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    test_csv_encodings_and_delimiters()
+    test_csv_streaming_chunks()
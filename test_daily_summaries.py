@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试多日汇总回填：一次计算的结果与逐日 calculate_daily_summary 一致
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.calculator import PnLCalculator
+from app.database import SQLiteAdapter
+from test_fifo_engine import random_trades
+
+FIELDS = ('summary_date', 'total_trades', 'buy_trades', 'sell_trades', 'total_volume', 'total_commission',
+          'realized_pnl', 'winning_trades', 'losing_trades', 'win_rate', 'largest_profit', 'largest_loss',
+          'avg_profit', 'avg_loss', 'profit_factor')
+
+
+def assert_same(actual, expected):
+    for field in FIELDS:
+        if isinstance(expected[field], float):
+            assert abs(actual[field] - expected[field]) <= 1e-9 * max(1.0, abs(expected[field])), \
+                (expected['summary_date'], field, actual[field], expected[field])
+        else:
+            assert actual[field] == expected[field], (expected['summary_date'], field, actual[field], expected[field])
+
+
+def test_summaries_match_per_day():
+    """区间内每一天（含无交易日）的汇总与逐日计算一致，并可一次批量写入"""
+    print("多日汇总回填测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            trades = random_trades(3, 1500)
+            storage.insert_trades(trades)
+            calculator = PnLCalculator(storage)
+            calculator.process_trades(trades)
+
+            summaries = calculator.calculate_daily_summaries('2023-12-25', '2024-03-10')
+            assert [s['summary_date'] for s in summaries][:2] == ['2023-12-25', '2023-12-26']
+            assert summaries[-1]['summary_date'] == '2024-03-10'
+
+            for summary in summaries:
+                assert_same(summary, calculator.calculate_daily_summary(summary['summary_date']))
+            trading_days = [s for s in summaries if s['total_trades']]
+            print(f"共 {len(summaries)} 天, 有交易 {len(trading_days)} 天")
+            assert len(trading_days) > 30 and any(s['losing_trades'] for s in trading_days)
+
+            # 默认从最早的交易日期开始
+            assert calculator.calculate_daily_summaries(end='2024-01-05')[0]['summary_date'] == \
+                min(t['trade_date'] for t in trades)
+
+            storage.insert_or_update_daily_summaries(summaries)
+            storage.insert_or_update_daily_summaries(summaries[-10:])
+            with storage.get_connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM daily_summary").fetchone()[0] == len(summaries)
+        finally:
+            storage.close()
+
+
+if __name__ == '__main__':
+    test_summaries_match_per_day()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+测试Dashboard预聚合：SQLite按批增量维护、迁移回填、Sheets按缓存版本复用、/api/dashboard
+"""
+import sys
+import os
+import random
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app.database import SQLiteAdapter
+from app import web_api
+from test_hybrid_adapter import make_trade
+from test_sheets_cache import make_adapter
+
+
+def legacy_dashboard(trades, positions, closed_positions):
+    """原 /api/dashboard 的计算方式：读取全部记录后逐条统计"""
+    total_pnl = sum(float(cp.get('net_pnl', 0)) for cp in closed_positions)
+    winning = len([cp for cp in closed_positions if float(cp.get('net_pnl', 0)) > 0])
+    daily_pnl = {t['trade_date']: 0 for t in trades if t.get('trade_date')}
+    for cp in closed_positions:
+        if cp.get('close_date') in daily_pnl:
+            daily_pnl[cp['close_date']] += float(cp.get('net_pnl', 0))
+
+    def ranking(sign):
+        by_symbol = {}
+        for cp in closed_positions:
+            pnl = float(cp.get('net_pnl', 0))
+            if pnl * sign > 0:
+                data = by_symbol.setdefault(cp['symbol'], {'pnl': 0, 'trades': 0, 'total_cost': 0})
+                data['pnl'] += pnl
+                data['trades'] += 1
+                data['total_cost'] += float(cp.get('total_cost', 0))
+        ranked = sorted(by_symbol.items(), key=lambda x: x[1]['pnl'], reverse=sign > 0)[:5]
+        return [(symbol, round(data['pnl'], 6), data['trades']) for symbol, data in ranked]
+
+    return {
+        'total_trades': len(trades),
+        'total_pnl': round(total_pnl, 6),
+        'win_rate': round(winning / len(closed_positions) * 100, 6) if closed_positions else 0,
+        'positions_count': len([p for p in positions if float(p.get('total_quantity', 0)) > 0]),
+        'daily_trend': [(date, round(daily_pnl[date], 6)) for date in sorted(daily_pnl)[-30:]],
+        'top_profits': ranking(1),
+        'top_losses': ranking(-1),
+    }
+
+
+def comparable(data):
+    """把聚合结果转成与 legacy_dashboard 相同的结构（金额保留6位小数）"""
+    overview = data['overview']
+    return {
+        'total_trades': overview['total_trades'],
+        'total_pnl': round(overview['total_pnl'], 6),
+        'win_rate': round(overview['win_rate'], 6),
+        'positions_count': overview['positions_count'],
+        'daily_trend': [(d['date'], round(d['pnl'], 6)) for d in data['daily_trend']],
+        'top_profits': [(r['symbol'], round(r['pnl'], 6), r['trades']) for r in data['top_profits']],
+        'top_losses': [(r['symbol'], round(r['pnl'], 6), r['trades']) for r in data['top_losses']],
+    }
+
+
+def make_records(seed, days=40, per_day=3):
+    """生成交易和对应的已平仓记录，平仓日期都是交易日"""
+    rng = random.Random(seed)
+    symbols = ['AAPL', 'TSLA', 'NVDA', 'MSFT', 'AMZN', 'META', 'GOOG']
+    trades, closed = [], []
+    for day in range(days):
+        date = f'2025-{day // 28 + 1:02d}-{day % 28 + 1:02d}'
+        for i in range(per_day):
+            symbol = rng.choice(symbols)
+            trades.append(make_trade(symbol, rng.randint(1, 50), date, f'10:{i:02d}:{seed % 60:02d}'))
+            if rng.random() < 0.7:
+                closed.append({'symbol': symbol, 'close_date': date, 'total_cost': 1000.0,
+                               'net_pnl': round(rng.uniform(-100, 100), 2)})
+    return trades, closed
+
+
+def expected(storage):
+    return legacy_dashboard(
+        storage.get_all_trades(), storage.get_open_positions(), storage.get_all_closed_positions())
+
+
+def test_sqlite_aggregates_match_full_recompute():
+    """SQLite聚合表随每次写入增量更新，结果与逐条计算一致"""
+    print("Dashboard预聚合测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        for seed in range(3):
+            trades, closed = make_records(seed)
+            storage.insert_trades(trades)
+            storage.insert_closed_positions(closed)
+            assert comparable(storage.get_dashboard_aggregates()) == expected(storage)
+
+        storage.update_positions([
+            {'symbol': 'AAPL', 'total_quantity': 10}, {'symbol': 'TSLA', 'total_quantity': 0}])
+        assert storage.get_dashboard_aggregates()['overview']['positions_count'] == 1
+
+        # 重复导入的交易不计数；修改交易日期、删除交易、重建已平仓记录后同样一致
+        storage.insert_trades(make_records(0)[0])
+        storage.delete_trade(storage.get_all_trades()[0]['id'])
+        storage.update_trade(storage.get_all_trades()[0]['id'], {'trade_date': '2025-03-20'})
+        assert comparable(storage.get_dashboard_aggregates()) == expected(storage)
+        storage.replace_closed_positions(make_records(7)[1])
+        assert comparable(storage.get_dashboard_aggregates()) == expected(storage)
+
+        storage.replace_closed_positions([])
+        data = storage.get_dashboard_aggregates()
+        assert data['overview']['total_pnl'] == 0 and data['top_profits'] == [] and data['top_losses'] == []
+        storage.close()
+
+
+def test_migration_backfills_existing_database():
+    """已有数据库升级时从现有记录回填聚合表"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'trading.db')
+        storage = SQLiteAdapter(path)
+        trades, closed = make_records(1)
+        storage.insert_trades(trades)
+        storage.insert_closed_positions(closed)
+        storage.close()
+
+        # 退回迁移前的数据库
+        conn = sqlite3.connect(path)
+        for table in ('dashboard_overview', 'dashboard_daily_pnl', 'dashboard_symbol_pnl'):
+            conn.execute(f"DROP TABLE {table}")
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+        conn.close()
+
+        storage = SQLiteAdapter(path)
+        assert comparable(storage.get_dashboard_aggregates()) == expected(storage)
+        storage.close()
+
+
+def test_sheets_aggregates_reuse_cache():
+    """Sheets适配器按读缓存版本复用聚合结果，写入后重新计算"""
+    adapter = make_adapter()
+    trades, closed = make_records(2)
+    adapter.insert_trades(trades)
+    adapter.insert_closed_positions(closed)
+    assert comparable(adapter.get_dashboard_aggregates()) == expected(adapter)
+
+    requests = adapter.spreadsheet.requests
+    requests.clear()
+    first = adapter.get_dashboard_aggregates()
+    assert adapter.get_dashboard_aggregates() == first
+    assert sum(requests.values()) == 0
+
+    adapter.insert_closed_position({'symbol': 'AAPL', 'close_date': '2025-02-12', 'total_cost': 10, 'net_pnl': 500})
+    assert adapter.get_dashboard_aggregates()['top_profits'][0]['symbol'] == 'AAPL'
+    assert comparable(adapter.get_dashboard_aggregates()) == expected(adapter)
+
+
+def test_dashboard_endpoint():
+    """/api/dashboard 返回预聚合的数据"""
+    saved = vars(Config)['get_storage_adapter']
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        trades, closed = make_records(3)
+        storage.insert_trades(trades)
+        storage.insert_closed_positions(closed)
+        try:
+            Config.get_storage_adapter = classmethod(lambda cls: storage)
+            client = web_api.create_app().test_client()
+        finally:
+            Config.get_storage_adapter = saved
+
+        response = client.get('/api/dashboard')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert set(data) == {'overview', 'daily_trend', 'top_profits', 'top_losses', 'last_updated'}
+        assert comparable(data) == expected(storage)
+        storage.close()
+
+
+if __name__ == '__main__':
+    test_sqlite_aggregates_match_full_recompute()
+    test_migration_backfills_existing_database()
+    test_sheets_aggregates_reuse_cache()
+    test_dashboard_endpoint()
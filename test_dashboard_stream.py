@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+测试Dashboard实时推送：增量计算、/api/stream 的快照和增量事件、开发服务器下由单个线程推送所有连接
+"""
+import sys
+import os
+import json
+import socket
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from werkzeug.serving import make_server
+
+from app.config import Config
+from app.dashboard_aggregates import dashboard_delta
+from app.database import SQLiteAdapter
+from app.event_stream import EventStreamRequestHandler
+from app import web_api
+from test_dashboard_aggregates import make_records
+
+
+def parse_events(data: bytes):
+    """把SSE数据流解析为 (事件名, 数据) 列表，忽略 retry 和注释"""
+    events = []
+    for block in data.decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def next_events(chunks):
+    """读取响应体直到收到事件（跳过保活注释）"""
+    while True:
+        events = parse_events(next(chunks))
+        if events:
+            return events
+
+
+def with_timeout(func, timeout=10):
+    """在线程中执行 func，超时则测试失败（避免读取事件时一直阻塞）"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert result, '等待推送超时'
+    return result[0]
+
+
+class stream_app:
+    """临时SQLite数据库上的 web_api 应用，推送间隔缩短为0.05秒"""
+
+    def __enter__(self):
+        self.saved = vars(Config)['get_storage_adapter'], Config.SSE_POLL_SECONDS
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'trading.db')
+        storage = SQLiteAdapter(self.path)
+        trades, closed = make_records(1)
+        storage.insert_trades(trades)
+        storage.insert_closed_positions(closed)
+        try:
+            Config.get_storage_adapter = classmethod(lambda cls: storage)
+            Config.SSE_POLL_SECONDS = 0.05
+            self.app = web_api.create_app()
+        finally:
+            Config.get_storage_adapter, Config.SSE_POLL_SECONDS = self.saved
+        return self
+
+    def __exit__(self, *exc):
+        self.app.extensions['dashboard_stream'].close()
+        self.folder.cleanup()
+
+    def write(self):
+        """模拟调度器进程导入一笔新的盈利平仓"""
+        storage = SQLiteAdapter(self.path)
+        trades, _ = make_records(2, days=1)
+        storage.insert_trades(trades)
+        storage.insert_closed_positions([{'symbol': 'NFLX', 'close_date': trades[0]['trade_date'],
+                                          'total_cost': 100.0, 'net_pnl': 5000.0}])
+        storage.close()
+
+
+def test_dashboard_delta():
+    """增量只包含变化的总览字段、新增或变化的日期、移出窗口的日期和变化的排行"""
+    print("Dashboard实时推送测试")
+    print("=" * 50)
+
+    previous = {
+        'overview': {'total_trades': 3, 'total_pnl': 10.0, 'win_rate': 50.0, 'positions_count': 1},
+        'daily_trend': [{'date': '2025-01-01', 'pnl': 4.0}, {'date': '2025-01-02', 'pnl': 6.0}],
+        'top_profits': [{'symbol': 'AAPL', 'pnl': 10.0, 'return_rate': 1.0, 'trades': 1}],
+        'top_losses': [],
+    }
+    current = json.loads(json.dumps(previous))
+    assert dashboard_delta(previous, current) == {}
+
+    current['overview']['total_trades'] = 4
+    current['daily_trend'] = [{'date': '2025-01-02', 'pnl': 6.0}, {'date': '2025-01-03', 'pnl': -2.0}]
+    current['top_losses'] = [{'symbol': 'TSLA', 'pnl': -2.0, 'return_rate': -1.0, 'trades': 1}]
+    assert dashboard_delta(previous, current) == {
+        'overview': {'total_trades': 4},
+        'daily_trend': [{'date': '2025-01-03', 'pnl': -2.0}],
+        'removed_days': ['2025-01-01'],
+        'top_losses': current['top_losses'],
+    }
+
+
+def test_stream_snapshot_and_delta():
+    """连接时收到与 /api/dashboard 一致的快照，其他进程写入后收到增量"""
+    with stream_app() as env:
+        client = env.app.test_client()
+        dashboard = client.get('/api/dashboard').get_json()
+        response = client.get('/api/stream', buffered=False)
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        chunks = iter(response.response)
+        assert with_timeout(lambda: next(chunks)).startswith(b'retry:')
+        (event, snapshot), = with_timeout(lambda: next_events(chunks))
+        del dashboard['last_updated']
+        assert event == 'snapshot' and snapshot == dashboard
+
+        env.write()
+        (event, delta), = with_timeout(lambda: next_events(chunks))
+        assert event == 'delta'
+        assert delta['overview']['total_trades'] > snapshot['overview']['total_trades']
+        assert delta['top_profits'][0]['symbol'] == 'NFLX'
+        response.close()
+
+
+def test_dev_server_fanout_without_thread_per_client():
+    """开发服务器下数百个连接由推送线程统一发送，请求线程在发送快照后即结束"""
+    with stream_app() as env:
+        server = make_server('127.0.0.1', 0, env.app, threaded=True, request_handler=EventStreamRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        baseline = threading.active_count()
+
+        def read_event(sock):
+            data = b''
+            while not parse_events(data.split(b'\r\n\r\n', 1)[-1]):
+                chunk = sock.recv(65536)
+                assert chunk, '连接被关闭'
+                data += chunk
+            return data
+
+        clients = []
+        try:
+            for _ in range(300):
+                sock = socket.create_connection(('127.0.0.1', server.port), timeout=10)
+                sock.sendall(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+                clients.append(sock)
+
+            for sock in clients:
+                head, body = read_event(sock).split(b'\r\n\r\n', 1)
+                assert head.startswith(b'HTTP/1.0 200') and b'text/event-stream' in head
+                assert b'chunked' not in head.lower()
+                assert [event for event, _ in parse_events(body)] == ['snapshot']
+
+            stream = env.app.extensions['dashboard_stream']
+            assert with_timeout(lambda: _wait(lambda: stream.client_count == 300))
+            # 推送线程之外不为连接保留线程
+            assert threading.active_count() <= baseline + 1
+            print(f"连接数: {stream.client_count}，线程数: {threading.active_count()}")
+
+            env.write()
+            for sock in clients:
+                (event, delta), = parse_events(read_event(sock))
+                assert event == 'delta' and delta['top_profits'][0]['symbol'] == 'NFLX'
+
+            # 客户端断开后推送线程释放连接
+            for sock in clients[:100]:
+                sock.close()
+            assert with_timeout(lambda: _wait(lambda: stream.client_count == 200))
+        finally:
+            for sock in clients:
+                sock.close()
+            server.shutdown()
+            server.server_close()
+
+
+def _wait(condition, interval=0.02):
+    while not condition():
+        time.sleep(interval)
+    return True
+
+
+if __name__ == '__main__':
+    test_dashboard_delta()
+    test_stream_snapshot_and_delta()
+    test_dev_server_fanout_without_thread_per_client()
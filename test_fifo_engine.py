@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+差分测试：NumPy FIFO重建引擎与逐笔算法（PnLCalculator）的已平仓记录完全一致
+"""
+import sys
+import os
+import random
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app import fifo_engine
+from app.calculator import PnLCalculator, trade_key
+from app.database import SQLiteAdapter
+
+FIELDS = fifo_engine.CLOSED_POSITION_FIELDS
+
+
+def random_trades(seed, count, symbols=12, accounts=('', 'A', 'B'), oversell=False, prefix='S',
+                  fractional=False):
+    """随机生成交易；oversell=False 时卖出不超过所在账户的持仓，fractional=True 时数量带小数（碎股）"""
+    rng = random.Random(seed)
+    holdings = {}
+    trades = []
+    for i in range(count):
+        symbol = f'{prefix}{rng.randrange(symbols):02d}'
+        account = rng.choice(accounts)
+        held = holdings.get((symbol, account), 0)
+        if held and rng.random() < 0.45:
+            action = 'SELL'
+            if fractional:
+                # 一部分卖出恰好清仓，累计数量的端点在浮点下不一定对齐
+                quantity = held if rng.random() < 0.3 else round(rng.uniform(0.001, held), 3)
+            else:
+                quantity = rng.randint(1, held if not oversell else held + 20)
+            holdings[(symbol, account)] = max(0, held - quantity)
+        else:
+            action = 'BUY'
+            quantity = round(rng.uniform(0.001, 50), 3) if fractional else rng.randint(1, 200)
+            holdings[(symbol, account)] = held + quantity
+        price = round(rng.uniform(1, 500), 2)
+        trades.append({
+            'trade_date': f'2024-{i // 280 % 12 + 1:02d}-{i // 10 % 28 + 1:02d}',
+            'trade_time': f'{i % 10 + 9:02d}:{rng.randrange(60):02d}:00',
+            'symbol': symbol, 'security_name': f'{symbol} Inc', 'action': action,
+            'quantity': quantity, 'price': price, 'amount': quantity * price,
+            'commission': round(rng.uniform(0, 5), 2), 'account_id': account,
+        })
+    rng.shuffle(trades)
+    return trades
+
+
+def replay(trades):
+    """逐笔算法：按标的从空持仓开始处理"""
+    calculator = PnLCalculator(None)
+    closed = []
+    for symbol_trades in calculator._group_by_symbol(trades).values():
+        closed.extend(calculator._replay_closed_positions(symbol_trades))
+    return closed
+
+
+def rebuild(trades):
+    return fifo_engine.rebuild_closed_positions(trades, PnLCalculator(None)._replay_closed_positions)
+
+
+def as_rows(closed):
+    return [tuple(cp[field] for field in FIELDS) for cp in closed]
+
+
+def test_engine_matches_per_trade_loop():
+    """持仓充足时全部走向量化路径，逐字段完全相等"""
+    print("FIFO重建引擎差分测试")
+    print("=" * 50)
+
+    for seed in range(5):
+        trades = random_trades(seed, 3000)
+        expected = as_rows(replay(trades))
+        actual = as_rows(rebuild(trades))
+        print(f"seed={seed}: 已平仓 {len(actual)} 条")
+        assert len(expected) > 500
+        assert actual == expected
+
+
+def test_engine_edge_cases():
+    """超额卖出和碎股的标的改用逐笔算法；重复交易只计一次；日期无法解析时持有天数为0"""
+    trades = random_trades(42, 2000) + random_trades(43, 600, symbols=3, oversell=True, prefix='X')
+    trades += trades[:50]
+    trades.append({'trade_date': '2024-01-1x', 'trade_time': '', 'symbol': 'ZZZ', 'action': 'BUY',
+                   'quantity': 10, 'price': 5.0, 'amount': 50.0, 'commission': 1.0})
+    trades.append({'trade_date': '2024-02-01', 'trade_time': '', 'symbol': 'ZZZ', 'action': 'SELL',
+                   'quantity': 10, 'price': 6.0, 'amount': 60.0, 'commission': 1.0})
+
+    dedup = list({trade_key(t): t for t in trades}.values())
+    assert as_rows(rebuild(trades)) == as_rows(replay(dedup))
+    assert rebuild(trades)[-1]['holding_days'] == 0
+    assert rebuild([]) == []
+
+    # 碎股：数量含小数的标的改用逐笔算法，与整数数量的标的混合时结果仍完全一致
+    for seed in range(3):
+        trades = random_trades(seed, 1500, fractional=True, prefix='F') + random_trades(seed, 1500)
+        expected = as_rows(replay(trades))
+        assert len(expected) > 500
+        assert as_rows(rebuild(trades)) == expected
+
+
+def test_rebuild_replaces_stored_closed_positions():
+    """SQLite中重建后的已平仓记录与增量处理的结果一致"""
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            trades = sorted(random_trades(7, 500), key=lambda t: (t['trade_date'], t['trade_time']))
+            calculator = PnLCalculator(storage)
+            for start in range(0, len(trades), 100):
+                batch = trades[start:start + 100]
+                storage.insert_trades(batch)
+                calculator.process_trades(batch)
+
+            incremental = sorted(as_rows(storage.get_all_closed_positions()))
+            result = calculator.rebuild_closed_positions()
+            assert result['closed_positions'] == len(incremental)
+            assert sorted(as_rows(storage.get_all_closed_positions())) == incremental
+        finally:
+            storage.close()
+
+
+if __name__ == '__main__':
+    test_engine_matches_per_trade_loop()
+    test_engine_edge_cases()
+    test_rebuild_replaces_stored_closed_positions()
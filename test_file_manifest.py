@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+测试文件哈希清单：未变化的文件不重新读取，旧版MD5导入日志仍能识别
+"""
+import sys
+import os
+import hashlib
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app import scheduler
+from app.utils import calculate_file_digests, calculate_file_hash
+from test_scheduler_import import MemoryStorage, write_statements
+
+
+def test_file_digests():
+    """一次读取同时计算的哈希应与hashlib一致"""
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, 'data.csv')
+        content = os.urandom(3 * 1024 * 1024 + 17)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+
+        digests = calculate_file_digests(file_path, ('blake2b', 'md5'))
+        assert digests['blake2b'] == hashlib.blake2b(content, digest_size=32).hexdigest()
+        assert digests['md5'] == hashlib.md5(content).hexdigest()
+        assert calculate_file_hash(file_path) == hashlib.md5(content).hexdigest()
+
+
+def test_manifest_skips_unchanged_files():
+    """第二次检查时未变化的文件不应被读取"""
+    print("文件哈希清单测试")
+    print("=" * 50)
+
+    saved = {name: vars(Config)[name] for name in (
+        'WATCH_FOLDER', 'FILE_MANIFEST_PATH', 'FILE_WATCH_ENABLED', 'get_storage_adapter')}
+    hashed = []
+
+    def counting_digests(file_path, algorithms=('blake2b',)):
+        hashed.append(os.path.basename(file_path))
+        return calculate_file_digests(file_path, algorithms)
+
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.WATCH_FOLDER = folder
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            Config.FILE_WATCH_ENABLED = False
+            Config.get_storage_adapter = classmethod(lambda cls: MemoryStorage())
+            scheduler.calculate_file_digests = counting_digests
+
+            write_statements(folder, 4)
+            trading_scheduler = scheduler.TradingScheduler()
+            storage = trading_scheduler.storage
+            trading_scheduler._check_new_files()
+            print(f"首次检查计算哈希: {hashed}")
+            assert len(hashed) == 4
+            assert len(storage.import_logs) == 4
+
+            # 未变化的文件直接使用清单中的哈希
+            hashed.clear()
+            trading_scheduler._check_new_files()
+            assert hashed == []
+
+            # 重启后（新进程内存为空）仍不读取文件，只查询导入日志
+            trading_scheduler = scheduler.TradingScheduler()
+            trading_scheduler.storage = storage
+            trading_scheduler._check_new_files()
+            assert hashed == []
+            assert len(storage.import_logs) == 4
+
+            # 修改过的文件重新计算哈希并导入
+            with open(os.path.join(folder, 'statement_01.csv'), 'a') as f:
+                f.write('2025-02-01,09:30:00,MSFT,买入,1,400.0,400.0,1.0\n')
+            trading_scheduler._check_new_files()
+            print(f"修改后计算哈希: {hashed}")
+            assert hashed == ['statement_01.csv']
+            assert len(storage.import_logs) == 5
+            assert len(storage.trades) == 16
+    finally:
+        scheduler.calculate_file_digests = calculate_file_digests
+        for name, value in saved.items():
+            setattr(Config, name, value)
+
+
+def test_legacy_md5_import_log():
+    """旧版导入日志记录的是MD5，对应文件不应被重复导入"""
+    saved = {name: vars(Config)[name] for name in (
+        'WATCH_FOLDER', 'FILE_MANIFEST_PATH', 'FILE_WATCH_ENABLED', 'get_storage_adapter')}
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.WATCH_FOLDER = folder
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            Config.FILE_WATCH_ENABLED = False
+            Config.get_storage_adapter = classmethod(lambda cls: MemoryStorage())
+
+            write_statements(folder, 2)
+            trading_scheduler = scheduler.TradingScheduler()
+            storage = trading_scheduler.storage
+            legacy_path = os.path.join(folder, 'statement_00.csv')
+            storage.insert_import_log({
+                'file_name': 'statement_00.csv',
+                'file_hash': calculate_file_hash(legacy_path),
+                'status': 'SUCCESS',
+            })
+
+            trading_scheduler._check_new_files()
+            assert [log['file_name'] for log in storage.import_logs] == ['statement_00.csv', 'statement_01.csv']
+            assert len(storage.trades) == 3
+            # 新的导入日志使用BLAKE2哈希
+            assert len(storage.import_logs[1]['file_hash']) == 64
+    finally:
+        for name, value in saved.items():
+            setattr(Config, name, value)
+
+
+if __name__ == '__main__':
+    test_file_digests()
+    test_manifest_skips_unchanged_files()
+    test_legacy_md5_import_log()
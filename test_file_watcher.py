@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+测试文件事件监控：新文件落入文件夹后几秒内完成导入
+"""
+import sys
+import os
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app import scheduler
+from app.file_watcher import FileWatcher
+from test_scheduler_import import MemoryStorage, write_statements
+
+DEBOUNCE_SECONDS = 0.5
+POLL_SECONDS = 0.1
+
+
+def force_polling(watcher):
+    """模拟未安装watchdog的环境"""
+    def start_observer():
+        raise ImportError('watchdog')
+    watcher._start_observer = start_observer
+
+
+def wait_until(condition, timeout):
+    """等待条件成立，返回耗时；超时返回None"""
+    start = time.time()
+    while time.time() - start < timeout:
+        if condition():
+            return time.time() - start
+        time.sleep(0.02)
+    return None
+
+
+def test_scheduler_imports_dropped_files():
+    """文件落入监控文件夹后，调度器应在防抖时间后很快完成导入"""
+    print("文件监控导入延迟测试")
+    print("=" * 50)
+
+    saved = {name: vars(Config)[name] for name in (
+        'WATCH_FOLDER', 'FILE_WATCH_ENABLED', 'FILE_WATCH_DEBOUNCE_SECONDS',
+        'FILE_WATCH_POLL_SECONDS', 'FILE_MANIFEST_PATH', 'get_storage_adapter')}
+    try:
+        Config.FILE_WATCH_ENABLED = True
+        Config.FILE_WATCH_DEBOUNCE_SECONDS = DEBOUNCE_SECONDS
+        Config.FILE_WATCH_POLL_SECONDS = POLL_SECONDS
+        Config.get_storage_adapter = classmethod(lambda cls: MemoryStorage())
+
+        for mode in ('watchdog', 'polling'):
+            with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+                Config.WATCH_FOLDER = folder
+                Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+                trading_scheduler = scheduler.TradingScheduler()
+                watcher = trading_scheduler.watcher
+                if mode == 'polling':
+                    force_polling(watcher)
+
+                watcher.start()
+                try:
+                    storage = trading_scheduler.storage
+                    with tempfile.TemporaryDirectory() as staging:
+                        write_statements(staging, 3)
+                        for i, name in enumerate(sorted(os.listdir(staging))):
+                            dropped_at = time.time()
+                            with open(os.path.join(staging, name), 'rb') as src, \
+                                    open(os.path.join(folder, name), 'wb') as dst:
+                                dst.write(src.read())
+
+                            latency = wait_until(lambda: len(storage.import_logs) == i + 1, 10)
+                            assert latency is not None, f"{mode}: {name} 未被导入"
+                            print(f"{watcher.mode}: {name} 导入延迟 {time.time() - dropped_at:.2f} 秒")
+                            assert latency < DEBOUNCE_SECONDS + 2
+
+                    assert len(storage.trades) == 9
+                    assert all(log['status'] == 'SUCCESS' for log in storage.import_logs)
+                finally:
+                    trading_scheduler.shutdown()
+    finally:
+        for name, value in saved.items():
+            setattr(Config, name, value)
+
+
+def test_debounce_waits_for_slow_writer():
+    """仍在写入的文件不会提前触发回调，写完后只回调一次"""
+    print("文件写入防抖测试")
+    print("=" * 50)
+
+    for polling in (False, True):
+        with tempfile.TemporaryDirectory() as folder:
+            ready = []
+            watcher = FileWatcher(folder, Config.SUPPORTED_EXTENSIONS,
+                                  lambda path: ready.append((path, os.path.getsize(path))),
+                                  debounce_seconds=DEBOUNCE_SECONDS, poll_seconds=POLL_SECONDS)
+            if polling:
+                force_polling(watcher)
+            watcher.start()
+            try:
+                file_path = os.path.join(folder, 'slow.csv')
+                with open(file_path, 'w') as f:
+                    for i in range(6):
+                        f.write(f'line {i}\n' * 100)
+                        f.flush()
+                        time.sleep(DEBOUNCE_SECONDS / 2)
+                        assert not ready, "文件写入过程中不应触发回调"
+
+                # 临时文件和不支持的扩展名应被忽略
+                for name in ('~$slow.xlsx', '.hidden.csv', 'notes.txt'):
+                    with open(os.path.join(folder, name), 'w') as f:
+                        f.write('x')
+
+                assert wait_until(lambda: ready, 5) is not None
+                time.sleep(DEBOUNCE_SECONDS * 2)
+                print(f"{watcher.mode}: 回调 {ready}")
+                assert ready == [(file_path, os.path.getsize(file_path))]
+            finally:
+                watcher.stop()
+
+
+if __name__ == '__main__':
+    test_scheduler_imports_dropped_files()
+    test_debounce_waits_for_slow_writer()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+测试读接口的HTTP缓存：数据版本ETag、未变化时304且不访问存储、写入后ETag变化、gzip压缩
+"""
+import sys
+import os
+import gzip
+import json
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app.data_version import DataVersion
+from app.database import SQLiteAdapter
+from app import api_server, web_api
+from test_sheets_cache import make_adapter
+from test_trades_pagination import make_trades
+
+
+class api_client:
+    """临时数据库上的 api_server 测试客户端"""
+
+    def __enter__(self):
+        self.saved = Config.SQLITE_DB_PATH, Config.WATCH_FOLDER
+        self.folder = tempfile.TemporaryDirectory()
+        Config.SQLITE_DB_PATH = os.path.join(self.folder.name, 'trading.db')
+        Config.WATCH_FOLDER = os.path.join(self.folder.name, 'uploads')
+        SQLiteAdapter(Config.SQLITE_DB_PATH).save_trades_bulk(make_trades(25))
+        return api_server.create_app().test_client()
+
+    def __exit__(self, *exc):
+        Config.SQLITE_DB_PATH, Config.WATCH_FOLDER = self.saved
+        self.folder.cleanup()
+
+
+def test_not_modified_without_storage_access():
+    """If-None-Match 与当前ETag一致时返回304，视图和存储都不执行"""
+    print("HTTP缓存测试")
+    print("=" * 50)
+
+    calls = []
+    iter_trades = SQLiteAdapter.iter_trades
+    get_statistics = SQLiteAdapter.get_statistics
+
+    def counting(method):
+        def wrapper(self, *args, **kwargs):
+            calls.append(method.__name__)
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    SQLiteAdapter.iter_trades = counting(iter_trades)
+    SQLiteAdapter.get_statistics = counting(get_statistics)
+    try:
+        with api_client() as client:
+            for url in ('/api/trades?limit=10', '/api/statistics', '/api/trades/1'):
+                response = client.get(url)
+                assert response.status_code == 200
+                etag = response.headers['ETag']
+                assert response.headers['Cache-Control'] == 'no-cache'
+
+                calls.clear()
+                cached = client.get(url, headers={'If-None-Match': etag})
+                assert cached.status_code == 304 and cached.data == b''
+                assert cached.headers['ETag'] == etag
+                assert calls == []
+
+            # 不同查询参数的ETag不同
+            assert client.get('/api/trades?limit=5').headers['ETag'] != client.get('/api/trades?limit=10').headers['ETag']
+    finally:
+        SQLiteAdapter.iter_trades = iter_trades
+        SQLiteAdapter.get_statistics = get_statistics
+
+
+def test_writes_change_etag():
+    """接口写入和其他进程（同一数据库的另一个适配器）写入后ETag变化"""
+    with api_client() as client:
+        etag = client.get('/api/trades').headers['ETag']
+        assert client.get('/api/trades', headers={'If-None-Match': etag}).status_code == 304
+
+        assert client.put('/api/trades/1', json={'commission': 2.5}).status_code == 200
+        response = client.get('/api/trades', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+
+        # 模拟调度器进程导入
+        SQLiteAdapter(Config.SQLITE_DB_PATH).insert_closed_position({'symbol': 'AAPL', 'net_pnl': 1.0})
+        assert client.get('/api/trades', headers={'If-None-Match': etag}).status_code == 200
+
+        # 写入失败回滚时不改变版本
+        storage = SQLiteAdapter(Config.SQLITE_DB_PATH)
+        version = storage.data_version_tag()
+        try:
+            with storage.transaction():
+                storage.insert_closed_position({'symbol': 'AAPL', 'net_pnl': 1.0})
+                raise RuntimeError('计算失败')
+        except RuntimeError:
+            pass
+        assert storage.data_version_tag() == version
+
+
+def test_gzip_large_responses():
+    """接受gzip时压缩较大的JSON响应，小响应和不接受gzip时原样返回"""
+    with api_client() as client:
+        response = client.get('/api/trades', headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        data = json.loads(gzip.decompress(response.data))
+        assert len(data['trades']) == 25
+        print(f"压缩: {len(json.dumps(data))} -> {len(response.data)} 字节")
+
+        plain = client.get('/api/trades')
+        assert 'Content-Encoding' not in plain.headers
+        assert plain.get_json() == data
+
+        small = client.get('/api/trades/1', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in small.headers
+
+        # 304 不带响应体，同一ETag对应压缩和未压缩两种表示
+        cached = client.get('/api/trades', headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']})
+        assert cached.status_code == 304 and 'Content-Encoding' not in cached.headers
+
+
+def test_dashboard_and_sheets_versions():
+    """Dashboard接口同样支持304；Sheets适配器写入后和缓存时段变化时版本变化"""
+    saved = vars(Config)['get_storage_adapter']
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            Config.get_storage_adapter = classmethod(lambda cls: storage)
+            client = web_api.create_app().test_client()
+        finally:
+            Config.get_storage_adapter = saved
+        etag = client.get('/api/dashboard').headers['ETag']
+        assert client.get('/api/dashboard', headers={'If-None-Match': etag}).status_code == 304
+        storage.save_trades_bulk(make_trades(3))
+        assert client.get('/api/dashboard', headers={'If-None-Match': etag}).status_code == 200
+        storage.close()
+
+        adapter = make_adapter()
+        assert adapter.data_version_tag() is None
+        adapter.data_version = DataVersion(os.path.join(folder, 'sheets_data_version'))
+        adapter.writer.on_flush = adapter._written
+        version = adapter.data_version_tag()
+        adapter.insert_import_log({'file_name': 'a.csv', 'file_hash': 'a'})
+        assert adapter.data_version_tag() == version    # 仍在写入缓冲中
+        adapter.flush()
+        assert adapter.data_version_tag() != version
+        adapter.cache.ttl_seconds = 0
+        assert adapter.data_version_tag() is None
+
+
+if __name__ == '__main__':
+    test_not_modified_without_storage_access()
+    test_writes_change_etag()
+    test_gzip_large_responses()
+    test_dashboard_and_sheets_versions()
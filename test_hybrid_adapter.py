@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+测试混合存储：读取不访问Sheets API、写入异步复制、按行数和校验和拉取表格中的修改
+"""
+import sys
+import os
+import json
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.database import SQLiteAdapter
+from app.hybrid_adapter import HybridAdapter
+from test_sheets_cache import make_adapter
+
+
+def make_trade(symbol, quantity, date='2025-01-02', time='10:00:00'):
+    return {
+        'trade_date': date, 'trade_time': time, 'symbol': symbol, 'security_name': symbol,
+        'direction': 'BUY', 'quantity': quantity, 'price': 100.0, 'amount': 100.0 * quantity,
+        'commission': 1.0, 'platform_fee': 0.0, 'net_amount': 100.0 * quantity + 1.0,
+        'currency': 'USD', 'market': 'US', 'broker': 'test', 'account_id': 'A1'
+    }
+
+
+def make_hybrid(folder, sheets=None):
+    sheets = sheets or make_adapter()
+    mirror = SQLiteAdapter(os.path.join(folder, 'mirror.db'))
+    return HybridAdapter(sheets, mirror, sync_interval=0, start=False)
+
+
+def test_reads_are_local_and_writes_replicate():
+    """读取只访问本地镜像；写入进入复制队列，复制后出现在Sheets中"""
+    print("混合存储测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        hybrid = make_hybrid(folder)
+        requests = hybrid.sheets.spreadsheet.requests
+        requests.clear()
+
+        assert hybrid.insert_trades([make_trade('AAPL', 10), make_trade('TSLA', 5)]) == 2
+        hybrid.update_position('AAPL', {'total_quantity': 10, 'avg_cost': 100.0, 'total_cost': 1000.0})
+        hybrid.insert_import_log({'file_name': 'a.csv', 'file_hash': 'h1', 'status': 'SUCCESS'})
+
+        for _ in range(10):
+            assert len(hybrid.get_all_trades()) == 2
+            assert hybrid.get_import_log_by_hash('h1')['file_name'] == 'a.csv'
+            assert [p['symbol'] for p in hybrid.get_open_positions()] == ['AAPL']
+        assert sum(requests.values()) == 0
+        assert hybrid.pending_replication() == 3
+
+        assert hybrid.replicate() == 3
+        assert hybrid.pending_replication() == 0
+        print(f"复制API请求: {dict(requests)}")
+        assert [r['symbol'] for r in hybrid.sheets.fetch_records('trades')] == ['AAPL', 'TSLA']
+        assert hybrid.sheets.fetch_records('import_logs')[0]['file_hash'] == 'h1'
+        assert hybrid.sheets.fetch_records('positions')[0]['total_quantity'] == 10
+        hybrid.close()
+
+
+def test_transaction_rolls_back_queue():
+    """事务回滚时本地写入和复制队列项一起丢弃"""
+    with tempfile.TemporaryDirectory() as folder:
+        hybrid = make_hybrid(folder)
+        try:
+            with hybrid.transaction():
+                hybrid.insert_trades([make_trade('AAPL', 10)])
+                raise RuntimeError('计算失败')
+        except RuntimeError:
+            pass
+        assert hybrid.get_all_trades() == []
+        assert hybrid.pending_replication() == 0
+        hybrid.close()
+
+
+def test_sync_pulls_remote_edits():
+    """表格中的修改在同步时载入；行数和校验和未变化的工作表不重新载入"""
+    with tempfile.TemporaryDirectory() as folder:
+        hybrid = make_hybrid(folder)
+        hybrid.insert_trades([make_trade('AAPL', 10)])
+        hybrid.replicate()
+
+        # 第一次同步载入全部工作表，之后无变化时不再载入
+        assert 'trades' in hybrid.sync_from_sheets()
+        assert hybrid.sync_from_sheets() == []
+
+        # 在表格中手工修改数量并新增一笔交易
+        worksheet = hybrid.sheets.spreadsheet.sheets['trades']
+        quantity_column = worksheet.rows[0].index('quantity')
+        worksheet.rows[1][quantity_column] = 20
+        row = [r.get(h, '') for r in [dict(make_trade('NVDA', 3), id=2)] for h in worksheet.rows[0]]
+        worksheet.rows.append(row)
+
+        assert hybrid.sync_from_sheets() == ['trades']
+        trades = {t['symbol']: t for t in hybrid.get_all_trades()}
+        assert trades['AAPL']['quantity'] == 20
+        assert trades['NVDA']['id'] == 2
+
+        # 复制队列未清空时不载入，以免覆盖尚未复制的本地写入
+        worksheet.rows[1][quantity_column] = 30
+        hybrid.insert_import_log({'file_name': 'b.csv', 'file_hash': 'h2'})
+        assert hybrid.sync_from_sheets() == []
+        assert {t['symbol']: t for t in hybrid.get_all_trades()}['AAPL']['quantity'] == 20
+        hybrid.replicate()
+        assert set(hybrid.sync_from_sheets()) == {'trades', 'import_logs'}
+        assert {t['symbol']: t for t in hybrid.get_all_trades()}['AAPL']['quantity'] == 30
+        hybrid.close()
+
+
+def test_failed_replication_is_retried():
+    """复制失败时写入留在队列中（重启后仍在），恢复后按顺序重放"""
+    with tempfile.TemporaryDirectory() as folder:
+        sheets = make_adapter()
+        hybrid = make_hybrid(folder, sheets)
+        worksheet = sheets.spreadsheet.sheets['import_logs']
+        append_rows = worksheet.append_rows
+
+        def fail(rows):
+            raise RuntimeError('quota exceeded')
+        worksheet.append_rows = fail
+
+        hybrid.insert_import_log({'file_name': 'a.csv', 'file_hash': 'h1'})
+        hybrid.insert_import_log({'file_name': 'b.csv', 'file_hash': 'h2'})
+        try:
+            hybrid.replicate()
+            assert False, 'replicate 应抛出异常'
+        except RuntimeError:
+            pass
+        assert hybrid.pending_replication() == 2
+        assert sheets.writer.pending() == 0
+        hybrid.mirror.close()
+
+        # 重新打开镜像，队列中的写入仍然保留
+        worksheet.append_rows = append_rows
+        hybrid = make_hybrid(folder, sheets)
+        assert hybrid.pending_replication() == 2
+        assert hybrid.replicate() == 2
+        assert [r['file_hash'] for r in sheets.fetch_records('import_logs')] == ['h1', 'h2']
+        hybrid.close()
+
+
+def test_background_thread_replicates():
+    """后台线程在写入后复制，关闭时等待复制完成"""
+    with tempfile.TemporaryDirectory() as folder:
+        sheets = make_adapter()
+        mirror = SQLiteAdapter(os.path.join(folder, 'mirror.db'))
+        hybrid = HybridAdapter(sheets, mirror, sync_interval=3600)
+        hybrid.insert_trades([make_trade('AAPL', 10)])
+        assert hybrid.wait_replicated(timeout=5)
+        hybrid.close()
+        assert [r['symbol'] for r in sheets.fetch_records('trades')] == ['AAPL']
+
+
+def queue_rows(hybrid):
+    with hybrid.mirror.get_connection() as conn:
+        return [dict(r) for r in conn.execute("SELECT method, payload, attempts FROM replication_queue ORDER BY id")]
+
+
+def test_only_new_trades_replicate():
+    """镜像中按自然键重复的交易不进入复制队列"""
+    with tempfile.TemporaryDirectory() as folder:
+        hybrid = make_hybrid(folder)
+        assert hybrid.insert_trades([make_trade('AAPL', 10), make_trade('TSLA', 5)]) == 2
+        assert hybrid.insert_trades([make_trade('AAPL', 10), make_trade('NVDA', 3), make_trade('NVDA', 3)]) == 1
+        assert hybrid.insert_trades([make_trade('TSLA', 5)]) == 0
+
+        rows = queue_rows(hybrid)
+        assert len(rows) == 2
+        assert [t['symbol'] for t in json.loads(rows[1]['payload'])[0]] == ['NVDA']
+        assert hybrid.replicate() == 2
+        assert [r['symbol'] for r in hybrid.sheets.fetch_records('trades')] == ['AAPL', 'TSLA', 'NVDA']
+        hybrid.close()
+
+
+def test_partial_failure_is_not_rewritten():
+    """一批中部分工作表已写入时，重试只重放未写入的写入；失败记在出错的写入上"""
+    with tempfile.TemporaryDirectory() as folder:
+        sheets = make_adapter()
+        hybrid = make_hybrid(folder, sheets)
+        worksheet = sheets.spreadsheet.sheets['import_logs']
+        append_rows = worksheet.append_rows
+
+        def fail(rows):
+            raise RuntimeError('quota exceeded')
+        worksheet.append_rows = fail
+
+        hybrid.insert_closed_position({'symbol': 'AAPL', 'close_date': '2025-01-03', 'net_pnl': 10.0})
+        hybrid.update_position('AAPL', {'total_quantity': 0, 'avg_cost': 0.0, 'total_cost': 0.0})
+        hybrid.insert_import_log({'file_name': 'a.csv', 'file_hash': 'h1'})
+        try:
+            hybrid.replicate()
+            assert False, 'replicate 应抛出异常'
+        except RuntimeError:
+            pass
+
+        # 持仓和已平仓记录已写入，只有导入日志留在队列中
+        rows = queue_rows(hybrid)
+        assert [(r['method'], r['attempts']) for r in rows] == [('insert_import_log', 1)]
+        assert len(sheets.fetch_records('closed_positions')) == 1
+
+        worksheet.append_rows = append_rows
+        assert hybrid.replicate() == 1
+        assert len(sheets.fetch_records('closed_positions')) == 1
+        assert len(sheets.fetch_records('positions')) == 1
+        assert [r['file_hash'] for r in sheets.fetch_records('import_logs')] == ['h1']
+
+        # 重放时出错：之前的写入仍在写缓冲中，随出错的写入一起留在队列
+        trades_sheet = sheets.spreadsheet.sheets['trades']
+        trades_append = trades_sheet.append_rows
+        trades_sheet.append_rows = fail
+        hybrid.insert_closed_position({'symbol': 'TSLA', 'close_date': '2025-01-04', 'net_pnl': 5.0})
+        hybrid.insert_trades([make_trade('TSLA', 5)])
+        try:
+            hybrid.replicate()
+            assert False, 'replicate 应抛出异常'
+        except RuntimeError:
+            pass
+        assert [(r['method'], r['attempts']) for r in queue_rows(hybrid)] == [
+            ('insert_closed_positions', 0), ('insert_trades', 1)]
+
+        trades_sheet.append_rows = trades_append
+        assert hybrid.replicate() == 2
+        assert [r['symbol'] for r in sheets.fetch_records('closed_positions')] == ['AAPL', 'TSLA']
+        assert [r['symbol'] for r in sheets.fetch_records('trades')] == ['TSLA']
+        hybrid.close()
+
+
+def test_two_adapters_share_one_mirror():
+    """调度器和Web服务各有一个适配器、使用同一个镜像时，写入只复制一次"""
+    with tempfile.TemporaryDirectory() as folder:
+        sheets_a, sheets_b = make_adapter(), make_adapter()
+        sheets_b.spreadsheet = sheets_a.spreadsheet
+        a, b = make_hybrid(folder, sheets_a), make_hybrid(folder, sheets_b)
+
+        # a 复制期间 b 取不到租约，不重放同一批写入，也不载入工作表
+        a.insert_closed_position({'symbol': 'AAPL', 'close_date': '2025-01-03', 'net_pnl': 10.0})
+        b.insert_import_log({'file_name': 'a.csv', 'file_hash': 'h1'})
+        flush = sheets_a.flush
+        during = []
+
+        def flush_while_b_runs():
+            during.append((b.replicate(), b.sync_from_sheets()))
+            flush()
+        sheets_a.flush = flush_while_b_runs
+        assert a.replicate() == 2
+        sheets_a.flush = flush
+        assert during == [(0, [])]
+        assert b.replicate() == 0
+        assert len(sheets_a.fetch_records('closed_positions')) == 1
+        assert len(sheets_a.fetch_records('import_logs')) == 1
+
+        # 两个后台线程同时复制：每条写入只写入一次，租约易手后重新读取记录数，ID不重复
+        a.retry_seconds = b.retry_seconds = 0.01
+        a.start()
+        b.start()
+        for i in range(20):
+            a.insert_closed_position({'symbol': 'A', 'close_date': '2025-01-04', 'net_pnl': float(i)})
+            b.insert_closed_position({'symbol': 'B', 'close_date': '2025-01-04', 'net_pnl': float(i)})
+        assert a.wait_replicated(timeout=10) and b.wait_replicated(timeout=10)
+        closed = sheets_a.spreadsheet.sheets['closed_positions'].rows[1:]
+        assert len(closed) == 41
+        assert sorted(row[0] for row in closed) == list(range(1, 42))
+        a.close()
+        b.close()
+
+
+def test_expired_lease_is_taken_over():
+    """持有租约的进程异常退出后，租约过期前其他适配器不复制，过期后接管"""
+    with tempfile.TemporaryDirectory() as folder:
+        hybrid = make_hybrid(folder)
+        hybrid.insert_import_log({'file_name': 'a.csv', 'file_hash': 'h1'})
+        with hybrid.mirror.get_connection() as conn:
+            conn.execute("INSERT INTO replication_lease (id, owner, expires_at) VALUES (1, 'crashed', ?)",
+                         (time.time() + 60,))
+            conn.commit()
+        assert hybrid.replicate() == 0
+        assert hybrid.pending_replication() == 1
+
+        with hybrid.mirror.get_connection() as conn:
+            conn.execute("UPDATE replication_lease SET expires_at = ?", (time.time() - 1,))
+            conn.commit()
+        assert hybrid.replicate() == 1
+        assert [r['file_hash'] for r in hybrid.sheets.fetch_records('import_logs')] == ['h1']
+        hybrid.close()
+
+
+if __name__ == '__main__':
+    test_reads_are_local_and_writes_replicate()
+    test_transaction_rolls_back_queue()
+    test_sync_pulls_remote_edits()
+    test_failed_replication_is_retried()
+    test_background_thread_replicates()
+    test_only_new_trades_replicate()
+    test_partial_failure_is_not_rewritten()
+    test_two_adapters_share_one_mirror()
+    test_expired_lease_is_taken_over()
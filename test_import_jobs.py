@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+测试异步导入任务：POST /api/import 立即返回任务ID、查询进度和结果、排队上限和503、
+从内存解析上传的文件并按哈希去重
+"""
+import sys
+import os
+import io
+import threading
+import time
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import pandas as pd
+
+from app.config import Config
+from app.database import SQLiteAdapter
+from app.import_jobs import ImportJobQueue, ImportQueueFull, estimate_rows
+from app.parser import ExcelParser
+from app.utils import HashingSpool, calculate_file_digests, import_hash_algorithms
+from test_http_cache import api_client
+
+HEADER = '成交日期,成交时间,证券代码,交易方向,成交数量,成交价格,成交金额,手续费\n'
+
+
+def statement(count, day=1):
+    """富途旧格式CSV对账单内容"""
+    rows = [f'2025-02-{day:02d},10:{i // 60 % 60:02d}:{i % 60:02d},SYM{i % 7},买入,{i + 1},10,{10 * (i + 1)},1\n'
+            for i in range(count)]
+    return (HEADER + ''.join(rows)).encode('utf-8')
+
+
+def upload(client, data, filename='statement.csv'):
+    return client.post('/api/import', data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def wait_job(client, job_id, timeout=30):
+    """轮询任务直到结束"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/import/{job_id}').get_json()
+        if job['status'] in ('succeeded', 'skipped', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError('导入任务超时')
+
+
+class BlockingStorage:
+    """保存交易时等待放行，模拟耗时的导入"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.release = threading.Event()
+
+    def save_trades_bulk(self, trades):
+        assert self.release.wait(30)
+        return self.storage.save_trades_bulk(trades)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def test_import_job_lifecycle():
+    """上传立即返回202和任务ID，后台分批导入；相同文件按哈希跳过，内容不同的重复记录按自然键跳过"""
+    print("异步导入任务测试")
+    print("=" * 50)
+
+    saved = Config.PARSE_CHUNK_SIZE, Config.UPLOAD_SPOOL_MAX_BYTES
+    Config.PARSE_CHUNK_SIZE = 100
+    Config.UPLOAD_SPOOL_MAX_BYTES = 4096    # 450行的文件转存临时文件
+    try:
+        with api_client() as client:
+            response = upload(client, statement(450))
+            assert response.status_code == 202
+            job = response.get_json()
+            assert job['status'] in ('queued', 'running', 'succeeded')
+            assert response.headers['Location'] == job['status_url'] == f"/api/import/{job['job_id']}"
+
+            job = wait_job(client, job['job_id'])
+            assert job['status'] == 'succeeded' and job['errors'] == []
+            assert (job['total_rows'], job['rows_parsed'], job['inserted_count'], job['skipped_count']) == (450, 450, 450, 0)
+            assert job['progress'] == 100.0
+            assert '成功导入 450 条' in job['message']
+            print(job['message'])
+
+            assert len(client.get('/api/trades?limit=1000').get_json()['trades']) == 475
+            # 上传的文件不写入监控目录
+            assert not os.path.exists(Config.WATCH_FOLDER)
+
+            # 导入日志的哈希与定时任务对同一文件计算的一致，定时任务会跳过该文件
+            path = os.path.join(os.path.dirname(Config.SQLITE_DB_PATH), 'statement.csv')
+            with open(path, 'wb') as f:
+                f.write(statement(450))
+            file_hash = calculate_file_digests(path, import_hash_algorithms())[Config.FILE_HASH_ALGORITHM]
+            log = SQLiteAdapter(Config.SQLITE_DB_PATH).get_import_log_by_hash(file_hash)
+            assert log['status'] == 'SUCCESS' and log['success_count'] == 450
+
+            again = wait_job(client, upload(client, statement(450)).get_json()['job_id'])
+            assert again['status'] == 'skipped' and again['rows_parsed'] == 0
+
+            changed = wait_job(client, upload(client, statement(450).replace(b'\n', b'\r\n')).get_json()['job_id'])
+            assert (changed['status'], changed['inserted_count'], changed['skipped_count']) == ('succeeded', 0, 450)
+
+            assert client.get('/api/import/unknown').status_code == 404
+    finally:
+        Config.PARSE_CHUNK_SIZE, Config.UPLOAD_SPOOL_MAX_BYTES = saved
+
+
+def test_import_job_failures():
+    """无法解析或没有有效记录的文件，任务失败并给出错误信息"""
+    with api_client() as client:
+        job = wait_job(client, upload(client, b'not a workbook', 'broken.xlsx').get_json()['job_id'])
+        assert job['status'] == 'failed' and job['errors'][0].startswith('导入失败')
+
+        job = wait_job(client, upload(client, HEADER.encode('utf-8')).get_json()['job_id'])
+        assert job['status'] == 'failed' and job['errors'] == ['文件中没有找到有效的交易记录']
+
+        assert upload(client, b'x', 'notes.txt').status_code == 400
+
+
+def test_backpressure_keeps_reads_responsive():
+    """后台线程忙、排队已满时上传返回503，读接口照常响应"""
+    with api_client() as client:
+        jobs = client.application.extensions['import_jobs']
+        storage = BlockingStorage(jobs.storage)
+        jobs.storage = storage
+
+        submitted = [upload(client, statement(5, day)).get_json()['job_id'] for day in range(1, 10)]
+        # 1个线程执行中 + 8个排队
+        rejected = upload(client, statement(5, 10))
+        assert rejected.status_code == 503 and rejected.headers['Retry-After']
+
+        start = time.perf_counter()
+        assert client.get('/api/statistics').status_code == 200
+        assert client.get('/api/trades').status_code == 200
+        assert time.perf_counter() - start < 1
+        assert client.get(f'/api/import/{submitted[-1]}').get_json()['status'] == 'queued'
+
+        storage.release.set()
+        results = [wait_job(client, job_id) for job_id in submitted]
+        assert [job['inserted_count'] for job in results] == [5] * 9
+        jobs.close()
+
+
+def test_queue_limits_and_estimate():
+    """ImportJobQueue 直接使用：排队上限、结束任务过期清除、行数估算、上传文件超过阈值才转存临时文件"""
+    assert estimate_rows(io.BytesIO(statement(12).rstrip(b'\n')), 'a.csv') == 12
+    assert estimate_rows(io.BytesIO(b'broken'), 'a.xlsx') is None
+
+    spool = HashingSpool(100, ('blake2b', 'md5'))
+    spool.write(b'x' * 60)
+    assert not spool._rolled
+    spool.write(b'x' * 60)
+    assert spool._rolled and spool.size == 120
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'x.bin')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 120)
+        assert spool.digests() == calculate_file_digests(path, ('blake2b', 'md5'))
+    spool.close()
+
+    class Storage:
+        def __init__(self):
+            self.logs = []
+
+        def save_trades_bulk(self, trades):
+            return {'inserted': len(trades), 'skipped': 0}
+
+        def get_import_log_by_hash(self, file_hash):
+            return None
+
+        def insert_import_log(self, log_data):
+            self.logs.append(log_data)
+
+    storage = BlockingStorage(Storage())
+    jobs = ImportJobQueue(storage, workers=1, max_pending=1, retention_seconds=0)
+    first = jobs.submit(statement(12), 'a.csv')
+    while first.status == 'queued':
+        time.sleep(0.01)
+    second = jobs.submit(b'not a workbook', 'b.xlsx')
+    try:
+        jobs.submit(statement(1), 'c.csv')
+        raise AssertionError('排队已满时应拒绝')
+    except ImportQueueFull:
+        pass
+
+    storage.release.set()
+    jobs.close()
+    assert first.status == 'succeeded' and first.rows_parsed == 12
+    assert second.status == 'failed'
+    assert [log['status'] for log in storage.storage.logs] == ['SUCCESS', 'FAILED']
+    time.sleep(0.01)
+    assert jobs.get(first.id) is None
+
+
+def test_parse_from_memory():
+    """ExcelParser 直接解析 bytes、文件对象和不能seek的流，结果与解析文件相同"""
+    class Unseekable(io.RawIOBase):
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            return self.data.readinto(buffer)
+
+    parser = ExcelParser()
+    data = statement(30)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'statement.csv')
+        with open(path, 'wb') as f:
+            f.write(data)
+        expected = [{**trade, 'import_time': None} for trade in parser.parse_file(path)]
+        for source in (data, bytearray(data), io.BytesIO(data), Unseekable(data)):
+            trades = parser.parse_file(source, 'statement.csv')
+            assert [{**trade, 'import_time': None} for trade in trades] == expected
+
+        buffer = io.BytesIO()
+        pd.read_csv(io.BytesIO(data), dtype=str).to_excel(buffer, index=False)
+        trades = parser.parse_file(buffer.getvalue(), 'statement.xlsx')
+        assert [(t['symbol'], t['quantity']) for t in trades] == [(t['symbol'], t['quantity']) for t in expected]
+
+
+if __name__ == '__main__':
+    test_import_job_lifecycle()
+    test_import_job_failures()
+    test_backpressure_keeps_reads_responsive()
+    test_queue_limits_and_estimate()
+    test_parse_from_memory()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+测试持仓批次账本：增量导入按FIFO消耗已有批次，重复导入不重复配对
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app.calculator import PnLCalculator
+from app.database import SQLiteAdapter
+from test_scheduler_import import MemoryStorage
+from test_sheets_cache import make_adapter
+
+
+def trade(date, action, quantity, price, account_id='', symbol='AAPL', time='10:00:00'):
+    return {
+        'trade_date': date, 'trade_time': time, 'symbol': symbol, 'action': action,
+        'quantity': quantity, 'price': price, 'amount': quantity * price,
+        'commission': 1.0, 'account_id': account_id,
+    }
+
+
+def import_batch(storage, calculator, trades):
+    """与调度器一致：先存交易，再计算盈亏"""
+    storage.insert_trades(trades)
+    return calculator.process_trades(trades)
+
+
+def check_ledger(storage):
+    calculator = PnLCalculator(storage)
+
+    # 第一批：两次买入
+    import_batch(storage, calculator, [
+        trade('2025-01-02', 'BUY', 10, 100.0),
+        trade('2025-01-03', 'BUY', 10, 110.0),
+    ])
+    lots = storage.get_open_lots('AAPL')
+    assert [lot['remaining_quantity'] for lot in lots] == [10, 10]
+
+    # 第二批：卖出跨越两个批次
+    result = import_batch(storage, calculator, [trade('2025-01-04', 'SELL', 15, 120.0)])
+    assert result['closed_positions'] == 2
+    lots = storage.get_open_lots('AAPL')
+    assert [lot['remaining_quantity'] for lot in lots] == [5]
+    assert abs(lots[0]['cost_basis'] - 5 * (110.0 + 0.1)) < 1e-9
+
+    # 第三批：卖出只消耗剩余批次，不再与已平仓的批次配对
+    result = import_batch(storage, calculator, [trade('2025-01-05', 'SELL', 5, 130.0)])
+    assert result['closed_positions'] == 1
+    closed = storage.get_all_closed_positions()
+    assert [(cp['open_price'], cp['quantity']) for cp in closed] == [(100.0, 10), (110.0, 5), (110.0, 5)]
+    assert storage.get_open_lots('AAPL') == []
+
+    # 重复导入同一批交易不产生新的已平仓记录
+    result = calculator.process_trades([trade('2025-01-04', 'SELL', 15, 120.0)])
+    assert result['processed'] == 0 and result['skipped'] == 1
+    assert len(storage.get_all_closed_positions()) == 3
+
+    # 不同账户的批次互不配对
+    import_batch(storage, calculator, [
+        trade('2025-02-01', 'BUY', 10, 50.0, account_id='A', symbol='TSLA'),
+        trade('2025-02-02', 'BUY', 10, 60.0, account_id='B', symbol='TSLA'),
+    ])
+    import_batch(storage, calculator, [trade('2025-02-03', 'SELL', 4, 70.0, account_id='B', symbol='TSLA')])
+    lots = {lot['account_id']: lot['remaining_quantity'] for lot in storage.get_open_lots('TSLA')}
+    assert lots == {'A': 10, 'B': 6}
+
+    # 从全部交易重建的账本与增量维护的一致
+    incremental = [(lot['account_id'], lot['remaining_quantity']) for lot in storage.get_open_lots('TSLA')]
+    calculator.rebuild_lot_ledger()
+    assert [(lot['account_id'], lot['remaining_quantity']) for lot in storage.get_open_lots('TSLA')] == incremental
+    assert storage.get_open_lots('AAPL') == []
+
+
+class MemoryLedgerStorage(MemoryStorage):
+    """补充测试用到的查询接口"""
+
+    def get_all_trades(self):
+        return list(self.trades)
+
+    def get_all_closed_positions(self):
+        return list(self.closed_positions)
+
+
+def test_memory_ledger():
+    """内存存储下的账本行为"""
+    check_ledger(MemoryLedgerStorage())
+
+
+def test_batch_reads_storage_once():
+    """一批交易涉及多个标的时，持仓和批次各读取一次，持仓和已平仓记录各一次写回"""
+    calls = []
+
+    class CountingStorage(MemoryLedgerStorage):
+        def __getattribute__(self, name):
+            if name in ('get_open_positions', 'get_open_lots_for_symbols', 'get_open_lots',
+                        'get_trades_by_symbol', 'update_position', 'update_positions', 'save_lot_ledger',
+                        'insert_closed_position', 'insert_closed_positions'):
+                calls.append(name)
+            return super().__getattribute__(name)
+
+    storage = CountingStorage()
+    calculator = PnLCalculator(storage)
+    symbols = [f'SYM{i:03d}' for i in range(50)]
+    trades = [trade('2025-01-02', 'BUY', 10, 10.0, symbol=symbol) for symbol in symbols]
+    trades += [trade('2025-01-03', 'SELL', 5, 12.0, symbol=symbol) for symbol in symbols]
+
+    result = import_batch(storage, calculator, trades)
+    assert result['positions_updated'] == 50 and result['closed_positions'] == 50
+    assert sorted(calls) == ['get_open_lots_for_symbols', 'get_open_positions', 'insert_closed_positions',
+                             'save_lot_ledger', 'update_positions']
+    assert all(storage.positions[symbol]['total_quantity'] == 5 for symbol in symbols)
+
+
+def test_parallel_matches_serial():
+    """多进程分片计算的持仓、批次和已平仓记录与串行一致，进程池在各批次间复用"""
+    min_symbols = Config.PNL_PARALLEL_MIN_SYMBOLS
+    try:
+        Config.PNL_PARALLEL_MIN_SYMBOLS = 1
+        symbols = [f'SYM{i:03d}' for i in range(40)]
+        batches = [
+            [trade(f'2025-01-{day:02d}', 'BUY', 10 + i % 7, 10.0 + i + day, account_id='AB'[i % 2], symbol=symbol)
+             for i, symbol in enumerate(symbols)]
+            + [trade(f'2025-01-{day:02d}', 'SELL', 3 + i % 5, 12.0 + i, account_id='AB'[i % 2], symbol=symbol,
+                     time='15:00:00') for i, symbol in enumerate(symbols) if i % 3]
+            for day in range(1, 6)
+        ]
+
+        results = []
+        for workers in (1, 3):
+            storage = MemoryLedgerStorage()
+            calculator = PnLCalculator(storage, workers=workers)
+            pools = set()
+            for batch in batches:
+                import_batch(storage, calculator, batch)
+                pools.add(id(calculator._pool))
+            calculator.rebuild_lot_ledger()
+            # 各批次复用同一个进程池，关闭后释放
+            assert len(pools) == 1 and (calculator._pool is None) == (workers == 1)
+            calculator.close()
+            assert calculator._pool is None
+            results.append((
+                [(cp['symbol'], cp['quantity'], cp['net_pnl']) for cp in storage.closed_positions],
+                {symbol: (p['total_quantity'], p['avg_cost']) for symbol, p in storage.positions.items()},
+                storage.open_lots,
+                storage.ledger_keys,
+            ))
+
+        assert len(results[0][0]) > 100
+        assert results[0] == results[1]
+    finally:
+        Config.PNL_PARALLEL_MIN_SYMBOLS = min_symbols
+
+
+def test_sheets_ledger():
+    """Google Sheets存储下的账本行为；每批只写入涉及标的的行，清空的行留待复用"""
+    adapter = make_adapter()
+    check_ledger(adapter)
+
+    calculator = PnLCalculator(adapter)
+    import_batch(adapter, calculator, [trade('2025-04-01', 'BUY', 10, 10.0, symbol=f'S{i:02d}') for i in range(20)])
+    adapter.flush()
+    sheet = adapter.spreadsheet.sheets['open_lots']
+    row_count = len(sheet.rows)
+    requests = adapter.spreadsheet.requests
+    requests.clear()
+
+    import_batch(adapter, calculator, [trade('2025-04-02', 'SELL', 10, 12.0, symbol='S03')])
+    adapter.flush()
+    assert requests['open_lots.batch_update'] == 1
+    assert requests['open_lots.clear'] == requests['open_lots.update'] == requests['open_lots.append_rows'] == 0
+    assert len(sheet.rows) == row_count
+
+    import_batch(adapter, calculator, [trade('2025-04-03', 'BUY', 5, 11.0, symbol='NEW')])
+    adapter.flush()
+    assert len(sheet.rows) == row_count
+
+    fresh = make_adapter()
+    fresh.spreadsheet = adapter.spreadsheet
+    assert fresh.get_open_lots('S03') == []
+    assert [lot['remaining_quantity'] for lot in fresh.get_open_lots('NEW')] == [5]
+    assert len(fresh.get_open_lots_for_symbols([f'S{i:02d}' for i in range(20)])) == 19
+
+
+def test_sqlite_ledger():
+    """SQLite存储下的账本行为，以及失败时整个标的的更新回滚"""
+    print("持仓批次账本测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            check_ledger(storage)
+
+            calculator = PnLCalculator(storage)
+            import_batch(storage, calculator, [trade('2025-03-01', 'BUY', 10, 10.0, symbol='NVDA')])
+
+            def fail(*args):
+                raise RuntimeError('写入失败')
+
+            storage.save_lot_ledger = fail
+            result = calculator.process_trades([trade('2025-03-02', 'SELL', 10, 12.0, symbol='NVDA')])
+            del storage.save_lot_ledger
+            assert result['errors']
+
+            # 已平仓记录和持仓随账本一起回滚，重试时正常配对
+            assert not [cp for cp in storage.get_all_closed_positions() if cp['symbol'] == 'NVDA']
+            assert [lot['remaining_quantity'] for lot in storage.get_open_lots('NVDA')] == [10]
+            result = calculator.process_trades([trade('2025-03-02', 'SELL', 10, 12.0, symbol='NVDA')])
+            assert result['closed_positions'] == 1
+            print(f"已平仓记录: {len(storage.get_all_closed_positions())}, "
+                  f"持仓: {[(p['symbol'], p['total_quantity']) for p in storage.get_open_positions()]}")
+        finally:
+            storage.close()
+
+
+def test_upgrade_rebuilds_ledger():
+    """旧版本数据（有持仓无账本）：启动时自动重建，之后可随时再次重建"""
+    with tempfile.TemporaryDirectory() as folder:
+        storage = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            calculator = PnLCalculator(storage)
+            import_batch(storage, calculator, [
+                trade('2025-01-02', 'BUY', 10, 100.0),
+                trade('2025-01-03', 'BUY', 10, 110.0, symbol='MSFT'),
+            ])
+            with storage.transaction() as conn:
+                conn.execute("DELETE FROM open_lots")
+                conn.execute("DELETE FROM ledger_trades")
+            assert storage.get_open_lots('AAPL') == []
+
+            result = calculator.ensure_lot_ledger()
+            assert result['symbols'] == 2 and result['open_lots'] == 2
+            assert calculator.ensure_lot_ledger() is None
+
+            result = import_batch(storage, calculator, [trade('2025-01-04', 'SELL', 10, 120.0)])
+            assert result['closed_positions'] == 1
+            assert storage.get_open_lots('AAPL') == []
+
+            # 命令行工具的 --closed-positions：重建已平仓记录，结果不变
+            assert calculator.rebuild_lot_ledger()['open_lots'] == 1
+            assert calculator.rebuild_closed_positions()['closed_positions'] == 1
+            assert [lot['remaining_quantity'] for lot in storage.get_open_lots('MSFT')] == [10]
+        finally:
+            storage.close()
+
+
+if __name__ == '__main__':
+    test_memory_ledger()
+    test_batch_reads_storage_once()
+    test_parallel_matches_serial()
+    test_sheets_ledger()
+    test_sqlite_ledger()
+    test_upgrade_rebuilds_ledger()
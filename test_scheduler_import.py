@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+测试调度器文件导入（串行 / 多进程流水线）
+"""
+import sys
+import os
+import queue
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import pandas as pd
+
+from app.config import Config
+from app import scheduler
+
+
+class MemoryStorage:
+    """内存存储，仅实现调度器和计算器用到的接口"""
+
+    def __init__(self):
+        self.trades = []
+        self.positions = {}
+        self.closed_positions = []
+        self.import_logs = []
+        self.open_lots = {}
+        self.ledger_keys = set()
+
+    def insert_trades(self, trades):
+        self.trades.extend(trades)
+        return len(trades)
+
+    def get_trades_by_symbol(self, symbol):
+        return [t for t in self.trades if t['symbol'] == symbol]
+
+    def get_open_positions(self):
+        return [p for p in self.positions.values() if p.get('total_quantity', 0) > 0]
+
+    def update_position(self, symbol, position_data):
+        self.positions[symbol] = dict(position_data)
+
+    def update_positions(self, positions):
+        for position in positions:
+            self.positions[position['symbol']] = dict(position)
+
+    def insert_closed_position(self, closed_data):
+        self.closed_positions.append(closed_data)
+
+    def insert_closed_positions(self, closed_list):
+        self.closed_positions.extend(closed_list)
+
+    def get_open_lots(self, symbol):
+        return [dict(lot) for lot in self.open_lots.get(symbol, [])]
+
+    def get_open_lots_for_symbols(self, symbols):
+        return {symbol: self.get_open_lots(symbol) for symbol in symbols if self.open_lots.get(symbol)}
+
+    def get_applied_trade_keys(self, trade_keys):
+        return self.ledger_keys & set(trade_keys)
+
+    def save_lot_ledger(self, lots_by_symbol, trade_keys):
+        for symbol, lots in lots_by_symbol.items():
+            self.open_lots[symbol] = [dict(lot) for lot in lots]
+        self.ledger_keys.update(trade_keys)
+
+    def insert_import_log(self, log_data):
+        self.import_logs.append(log_data)
+
+    def get_import_log_by_hash(self, file_hash):
+        return next((log for log in self.import_logs if log['file_hash'] == file_hash), None)
+
+
+def write_statements(folder, count):
+    """生成若干富途旧格式CSV对账单"""
+    for i in range(count):
+        pd.DataFrame({
+            '成交日期': [f'2025-01-{i + 1:02d}'] * 3,
+            '成交时间': ['09:30:00', '10:30:00', '14:00:00'],
+            '证券代码': ['AAPL', 'AAPL', 'TSLA'],
+            '交易方向': ['买入', '卖出', '买入'],
+            '成交数量': [10, 5, 3],
+            '成交价格': [100.0 + i, 101.0 + i, 250.0],
+            '成交金额': [1000.0 + 10 * i, 505.0 + 5 * i, 750.0],
+            '手续费': [1.0, 1.0, 1.0],
+        }).to_csv(os.path.join(folder, f'statement_{i:02d}.csv'), index=False)
+
+
+def run_import(folder, workers):
+    """用指定进程数导入文件夹，返回调度器"""
+    Config.WATCH_FOLDER = folder
+    Config.IMPORT_WORKERS = workers
+    Config.get_storage_adapter = classmethod(lambda cls: MemoryStorage())
+
+    trading_scheduler = scheduler.TradingScheduler()
+    trading_scheduler._check_new_files()
+    return trading_scheduler
+
+
+def test_parallel_import_matches_serial():
+    """多进程导入的结果应与串行导入完全一致"""
+    print("调度器导入测试")
+    print("=" * 50)
+
+    watch_folder, workers, manifest_path = Config.WATCH_FOLDER, Config.IMPORT_WORKERS, Config.FILE_MANIFEST_PATH
+    get_storage_adapter = vars(Config)['get_storage_adapter']
+    chunk_size = Config.PARSE_CHUNK_SIZE
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            # 每个文件分多批解析，多进程导入时逐批传回主进程
+            Config.PARSE_CHUNK_SIZE = 2
+            write_statements(folder, 6)
+
+            results = []
+            for workers_count in (1, 3):
+                trading_scheduler = run_import(folder, workers_count)
+                storage = trading_scheduler.storage
+                print(f"进程数={workers_count}: 交易={len(storage.trades)}, "
+                      f"已平仓={len(storage.closed_positions)}, 日志={len(storage.import_logs)}")
+
+                assert len(storage.trades) == 18
+                assert all(log['status'] == 'SUCCESS' for log in storage.import_logs)
+                assert trading_scheduler.imported_trades == 18
+
+                results.append((
+                    [(t['symbol'], t['trade_date'], t['price']) for t in storage.trades],
+                    [(cp['symbol'], cp['quantity'], cp['net_pnl']) for cp in storage.closed_positions],
+                    [log['file_name'] for log in storage.import_logs],
+                    # updated_at 是处理时间，不参与比较
+                    {symbol: {k: v for k, v in position.items() if k != 'updated_at'}
+                     for symbol, position in storage.positions.items()},
+                ))
+
+                # 再次检查时已导入的文件应被跳过
+                trading_scheduler._check_new_files()
+                assert len(storage.import_logs) == 6
+
+            assert results[0] == results[1]
+    finally:
+        Config.WATCH_FOLDER, Config.IMPORT_WORKERS, Config.get_storage_adapter = watch_folder, workers, get_storage_adapter
+        Config.FILE_MANIFEST_PATH, Config.PARSE_CHUNK_SIZE = manifest_path, chunk_size
+
+
+def test_duplicate_files_in_one_drop():
+    """同一批次中内容相同的文件只导入一次，串行和多进程导入结果一致"""
+    watch_folder, workers, manifest_path = Config.WATCH_FOLDER, Config.IMPORT_WORKERS, Config.FILE_MANIFEST_PATH
+    get_storage_adapter = vars(Config)['get_storage_adapter']
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            write_statements(folder, 3)
+            shutil.copy(os.path.join(folder, 'statement_01.csv'), os.path.join(folder, 'statement_01_copy.csv'))
+
+            for workers_count in (1, 3):
+                storage = run_import(folder, workers_count).storage
+                assert len(storage.trades) == 9
+                assert [log['file_name'] for log in storage.import_logs] == [
+                    'statement_00.csv', 'statement_01.csv', 'statement_02.csv']
+    finally:
+        Config.WATCH_FOLDER, Config.IMPORT_WORKERS, Config.get_storage_adapter = watch_folder, workers, get_storage_adapter
+        Config.FILE_MANIFEST_PATH = manifest_path
+
+
+def test_batches_stream_from_worker():
+    """解析任务逐批放入有长度上限的队列；提前停止读取时取走剩余批次；解析失败在已读批次之后抛出"""
+    chunk_size = Config.PARSE_CHUNK_SIZE
+    try:
+        Config.PARSE_CHUNK_SIZE = 1
+        with tempfile.TemporaryDirectory() as folder, ThreadPoolExecutor(max_workers=1) as pool:
+            write_statements(folder, 1)
+            path = os.path.join(folder, 'statement_00.csv')
+
+            batch_queue = queue.Queue(scheduler.STREAM_QUEUE_BATCHES)
+            future = pool.submit(scheduler.stream_file_batches, path, batch_queue)
+            assert [count for count, _, _ in scheduler.BatchStream(batch_queue, future)] == [1, 1, 1]
+            assert future.result() == 3
+
+            # 只读一批就停止，解析任务不会阻塞在已满的队列上
+            batch_queue = queue.Queue(1)
+            future = pool.submit(scheduler.stream_file_batches, path, batch_queue)
+            batches = scheduler.BatchStream(batch_queue, future)
+            next(iter(batches))
+            batches.close()
+            assert future.result(timeout=5) == 3
+
+            batch_queue = queue.Queue(1)
+            future = pool.submit(scheduler.stream_file_batches, os.path.join(folder, 'missing.csv'), batch_queue)
+            try:
+                list(scheduler.BatchStream(batch_queue, future))
+                assert False, '解析失败时应抛出异常'
+            except Exception as e:
+                assert not isinstance(e, AssertionError)
+    finally:
+        Config.PARSE_CHUNK_SIZE = chunk_size
+
+
+if __name__ == '__main__':
+    test_parallel_import_matches_serial()
+    test_duplicate_files_in_one_drop()
+    test_batches_stream_from_worker()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+测试Google Sheets适配器的读缓存：重复读取不请求API、写入修补缓存、TTL过期重新读取
+"""
+import sys
+import os
+import time
+from collections import Counter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import gspread
+
+from app.google_sheets_adapter import GoogleSheetsAdapter, WORKSHEET_HEADERS
+from app.sheets_cache import SheetCache
+from app.sheets_writer import SheetWriteBuffer
+
+
+class FakeWorksheet:
+    """内存中的工作表，实现适配器用到的 gspread.Worksheet 方法，每次调用计为一次API请求"""
+
+    def __init__(self, name, headers, requests):
+        self.title = name
+        self.rows = [list(headers)]
+        self.requests = requests
+
+    def _count(self, method):
+        self.requests[f'{self.title}.{method}'] += 1
+
+    def get_all_records(self):
+        self._count('get_all_records')
+        headers = self.rows[0]
+        return [dict(zip(headers, row)) for row in self.rows[1:]]
+
+    def col_values(self, col):
+        self._count('col_values')
+        return [row[col - 1] for row in self.rows]
+
+    def row_values(self, row):
+        self._count('row_values')
+        return list(self.rows[row - 1])
+
+    def append_row(self, row):
+        self._count('append_row')
+        self.rows.append(list(row))
+
+    def append_rows(self, rows):
+        self._count('append_rows')
+        self.rows.extend(list(row) for row in rows)
+
+    def batch_update(self, data):
+        self._count('batch_update')
+        for item in data:
+            index = int(item['range'].split(':')[0][1:]) - 1
+            self.rows[index] = list(item['values'][0])
+
+    def update(self, range_name, values):
+        self._count('update')
+        self.rows = [list(row) for row in values]
+
+    def clear(self):
+        self._count('clear')
+        self.rows = []
+
+    def delete_rows(self, start, end=None):
+        self._count('delete_rows')
+        del self.rows[start - 1:end or start]
+
+
+class FakeSpreadsheet:
+    """内存中的电子表格，requests 统计各工作表的API请求次数"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.sheets = {name: FakeWorksheet(name, headers, self.requests)
+                       for name, headers in WORKSHEET_HEADERS.items()}
+
+    def worksheet(self, name):
+        if name not in self.sheets:
+            raise gspread.exceptions.WorksheetNotFound(name)
+        return self.sheets[name]
+
+    def add_worksheet(self, title, rows, cols):
+        self.sheets[title] = FakeWorksheet(title, [], self.requests)
+        return self.sheets[title]
+
+
+def make_adapter(ttl_seconds=300, buffer_rows=500, buffer_seconds=0):
+    """不连接Google的适配器（默认不启用定时写入）"""
+    adapter = GoogleSheetsAdapter.__new__(GoogleSheetsAdapter)
+    adapter.spreadsheet = FakeSpreadsheet()
+    adapter.cache = SheetCache(ttl_seconds)
+    adapter.writer = SheetWriteBuffer(adapter._worksheet, list(WORKSHEET_HEADERS), buffer_rows, buffer_seconds,
+                                      on_error=adapter.cache.invalidate)
+    return adapter
+
+
+def make_trade(i, symbol='AAPL'):
+    return {
+        'trade_date': f'2025-01-{i % 3 + 1:02d}', 'trade_time': f'10:00:{i:02d}',
+        'symbol': symbol, 'action': 'BUY', 'quantity': 10, 'price': 100.0 + i,
+        'amount': 1000.0 + i * 10, 'commission': 1.0
+    }
+
+
+def test_repeated_reads_hit_cache():
+    """首次读取后，重复读取和按字段查找都不再请求API"""
+    print("Sheets读缓存测试")
+    print("=" * 50)
+
+    adapter = make_adapter()
+    adapter.insert_trades([make_trade(i, ['AAPL', 'TSLA'][i % 2]) for i in range(6)])
+    # 插入时为按自然键去重已读取交易表，这里丢弃缓存，从首次读取开始统计
+    adapter.cache.invalidate()
+    requests = adapter.spreadsheet.requests
+    requests.clear()
+
+    first = adapter.get_all_trades()
+    assert len(first) == 6
+    assert requests['trades.get_all_records'] == 1
+
+    for _ in range(5):
+        assert len(adapter.get_all_trades()) == 6
+        assert [t['symbol'] for t in adapter.get_trades_by_symbol('TSLA')] == ['TSLA'] * 3
+        assert len(adapter.get_trades_by_date('2025-01-01')) == 2
+    print(f"API请求: {dict(requests)}, 命中={adapter.cache.hits}, 未命中={adapter.cache.misses}")
+    assert sum(requests.values()) == 1
+
+    # 调用方修改返回的记录不影响缓存
+    first[0]['symbol'] = 'CHANGED'
+    adapter.get_trades_by_symbol('TSLA')[0]['symbol'] = 'CHANGED'
+    assert 'CHANGED' not in {t['symbol'] for t in adapter.get_all_trades()}
+
+
+def test_writes_patch_cache():
+    """适配器自己的写入修补缓存和索引，读取结果与工作表内容一致且不重新读取"""
+    adapter = make_adapter()
+    adapter.insert_trades([make_trade(0)])
+    assert len(adapter.get_trades_by_symbol('AAPL')) == 1
+
+    requests = adapter.spreadsheet.requests
+    requests.clear()
+    adapter.insert_trades([make_trade(1), make_trade(2, 'TSLA')])
+    assert [t['id'] for t in adapter.get_trades_by_symbol('AAPL')] == [1, 2]
+    assert [t['id'] for t in adapter.get_trades_by_symbol('TSLA')] == [3]
+    # 追加写入用缓存的记录数计算ID，不再读取ID列
+    assert requests == Counter({'trades.append_rows': 1})
+
+    adapter.update_positions([{'symbol': 'AAPL', 'total_quantity': 10, 'avg_cost': 100.0, 'total_cost': 1000.0}])
+    adapter.update_positions([
+        {'symbol': 'AAPL', 'total_quantity': 0, 'avg_cost': 0, 'total_cost': 0},
+        {'symbol': 'TSLA', 'total_quantity': 5, 'avg_cost': 200.0, 'total_cost': 1000.0},
+    ])
+    assert [p['symbol'] for p in adapter.get_open_positions()] == ['TSLA']
+
+    adapter.save_lot_ledger({'TSLA': [{'account_id': '', 'trade_date': '2025-01-03', 'trade_time': '10:00:02',
+                                       'quantity': 5, 'remaining_quantity': 5, 'price': 200.0,
+                                       'commission': 0, 'cost_basis': 1000.0}]}, {'k1': 'TSLA'})
+    assert adapter.get_applied_trade_keys(['k1', 'k2']) == {'k1'}
+    assert [lot['remaining_quantity'] for lot in adapter.get_open_lots('TSLA')] == [5]
+
+    adapter.insert_closed_positions([{'symbol': 'AAPL', 'close_date': '2025-01-02', 'net_pnl': 10.0}])
+    assert len(adapter.get_closed_positions_by_date('2025-01-02')) == 1
+    adapter.replace_closed_positions([{'symbol': 'TSLA', 'close_date': '2025-01-03', 'net_pnl': 5.0}])
+    assert adapter.get_closed_positions_by_date('2025-01-02') == []
+    assert [c['symbol'] for c in adapter.get_all_closed_positions()] == ['TSLA']
+
+    adapter.insert_import_log({'file_name': 'a.xlsx', 'file_hash': 'abc', 'status': 'SUCCESS'})
+    assert adapter.get_import_log_by_hash('abc')['file_name'] == 'a.xlsx'
+    assert adapter.get_import_log_by_hash('missing') is None
+
+    assert requests['trades.get_all_records'] == 0
+
+    # 缓冲写入后，缓存内容与重新读取工作表的结果一致
+    adapter.flush()
+    fresh = make_adapter()
+    fresh.spreadsheet = adapter.spreadsheet
+    for name in ('trades', 'positions', 'closed_positions', 'open_lots', 'ledger_trades', 'import_logs'):
+        assert adapter._records(name) == fresh._records(name), name
+
+    adapter.clear_all_data()
+    assert adapter.get_all_trades() == []
+
+
+def test_failed_write_invalidates():
+    """写入失败时丢弃该工作表的缓存，下次读取重新请求"""
+    adapter = make_adapter()
+    adapter.insert_trades([make_trade(0)])
+    adapter.get_all_trades()
+
+    worksheet = adapter.spreadsheet.sheets['trades']
+
+    def fail(rows):
+        raise RuntimeError('quota exceeded')
+    worksheet.append_rows = fail
+
+    try:
+        adapter.insert_trades([make_trade(1)])
+        assert False, 'insert_trades 应抛出异常'
+    except RuntimeError:
+        pass
+    assert adapter.cache.peek('trades') is None
+    assert len(adapter.get_all_trades()) == 1
+
+
+def test_ttl_expiry_and_disabled():
+    """超过TTL后重新读取；TTL为0时每次都读取"""
+    adapter = make_adapter(ttl_seconds=0.05)
+    requests = adapter.spreadsheet.requests
+    adapter.get_all_trades()
+    adapter.get_all_trades()
+    assert requests['trades.get_all_records'] == 1
+
+    # 其他客户端直接修改了工作表
+    adapter.spreadsheet.sheets['trades'].rows.append([1, '2025-01-01', '', 'AAPL'])
+    time.sleep(0.06)
+    assert len(adapter.get_all_trades()) == 1
+    assert requests['trades.get_all_records'] == 2
+
+    adapter = make_adapter(ttl_seconds=0)
+    requests = adapter.spreadsheet.requests
+    for _ in range(3):
+        adapter.get_trades_by_symbol('AAPL')
+    assert requests['trades.get_all_records'] == 3
+    assert adapter.cache.peek('trades') is None
+
+
+if __name__ == '__main__':
+    test_repeated_reads_hit_cache()
+    test_writes_patch_cache()
+    test_failed_write_invalidates()
+    test_ttl_expiry_and_disabled()
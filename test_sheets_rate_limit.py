@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+测试Sheets API限流和重试：本地假Sheets服务器 + 真实gspread客户端
+"""
+import sys
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import gspread
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.google_sheets_adapter import GoogleSheetsAdapter, WORKSHEET_HEADERS
+from app.sheets_cache import SheetCache
+from app.sheets_rate_limit import SheetsRateLimiter, TokenBucket
+from app.sheets_writer import SheetWriteBuffer
+
+SHEETS_API = 'https://sheets.googleapis.com'
+SPREADSHEET_ID = 'local-test'
+
+
+class FakeSheetsServer(ThreadingHTTPServer):
+    """
+    本地假Sheets API服务器，实现适配器用到的 spreadsheets / values 接口
+
+    quota: 每 window 秒内允许的请求数，超出返回429
+    failures: [(方法, 路径片段, 状态码)]，匹配的请求依次返回一次该错误
+    """
+
+    daemon_threads = True
+
+    def __init__(self, quota=None, window=1.0):
+        super().__init__(('127.0.0.1', 0), FakeSheetsHandler)
+        self.quota = quota
+        self.window = window
+        self.failures = []
+        self.recent = deque()
+        self.statuses = []
+        self.sheets = {}
+        self.lock = threading.Lock()
+        for name, headers in WORKSHEET_HEADERS.items():
+            self.add_sheet(name, [list(headers)])
+
+    def add_sheet(self, title, rows=None):
+        self.sheets[title] = {'sheetId': len(self.sheets), 'rows': rows or []}
+        return self.sheet_properties(title)
+
+    def sheet_properties(self, title):
+        sheet = self.sheets[title]
+        return {'title': title, 'sheetId': sheet['sheetId'], 'index': sheet['sheetId'],
+                'gridProperties': {'rowCount': 1000, 'columnCount': 26}}
+
+    def admit(self, method, path):
+        """按配额和注入的错误决定本次请求的状态码"""
+        with self.lock:
+            for i, (fail_method, fragment, status) in enumerate(self.failures):
+                if fail_method == method and fragment in path:
+                    del self.failures[i]
+                    self.statuses.append(status)
+                    return status
+
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] >= self.window:
+                self.recent.popleft()
+            if self.quota is not None and len(self.recent) >= self.quota:
+                self.statuses.append(429)
+                return 429
+            self.recent.append(now)
+            self.statuses.append(200)
+            return 200
+
+
+def parse_range(value):
+    """"'标题'!A2:M2" -> (标题, 起始行, 单元格部分)"""
+    match = re.match(r"^'((?:[^']|'')*)'(?:!(.*))?$", value)
+    title, cells = match.group(1).replace("''", "'"), match.group(2) or ''
+    row = re.match(r'^[A-Z]*(\d*)', cells).group(1)
+    return title, int(row) if row else 1, cells
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        path = unquote(url.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+
+        status = server.admit(method, path)
+        if status != 200:
+            reason = 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'
+            return self._reply(status, {'error': {'code': status, 'message': reason, 'status': reason}})
+
+        prefix = f'/v4/spreadsheets/{SPREADSHEET_ID}'
+        rest = path[len(prefix):]
+        with server.lock:
+            if rest == '' and method == 'GET':
+                return self._reply(200, {
+                    'spreadsheetId': SPREADSHEET_ID, 'properties': {'title': 'test'},
+                    'sheets': [{'properties': server.sheet_properties(t)} for t in server.sheets]})
+
+            if rest == ':batchUpdate':
+                replies = []
+                for item in body['requests']:
+                    if 'addSheet' in item:
+                        title = item['addSheet']['properties']['title']
+                        replies.append({'addSheet': {'properties': server.add_sheet(title)}})
+                    elif 'deleteDimension' in item:
+                        dimension = item['deleteDimension']['range']
+                        sheet = next(s for s in server.sheets.values() if s['sheetId'] == dimension['sheetId'])
+                        del sheet['rows'][dimension['startIndex']:dimension['endIndex']]
+                        replies.append({})
+                return self._reply(200, {'spreadsheetId': SPREADSHEET_ID, 'replies': replies})
+
+            if rest == '/values:batchUpdate':
+                for item in body['data']:
+                    title, row, _ = parse_range(item['range'])
+                    self._write(server.sheets[title]['rows'], row, item['values'])
+                return self._reply(200, {'spreadsheetId': SPREADSHEET_ID})
+
+            value_range = rest[len('/values/'):]
+            if value_range.endswith(':append'):
+                title, _, _ = parse_range(value_range[:-len(':append')])
+                server.sheets[title]['rows'].extend(body['values'])
+                return self._reply(200, {'spreadsheetId': SPREADSHEET_ID, 'updates': {}})
+            if value_range.endswith(':clear'):
+                title, _, _ = parse_range(value_range[:-len(':clear')])
+                server.sheets[title]['rows'] = []
+                return self._reply(200, {'spreadsheetId': SPREADSHEET_ID})
+
+            title, row, cells = parse_range(value_range)
+            rows = server.sheets[title]['rows']
+            if method == 'PUT':
+                self._write(rows, row, body['values'])
+                return self._reply(200, {'spreadsheetId': SPREADSHEET_ID})
+
+            if params.get('majorDimension') == 'COLUMNS':
+                col = ord(cells[0]) - ord('A')
+                values = [[r[col] if col < len(r) else '' for r in rows]]
+            else:
+                values = rows
+            result = {'range': value_range, 'majorDimension': params.get('majorDimension', 'ROWS')}
+            if values and values[0]:
+                result['values'] = values
+            return self._reply(200, result)
+
+    @staticmethod
+    def _write(rows, start_row, values):
+        while len(rows) < start_row - 1 + len(values):
+            rows.append([])
+        rows[start_row - 1:start_row - 1 + len(values)] = [list(v) for v in values]
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+
+class LocalAdapter(HTTPAdapter):
+    """把发往Sheets API的请求转到本地服务器"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(SHEETS_API, self.base_url, 1)
+        return super().send(request, **kwargs)
+
+
+def open_spreadsheet(server, limiter):
+    """用真实gspread客户端连接本地服务器，返回经限流的电子表格"""
+    session = requests.Session()
+    session.mount(SHEETS_API, LocalAdapter(f'http://127.0.0.1:{server.server_address[1]}'))
+    client = gspread.Client(None, session=session)
+    return limiter.wrap(client.open_by_key(SPREADSHEET_ID))
+
+
+def make_adapter(server, limiter):
+    adapter = GoogleSheetsAdapter.__new__(GoogleSheetsAdapter)
+    adapter.limiter = limiter
+    adapter.spreadsheet = open_spreadsheet(server, limiter)
+    adapter.cache = SheetCache(300)
+    adapter.writer = SheetWriteBuffer(adapter._worksheet, list(WORKSHEET_HEADERS), 500, 0,
+                                      on_error=adapter.cache.invalidate)
+    return adapter
+
+
+def run_import(adapter, files=5):
+    """模拟多个文件导入：交易、持仓、已平仓、导入日志，每个文件结束时写入缓冲"""
+    for i in range(files):
+        adapter.insert_trades([{'trade_date': f'2025-01-{i + 1:02d}', 'symbol': f'S{j}', 'action': 'BUY',
+                                'quantity': 10, 'price': 100.0 + j, 'amount': 1000.0} for j in range(3)])
+        adapter.update_positions([{'symbol': f'S{j}', 'total_quantity': 10 * (i + 1)} for j in range(3)])
+        adapter.insert_closed_positions([{'symbol': 'S0', 'close_date': f'2025-01-{i + 1:02d}', 'net_pnl': 1.0}])
+        adapter.insert_import_log({'file_name': f'{i}.csv', 'file_hash': f'h{i}', 'status': 'SUCCESS'})
+        adapter.flush()
+        adapter.cache.invalidate()
+
+
+def check_result(server, files=5):
+    sheets = server.sheets
+    assert len(sheets['trades']['rows']) == 1 + 3 * files
+    assert [r[0] for r in sheets['trades']['rows'][1:]] == list(range(1, 3 * files + 1))
+    assert [(r[1], r[4]) for r in sheets['positions']['rows'][1:]] == [(f'S{j}', 10 * files) for j in range(3)]
+    assert len(sheets['closed_positions']['rows']) == 1 + files
+    assert [r[1] for r in sheets['import_logs']['rows'][1:]] == [f'{i}.csv' for i in range(files)]
+
+
+def test_token_bucket_paces_requests():
+    """令牌用完后按速率等待，等待时间累计"""
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(60, clock=lambda: now[0], sleep=sleep, burst=3)
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert [round(w, 6) for w in waits[3:]] == [1.0, 1.0, 1.0]
+
+    now[0] += 10   # 空闲后令牌恢复，但不超过容量
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert round(bucket.acquire(), 6) == 1.0
+
+
+def test_backoff_on_quota_errors():
+    """服务器按配额返回429时退避重试，导入变慢但不失败"""
+    print("Sheets API限流测试")
+    print("=" * 50)
+
+    server = FakeSheetsServer(quota=8, window=0.5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # 不重试时，超出配额的请求直接失败
+        limiter = SheetsRateLimiter(10 ** 6, 10 ** 6, max_retries=0)
+        adapter = make_adapter(server, limiter)
+        try:
+            run_import(adapter)
+            assert False, '超出配额时应抛出异常'
+        except gspread.exceptions.APIError as e:
+            assert e.code == 429
+
+        server.shutdown()
+        server = FakeSheetsServer(quota=8, window=0.5)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        limiter = SheetsRateLimiter(10 ** 6, 10 ** 6, max_retries=10, base_delay=0.05, max_delay=0.5,
+                                    rand=random.Random(1))
+        adapter = make_adapter(server, limiter)
+        start = time.monotonic()
+        run_import(adapter)
+        print(f"退避重试: {limiter.metrics}, 耗时 {time.monotonic() - start:.2f} 秒, "
+              f"429 次数 {server.statuses.count(429)}")
+        check_result(server)
+        assert limiter.metrics['retries'] == server.statuses.count(429) > 0
+        assert limiter.metrics['backoff_seconds'] > 0
+    finally:
+        server.shutdown()
+
+
+def test_token_bucket_avoids_quota_errors():
+    """客户端令牌桶的速率低于服务器配额时不出现429"""
+    server = FakeSheetsServer(quota=12, window=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        limiter = SheetsRateLimiter(300, 300, burst=3)
+        adapter = make_adapter(server, limiter)
+        run_import(adapter, files=3)
+        print(f"令牌桶限流: {limiter.metrics}")
+        check_result(server, files=3)
+        assert 429 not in server.statuses
+        assert limiter.metrics['retries'] == 0
+        assert limiter.metrics['throttled_seconds'] > 0
+    finally:
+        server.shutdown()
+
+
+def test_server_errors_retry_only_idempotent_calls():
+    """5xx时重试读取和覆盖写入，不重试可能已生效的追加"""
+    server = FakeSheetsServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        limiter = SheetsRateLimiter(10 ** 6, 10 ** 6, max_retries=3, base_delay=0.01)
+        adapter = make_adapter(server, limiter)
+        adapter.insert_trades([{'trade_date': '2025-01-01', 'symbol': 'AAPL', 'action': 'BUY', 'quantity': 1}])
+
+        server.failures = [('GET', '/values/', 503), ('GET', '/values/', 500)]
+        adapter.cache.invalidate()
+        assert len(adapter.get_all_trades()) == 1
+        assert limiter.metrics['retries'] == 2
+
+        server.failures = [('POST', ':append', 503)]
+        try:
+            adapter.insert_trades([{'trade_date': '2025-01-02', 'symbol': 'AAPL', 'action': 'BUY', 'quantity': 1}])
+            assert False, '追加失败时应抛出异常'
+        except gspread.exceptions.APIError as e:
+            assert e.code == 503
+        assert limiter.metrics['retries'] == 2
+        assert len(server.sheets['trades']['rows']) == 2
+
+        # 重试按行更新时写入原来的单元格范围
+        adapter.update_positions([{'symbol': 'AAPL', 'total_quantity': 1}])
+        adapter.flush()
+        server.failures = [('POST', 'values:batchUpdate', 503)]
+        adapter.update_positions([{'symbol': 'AAPL', 'total_quantity': 2}])
+        adapter.flush()
+        assert limiter.metrics['retries'] == 3
+        rows = server.sheets['positions']['rows']
+        assert rows[0] == WORKSHEET_HEADERS['positions']
+        assert [(r[1], r[4]) for r in rows[1:]] == [('AAPL', 2)]
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_token_bucket_paces_requests()
+    test_backoff_on_quota_errors()
+    test_token_bucket_avoids_quota_errors()
+    test_server_errors_retry_only_idempotent_calls()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+测试Google Sheets写入缓冲：合并写入、本地ID、行数/时间阈值、导入结束和关闭时写入
+"""
+import sys
+import os
+import time
+import tempfile
+from collections import Counter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app import scheduler
+from app.calculator import PnLCalculator
+from test_scheduler_import import write_statements
+from test_sheets_cache import make_adapter
+
+
+def make_position(symbol, quantity):
+    return {'symbol': symbol, 'total_quantity': quantity, 'avg_cost': 100.0, 'total_cost': 100.0 * quantity}
+
+
+def sheet_rows(adapter, name):
+    """工作表中实际写入的数据行（不含标题行）"""
+    return adapter.spreadsheet.sheets[name].rows[1:]
+
+
+def test_writes_are_coalesced():
+    """多次写入在 flush 时合并为每个工作表一次 batch_update 和一次 append_rows"""
+    print("Sheets写入缓冲测试")
+    print("=" * 50)
+
+    adapter = make_adapter()
+    requests = adapter.spreadsheet.requests
+    adapter.update_positions([make_position('AAPL', 10), make_position('TSLA', 5)])
+    adapter.flush()
+    requests.clear()
+
+    for i in range(20):
+        adapter.insert_closed_position({'symbol': 'AAPL', 'close_date': '2025-01-02', 'net_pnl': float(i)})
+        adapter.insert_import_log({'file_name': f'{i}.csv', 'file_hash': f'h{i}', 'status': 'SUCCESS'})
+        adapter.update_position('AAPL', make_position('AAPL', 10 + i))
+        adapter.insert_or_update_daily_summary({'summary_date': f'2025-01-{i % 5 + 1:02d}', 'total_trades': i})
+    adapter.update_position('NVDA', make_position('NVDA', 1))
+    adapter.update_position('NVDA', make_position('NVDA', 2))
+
+    # 排队期间只读取一次各表的ID列；已缓存的工作表读取时看到待写入的内容
+    assert set(requests) <= {'closed_positions.col_values', 'import_logs.col_values', 'daily_summary.get_all_records'}
+    assert [p['total_quantity'] for p in adapter.get_open_positions()] == [29, 5, 2]
+    assert adapter.writer.pending() > 0
+
+    requests.clear()
+    adapter.flush()
+    print(f"flush API请求: {dict(requests)}")
+    assert requests == Counter({
+        'positions.batch_update': 1, 'positions.append_rows': 1,
+        'closed_positions.append_rows': 1,
+        'daily_summary.append_rows': 1,
+        'import_logs.append_rows': 1,
+    })
+    assert adapter.writer.pending() == 0
+
+    assert [row[0] for row in sheet_rows(adapter, 'closed_positions')] == list(range(1, 21))
+    assert [row[0] for row in sheet_rows(adapter, 'import_logs')] == list(range(1, 21))
+    assert adapter.get_import_log_by_hash('h7')['id'] == 8
+    assert [(row[1], row[4]) for row in sheet_rows(adapter, 'positions')] == [('AAPL', 29), ('TSLA', 5), ('NVDA', 2)]
+    # 同一日期多次写入合并为一行，保留最后一次
+    assert [(row[1], row[2]) for row in sheet_rows(adapter, 'daily_summary')] == [
+        ('2025-01-01', 15), ('2025-01-02', 16), ('2025-01-03', 17), ('2025-01-04', 18), ('2025-01-05', 19)]
+
+
+def test_thresholds():
+    """待写入行数达到上限时立即写入，排队超过时间上限时由定时器写入"""
+    adapter = make_adapter(buffer_rows=5)
+    for i in range(4):
+        adapter.insert_import_log({'file_name': f'{i}.csv', 'file_hash': f'h{i}'})
+    assert sheet_rows(adapter, 'import_logs') == []
+    adapter.insert_import_log({'file_name': '4.csv', 'file_hash': 'h4'})
+    assert len(sheet_rows(adapter, 'import_logs')) == 5
+    assert adapter.writer.pending() == 0
+
+    adapter = make_adapter(buffer_seconds=0.1)
+    adapter.insert_import_log({'file_name': 'a.csv', 'file_hash': 'a'})
+    assert sheet_rows(adapter, 'import_logs') == []
+    deadline = time.time() + 5
+    while not sheet_rows(adapter, 'import_logs') and time.time() < deadline:
+        time.sleep(0.02)
+    assert len(sheet_rows(adapter, 'import_logs')) == 1
+
+    # 不缓冲时每次写入立即执行
+    adapter = make_adapter(buffer_rows=0)
+    adapter.insert_import_log({'file_name': 'a.csv', 'file_hash': 'a'})
+    assert len(sheet_rows(adapter, 'import_logs')) == 1
+
+
+def test_failed_flush_keeps_rows():
+    """写入失败时保留待写入内容并丢弃读缓存，下次写入时重试"""
+    adapter = make_adapter()
+    adapter.insert_import_log({'file_name': 'a.csv', 'file_hash': 'a'})
+
+    worksheet = adapter.spreadsheet.sheets['import_logs']
+    append_rows = worksheet.append_rows
+
+    def fail(rows):
+        raise RuntimeError('quota exceeded')
+    worksheet.append_rows = fail
+
+    try:
+        adapter.flush()
+        assert False, 'flush 应抛出异常'
+    except RuntimeError:
+        pass
+    assert adapter.writer.pending('import_logs') == 1
+    assert adapter.cache.peek('import_logs') is None
+
+    worksheet.append_rows = append_rows
+    adapter.flush()
+    assert [row[1] for row in sheet_rows(adapter, 'import_logs')] == ['a.csv']
+
+
+def test_scheduler_flushes_after_import_and_on_shutdown():
+    """调度器在每个文件导入结束时写入缓冲，关闭时写入剩余内容"""
+    saved = {name: vars(Config)[name] for name in (
+        'WATCH_FOLDER', 'FILE_WATCH_ENABLED', 'IMPORT_WORKERS', 'FILE_MANIFEST_PATH', 'get_storage_adapter')}
+    adapter = make_adapter(buffer_seconds=3600)
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.WATCH_FOLDER = folder
+            Config.FILE_WATCH_ENABLED = False
+            Config.IMPORT_WORKERS = 1
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            Config.get_storage_adapter = classmethod(lambda cls: adapter)
+            write_statements(folder, 3)
+
+            trading_scheduler = scheduler.TradingScheduler()
+            trading_scheduler._check_new_files()
+            assert adapter.writer.pending() == 0
+            assert len(sheet_rows(adapter, 'import_logs')) == 3
+            assert len(sheet_rows(adapter, 'trades')) == 9
+            assert len(sheet_rows(adapter, 'closed_positions')) == 3
+
+            adapter.insert_or_update_daily_summary({'summary_date': '2025-01-01', 'total_trades': 3})
+            assert sheet_rows(adapter, 'daily_summary') == []
+            trading_scheduler.shutdown()
+            assert len(sheet_rows(adapter, 'daily_summary')) == 1
+            assert adapter.writer.pending() == 0
+    finally:
+        for name, value in saved.items():
+            setattr(Config, name, value)
+
+
+def test_reimport_after_partial_failure():
+    """文件后面的批次解析失败时前面的批次已写入，重新导入时交易和已平仓记录不重复"""
+    saved = {name: vars(Config)[name] for name in (
+        'WATCH_FOLDER', 'FILE_WATCH_ENABLED', 'IMPORT_WORKERS', 'FILE_MANIFEST_PATH', 'get_storage_adapter')}
+    iter_valid_batches = scheduler.iter_valid_batches
+    adapter = make_adapter()
+
+    def fail_after_first_batch(parser, file_path):
+        batches = iter_valid_batches(parser, file_path)
+        yield next(batches)
+        raise ValueError('第二批解析失败')
+
+    try:
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as data_folder:
+            Config.WATCH_FOLDER = folder
+            Config.FILE_WATCH_ENABLED = False
+            Config.IMPORT_WORKERS = 1
+            Config.FILE_MANIFEST_PATH = os.path.join(data_folder, 'file_manifest.db')
+            Config.get_storage_adapter = classmethod(lambda cls: adapter)
+            write_statements(folder, 1)
+
+            trading_scheduler = scheduler.TradingScheduler()
+            scheduler.iter_valid_batches = fail_after_first_batch
+            trading_scheduler._check_new_files()
+            assert [row[8] for row in sheet_rows(adapter, 'import_logs')] == ['FAILED']
+            assert len(sheet_rows(adapter, 'trades')) == 3
+
+            scheduler.iter_valid_batches = iter_valid_batches
+            trading_scheduler._check_new_files()
+            assert [row[8] for row in sheet_rows(adapter, 'import_logs')] == ['FAILED', 'SUCCESS']
+            assert len(sheet_rows(adapter, 'trades')) == 3
+            assert len(sheet_rows(adapter, 'closed_positions')) == 1
+
+            # 同一批次内和与表格中已有记录重复的交易都跳过
+            trades = adapter.get_all_trades()
+            assert adapter.insert_trades(trades[:2] + trades[:1]) == 0
+            assert len(sheet_rows(adapter, 'trades')) == 3
+    finally:
+        scheduler.iter_valid_batches = iter_valid_batches
+        for name, value in saved.items():
+            setattr(Config, name, value)
+
+
+def test_ledger_written_last():
+    """账本与已平仓记录一起缓冲，flush 时最后写入；写入前中断时重新处理仍生成已平仓记录"""
+    adapter = make_adapter()
+    calculator = PnLCalculator(adapter)
+    buy = {'trade_date': '2025-01-02', 'trade_time': '10:00:00', 'symbol': 'AAPL', 'action': 'BUY',
+           'quantity': 10, 'price': 100.0, 'amount': 1000.0, 'commission': 1.0, 'account_id': ''}
+    sell = dict(buy, trade_date='2025-01-03', action='SELL', price=120.0, amount=1200.0)
+    adapter.insert_trades([buy])
+    calculator.process_trades([buy])
+    adapter.flush()
+
+    # 处理卖出后账本仍在缓冲中；进程在 flush 前退出，缓冲内容全部丢失
+    assert calculator.process_trades([sell])['closed_positions'] == 1
+    assert adapter.writer.pending('ledger_trades') == 1
+    assert len(sheet_rows(adapter, 'ledger_trades')) == 1
+    adapter.writer.reset()
+    adapter.cache.invalidate()
+
+    # 重新处理时卖出未计入账本，再次配对；已平仓记录写入失败时账本也不写入
+    calculator = PnLCalculator(adapter)
+    assert calculator.process_trades([sell])['closed_positions'] == 1
+    worksheet = adapter.spreadsheet.sheets['closed_positions']
+    append_rows = worksheet.append_rows
+
+    def fail(rows):
+        raise RuntimeError('quota exceeded')
+    worksheet.append_rows = fail
+    try:
+        adapter.flush()
+        assert False, 'flush 应抛出异常'
+    except RuntimeError:
+        pass
+    assert len(sheet_rows(adapter, 'ledger_trades')) == 1
+    assert adapter.writer.pending('open_lots') and adapter.writer.pending('ledger_trades')
+
+    # 重试时按顺序写入，交易键最后写入
+    order = []
+    for name, sheet in adapter.spreadsheet.sheets.items():
+        for method in ('append_rows', 'batch_update'):
+            original = append_rows if (name, method) == ('closed_positions', 'append_rows') else getattr(sheet, method)
+
+            def record(data, name=name, original=original):
+                order.append(name)
+                return original(data)
+            setattr(sheet, method, record)
+    adapter.flush()
+    assert order[-1] == 'ledger_trades'
+    assert order.index('closed_positions') < order.index('open_lots')
+    assert len(sheet_rows(adapter, 'closed_positions')) == 1
+    assert len(sheet_rows(adapter, 'ledger_trades')) == 2
+    assert adapter.get_open_lots('AAPL') == []
+
+
+if __name__ == '__main__':
+    test_writes_are_coalesced()
+    test_thresholds()
+    test_failed_flush_keeps_rows()
+    test_scheduler_flushes_after_import_and_on_shutdown()
+    test_reimport_after_partial_failure()
+    test_ledger_written_last()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试SQLite批量去重写入和唯一索引迁移
+"""
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.database import SQLiteAdapter, TradeRecord
+
+
+def make_trade(i, **kwargs):
+    data = dict(trade_date='2025-01-02', trade_time=f'10:00:{i:02d}', symbol='AAPL',
+                action='BUY', quantity=10, price=100.0 + i, amount=1000.0 + 10 * i)
+    data.update(kwargs)
+    return TradeRecord(**data)
+
+
+def test_bulk_insert_counts():
+    """重复记录（包括同一批次内）被跳过，返回准确的新增和跳过条数"""
+    with tempfile.TemporaryDirectory() as folder:
+        adapter = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            first = [make_trade(i) for i in range(5)] + [make_trade(0, notes='同一批次重复')]
+            assert adapter.save_trades_bulk(first) == {'inserted': 5, 'skipped': 1}
+
+            second = [make_trade(i) for i in range(3, 8)]
+            assert adapter.save_trades_bulk(second) == {'inserted': 3, 'skipped': 2}
+            assert adapter.save_trades(second) is True
+            assert adapter.get_statistics()['total_trades'] == 8
+
+            # 自然键以外的字段不同不影响去重，数量或价格不同则视为不同交易
+            assert adapter.save_trades_bulk([make_trade(1, commission=5.0)])['skipped'] == 1
+            assert adapter.save_trades_bulk([make_trade(1, quantity=11)])['inserted'] == 1
+        finally:
+            adapter.close()
+
+
+def test_migration_moves_existing_duplicates():
+    """旧数据库中的重复记录在迁移时移到 trades_duplicates 表"""
+    print("唯一索引迁移测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, 'trading.db')
+        adapter = SQLiteAdapter(db_path)
+        adapter.save_trades_bulk([make_trade(i) for i in range(3)])
+        adapter.close()
+
+        # 模拟旧版本数据库：没有唯一索引，存在重复记录
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP INDEX idx_trade_natural_key")
+        conn.execute("PRAGMA user_version = 0")
+        conn.execute("INSERT INTO trades SELECT NULL, trade_date, trade_time, symbol, security_name, "
+                     "security_type, action, quantity, price, amount, commission, net_amount, "
+                     "underlying_symbol, strike_price, expiration_date, option_type, source, close_date, "
+                     "close_price, close_quantity, close_reason, trade_rating, trade_type, notes, broker, "
+                     "account_id, source_file, import_time, created_at, updated_at FROM trades WHERE price < 102")
+        conn.commit()
+        conn.close()
+
+        adapter = SQLiteAdapter(db_path)
+        try:
+            with adapter.get_connection() as conn:
+                ids = [row[0] for row in conn.execute("SELECT id FROM trades ORDER BY id")]
+                moved = [row[0] for row in conn.execute("SELECT id FROM trades_duplicates ORDER BY id")]
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+            print(f"保留: {ids}, 移出: {moved}")
+            assert ids == [1, 2, 3]
+            assert moved == [4, 5]
+            assert version >= 1
+            assert adapter.save_trades_bulk([make_trade(0)]) == {'inserted': 0, 'skipped': 1}
+        finally:
+            adapter.close()
+
+
+if __name__ == '__main__':
+    test_bulk_insert_counts()
+    test_migration_moves_existing_duplicates()
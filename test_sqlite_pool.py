@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试SQLite连接池：WAL模式、连接复用、并发读写
+"""
+import sys
+import os
+import tempfile
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.database import SQLiteAdapter, TradeRecord
+
+
+def make_trade(i):
+    return TradeRecord(trade_date='2025-01-02', trade_time=f'10:{i // 60:02d}:{i % 60:02d}',
+                       symbol='AAPL', action='BUY', quantity=1, price=100.0 + i, amount=100.0 + i)
+
+
+def test_pool_pragmas_and_reuse():
+    """连接启用WAL，同一线程嵌套获取复用同一连接，归还后再次复用"""
+    with tempfile.TemporaryDirectory() as folder:
+        adapter = SQLiteAdapter(os.path.join(folder, 'trading.db'), pool_size=2)
+        try:
+            with adapter.get_connection() as conn:
+                assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+                assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+                with adapter.get_connection() as nested:
+                    assert nested is conn
+
+            with adapter.get_connection() as again:
+                assert again is conn
+
+            # 未提交的事务在归还时回滚
+            with adapter.get_connection() as conn:
+                conn.execute("DELETE FROM trades")
+            assert adapter.pool._created == 1
+        finally:
+            adapter.close()
+
+
+def test_concurrent_reads_during_writes():
+    """多个读线程和一个写线程同时访问，不出现错误且连接数不超过上限"""
+    print("SQLite连接池并发测试")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as folder:
+        adapter = SQLiteAdapter(os.path.join(folder, 'trading.db'), pool_size=3)
+        errors = []
+        counts = []
+
+        def writer():
+            for batch in range(10):
+                if not adapter.save_trades([make_trade(batch * 20 + i) for i in range(20)]):
+                    errors.append('save_trades')
+
+        def reader():
+            for _ in range(20):
+                stats = adapter.get_statistics()
+                if not stats:
+                    errors.append('get_statistics')
+                counts.append(stats.get('total_trades', 0))
+
+        try:
+            threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            print(f"读取 {len(counts)} 次, 连接数 {adapter.pool._created}, 错误 {errors}")
+            assert errors == []
+            assert adapter.pool._created <= 3
+            assert adapter.get_statistics()['total_trades'] == 200
+        finally:
+            adapter.close()
+
+
+if __name__ == '__main__':
+    test_pool_pragmas_and_reuse()
+    test_concurrent_reads_during_writes()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+测试交易记录按ID查询和键集分页（SQLiteAdapter + /api/trades）
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.config import Config
+from app.database import SQLiteAdapter, TradeRecord
+from app import api_server
+
+
+def make_trades(count):
+    """同一天多笔交易、部分时间相同，覆盖游标的各个比较字段"""
+    return [TradeRecord(
+        trade_date=f'2025-01-{i % 5 + 1:02d}',
+        trade_time=f'10:00:{i % 3:02d}',
+        symbol=['AAPL', 'TSLA'][i % 2],
+        action='BUY',
+        quantity=1,
+        price=100.0 + i,
+        amount=100.0 + i,
+        security_type='OPTION' if i % 4 == 0 else 'STOCK',
+    ) for i in range(count)]
+
+
+def test_iter_trades_pages_match_full_scan():
+    """逐页遍历的结果与一次性排序的结果一致，且不重复不遗漏"""
+    with tempfile.TemporaryDirectory() as folder:
+        adapter = SQLiteAdapter(os.path.join(folder, 'trading.db'))
+        try:
+            adapter.save_trades_bulk(make_trades(53))
+
+            expected = [t.id for t in adapter.get_trades()]
+            expected.sort(key=lambda i: (adapter.get_trade_by_id(i).trade_date,
+                                         adapter.get_trade_by_id(i).trade_time, i), reverse=True)
+
+            paged = []
+            after = None
+            while True:
+                page = list(adapter.iter_trades(after=after, limit=10))
+                paged.extend(t.id for t in page)
+                if len(page) < 10:
+                    break
+                after = (page[-1].trade_date, page[-1].trade_time, page[-1].id)
+
+            assert paged == expected
+            # 不限条数时内部逐页查询
+            assert [t.id for t in adapter.iter_trades(page_size=7)] == expected
+
+            options = [t.id for t in adapter.iter_trades(filters={'security_type': 'OPTION'})]
+            assert options == [i for i in expected if adapter.get_trade_by_id(i).security_type == 'OPTION']
+
+            assert adapter.get_trade_by_id(expected[0]).id == expected[0]
+            assert adapter.get_trade_by_id(10 ** 6) is None
+
+            with adapter.get_connection() as conn:
+                plan = conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT * FROM trades WHERE (trade_date, trade_time, id) < (?, ?, ?) "
+                    "ORDER BY trade_date DESC, trade_time DESC, id DESC LIMIT 10", ('2025-01-03', '10:00:01', 5)
+                ).fetchall()
+            assert 'idx_trade_keyset' in str([tuple(row) for row in plan])
+        finally:
+            adapter.close()
+
+
+def test_trades_api_cursor():
+    """列表接口返回 next_cursor，单条查询和更新按ID直接定位"""
+    print("交易记录分页接口测试")
+    print("=" * 50)
+
+    db_path, watch_folder = Config.SQLITE_DB_PATH, Config.WATCH_FOLDER
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            Config.SQLITE_DB_PATH = os.path.join(folder, 'trading.db')
+            Config.WATCH_FOLDER = os.path.join(folder, 'uploads')
+            SQLiteAdapter(Config.SQLITE_DB_PATH).save_trades_bulk(make_trades(25))
+
+            client = api_server.create_app().test_client()
+
+            ids = []
+            cursor = None
+            pages = 0
+            while True:
+                params = {'limit': 10}
+                if cursor:
+                    params['cursor'] = cursor
+                data = client.get('/api/trades', query_string=params).get_json()
+                ids.extend(t['id'] for t in data['trades'])
+                pages += 1
+                cursor = data['next_cursor']
+                assert data['has_more'] == (cursor is not None)
+                if not cursor:
+                    break
+
+            print(f"分页: {pages} 页, {len(ids)} 条")
+            assert pages == 3
+            assert sorted(ids) == list(range(1, 26))
+
+            assert client.get('/api/trades', query_string={'cursor': 'bad'}).status_code == 400
+
+            trade = client.get(f'/api/trades/{ids[0]}').get_json()
+            assert trade['id'] == ids[0]
+            assert client.get('/api/trades/999').status_code == 404
+
+            response = client.put(f'/api/trades/{ids[0]}', json={'commission': 2.5})
+            updated = response.get_json()['trade']
+            assert updated['commission'] == 2.5
+            assert updated['net_amount'] == trade['amount'] + 2.5
+    finally:
+        Config.SQLITE_DB_PATH, Config.WATCH_FOLDER = db_path, watch_folder
+
+
+def test_statistics_breakdowns_cover_all_trades():
+    """/api/statistics 的月度、标的、评分和来源统计包含全部交易，而不是交易列表的第一页"""
+    db_path, watch_folder = Config.SQLITE_DB_PATH, Config.WATCH_FOLDER
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            Config.SQLITE_DB_PATH = os.path.join(folder, 'trading.db')
+            Config.WATCH_FOLDER = os.path.join(folder, 'uploads')
+            trades = [TradeRecord(
+                trade_date=f'2025-{i % 3 + 1:02d}-{i % 28 + 1:02d}',
+                trade_time=f'{i // 60 % 24:02d}:{i % 60:02d}:00',
+                symbol=f'S{i % 12:02d}',
+                action='BUY' if i % 2 == 0 else 'SELL',
+                quantity=1,
+                price=10.0,
+                amount=10.0 + i % 12,
+                close_price=12.0 if i % 2 else 0,
+                trade_rating=(i % 6) * 0.9,
+                source=['群聊', '研报', ''][i % 3],
+            ) for i in range(450)]
+            SQLiteAdapter(Config.SQLITE_DB_PATH).save_trades_bulk(trades)
+
+            client = api_server.create_app().test_client()
+            page = client.get('/api/trades', query_string={'limit': 200}).get_json()
+            assert len(page['trades']) == 200 and page['has_more']
+            assert 'total' not in page
+
+            stats = client.get('/api/statistics').get_json()
+            assert stats['total_trades'] == 450
+
+            monthly = {row['month']: row for row in stats['monthly']}
+            assert sorted(monthly) == ['2025-01', '2025-02', '2025-03']
+            assert sum(row['trades'] for row in stats['monthly']) == 450
+            for month, row in monthly.items():
+                expected = [t for t in trades if t.trade_date.startswith(month)]
+                assert row['trades'] == len(expected)
+                assert row['amount'] == sum(t.amount for t in expected)
+                assert row['sellCount'] == sum(1 for t in expected if t.action == 'SELL')
+                assert row['profit'] == 2.0 * row['sellCount']
+
+            assert len(stats['top_symbols']) == 10
+            assert stats['top_symbols'][0] == {'symbol': 'S11', 'trades': 37, 'amount': 37 * 21.0, 'type': 'STOCK'}
+
+            expected_ratings = {str(r): 0 for r in range(1, 6)}
+            for t in trades:
+                if t.trade_rating > 0:
+                    expected_ratings[str(int(t.trade_rating + 0.5))] += 1
+            assert stats['rating_distribution'] == expected_ratings
+            assert stats['rated_trades'] == 375
+
+            sources = {row['source']: row for row in stats['sources']}
+            assert set(sources) == {'群聊', '研报'}
+            assert sources['群聊']['count'] == 150
+            assert sources['群聊']['profit'] == 2.0 * sum(
+                1 for t in trades if t.source == '群聊' and t.action == 'SELL')
+    finally:
+        Config.SQLITE_DB_PATH, Config.WATCH_FOLDER = db_path, watch_folder
+
+
+if __name__ == '__main__':
+    test_iter_trades_pages_match_full_scan()
+    test_trades_api_cursor()
+    test_statistics_breakdowns_cover_all_trades()